@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Fake ffmpeg
+Stands in for ffmpeg when recorder_stress.py drives the recorders: no
+camera, no decoding, just the output the recorders watch for. A
+frame pattern (…%04d.jpg) gets a small JPEG at the -vf fps=1/N interval;
+anything else gets a fragmented-MP4-shaped file of ftyp/moov then
+moof/mdat boxes. SIGTERM finishes like ffmpeg does (after
+FAKE_FFMPEG_EXIT_DELAY seconds).
+
+Environment:
+    FAKE_FFMPEG_START_DELAY  seconds before the first output (default 0.1)
+    FAKE_FFMPEG_EXIT_DELAY   seconds to finalize after SIGTERM (default 0.05)
+    FAKE_FFMPEG_CRASH_RATE   chance per output of exiting with status 1 (default 0)
+    FAKE_FFMPEG_HANG_RATE    chance of ignoring SIGTERM entirely (default 0; a SIGTERM
+                             during interpreter startup, ~50 ms, still ends it)
+"""
+
+import os
+import random
+import re
+import signal
+import sys
+import time
+
+JPEG = b'\xff\xd8\xff\xe0' + bytes(2048) + b'\xff\xd9'
+MP4_INTERVAL = 0.3  # seconds between fragments
+
+stopping = False
+
+
+def on_term(signum, frame):
+    global stopping
+    stopping = True
+
+
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def box(f, kind, payload):
+    f.write((payload + 8).to_bytes(4, 'big') + kind + bytes(payload))
+    f.flush()
+
+
+def main():
+    args = sys.argv[1:]
+    output = args[-1] if args else ''
+    if output in ('-', 'pipe:1') or not output:
+        sys.exit(0)
+
+    if random.random() < env_float('FAKE_FFMPEG_HANG_RATE', 0):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)  # only SIGKILL stops this one
+    else:
+        signal.signal(signal.SIGTERM, on_term)
+    signal.signal(signal.SIGINT, on_term)
+    crash_rate = env_float('FAKE_FFMPEG_CRASH_RATE', 0)
+
+    interval = 0.7
+    if '-vf' in args:
+        match = re.search(r'fps=1/([\d.]+)', args[args.index('-vf') + 1])
+        if match:
+            interval = float(match.group(1))
+
+    time.sleep(env_float('FAKE_FFMPEG_START_DELAY', 0.1))
+    if '%' in os.path.basename(output):
+        number = 1
+        while not stopping:
+            with open(output % number, 'wb') as f:
+                f.write(JPEG)
+            number += 1
+            if random.random() < crash_rate:
+                sys.exit(1)
+            deadline = time.monotonic() + interval
+            while not stopping and time.monotonic() < deadline:
+                time.sleep(0.02)
+    else:
+        with open(output, 'wb') as f:
+            box(f, b'ftyp', 16)
+            box(f, b'moov', 100)
+            while not stopping:
+                box(f, b'moof', 50)
+                box(f, b'mdat', 4096)
+                if random.random() < crash_rate:
+                    sys.exit(1)
+                deadline = time.monotonic() + MP4_INTERVAL
+                while not stopping and time.monotonic() < deadline:
+                    time.sleep(0.02)
+    time.sleep(env_float('FAKE_FFMPEG_EXIT_DELAY', 0.05))
+
+
+if __name__ == "__main__":
+    main()
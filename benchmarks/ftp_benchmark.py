@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+FTP Server Benchmark
+Builds a synthetic scout-videos tree (50k frame files by default), starts
+ftpserver.py against it and measures aggregate download MB/s and LIST latency
+"""
+
+import argparse
+import ftplib
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FTPSERVER_SCRIPT = os.path.join(SCRIPT_DIR, '..', 'ftpserver.py')
+FTP_USERNAME = "pirecorder"
+FTP_PASSWORD = "recorderpi"
+POSITIONS = ["bottom", "middle", "top"]
+CHUNK = os.urandom(64 * 1024)
+
+
+def write_file(path, size):
+    """Write a file of the given size filled with random-looking data"""
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            f.write(CHUNK[:min(remaining, len(CHUNK))])
+            remaining -= len(CHUNK)
+
+
+def build_tree(root, total_files, files_per_dir, file_size, big_files, big_size):
+    """Create a frame-mode style tree: recordings_<date>/<grid>-<position>/*.jpg"""
+    marker = os.path.join(root, f".bench_{total_files}_{files_per_dir}_{file_size}_{big_files}_{big_size}")
+    if os.path.exists(marker):
+        print(f"Reusing synthetic tree at {root}")
+        return
+
+    print(f"Building synthetic tree with {total_files} files at {root}...")
+    start = time.time()
+    date = datetime.today().strftime('%Y-%m-%d')
+    session_dir = os.path.join(root, f"recordings_{date}")
+    created = 0
+    grid_index = 0
+    while created < total_files:
+        grid = f"A-{grid_index // 2 + 1}-{'AB'[grid_index % 2]}"
+        for position in POSITIONS:
+            if created >= total_files:
+                break
+            frame_dir = os.path.join(session_dir, f"{grid}-{position}")
+            os.makedirs(frame_dir, exist_ok=True)
+            count = min(files_per_dir, total_files - created)
+            for i in range(1, count + 1):
+                name = f"ABC_GRID_{grid}_bench_recording_{date}_{position}_frame_{i:04d}_{int(start)}.jpg"
+                write_file(os.path.join(frame_dir, name), file_size)
+            created += count
+        grid_index += 1
+
+    big_dir = os.path.join(root, "bench_big")
+    os.makedirs(big_dir, exist_ok=True)
+    for i in range(big_files):
+        write_file(os.path.join(big_dir, f"big_{i}.mp4"), big_size)
+
+    open(marker, 'w').close()
+    print(f"Synthetic tree built in {time.time() - start:.1f}s")
+
+
+def start_server(root, port, server_args):
+    """Start ftpserver.py on a high port against the synthetic tree"""
+    cmd = [sys.executable, FTPSERVER_SCRIPT, '--port', str(port), '--root', root, '--no-keepalive'] + server_args
+    print(f"Starting server: {' '.join(cmd)}")
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            ftp = ftplib.FTP()
+            ftp.connect('127.0.0.1', port, timeout=2)
+            ftp.quit()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("FTP server did not start within 10 seconds")
+
+
+def connect(host, port):
+    ftp = ftplib.FTP()
+    ftp.connect(host, port, timeout=60)
+    ftp.login(FTP_USERNAME, FTP_PASSWORD)
+    return ftp
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_list(host, port, clients, rounds):
+    """Measure LIST latency on every frame directory from concurrent clients"""
+    ftp = connect(host, port)
+    session_dirs = [d for d in ftp.nlst('/') if d.lstrip('/').startswith('recordings_')]
+    frame_dirs = []
+    for session in session_dirs:
+        frame_dirs.extend(f"/{session.lstrip('/')}/{os.path.basename(d)}" for d in ftp.nlst(session))
+    ftp.quit()
+
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        client = connect(host, port)
+        for r in range(rounds):
+            for i in range(len(frame_dirs)):
+                directory = frame_dirs[(i + offset) % len(frame_dirs)]
+                lines = []
+                start = time.perf_counter()
+                client.retrlines(f"LIST {directory}", lines.append)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+        client.quit()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - start
+
+    return {
+        'directories': len(frame_dirs),
+        'lists': len(latencies),
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0,
+        'p95_ms': percentile(latencies, 95) * 1000 if latencies else 0,
+        'max_ms': max(latencies) * 1000 if latencies else 0,
+        'wall_s': total,
+    }
+
+
+def bench_download(host, port, clients):
+    """Download the large files concurrently and report aggregate throughput"""
+    ftp = connect(host, port)
+    big_files = sorted(ftp.nlst('/bench_big'))
+    ftp.quit()
+    if not big_files:
+        return {'bytes': 0, 'mb_per_s': 0, 'wall_s': 0}
+
+    received = [0] * clients
+
+    def worker(index):
+        client = connect(host, port)
+        name = big_files[index % len(big_files)]
+        path = name if name.startswith('/') else f"/bench_big/{name}"
+
+        def on_block(block):
+            received[index] += len(block)
+
+        client.retrbinary(f"RETR {path}", on_block, blocksize=256 * 1024)
+        client.quit()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - start
+
+    total_bytes = sum(received)
+    return {
+        'bytes': total_bytes,
+        'mb_per_s': total_bytes / (1024 * 1024) / total if total else 0,
+        'wall_s': total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FTP Server Benchmark')
+    parser.add_argument('--root', type=str, default=os.path.join(tempfile.gettempdir(), 'ftp-bench-tree'),
+                        help='Directory for the synthetic tree')
+    parser.add_argument('--files', type=int, default=50000, help='Number of frame files (default: 50000)')
+    parser.add_argument('--files-per-dir', type=int, default=1000, help='Frames per grid directory (default: 1000)')
+    parser.add_argument('--file-size', type=int, default=16 * 1024, help='Frame file size in bytes (default: 16384)')
+    parser.add_argument('--big-files', type=int, default=4, help='Number of large files for throughput (default: 4)')
+    parser.add_argument('--big-size', type=int, default=256 * 1024 * 1024,
+                        help='Large file size in bytes (default: 256 MiB)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Server host (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=2121, help='Server port (default: 2121)')
+    parser.add_argument('--external', action='store_true', help='Benchmark an already running server')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent clients (default: 4)')
+    parser.add_argument('--list-rounds', type=int, default=1, help='LIST passes per client (default: 1)')
+    parser.add_argument('server_args', nargs=argparse.REMAINDER,
+                        help='Extra ftpserver.py arguments after --, e.g. -- --performance --server-mode prefork')
+    args = parser.parse_args()
+
+    server_args = [a for a in args.server_args if a != '--']
+    process = None
+    if not args.external:
+        os.makedirs(args.root, exist_ok=True)
+        build_tree(args.root, args.files, args.files_per_dir, args.file_size, args.big_files, args.big_size)
+        process = start_server(args.root, args.port, server_args)
+
+    try:
+        print(f"Running LIST benchmark with {args.clients} clients...")
+        list_result = bench_list(args.host, args.port, args.clients, args.list_rounds)
+        print(f"Running download benchmark with {args.clients} clients...")
+        download_result = bench_download(args.host, args.port, args.clients)
+    finally:
+        if process:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print("=" * 50)
+    print(f"Server args: {' '.join(server_args) or '(default)'}")
+    print(f"LIST: {list_result['lists']} listings over {list_result['directories']} directories "
+          f"in {list_result['wall_s']:.2f}s")
+    print(f"  p50 {list_result['p50_ms']:.1f} ms, p95 {list_result['p95_ms']:.1f} ms, "
+          f"max {list_result['max_ms']:.1f} ms")
+    print(f"Download: {download_result['bytes'] / (1024 * 1024):.1f} MB in {download_result['wall_s']:.2f}s "
+          f"= {download_result['mb_per_s']:.1f} MB/s aggregate")
+
+
+if __name__ == "__main__":
+    main()
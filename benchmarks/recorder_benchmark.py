@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Recorder Benchmark
+Runs the recorders against synthetic cameras on an ordinary x86 Linux box:
+each camera is an ffmpeg test pattern published to a local RTSP server
+(mediamtx, https://github.com/bluenviron/mediamtx), with one
+rtsp_record_api.py per camera writing to a scratch tree. All cameras are
+started and stopped together for several rounds, in video and/or frame
+mode, and the report covers start and stop latency, frame interval
+jitter, dropped frames, CPU per camera and bytes written.
+
+    python3 benchmarks/recorder_benchmark.py --cameras 3 --duration 30 --rounds 3
+    python3 benchmarks/recorder_benchmark.py --mode frames -- --no-staging
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import psutil
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, REPO_DIR)
+
+from launcher import Services, http_json, log_tail, recorder_ready, rtsp_ready, wait_until  # noqa: E402
+
+RECORDERS = {
+    'video': os.path.join(REPO_DIR, 'videos', 'rtsp_record_api.py'),
+    'frames': os.path.join(REPO_DIR, 'frames', 'rtsp_record_api.py'),
+}
+RTSP_PORT = 8754  # away from v4l2rtspserver's 8554-8556
+BASE_PORT = 5100  # recorder APIs, away from 5000-5002
+STAGE_DIR = "/dev/shm/scout-bench-staging"
+SERVER_READY_TIMEOUT = 10  # seconds for the RTSP server to listen
+SOURCE_READY_TIMEOUT = 20  # seconds for a test pattern to be published
+RECORDER_READY_TIMEOUT = 15
+FIRST_OUTPUT_TIMEOUT = 30  # seconds after /record/start for the first frame or bytes
+FLUSH_TIMEOUT = 30  # seconds after /record/stop for staged frames to reach the disk
+POLL_INTERVAL = 0.05
+HTTP_TIMEOUT = 30
+
+MEDIAMTX_CONFIG = """\
+logLevel: warn
+rtspAddress: :{port}
+rtspTransports: [tcp]
+rtmp: no
+hls: no
+webrtc: no
+srt: no
+api: no
+metrics: no
+paths:
+  all_others:
+"""
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values, scale=1.0):
+    """p50/p95/max of a list (scaled, e.g. to ms), or None if it is empty"""
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {'n': len(values), 'p50': statistics.median(values) * scale,
+            'p95': percentile(values, 95) * scale, 'max': max(values) * scale}
+
+
+def http_get(url):
+    """GET url; returns (seconds, status, body)"""
+    start = time.perf_counter()
+    status, body = http_json(url, timeout=HTTP_TIMEOUT)
+    return time.perf_counter() - start, status, body
+
+
+def port_open(port):
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+# --- Synthetic cameras
+
+def start_rtsp_server(services, binary, port, workdir):
+    path = shutil.which(binary)
+    if path is None:
+        raise RuntimeError(f"{binary} not found; install mediamtx (https://github.com/bluenviron/mediamtx) "
+                           f"or pass --rtsp-server PATH")
+    config = os.path.join(workdir, 'mediamtx.yml')
+    with open(config, 'w') as f:
+        f.write(MEDIAMTX_CONFIG.format(port=port))
+    log_file = os.path.join(workdir, 'rtsp_server.log')
+    process = services.start('rtsp-server', [path, config], log_file)
+    if not wait_until(lambda: port_open(port), process, SERVER_READY_TIMEOUT):
+        raise RuntimeError(f"RTSP server did not listen on {port}:\n{log_tail(log_file)}")
+    return process
+
+
+def start_source(services, index, args, workdir):
+    """Publish an ffmpeg test pattern as rtsp://127.0.0.1:<port>/cam<index>"""
+    url = f"rtsp://127.0.0.1:{args.rtsp_port}/cam{index}"
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-re',
+           '-f', 'lavfi', '-i', f"testsrc2=size={args.width}x{args.height}:rate={args.fps}",
+           '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency', '-pix_fmt', 'yuv420p',
+           '-g', str(args.fps), '-b:v', f"{args.bitrate}k",
+           '-f', 'rtsp', '-rtsp_transport', 'tcp', url]
+    log_file = os.path.join(workdir, f'source_{index}.log')
+    process = services.start(f'source-{index}', cmd, log_file)
+    if not wait_until(lambda: rtsp_ready(url), process, SOURCE_READY_TIMEOUT):
+        raise RuntimeError(f"Test pattern {index} was not served at {url}:\n{log_tail(log_file)}")
+    return url
+
+
+def start_recorder(services, mode, index, url, root, args):
+    port = args.base_port + index
+    cmd = [sys.executable, RECORDERS[mode], '--port', str(port), '--rtsp-url', url,
+           '--width', str(args.width), '--height', str(args.height), '--save-root', root]
+    if mode == 'frames':
+        cmd += ['--stage-dir', args.stage_dir]
+    cmd += args.recorder_args
+    log_file = os.path.join(root, f'recorder_{mode}_{port}.log')
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, PYTHONUNBUFFERED='1')
+    with open(log_file, 'w') as log:
+        process = subprocess.Popen(cmd, cwd=root, stdout=log, stderr=subprocess.STDOUT, env=env)
+    with services.lock:
+        services.processes.append((f'recorder-{mode}-{port}', process))
+    if not wait_until(lambda: recorder_ready(port), process, RECORDER_READY_TIMEOUT):
+        raise RuntimeError(f"Recorder on {port} did not answer:\n{log_tail(log_file)}")
+    return Camera(index, port, process, root, args.stage_dir)
+
+
+# --- Measurement
+
+class Camera:
+    """One recorder under test and the process tree it runs"""
+
+    def __init__(self, index, port, popen, root, stage_dir):
+        self.index = index
+        self.port = port
+        self.popen = popen
+        self.process = psutil.Process(popen.pid)
+        self.root = root
+        self.stage_dir = os.path.join(stage_dir, f"recorder_{port}")
+        self.io_seen = {}  # pid -> highest write_bytes seen (ffmpeg's counters vanish when it exits)
+
+    def api(self, path, **params):
+        return http_get(f"http://127.0.0.1:{self.port}{path}?{urllib.parse.urlencode(params)}")
+
+    def cpu_seconds(self):
+        """CPU time of the recorder, its exited ffmpeg children and the running ones"""
+        times = self.process.cpu_times()
+        total = times.user + times.system + times.children_user + times.children_system
+        for child in self.process.children(recursive=True):
+            try:
+                child_times = child.cpu_times()
+                total += child_times.user + child_times.system
+            except psutil.Error:
+                pass
+        return total
+
+    def sample_io(self):
+        for proc in [self.process] + self.process.children(recursive=True):
+            try:
+                write_bytes = proc.io_counters().write_bytes
+            except (psutil.Error, AttributeError):
+                continue
+            self.io_seen[proc.pid] = max(write_bytes, self.io_seen.get(proc.pid, 0))
+
+    def io_write_bytes(self):
+        return sum(self.io_seen.values())
+
+    def outputs(self, grid, staged=False):
+        """Captures of a grid on disk (and, with staged, still in the frame staging area)"""
+        paths = glob.glob(os.path.join(self.root, 'recordings_*', '**', f"ABC_GRID_{grid}_*"), recursive=True)
+        return paths + self.staged(grid) if staged else paths
+
+    def staged(self, grid):
+        return glob.glob(os.path.join(self.stage_dir, '**', f"ABC_GRID_{grid}_*"), recursive=True)
+
+
+def output_bytes(paths):
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def wait_for(check, timeout):
+    """Seconds until check() is true, or None on timeout"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if check():
+            return time.perf_counter() - start
+        time.sleep(POLL_INTERVAL)
+    return None
+
+
+def frame_timeline(paths):
+    """(frame number, mtime) of each saved frame, in frame order"""
+    frames = []
+    for path in paths:
+        stem = os.path.basename(path)[:-len('.jpg')]
+        parts = stem.split('_frame_', 1)[-1].split('_')
+        try:
+            frames.append((int(parts[0]), os.stat(path).st_mtime_ns / 1e9))
+        except (ValueError, OSError):
+            pass
+    return sorted(frames)
+
+
+def video_timeline(path):
+    """Packet timestamps of the video stream (needs ffprobe), or None"""
+    if shutil.which('ffprobe') is None:
+        return None
+    result = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries',
+                             'packet=pts_time', '-of', 'csv=p=0', path],
+                            capture_output=True, text=True, timeout=60)
+    times = []
+    for line in result.stdout.split():
+        try:
+            times.append(float(line.strip(',')))
+        except ValueError:
+            pass
+    return sorted(times)
+
+
+def interval_stats(times, expected):
+    """Jitter and gaps of a capture timeline against the expected interval"""
+    intervals = [b - a for a, b in zip(times, times[1:])]
+    if not intervals:
+        return {'captured': len(times), 'dropped': 0, 'intervals': []}
+    dropped = sum(max(0, round(interval / expected) - 1) for interval in intervals)
+    return {'captured': len(times), 'dropped': dropped, 'intervals': intervals}
+
+
+def run_round(cameras, mode, round_index, duration, expected_interval):
+    """Start every camera at once, record for duration, stop them all; one result per camera"""
+    results = [None] * len(cameras)
+    barrier = threading.Barrier(len(cameras))
+
+    def worker(position, camera):
+        grid = f"BENCH{camera.index}-{round_index}"
+        result = {'camera': camera.index, 'round': round_index, 'grid': grid}
+        camera.sample_io()
+        cpu_before, wall_before = camera.cpu_seconds(), time.perf_counter()
+        barrier.wait()
+
+        result['start_api'], status, body = camera.api('/record/start', grid_name=grid, counter='bench')
+        if status != 200:
+            result['error'] = f"start returned {status}: {body[:100]}"
+        result['first_output'] = wait_for(
+            lambda: output_bytes(camera.outputs(grid, staged=True)) > 0, FIRST_OUTPUT_TIMEOUT)
+        if result['first_output'] is not None:
+            result['first_output'] += result['start_api']
+
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            camera.sample_io()
+            time.sleep(min(1.0, max(0, end - time.perf_counter())))
+        camera.sample_io()
+
+        result['stop_api'], status, body = camera.api('/record/stop', grid_name=grid)
+        if status != 200:
+            result['error'] = f"stop returned {status}: {body[:100]}"
+        # Frame mode: the last batch is flushed from the staging area after ffmpeg exits
+        result['stop_flushed'] = wait_for(lambda: not camera.staged(grid), FLUSH_TIMEOUT)
+        if result['stop_flushed'] is not None:
+            result['stop_flushed'] += result['stop_api']
+        camera.sample_io()
+        wall = time.perf_counter() - wall_before
+        result['cpu_percent'] = (camera.cpu_seconds() - cpu_before) / wall * 100 if wall else None
+        result['wall'] = wall
+
+        outputs = camera.outputs(grid)
+        result['bytes'] = output_bytes(outputs)
+        if mode == 'frames':
+            timeline = [t for _, t in frame_timeline(outputs)]
+            result.update(interval_stats(timeline, expected_interval))
+        else:
+            timeline = video_timeline(outputs[0]) if outputs else None
+            if timeline is not None:
+                result.update(interval_stats(timeline, expected_interval))
+        results[position] = result
+
+    threads = [threading.Thread(target=worker, args=(i, camera)) for i, camera in enumerate(cameras)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def run_mode(services, mode, urls, root, args):
+    """Bring up one recorder per camera, run the rounds and stop the recorders again"""
+    mode_root = os.path.join(root, mode)
+    os.makedirs(mode_root, exist_ok=True)
+    print(f"Starting {len(urls)} {mode} recorders...")
+    cameras = [start_recorder(services, mode, i, url, mode_root, args) for i, url in enumerate(urls)]
+    if mode == 'frames':
+        _, _, body = http_get(f"http://127.0.0.1:{cameras[0].port}/governor")
+        expected = json.loads(body)['frame_interval']
+    else:
+        expected = 1 / args.fps
+    try:
+        results = []
+        for r in range(args.rounds):
+            print(f"  {mode} round {r + 1}/{args.rounds}: recording {args.duration}s on {len(cameras)} cameras")
+            results += run_round(cameras, mode, r, args.duration, expected)
+            time.sleep(args.pause)
+        io_bytes = sum(camera.io_write_bytes() for camera in cameras)
+    finally:
+        for camera in cameras:
+            services.discard(camera.popen)  # SIGTERM: the frame recorder flushes what is still staged
+    return report(mode, results, expected, io_bytes, args)
+
+
+def report(mode, results, expected, io_bytes, args):
+    intervals = [i for r in results for i in r.get('intervals', [])]
+    captured = sum(r.get('captured', 0) for r in results)
+    dropped = sum(r.get('dropped', 0) for r in results)
+    recorded = sum(r['wall'] for r in results) or 1
+    summary = {
+        'mode': mode,
+        'cameras': args.cameras,
+        'rounds': args.rounds,
+        'duration': args.duration,
+        'errors': [f"camera {r['camera']} round {r['round']}: {r['error']}" for r in results if r.get('error')],
+        'start_api_ms': summarize([r['start_api'] for r in results], 1000),
+        'first_output_ms': summarize([r['first_output'] for r in results], 1000),
+        'stop_api_ms': summarize([r['stop_api'] for r in results], 1000),
+        'stop_flushed_ms': summarize([r['stop_flushed'] for r in results], 1000),
+        'expected_interval_s': expected,
+        'interval_mean_s': statistics.mean(intervals) if intervals else None,
+        'interval_stdev_ms': statistics.pstdev(intervals) * 1000 if intervals else None,
+        'interval_p99_deviation_ms': percentile([abs(i - expected) for i in intervals], 99) * 1000
+        if intervals else None,
+        'captured': captured,
+        'dropped': dropped,
+        'cpu_percent_per_camera': summarize([r['cpu_percent'] for r in results]),
+        'bytes_written': sum(r['bytes'] for r in results),
+        'mb_per_s_per_camera': sum(r['bytes'] for r in results) / 1e6 / recorded,
+        'io_write_bytes': io_bytes,
+        'runs': [{k: v for k, v in r.items() if k != 'intervals'} for r in results],
+    }
+    print_summary(summary)
+    return summary
+
+
+def print_summary(s):
+    def line(label, stats, unit='ms'):
+        if stats is None:
+            return f"  {label:<18} n/a"
+        return (f"  {label:<18} p50 {stats['p50']:.1f} {unit}, p95 {stats['p95']:.1f} {unit}, "
+                f"max {stats['max']:.1f} {unit}")
+
+    print("=" * 60)
+    print(f"{s['mode']}: {s['cameras']} cameras x {s['rounds']} rounds of {s['duration']}s")
+    print(line("start (API)", s['start_api_ms']))
+    print(line("start (1st output)", s['first_output_ms']))
+    print(line("stop (API)", s['stop_api_ms']))
+    print(line("stop (on disk)", s['stop_flushed_ms']))
+    if s['interval_mean_s'] is not None:
+        print(f"  {'capture interval':<18} mean {s['interval_mean_s'] * 1000:.1f} ms "
+              f"(expected {s['expected_interval_s'] * 1000:.1f}), stdev {s['interval_stdev_ms']:.1f} ms, "
+              f"p99 deviation {s['interval_p99_deviation_ms']:.1f} ms")
+        total = s['captured'] + s['dropped']
+        print(f"  {'dropped frames':<18} {s['dropped']} of {total} ({s['dropped'] / total * 100 if total else 0:.2f}%)")
+    else:
+        print(f"  {'capture interval':<18} n/a (ffprobe not found)")
+    print(line("CPU per camera", s['cpu_percent_per_camera'], '%'))
+    print(f"  {'bytes written':<18} {s['bytes_written'] / 1e6:.1f} MB "
+          f"({s['mb_per_s_per_camera']:.2f} MB/s per camera), {s['io_write_bytes'] / 1e6:.1f} MB block I/O")
+    for error in s['errors']:
+        print(f"  ✗ {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recorder benchmark with synthetic RTSP cameras')
+    parser.add_argument('--mode', choices=['video', 'frames', 'both'], default='both',
+                        help='Recorder to benchmark (default: both)')
+    parser.add_argument('--cameras', type=int, default=3, help='Synthetic cameras (default: 3)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds recorded per round (default: 30)')
+    parser.add_argument('--rounds', type=int, default=3, help='Start/stop rounds per mode (default: 3)')
+    parser.add_argument('--pause', type=float, default=2, help='Seconds between rounds (default: 2)')
+    parser.add_argument('--width', type=int, default=1920, help='Test pattern width (default: 1920)')
+    parser.add_argument('--height', type=int, default=1080, help='Test pattern height (default: 1080)')
+    parser.add_argument('--fps', type=int, default=30, help='Test pattern frame rate (default: 30)')
+    parser.add_argument('--bitrate', type=int, default=4000, help='Test pattern H.264 kbit/s (default: 4000)')
+    parser.add_argument('--rtsp-server', type=str, default='mediamtx', help='RTSP server binary (default: mediamtx)')
+    parser.add_argument('--rtsp-port', type=int, default=RTSP_PORT, help=f'RTSP server port (default: {RTSP_PORT})')
+    parser.add_argument('--base-port', type=int, default=BASE_PORT,
+                        help=f'First recorder API port (default: {BASE_PORT})')
+    parser.add_argument('--stage-dir', type=str, default=STAGE_DIR,
+                        help=f'Frame staging area for the frame recorders (default: {STAGE_DIR})')
+    parser.add_argument('--root', type=str, default=None, help='Scratch capture tree (default: a temp dir)')
+    parser.add_argument('--keep', action='store_true', help='Keep the captures and logs afterwards')
+    parser.add_argument('-o', '--json', type=str, default=None, help='Write the results as JSON')
+    parser.add_argument('recorder_args', nargs=argparse.REMAINDER,
+                        help='Extra rtsp_record_api.py arguments after --, e.g. -- --no-staging')
+    args = parser.parse_args()
+    args.recorder_args = [a for a in args.recorder_args if a != '--']
+
+    if shutil.which('ffmpeg') is None:
+        print("✗ ffmpeg not found")
+        sys.exit(1)
+    root = args.root or tempfile.mkdtemp(prefix='recorder-bench-')
+    os.makedirs(root, exist_ok=True)
+    modes = ['video', 'frames'] if args.mode == 'both' else [args.mode]
+    services = Services(root)
+    summaries = []
+    try:
+        start_rtsp_server(services, args.rtsp_server, args.rtsp_port, root)
+        print(f"Publishing {args.cameras} test patterns ({args.width}x{args.height}@{args.fps})...")
+        urls = [start_source(services, i, args, root) for i in range(args.cameras)]
+        for mode in modes:
+            summaries.append(run_mode(services, mode, urls, root, args))
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    finally:
+        services.stop_all()
+        if not args.keep:
+            shutil.rmtree(args.stage_dir, ignore_errors=True)
+        if not args.keep and not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+        elif summaries:
+            print(f"Captures and logs kept in {root}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summaries, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Recorder Stress Test
+Fires concurrent start/stop/switch/status storms over many grids at one
+rtsp_record_api.py (video or frame mode) backed by fake_ffmpeg.py. The
+recorder runs in this process, behind its real Flask app on a local port,
+with recording_lock replaced by a lock that times every hold and wait.
+
+Reported: p50/p99/max latency per request type, lock wait and hold times
+(and which code path held it longest), and invariant violations:
+
+  - more than one recording registered at once (one recording per camera)
+  - two live ffmpeg processes for the same grid
+  - an ffmpeg no recording refers to that is still alive after a grace period
+  - a registered recording whose ffmpeg exited and was never cleaned up
+  - after the final stop: recordings, ffmpeg processes or journal sessions left open
+
+Exits with status 1 if any invariant was violated.
+
+    python3 benchmarks/recorder_stress.py --mode frames --clients 16 --duration 30
+    FAKE_FFMPEG_EXIT_DELAY=1 python3 benchmarks/recorder_stress.py --mode video
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+import psutil
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, REPO_DIR)
+
+from recording_journal import OPEN_STATES, RecordingJournal, journal_path, read_sessions  # noqa: E402
+
+FAKE_FFMPEG = os.path.join(SCRIPT_DIR, 'fake_ffmpeg.py')
+RECORDERS = {
+    'video': os.path.join(REPO_DIR, 'videos', 'rtsp_record_api.py'),
+    'frames': os.path.join(REPO_DIR, 'frames', 'rtsp_record_api.py'),
+}
+PORT = 5190
+OPERATIONS = {'start': 30, 'switch': 20, 'stop': 15, 'stop_all': 5, 'status': 20, 'session': 5, 'settings': 5}
+CHECK_INTERVAL = 0.05  # seconds between invariant checks
+PROCESS_GRACE = 8  # seconds an unreferenced or duplicate ffmpeg may live (stop waits up to 5s, then SIGKILL)
+STALE_GRACE = 3  # seconds an exited ffmpeg may stay registered before its thread cleans it up
+QUIESCE_TIMEOUT = 20  # seconds after the final stop for everything to wind down
+HTTP_TIMEOUT = 30
+GRID_PATTERN = re.compile(r'ABC_GRID_(G\d+)_')
+
+
+def log(message):
+    print(message, file=sys.__stdout__, flush=True)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values, scale=1000):
+    if not values:
+        return None
+    return {'n': len(values), 'p50': statistics.median(values) * scale,
+            'p99': percentile(values, 99) * scale, 'max': max(values) * scale}
+
+
+class TimedLock:
+    """Drop-in for recording_lock that records wait and hold times per calling function"""
+
+    def __init__(self):
+        self.lock = threading.Lock()  # the real lock; the invariant checker reads state under it untimed
+        self.stats_lock = threading.Lock()
+        self.waits = []
+        self.holds = defaultdict(list)  # caller -> hold durations
+        self.holder = None  # (caller, acquired at)
+
+    def _acquire(self, depth, blocking=True, timeout=-1):
+        requested = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        if acquired:
+            now = time.perf_counter()
+            self.holder = (sys._getframe(depth).f_code.co_name, now)
+            with self.stats_lock:
+                self.waits.append(now - requested)
+        return acquired
+
+    def acquire(self, blocking=True, timeout=-1):
+        return self._acquire(2, blocking, timeout)
+
+    def release(self):
+        caller, acquired = self.holder
+        held = time.perf_counter() - acquired
+        self.lock.release()
+        with self.stats_lock:
+            self.holds[caller].append(held)
+
+    def __enter__(self):
+        self._acquire(2)
+        return True
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def report(self):
+        with self.stats_lock:
+            holds = [h for values in self.holds.values() for h in values]
+            by_caller = sorted(((caller, summarize(values)) for caller, values in self.holds.items()),
+                               key=lambda item: item[1]['max'], reverse=True)
+            return {'acquisitions': len(self.waits), 'wait_ms': summarize(self.waits), 'hold_ms': summarize(holds),
+                    'by_caller': dict(by_caller)}
+
+
+class InvariantChecker:
+    """Samples the recorder's state and the live fake ffmpeg processes while the storm runs"""
+
+    def __init__(self, stream, root):
+        self.stream = stream
+        self.root = root
+        self.violations = []
+        self.reported = set()
+        self.unowned_since = {}  # pid -> first time no recording referred to it
+        self.duplicate_since = {}  # grid -> first time it had two live ffmpeg
+        self.exited_since = {}  # (grid, pid) -> first time its ffmpeg was seen exited while registered
+        self.max_live = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def violation(self, key, message):
+        if key not in self.reported:
+            self.reported.add(key)
+            self.violations.append({'time': round(time.time(), 3), 'message': message})
+            log(f"  ✗ {message}")
+
+    def ffmpeg_processes(self):
+        """pid -> grid of the fake ffmpeg processes writing under our scratch root"""
+        processes = {}
+        for child in psutil.Process().children():
+            try:
+                cmdline = child.cmdline()
+                if child.status() == psutil.STATUS_ZOMBIE:
+                    continue
+            except psutil.Error:
+                continue
+            if any(arg.endswith('/ffmpeg') for arg in cmdline[:2]) and cmdline and self.root in cmdline[-1]:
+                match = GRID_PATTERN.search(cmdline[-1])
+                processes[child.pid] = match.group(1) if match else None
+        return processes
+
+    def check(self):
+        now = time.monotonic()
+        with self.stream.recording_lock.lock:
+            registered = {grid: info.get('process') for grid, info in self.stream.active_recordings.items()}
+        live = self.ffmpeg_processes()
+        self.max_live = max(self.max_live, len(live))
+
+        if len(registered) > 1:
+            self.violation(('multiple', tuple(sorted(registered))),
+                           f"{len(registered)} recordings registered at once: {', '.join(sorted(registered))}")
+
+        owned = {process.pid for process in registered.values() if process is not None}
+        for pid, grid in live.items():
+            if pid in owned or grid in registered:
+                self.unowned_since.pop(pid, None)
+                continue
+            first = self.unowned_since.setdefault(pid, now)
+            if now - first > PROCESS_GRACE:
+                self.violation(('leak', pid), f"ffmpeg {pid} (grid {grid}) still running {now - first:.1f}s "
+                                              f"after its recording was unregistered")
+        for pid in list(self.unowned_since):
+            if pid not in live:
+                del self.unowned_since[pid]
+
+        per_grid = defaultdict(list)
+        for pid, grid in live.items():
+            per_grid[grid].append(pid)
+        for grid, pids in per_grid.items():
+            if len(pids) > 1:
+                first = self.duplicate_since.setdefault(grid, now)
+                if now - first > PROCESS_GRACE:
+                    self.violation(('duplicate', grid, tuple(sorted(pids))),
+                                   f"grid {grid} has {len(pids)} live ffmpeg processes: {sorted(pids)}")
+            else:
+                self.duplicate_since.pop(grid, None)
+
+        for grid, process in registered.items():
+            if process is not None and process.poll() is not None:
+                first = self.exited_since.setdefault((grid, process.pid), now)
+                if now - first > STALE_GRACE:
+                    self.violation(('stale', grid, process.pid),
+                                   f"grid {grid} still registered {now - first:.1f}s after its ffmpeg "
+                                   f"{process.pid} exited ({process.returncode})")
+
+    def _run(self):
+        while not self.stop_event.wait(CHECK_INTERVAL):
+            try:
+                self.check()
+            except Exception as e:
+                log(f"Invariant check failed: {e}")
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+
+def load_recorder(mode, root, port):
+    """Import a recorder module and set it up to save under root, as its main() would"""
+    sys.path.insert(0, os.path.dirname(RECORDERS[mode]))
+    spec = importlib.util.spec_from_file_location(f"recorder_{mode}", RECORDERS[mode])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.port = port
+    module.SAVE_ROOT = os.path.join(root, 'captures')
+    journal = RecordingJournal(journal_path(port, os.path.join(root, 'journal')))
+    kwargs = {'journal': journal}
+    if mode == 'frames':
+        kwargs['stage_root'] = os.path.join(root, 'staging')
+    stream = module.RTSPStream(rtsp_url='rtsp://127.0.0.1:8754/stress', **kwargs)
+    stream.recording_lock = TimedLock()
+    module.rtsp_stream = stream
+    return module, stream, journal
+
+
+def serve(app, port):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def request(port, path, method='GET', **params):
+    """Returns (seconds, status); status is None if the request failed"""
+    url = f"http://127.0.0.1:{port}{path}?{urllib.parse.urlencode(params)}"
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method=method), timeout=HTTP_TIMEOUT) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = None
+    return time.perf_counter() - start, status
+
+
+def storm(port, mode, grids, clients, duration, seed):
+    """Run clients threads issuing random operations for duration seconds"""
+    latencies = defaultdict(list)
+    failures = defaultdict(int)
+    stats_lock = threading.Lock()
+    last_started = [None]
+    operations = {op: weight for op, weight in OPERATIONS.items() if op != 'settings' or mode == 'frames'}
+    names, weights = list(operations), list(operations.values())
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        while time.monotonic() < deadline:
+            op = rng.choices(names, weights)[0]
+            grid = f"G{rng.randrange(grids)}"
+            if op == 'start':
+                elapsed, status = request(port, '/record/start', grid_name=grid, counter=f"c{index}")
+                last_started[0] = grid
+            elif op == 'switch':
+                # Start a grid other than the one just started, so the recorder has to stop that one first
+                current = last_started[0]
+                while grid == current and grids > 1:
+                    grid = f"G{rng.randrange(grids)}"
+                elapsed, status = request(port, '/record/start', grid_name=grid, counter=f"c{index}")
+                last_started[0] = grid
+            elif op == 'stop':
+                elapsed, status = request(port, '/record/stop', grid_name=last_started[0] or grid)
+            elif op == 'stop_all':
+                elapsed, status = request(port, '/record/stop')
+            elif op == 'status':
+                elapsed, status = request(port, '/status')
+            elif op == 'session':
+                elapsed, status = request(port, '/session')
+            else:
+                elapsed, status = request(port, '/governor', method='POST', fps=rng.choice(['1.0', '1.428571']))
+            with stats_lock:
+                latencies[op].append(elapsed)
+                if status != 200:
+                    failures[op] += 1
+            time.sleep(rng.uniform(0, 0.02))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, failures
+
+
+def quiesce(port, stream, checker, journal):
+    """Stop everything and check that nothing is left registered, running or open in the journal"""
+    request(port, '/record/stop')
+    deadline = time.monotonic() + QUIESCE_TIMEOUT
+    while time.monotonic() < deadline:
+        with stream.recording_lock.lock:
+            registered = list(stream.active_recordings)
+        if not registered and not checker.ffmpeg_processes():
+            break
+        time.sleep(0.2)
+    with stream.recording_lock.lock:
+        registered = list(stream.active_recordings)
+    if registered:
+        checker.violation('final-registered', f"still registered after the final stop: {', '.join(registered)}")
+    for pid, grid in checker.ffmpeg_processes().items():
+        checker.violation(('final-leak', pid), f"ffmpeg {pid} (grid {grid}) still running after the final stop")
+        try:
+            psutil.Process(pid).kill()
+        except psutil.Error:
+            pass
+    open_sessions = [s for s in read_sessions(journal.path).values() if s.get('event') in OPEN_STATES]
+    for session in open_sessions:
+        checker.violation(('journal', session['session']),
+                          f"journal session {session['session']} left {session['event']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrency stress test for the recorder HTTP API')
+    parser.add_argument('--mode', choices=['video', 'frames'], default='frames', help='Recorder (default: frames)')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent HTTP clients (default: 16)')
+    parser.add_argument('--grids', type=int, default=50, help='Grid names to pick from (default: 50)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of storm (default: 30)')
+    parser.add_argument('--port', type=int, default=PORT, help=f'Recorder API port (default: {PORT})')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--root', type=str, default=None, help='Scratch directory (default: a temp dir)')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch directory and recorder log')
+    parser.add_argument('-o', '--json', type=str, default=None, help='Write the results as JSON')
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root or tempfile.mkdtemp(prefix='recorder-stress-'))
+    bin_dir = os.path.join(root, 'bin')
+    os.makedirs(bin_dir, exist_ok=True)
+    fake = os.path.join(bin_dir, 'ffmpeg')
+    if not os.path.exists(fake):
+        os.symlink(FAKE_FFMPEG, fake)
+    os.environ['PATH'] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+    # The recorder prints every frame and state change; keep that out of the report
+    recorder_log = open(os.path.join(root, 'recorder.log'), 'w')
+    sys.stdout = recorder_log
+    try:
+        module, stream, journal = load_recorder(args.mode, root, args.port)
+        server = serve(module.app, args.port)
+        checker = InvariantChecker(stream, root)
+        checker.start()
+        log(f"Storm: {args.clients} clients, {args.grids} grids, {args.duration}s against the {args.mode} recorder "
+            f"on port {args.port}")
+        started = time.monotonic()
+        latencies, failures = storm(args.port, args.mode, args.grids, args.clients, args.duration, args.seed)
+        wall = time.monotonic() - started
+        log("Storm over, stopping all recordings and checking for leftovers...")
+        quiesce(args.port, stream, checker, journal)
+        checker.stop()
+        server.shutdown()
+        journal.close()
+    finally:
+        sys.stdout = sys.__stdout__
+        recorder_log.close()
+
+    total = sum(len(values) for values in latencies.values())
+    result = {
+        'mode': args.mode,
+        'clients': args.clients,
+        'grids': args.grids,
+        'duration': args.duration,
+        'requests': total,
+        'requests_per_s': total / wall if wall else 0,
+        'latency_ms': {op: summarize(values) for op, values in latencies.items()},
+        'failures': dict(failures),
+        'lock': stream.recording_lock.report(),
+        'max_live_ffmpeg': checker.max_live,
+        'violations': checker.violations,
+    }
+
+    print("=" * 60)
+    print(f"{args.mode}: {total} requests in {wall:.1f}s ({result['requests_per_s']:.0f}/s), "
+          f"{args.clients} clients, {args.grids} grids")
+    for op, stats in sorted(result['latency_ms'].items()):
+        print(f"  {op:<10} n {stats['n']:>5}  p50 {stats['p50']:8.1f} ms  p99 {stats['p99']:8.1f} ms  "
+              f"max {stats['max']:8.1f} ms  failed {failures.get(op, 0)}")
+    lock = result['lock']
+    if lock['wait_ms']:
+        print(f"  recording_lock: {lock['acquisitions']} acquisitions, wait p50 {lock['wait_ms']['p50']:.2f} ms "
+              f"p99 {lock['wait_ms']['p99']:.1f} ms max {lock['wait_ms']['max']:.1f} ms; "
+              f"hold p50 {lock['hold_ms']['p50']:.2f} ms p99 {lock['hold_ms']['p99']:.1f} ms "
+              f"max {lock['hold_ms']['max']:.1f} ms")
+        for caller, stats in list(lock['by_caller'].items())[:5]:
+            print(f"    held by {caller:<24} n {stats['n']:>6}  p99 {stats['p99']:8.1f} ms  max {stats['max']:8.1f} ms")
+    print(f"  ffmpeg processes alive at once: up to {checker.max_live}")
+    if checker.violations:
+        print(f"  ✗ {len(checker.violations)} invariant violations:")
+        for v in checker.violations:
+            print(f"    - {v['message']}")
+    else:
+        print("  ✓ No invariant violations")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.json}")
+    if args.keep or args.root:
+        print(f"Scratch directory and recorder log kept in {root}")
+    else:
+        shutil.rmtree(root, ignore_errors=True)
+    sys.exit(1 if checker.violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Capture Catalog
+Indexes recordings under ~/Desktop/scout-videos so FTP listings are served
+from cached stat data instead of stat()ing every frame on every LIST, and
+keeps the download and tier state shared by ftpserver.py, retention.py and
+tiering.py. The pyftpdlib side (virtual views) lives in catalog_ftp.py so
+the services running from the venv do not need pyftpdlib.
+"""
+
+import fcntl
+import json
+import os
+import re
+import stat
+import threading
+import time
+
+VIEW_BY_GRID = "by-grid"
+VIEW_BY_CAMERA = "by-camera"
+VIEW_PENDING = "pending-upload"
+VIEW_DIRS = (VIEW_BY_GRID, VIEW_BY_CAMERA, VIEW_PENDING)
+STATE_DIR = ".catalog"
+UPLOAD_STATE_FILE = "uploaded.json"  # compacted download state
+UPLOAD_LOG_FILE = "uploaded.log"  # downloads since the last compaction, one JSON path per line
+UPLOAD_LOG_MIN_COMPACT = 1000  # compact once the log holds this many paths and half as many as the state
+TIER_INDEX_FILE = "tiered.json"  # captures moved to a second volume by tiering.py
+ACTIVE_WINDOW = 10  # seconds; files modified more recently are still being written
+VIEW_CACHE_TTL = 2.0  # seconds; a LIST stats every entry, so reuse the view for its duration
+SESSION_PREFIX = "recordings_"
+
+# ABC_GRID_A-12-B_2025-05-17-10-11-12-0_recording_20250517_101112_top.mp4
+# ABC_GRID_A-12-B_..._recording_20250517_101112_top_frame_0001_1747476672.jpg
+CAPTURE_PATTERN = re.compile(
+    r'^ABC_GRID_(?P<grid>[^_]+)_(?P<counter>.*)_recording_(?P<start>\d{8}_\d{6})_(?P<position>[^_.]+)'
+    r'(?:_frame_(?P<frame>\d+)(?:_(?P<epoch>\d+))?)?\.(?P<ext>mp4|jpg)$'
+)
+
+
+def parse_capture_name(filename):
+    """Return grid/position/start info for a capture filename, or None"""
+    match = CAPTURE_PATTERN.match(filename)
+    if not match:
+        return None
+    return match.groupdict()
+
+
+def open_state_lock(state_dir):
+    """Open (creating it) the lock shared by everything that writes under .catalog.
+
+    Opened read-only, since flock needs no write access: the services running as the
+    user can then lock a .lock file that the FTP server created as root.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    return os.fdopen(os.open(os.path.join(state_dir, ".lock"), os.O_RDONLY | os.O_CREAT, 0o644))
+
+
+class CaptureCatalog:
+    """Directory listings and stat data for the capture tree, cached per directory.
+
+    A directory is rescanned only when its mtime changes, which happens when
+    ffmpeg creates a capture or the recorder renames a finished frame. Files
+    modified within ACTIVE_WINDOW seconds are re-stat'ed on every access so
+    growing video files report their current size.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.state_dir = os.path.join(self.root, STATE_DIR)
+        self.upload_state_path = os.path.join(self.state_dir, UPLOAD_STATE_FILE)
+        self.upload_log_path = os.path.join(self.state_dir, UPLOAD_LOG_FILE)
+        self.lock = threading.RLock()
+        self.owner = None  # (uid, gid) state files are handed to when the FTP server runs as root
+        self.dirs = {}  # dir path -> (mtime_ns, {name: stat_result})
+        self.views = {}  # view parts -> (time, listing)
+        self.uploaded = set()  # paths relative to root
+        self.uploaded_state_id = None  # (inode, mtime_ns) of the state file loaded
+        self.upload_log_id = None  # (inode, bytes read) of the log
+        self.upload_log_entries = 0
+        self.tier_index_path = os.path.join(self.state_dir, TIER_INDEX_FILE)
+        self.tier_targets = ()
+        self.tier_mtime_ns = None
+
+    # --- Directory cache
+
+    def _scan(self, path):
+        entries = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    entries[entry.name] = entry.stat()
+                except OSError:
+                    continue
+        return entries
+
+    def _entries(self, path):
+        """Return {name: stat_result} for a directory, rescanning if it changed"""
+        dir_mtime_ns = os.stat(path).st_mtime_ns
+        with self.lock:
+            cached = self.dirs.get(path)
+            if cached and cached[0] == dir_mtime_ns:
+                return cached[1]
+        entries = self._scan(path)
+        with self.lock:
+            self.dirs[path] = (dir_mtime_ns, entries)
+        return entries
+
+    def invalidate(self, path):
+        """Drop cached data for a path and its parent directory"""
+        path = os.path.abspath(path)
+        with self.lock:
+            self.dirs.pop(path, None)
+            self.dirs.pop(os.path.dirname(path), None)
+            self.views.clear()
+
+    def listdir(self, path):
+        names = [n for n in self._entries(path) if n != STATE_DIR or path != self.root]
+        return names
+
+    def stat(self, path):
+        parent, name = os.path.split(path)
+        try:
+            st = self._entries(parent).get(name)
+        except OSError:
+            st = None
+        if st is None or time.time() - st.st_mtime < ACTIVE_WINDOW:
+            st = os.stat(path)
+        return st
+
+    # --- Capture index
+
+    def session_dirs(self):
+        return sorted(
+            os.path.join(self.root, name) for name, st in self._entries(self.root).items()
+            if name.startswith(SESSION_PREFIX) and stat.S_ISDIR(st.st_mode)
+        )
+
+    def captures(self):
+        """Yield (path, info) for every capture file in every session"""
+        for session_dir in self.session_dirs():
+            try:
+                session_entries = self._entries(session_dir)
+            except OSError:
+                continue
+            for name, st in sorted(session_entries.items()):
+                path = os.path.join(session_dir, name)
+                if stat.S_ISDIR(st.st_mode):
+                    try:
+                        frame_entries = self._entries(path)
+                    except OSError:
+                        continue
+                    for frame_name in sorted(frame_entries):
+                        info = parse_capture_name(frame_name)
+                        if info:
+                            yield os.path.join(path, frame_name), info
+                else:
+                    info = parse_capture_name(name)
+                    if info:
+                        yield path, info
+
+    def view_listing(self, parts):
+        """Return {name: real path or None for directories} for a virtual view path.
+
+        Only directory listings are cached; a path inside a view returns None.
+        """
+        key = tuple(parts)
+        now = time.time()
+        with self.lock:
+            cached = self.views.get(key)
+            if cached and now - cached[0] < VIEW_CACHE_TTL:
+                return cached[1]
+        listing = self._build_view(parts)
+        if listing is not None:
+            with self.lock:
+                for stale in [k for k, (t, _) in self.views.items() if now - t >= VIEW_CACHE_TTL]:
+                    del self.views[stale]
+                self.views[key] = (now, listing)
+        return listing
+
+    def _build_view(self, parts):
+        view = parts[0]
+        if view == VIEW_PENDING:
+            if len(parts) > 1:
+                return None
+            uploaded = self.uploaded_paths()
+            return {os.path.basename(p): p for p, _ in self.captures()
+                    if os.path.relpath(p, self.root) not in uploaded}
+
+        key = 'grid' if view == VIEW_BY_GRID else 'position'
+        if len(parts) == 1:
+            return {info[key]: None for _, info in self.captures()}
+        if len(parts) == 2:
+            listing = {os.path.basename(p): p for p, info in self.captures() if info[key] == parts[1]}
+            return listing or None
+        return None
+
+    # --- Upload state (shared between worker processes through the state file and log)
+    #
+    # Each download appends one line to UPLOAD_LOG_FILE under the state lock,
+    # so a bulk download writes O(N) bytes rather than rewriting the whole set
+    # per file. The log is folded into UPLOAD_STATE_FILE once it outgrows it.
+
+    def uploaded_paths(self):
+        with self.lock:
+            try:
+                st = os.stat(self.upload_state_path)
+                state_id = (st.st_ino, st.st_mtime_ns)
+            except OSError:
+                state_id = None
+            if state_id != self.uploaded_state_id:
+                uploaded = set()
+                if state_id is not None:
+                    try:
+                        with open(self.upload_state_path) as f:
+                            uploaded = set(json.load(f))
+                    except (OSError, ValueError) as e:
+                        print(f"Warning: Could not read upload state: {e}")
+                        return self.uploaded
+                self.uploaded = uploaded
+                self.uploaded_state_id = state_id
+                self.upload_log_id = None  # compacted: the log starts over
+            self._read_upload_log()
+            return self.uploaded
+
+    def _read_upload_log(self):
+        """Add the paths appended to the log since the last read"""
+        try:
+            with open(self.upload_log_path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                offset = 0
+                if self.upload_log_id is not None and self.upload_log_id[0] == inode:
+                    offset = self.upload_log_id[1]
+                else:
+                    self.upload_log_entries = 0
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            return
+        complete = data[:data.rfind(b'\n') + 1]  # a line being appended is read next time
+        for line in complete.splitlines():
+            try:
+                self.uploaded.add(json.loads(line))
+                self.upload_log_entries += 1
+            except ValueError:
+                continue
+        self.upload_log_id = (inode, offset + len(complete))
+
+    def _own(self, *paths):
+        """Hand state files to the FTP user so retention.py (running as that user) can rewrite them"""
+        if not self.owner:
+            return
+        for path in paths:
+            try:
+                os.chown(path, *self.owner)
+            except OSError as e:
+                print(f"Warning: Could not change ownership of {path}: {e}")
+
+    def _write_upload_state(self, uploaded):
+        """Replace the state file with uploaded and start an empty log (caller holds the state lock)"""
+        tmp_path = self.upload_state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(sorted(uploaded), f)
+        self._own(tmp_path)
+        os.replace(tmp_path, self.upload_state_path)
+        tmp_path = self.upload_log_path + ".tmp"
+        open(tmp_path, 'w').close()
+        self._own(tmp_path)
+        os.replace(tmp_path, self.upload_log_path)
+        with self.lock:
+            self.uploaded = set(uploaded)
+            self.uploaded_state_id = None
+            self.upload_log_id = None
+            self.upload_log_entries = 0
+
+    def tier_roots(self):
+        """Directories on the tier volume that captures under the root may link to"""
+        try:
+            mtime_ns = os.stat(self.tier_index_path).st_mtime_ns
+        except OSError:
+            return ()
+        with self.lock:
+            if mtime_ns != self.tier_mtime_ns:
+                try:
+                    with open(self.tier_index_path) as f:
+                        self.tier_targets = tuple(os.path.realpath(t) for t in json.load(f).get('targets', []))
+                    self.tier_mtime_ns = mtime_ns
+                except (OSError, ValueError, AttributeError) as e:
+                    print(f"Warning: Could not read tier index: {e}")
+            return self.tier_targets
+
+    def mark_uploaded(self, path):
+        """Record that a capture has been downloaded so it leaves /pending-upload/"""
+        relpath = os.path.relpath(os.path.abspath(path), self.root)
+        if relpath.startswith('..') or not parse_capture_name(os.path.basename(relpath)):
+            return
+        with open_state_lock(self.state_dir) as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            uploaded = self.uploaded_paths()
+            if relpath in uploaded:
+                return
+            created = not os.path.exists(self.upload_log_path)
+            with open(self.upload_log_path, 'a') as f:
+                f.write(json.dumps(relpath) + '\n')
+            if created:
+                self._own(self.state_dir, os.path.join(self.state_dir, ".lock"), self.upload_log_path)
+            with self.lock:
+                self.uploaded.add(relpath)
+                self._read_upload_log()  # skip past our own line
+                self.views.pop((VIEW_PENDING,), None)
+                compact = self.upload_log_entries >= max(UPLOAD_LOG_MIN_COMPACT, len(self.uploaded) // 2)
+            if compact:
+                self._write_upload_state(self.uploaded)
+
+    def forget_uploaded(self, paths):
+        """Drop deleted captures from the upload state so it does not grow forever"""
+        relpaths = {os.path.relpath(os.path.abspath(p), self.root) for p in paths}
+        if not relpaths:
+            return
+        with open_state_lock(self.state_dir) as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._write_upload_state(self.uploaded_paths() - relpaths)
+        with self.lock:
+            self.views.clear()
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(root):
+    """Return the shared catalog for an FTP root directory"""
+    root = os.path.abspath(root)
+    with _catalogs_lock:
+        if root not in _catalogs:
+            _catalogs[root] = CaptureCatalog(root)
+        return _catalogs[root]
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Capture Catalog FTP Filesystem
+pyftpdlib filesystem for ftpserver.py --catalog. Listings come from the
+capture catalog and read-only virtual views are added without duplicating
+files on disk:
+  /by-grid/<grid>/        all captures of a grid (e.g. /by-grid/A-12-B/)
+  /by-camera/<position>/  all captures of a camera (e.g. /by-camera/top/)
+  /pending-upload/        captures not yet downloaded by a client
+"""
+
+import errno
+import os
+import stat
+
+from pyftpdlib.filesystems import AbstractedFS
+
+from capture_catalog import VIEW_DIRS, get_catalog
+
+
+def _read_only_error(path):
+    return OSError(errno.EACCES, "Virtual views are read-only", path)
+
+
+class TieredFS(AbstractedFS):
+    """Stock pyftpdlib filesystem that also serves captures tiering.py moved to the tier volume"""
+
+    def __init__(self, root, cmd_channel):
+        super().__init__(root, cmd_channel)
+        self.catalog = get_catalog(root)
+
+    def validpath(self, path):
+        """Paths under the root, including captures that tiering.py replaced with a symlink to the tier volume"""
+        if super().validpath(path):
+            return True
+        if os.path.relpath(os.path.abspath(path), self.catalog.root).startswith('..'):
+            return False
+        real = os.path.realpath(path)
+        return any(real.startswith(target + os.sep) for target in self.catalog.tier_roots())
+
+
+class CatalogFS(TieredFS):
+    """pyftpdlib filesystem that lists from the capture catalog and serves virtual views"""
+
+    def _view_parts(self, path):
+        """Return the virtual view components of a filesystem path, or None"""
+        relpath = os.path.relpath(path, self.catalog.root)
+        if relpath.startswith('..'):
+            return None
+        parts = [p for p in relpath.split(os.sep) if p and p != '.']
+        if parts and parts[0] in VIEW_DIRS and not os.path.lexists(os.path.join(self.catalog.root, parts[0])):
+            return parts
+        return None
+
+    def _resolve(self, path):
+        """Map a path inside a virtual view to the real capture file.
+
+        Returns (real_path, is_virtual_dir); real_path is None for views.
+        """
+        parts = self._view_parts(path)
+        if parts is None:
+            return path, False
+        listing = self.catalog.view_listing(parts)
+        if listing is not None:
+            return None, True
+        parent = self.catalog.view_listing(parts[:-1])
+        if parent and parent.get(parts[-1]):
+            return parent[parts[-1]], False
+        raise OSError(errno.ENOENT, "No such file or directory", path)
+
+    def _virtual_dir_stat(self):
+        root_st = os.stat(self.catalog.root)
+        return os.stat_result((stat.S_IFDIR | 0o555, 0, root_st.st_dev, 2, root_st.st_uid,
+                               root_st.st_gid, 0, root_st.st_mtime, root_st.st_mtime, root_st.st_mtime))
+
+    # --- Listing and stat
+
+    def listdir(self, path):
+        real, is_view = self._resolve(path)
+        if is_view:
+            return list(self.catalog.view_listing(self._view_parts(path)))
+        names = self.catalog.listdir(real)
+        if os.path.abspath(real) == self.catalog.root:
+            names += [v for v in VIEW_DIRS if v not in names]
+        return names
+
+    listdirinfo = listdir
+
+    def stat(self, path):
+        real, is_view = self._resolve(path)
+        if is_view:
+            return self._virtual_dir_stat()
+        return self.catalog.stat(real)
+
+    lstat = stat
+
+    def isdir(self, path):
+        try:
+            real, is_view = self._resolve(path)
+        except OSError:
+            return False
+        return is_view or os.path.isdir(real)
+
+    def isfile(self, path):
+        try:
+            real, is_view = self._resolve(path)
+        except OSError:
+            return False
+        return not is_view and os.path.isfile(real)
+
+    def islink(self, path):
+        try:
+            real, is_view = self._resolve(path)
+        except OSError:
+            return False
+        return not is_view and os.path.islink(real)
+
+    def lexists(self, path):
+        try:
+            real, is_view = self._resolve(path)
+        except OSError:
+            return False
+        return is_view or os.path.lexists(real)
+
+    def getsize(self, path):
+        return self.stat(path).st_size
+
+    def getmtime(self, path):
+        return self.stat(path).st_mtime
+
+    def chdir(self, path):
+        real, is_view = self._resolve(path)
+        if not is_view:
+            os.chdir(real)
+        self.cwd = self.fs2ftp(path)
+
+    def open(self, filename, mode):
+        real, is_view = self._resolve(filename)
+        if is_view or (real != filename and any(c in mode for c in 'wa+')):
+            raise _read_only_error(filename)
+        if any(c in mode for c in 'wa+'):
+            self.catalog.invalidate(real)
+        return open(real, mode)
+
+    # --- Write operations are refused inside views and invalidate the cache elsewhere
+
+    def _writable(self, path):
+        if self._view_parts(path) is not None:
+            raise _read_only_error(path)
+        self.catalog.invalidate(path)
+        return path
+
+    def mkstemp(self, suffix="", prefix="", dir=None, mode="wb"):
+        return super().mkstemp(suffix, prefix, self._writable(dir) if dir else dir, mode)
+
+    def mkdir(self, path):
+        super().mkdir(self._writable(path))
+
+    def rmdir(self, path):
+        super().rmdir(self._writable(path))
+
+    def remove(self, path):
+        super().remove(self._writable(path))
+
+    def rename(self, src, dst):
+        super().rename(self._writable(src), self._writable(dst))
+
+    def chmod(self, path, mode):
+        super().chmod(self._writable(path), mode)
+
+    def utime(self, path, timeval):
+        return super().utime(self._writable(path), timeval)
+
+
+def make_catalog_handler(handler_class, views=True):
+    """Return a handler subclass that tracks downloads and follows tiered captures.
+
+    With views it uses CatalogFS, otherwise the stock filesystem plus tier links (TieredFS).
+
+    Downloads are recorded whether or not the views are served: retention.py
+    only deletes sessions whose captures have all been downloaded.
+    """
+
+    class CatalogFTPHandler(handler_class):
+        abstracted_fs = CatalogFS if views else TieredFS
+
+        def on_file_sent(self, file):
+            super().on_file_sent(file)
+            try:
+                if views:
+                    file, _ = self.fs._resolve(file)
+                self.fs.catalog.mark_uploaded(file)
+            except OSError as e:
+                print(f"Warning: Could not update upload state for {file}: {e}")
+
+        def on_file_received(self, file):
+            super().on_file_received(file)
+            self.fs.catalog.invalidate(file)
+
+    return CatalogFTPHandler
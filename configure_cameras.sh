@@ -90,7 +90,18 @@ get_camera_serial() {
     
     # Wait a moment for camera to be fully recognized
     sleep 2
-    
+
+    # device_cache.py reads the serial from sysfs and probes the camera once, so the
+    # launcher can skip probing it from now on
+    if [ -f "$SCRIPT_DIR/device_cache.py" ]; then
+        local cached=$(python3 "$SCRIPT_DIR/device_cache.py" list --plain 2>/dev/null | head -n 1)
+        local serial="${cached#* }"
+        if [ -n "$cached" ] && [ "$serial" != "unknown" ]; then
+            echo "$serial"
+            return 0
+        fi
+    fi
+
     # Find first available USB camera
     for dev in /dev/video*; do 
         if [ -e "$dev" ]; then
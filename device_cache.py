@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Camera Capability Cache
+Remembers, per USB camera serial, which /dev/video node is the capture
+node, its formats / resolutions / frame rates and whether it passed the
+playability test. A known camera is recognised from sysfs alone (serial,
+USB id, firmware revision and its video nodes), so the launchers skip
+udevadm, v4l2-ctl and ffplay for it; only new or changed cameras get the
+full scan, which then updates the cache.
+
+    python3 device_cache.py list            # cameras, probing only unknown ones
+    python3 device_cache.py list --plain    # "device serial" lines for shell scripts
+    python3 device_cache.py list --rescan   # ignore the cache
+    python3 device_cache.py clear
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SYSFS_V4L = "/sys/class/video4linux"
+CACHE_PATH = os.path.expanduser("~/.cache/scout/device_cache.json")
+CACHE_VERSION = 1
+PROBE_TIMEOUT = 3  # seconds for each v4l2-ctl / ffplay probe
+
+
+def run(cmd, timeout=PROBE_TIMEOUT):
+    """Run cmd and return (returncode, output); returncode is None if it timed out"""
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout,
+                                universal_newlines=True)
+        return result.returncode, result.stdout
+    except subprocess.TimeoutExpired as e:
+        output = e.output.decode(errors='replace') if isinstance(e.output, bytes) else (e.output or '')
+        return None, output
+    except OSError as e:
+        return -1, str(e)
+
+
+def node_number(name):
+    digits = re.sub(r'\D', '', name)
+    return int(digits) if digits else 0
+
+
+def read_attr(directory, name):
+    try:
+        with open(os.path.join(directory, name)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def usb_device_dir(node_dir):
+    """The USB device directory above a video node, or None for non-USB nodes"""
+    path = os.path.realpath(os.path.join(node_dir, 'device'))
+    while path not in ('/', '/sys/devices'):
+        if os.path.exists(os.path.join(path, 'idVendor')):
+            return path
+        path = os.path.dirname(path)
+    return None
+
+
+def read_topology(sysfs=SYSFS_V4L):
+    """USB video nodes as seen in sysfs; only file reads, no device access"""
+    try:
+        names = sorted(os.listdir(sysfs), key=node_number)
+    except OSError:
+        return []
+    nodes = []
+    for name in names:
+        node_dir = os.path.join(sysfs, name)
+        usb = usb_device_dir(node_dir)
+        if usb is None:
+            continue
+        # udev's ID_SERIAL_SHORT (what config.txt holds) is the sysfs serial with blanks as '_'
+        serial = re.sub(r'\s', '_', read_attr(usb, 'serial') or '')
+        nodes.append({
+            'device': f"/dev/{name}",
+            'serial': serial,
+            'usb_id': f"{read_attr(usb, 'idVendor')}:{read_attr(usb, 'idProduct')}",
+            'revision': read_attr(usb, 'bcdDevice'),
+            'product': read_attr(usb, 'product'),
+            'port': os.path.basename(usb),
+            'index': int(read_attr(node_dir, 'index') or 0),
+            'name': read_attr(node_dir, 'name'),
+        })
+    return nodes
+
+
+def parse_formats(output):
+    """{fourcc: {'WxH': [fps, ...]}} from `v4l2-ctl --list-formats-ext`"""
+    formats = {}
+    sizes = None
+    size = None
+    for line in output.splitlines():
+        match = re.search(r"\[\d+\]: '(\w+)'", line)
+        if match:
+            sizes = formats.setdefault(match.group(1), {})
+            continue
+        match = re.search(r"Size: \w+ (\d+x\d+)", line)
+        if match and sizes is not None:
+            size = sizes.setdefault(match.group(1), [])
+            continue
+        match = re.search(r"\((\d+(?:\.\d+)?) fps\)", line)
+        if match and size is not None:
+            size.append(float(match.group(1)))
+    return formats
+
+
+def is_playable(device):
+    """The launchers' test: metadata nodes fail with "Inappropriate ioctl for device" """
+    if shutil.which('ffplay') is None:
+        return True
+    _, output = run(['ffplay', '-f', 'v4l2', '-i', device, '-t', '1', '-nodisp', '-loglevel', 'error'])
+    return 'Inappropriate ioctl for device' not in output
+
+
+def scan_camera(nodes):
+    """Full probe of one camera's video nodes; returns its cache entry"""
+    first = nodes[0]
+    entry = {
+        'usb_id': first['usb_id'],
+        'revision': first['revision'],
+        'product': first['product'],
+        'nodes': len(nodes),
+        'capture_index': None,
+        'playable': False,
+        'formats': {},
+        'probed': round(time.time()),
+    }
+    for node in sorted(nodes, key=lambda n: n['index']):
+        returncode, output = run(['v4l2-ctl', f"--device={node['device']}", '--list-formats-ext'])
+        formats = parse_formats(output) if returncode == 0 else {}
+        if formats:
+            entry['capture_index'] = node['index']
+            entry['formats'] = formats
+            entry['playable'] = is_playable(node['device'])
+            break
+    return entry
+
+
+def supports(formats, width, height, fps):
+    """True if any format offers width x height at fps or more"""
+    size = f"{width}x{height}"
+    return any(size in sizes and any(rate >= fps for rate in sizes[size]) for sizes in formats.values())
+
+
+class DeviceCache:
+    """Per-serial camera capabilities, stored as JSON"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.cameras = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                self.cameras = data.get('cameras', {})
+        except (OSError, ValueError):
+            pass
+
+    def lookup(self, serial, nodes):
+        """The cached entry if it still matches the camera's sysfs fingerprint, else None"""
+        entry = self.cameras.get(serial)
+        if not entry:
+            return None
+        first = nodes[0]
+        if (entry['usb_id'], entry['revision'], entry['product'], entry['nodes']) != \
+                (first['usb_id'], first['revision'], first['product'], len(nodes)):
+            return None
+        if entry['capture_index'] is not None and entry['capture_index'] not in [n['index'] for n in nodes]:
+            return None
+        return entry
+
+    def update(self, serial, entry):
+        with self.lock:
+            self.cameras[serial] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self.lock:
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'cameras': self.cameras}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def discover(cache=None, rescan=False, scan=scan_camera, topology=None):
+    """Playable USB cameras: [{device, serial, formats, cached, ...}] in /dev/video order.
+
+    Cameras whose cache entry matches sysfs are returned without touching
+    the device. The others are scanned concurrently with scan(nodes) and
+    cached. Cameras without a serial, or sharing one, are always scanned.
+    """
+    cache = cache if cache is not None else DeviceCache()
+    groups = {}
+    for node in topology if topology is not None else read_topology():
+        groups.setdefault((node['serial'], node['port']), []).append(node)
+    serial_ports = {}
+    for serial, port in groups:
+        serial_ports[serial] = serial_ports.get(serial, 0) + 1
+
+    results, to_scan = {}, []
+    for key, nodes in groups.items():
+        serial = key[0]
+        cacheable = bool(serial) and serial_ports[serial] == 1
+        entry = cache.lookup(serial, nodes) if cacheable and not rescan else None
+        if entry is not None:
+            results[key] = (entry, True)
+        else:
+            to_scan.append((key, nodes, cacheable))
+
+    if to_scan:
+        with ThreadPoolExecutor(max_workers=len(to_scan)) as pool:
+            entries = pool.map(lambda item: scan(item[1]), to_scan)
+            for (key, nodes, cacheable), entry in zip(to_scan, entries):
+                results[key] = (entry, False)
+                if cacheable:
+                    cache.update(key[0], entry)
+        try:
+            cache.save()
+        except OSError as e:
+            print(f"✗ Could not save device cache {cache.path}: {e}")
+
+    cameras = []
+    for key, nodes in groups.items():
+        entry, cached = results[key]
+        capture = [n for n in nodes if n['index'] == entry['capture_index']]
+        if not capture or not entry['playable']:
+            continue
+        cameras.append(dict(entry, device=capture[0]['device'], serial=key[0], port=key[1], cached=cached))
+    return sorted(cameras, key=lambda c: node_number(c['device']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Camera capability cache')
+    subparsers = parser.add_subparsers(dest='command')
+    list_parser = subparsers.add_parser('list', help='List cameras, probing only new or changed ones (default)')
+    list_parser.add_argument('--rescan', action='store_true', help='Probe every camera again')
+    list_parser.add_argument('--plain', action='store_true', help='Print "device serial" lines')
+    list_parser.add_argument('--json', action='store_true', help='Print JSON')
+    subparsers.add_parser('clear', help='Forget all cached cameras')
+    parser.add_argument('--cache', type=str, default=CACHE_PATH, help=f'Cache file (default: {CACHE_PATH})')
+    args = parser.parse_args()
+
+    if args.command == 'clear':
+        try:
+            os.remove(args.cache)
+            print(f"✓ Removed {args.cache}")
+        except FileNotFoundError:
+            print(f"No cache at {args.cache}")
+        return
+
+    cameras = discover(DeviceCache(args.cache), rescan=getattr(args, 'rescan', False))
+    if getattr(args, 'json', False):
+        print(json.dumps(cameras, indent=2))
+    elif getattr(args, 'plain', False):
+        for camera in cameras:
+            print(f"{camera['device']} {camera['serial'] or 'unknown'}")
+    else:
+        if not cameras:
+            print("No playable USB cameras found")
+        for camera in cameras:
+            sizes = sorted({size for sizes in camera['formats'].values() for size in sizes},
+                           key=lambda s: [int(v) for v in s.split('x')], reverse=True)
+            print(f"{camera['device']:<13} {camera['serial'] or 'unknown':<16} {camera['product'] or ''} "
+                  f"[{'cached' if camera['cached'] else 'probed'}]")
+            print(f"  formats: {', '.join(camera['formats'])}; sizes: {', '.join(sizes[:6])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Frame Staging
+RAM staging for the frame recorder. ffmpeg writes its JPEGs (and the
+recorder renames them) under /dev/shm, and FrameStager copies finished
+frames to the SD card in batches: every FLUSH_INTERVAL seconds or
+FLUSH_BYTES, in frame order, each batch fsynced once before the staged
+copies are removed. The card sees a few large sequential writes instead
+of a create, a ~400 KB write and a rename per frame and camera.
+
+A batch is flushed early when MemAvailable or free space in the staging
+area runs low. A recorder crash loses nothing (the next recorder flushes
+what is left in its staging area); a power cut loses at most the batch
+being staged.
+
+    python3 frame_staging.py            # flush frames left by stopped recorders
+"""
+
+import argparse
+import os
+import re
+import time
+
+from recording_journal import JPEG_END, repair_frames
+
+STAGE_ROOT = "/dev/shm/scout-staging"
+SAVE_ROOT = os.path.expanduser("~/Desktop/scout-videos")
+FLUSH_INTERVAL = 10  # seconds of frames per batch (at most this much is lost on a power cut)
+FLUSH_BYTES = 16 * 1024 * 1024  # flush earlier once a batch is this large
+MIN_MEM_AVAILABLE_MB = 200  # flush right away below this much available RAM
+MIN_STAGE_FREE_MB = 64  # ... or this much free space in the staging area
+PRESSURE_CHECK_INTERVAL = 1.0  # seconds between RAM checks
+
+FRAME_NAME = re.compile(r'^(.*_frame_)(\d+)(_\d+)?\.jpg$')  # prefix, frame number, timestamp suffix
+
+
+def stage_root_for(port, stage_root=STAGE_ROOT):
+    """Staging area of one recorder, so recorders never flush each other's frames"""
+    return os.path.join(stage_root, f"recorder_{port}")
+
+
+def stage_dir_for(save_dir, stage_root, save_root=SAVE_ROOT):
+    """Staging directory mirroring save_dir (a directory under save_root)"""
+    return os.path.join(stage_root, os.path.relpath(save_dir, save_root))
+
+
+def mem_available_mb():
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def free_mb(path):
+    try:
+        st = os.statvfs(path)
+    except OSError:
+        return None
+    return st.f_bavail * st.f_frsize / (1024 * 1024)
+
+
+def frame_key(path):
+    """Sort key putting frames in recording order (frame numbers can outgrow %04d)"""
+    match = FRAME_NAME.match(os.path.basename(path))
+    return (match.group(1), int(match.group(2))) if match else (os.path.basename(path), 0)
+
+
+class FrameStager:
+    """Batches the frames of one recording from its staging directory to save_dir"""
+
+    def __init__(self, stage_dir, save_dir, flush_interval=FLUSH_INTERVAL, flush_bytes=FLUSH_BYTES):
+        self.stage_dir = stage_dir
+        self.save_dir = save_dir
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.ready = []  # complete frames waiting for the next batch
+        self.ready_bytes = 0
+        self.ready_since = None
+        self.newest = None  # frame ffmpeg may still be writing; complete once a newer one appears
+        self.flushed = 0
+        self.dropped = 0
+        self.last_flush = None  # {'files', 'bytes', 'seconds', 'reason', 'time'}
+        self.pressure = False
+        self.pressure_checked = 0.0
+        self.failed_at = None
+
+    @property
+    def pending(self):
+        return len(self.ready) + (self.newest is not None)
+
+    def add(self, path):
+        """Register a staged (renamed) frame; the previous newest frame is complete now"""
+        if self.newest is not None:
+            self._add_ready(self.newest)
+        self.newest = path
+
+    def _add_ready(self, path):
+        try:
+            self.ready_bytes += os.path.getsize(path)
+        except OSError:
+            return
+        if not self.ready:
+            self.ready_since = time.monotonic()
+        self.ready.append(path)
+
+    def under_pressure(self):
+        now = time.monotonic()
+        if now - self.pressure_checked >= PRESSURE_CHECK_INTERVAL:
+            self.pressure_checked = now
+            available, stage_free = mem_available_mb(), free_mb(self.stage_dir)
+            self.pressure = ((available is not None and available < MIN_MEM_AVAILABLE_MB)
+                             or (stage_free is not None and stage_free < MIN_STAGE_FREE_MB))
+        return self.pressure
+
+    def poll(self):
+        """Flush the ready frames if the batch is old or large enough or RAM runs low"""
+        if not self.ready:
+            return None
+        retry = self.failed_at is None or time.monotonic() - self.failed_at >= self.flush_interval
+        if self.under_pressure():
+            reason = 'pressure'
+        elif not retry:
+            return None  # the card refused the last batch; try again after an interval
+        elif time.monotonic() - self.ready_since >= self.flush_interval:
+            reason = 'interval'
+        elif self.ready_bytes >= self.flush_bytes:
+            reason = 'size'
+        else:
+            return None
+        result = self.flush(reason=reason)
+        if result is None:
+            self.failed_at = time.monotonic()
+            if reason == 'pressure':
+                self._drop_oldest()
+        else:
+            self.failed_at = None
+        return result
+
+    def flush(self, final=False, reason='final'):
+        """Write the ready frames (and with final, the newest one) to save_dir as one batch.
+
+        Frames are written in order and fsynced together, then the directory;
+        only then are the staged copies removed. Returns {'files', 'bytes'},
+        or None if the card could not be written (the frames stay staged).
+        """
+        batch = list(self.ready)
+        if final and self.newest is not None:
+            batch.append(self.newest)
+        if not batch:
+            return {'files': 0, 'bytes': 0}
+        started = time.monotonic()
+        written, complete, nbytes = [], [], 0
+        try:
+            os.makedirs(self.save_dir, exist_ok=True)
+            try:
+                for source in sorted(batch, key=frame_key):
+                    with open(source, 'rb') as f:
+                        data = f.read()
+                        st = os.fstat(f.fileno())
+                    if source == self.newest and not data.endswith(JPEG_END):
+                        complete.append(source)  # truncated last frame: drop it like repair_frames does
+                        print(f"Dropping incomplete frame {os.path.basename(source)}")
+                        continue
+                    target = open(os.path.join(self.save_dir, os.path.basename(source)), 'wb')
+                    written.append(target)
+                    target.write(data)
+                    target.flush()
+                    os.utime(target.fileno(), ns=(st.st_atime_ns, st.st_mtime_ns))
+                    complete.append(source)
+                    nbytes += len(data)
+                for target in written:
+                    os.fsync(target.fileno())
+            finally:
+                for target in written:
+                    target.close()
+            fd = os.open(self.save_dir, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"✗ Could not flush {len(batch)} staged frames to {self.save_dir}: {e}")
+            return None
+
+        for source in complete:
+            try:
+                os.remove(source)
+            except OSError:
+                pass
+        files = len(written)
+        self.flushed += files
+        self.ready, self.ready_bytes, self.ready_since = [], 0, None
+        if final:
+            self.newest = None
+        self.last_flush = {'files': files, 'bytes': nbytes, 'seconds': round(time.monotonic() - started, 3),
+                           'reason': reason, 'time': time.time()}
+        return {'files': files, 'bytes': nbytes}
+
+    def _drop_oldest(self):
+        """RAM is low and the card can't take the batch: drop the oldest half so recording goes on"""
+        drop = self.ready[:max(1, len(self.ready) // 2)]
+        for path in drop:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.ready = self.ready[len(drop):]
+        self.ready_bytes = sum(os.path.getsize(path) for path in self.ready if os.path.exists(path))
+        self.dropped += len(drop)
+        print(f"✗ Low on RAM and the card is not writable: dropped {len(drop)} staged frames "
+              f"({self.dropped} so far)")
+
+    def status(self):
+        return {'staged': self.pending, 'staged_bytes': self.ready_bytes, 'flushed': self.flushed,
+                'dropped': self.dropped, 'last_flush': self.last_flush}
+
+
+def flush_leftovers(stage_root, save_root=SAVE_ROOT, skip=()):
+    """Flush frames a stopped or crashed recorder left staged under stage_root.
+
+    Frames that never got their timestamp are finalized with repair_frames
+    first. Directories in skip (recordings still running) are left alone.
+    Returns (directories, files flushed).
+    """
+    directories = files = 0
+    for directory, subdirs, names in os.walk(stage_root, topdown=False):
+        if directory in skip:
+            continue
+        prefixes = set()
+        for name in names:
+            match = FRAME_NAME.match(name)
+            if match and not match.group(3):
+                prefixes.add(match.group(1))
+        for prefix in prefixes:
+            repair_frames(os.path.join(directory, prefix + '%04d.jpg'))
+        recordings = {}
+        for name in os.listdir(directory):
+            match = FRAME_NAME.match(name)
+            if match:
+                recordings.setdefault(match.group(1), []).append(os.path.join(directory, name))
+        flushed = 0
+        for frames in recordings.values():
+            stager = FrameStager(directory, os.path.join(save_root, os.path.relpath(directory, stage_root)))
+            for path in sorted(frames, key=frame_key):
+                stager.add(path)
+            result = stager.flush(final=True, reason='leftover')
+            flushed += result['files'] if result else 0
+        if flushed:
+            directories += 1
+            files += flushed
+        if directory != stage_root:
+            try:
+                os.rmdir(directory)  # only succeeds once it is empty
+            except OSError:
+                pass
+    return directories, files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flush frames left in the recorders\' RAM staging areas')
+    parser.add_argument('--stage-dir', type=str, default=STAGE_ROOT, help=f'Staging root (default: {STAGE_ROOT})')
+    parser.add_argument('--save-root', type=str, default=SAVE_ROOT, help=f'Capture root (default: {SAVE_ROOT})')
+    parser.add_argument('--port', type=int, default=None,
+                        help='Only this recorder\'s staging area (default: all; stop the recorders first)')
+    args = parser.parse_args()
+
+    if args.port is not None:
+        roots = [stage_root_for(args.port, args.stage_dir)]
+    else:
+        try:
+            roots = sorted(os.path.join(args.stage_dir, name) for name in os.listdir(args.stage_dir))
+        except OSError:
+            roots = []
+    total = 0
+    for root in roots:
+        directories, files = flush_leftovers(root, args.save_root)
+        total += files
+        if files:
+            print(f"✓ {os.path.basename(root)}: flushed {files} frames from {directories} folders")
+    if not total:
+        print(f"No staged frames in {args.stage_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,11 @@ from tkinter import messagebox
 import vlc
 import platform
 import sys
-import requests
-from datetime import datetime
 import argparse
+from recorder_client import RecorderClient
+from grid_controller import GRID_SETTLE_SECONDS, GridController, start_api_server
+
+STALE_FRAME_SECONDS = 5  # a recording without a new frame for this long is flagged
 
 
 class RTSPStream:
@@ -17,6 +19,7 @@ class RTSPStream:
         self.stream_index = stream_index
         self.stream_running = False
         self.app_reference = None  # Will be set by app
+        self.recorder = None  # RecorderClient, set by app
 
         # Camera naming
         labels = ["bottom", "middle", "top"]
@@ -131,28 +134,51 @@ class RTSPStream:
             self.label.grid(row=2, column=0, padx=6, pady=2, sticky="ew")
             self.individual_button = None
 
-    def start_recording(self, grid_name, counter):
-        if self.stream_running:
-            params = {'counter': counter, 'grid_name': grid_name}
-            try:
-                r = requests.get(f"{self.record_api_url}/record/start", params=params)
-                print(f"Started recording {self.camera_label} @ {self.record_api_url}: {r.status_code}")
-            except Exception as e:
-                print(f"Failed to start recording {self.camera_label}: {e}")
+    def set_record_status(self, text, color='black'):
+        """Show the last recorder result next to the camera name"""
+        base = f"{self.camera_label} ({self.camera_name})"
+        self.label.config(text=f"{base} · {text}" if text else base, fg=color)
+
+    def follow_recorder_events(self):
+        """Subscribe to the recorder's /events stream for the live badge"""
+        self.recorder.subscribe_events(self.record_api_url, self._on_status_event)
+
+    def _on_status_event(self, status):
+        if status is None:
+            self.set_record_status("recorder offline", 'gray50')
+            return
+        error = status.get('error')
+        recordings = status.get('recordings') or []
+        if recordings:
+            rec = recordings[0]
+            text = f"● {rec['grid']} · {rec['frames']} frames · {rec['fps']:.1f}/s"
+            age = rec.get('last_frame_age')
+            stale = (age is None and rec['duration'] > STALE_FRAME_SECONDS) or (age or 0) > STALE_FRAME_SECONDS
+            if age is not None:
+                text += f" · last {age:.0f}s ago"
+            self.set_record_status(text, '#aa6600' if stale or not rec['ffmpeg_running'] else '#cc0000')
+        elif error:
+            self.set_record_status(f"✗ {error['grid']}: {error['message'][:40]}", '#aa6600')
+        elif not (self.app_reference and self.app_reference.controller.pending_grid):
+            self.set_record_status("idle", 'gray30')
+
+    def _on_record_result(self, result, action, grid_name):
+        if result.ok:
+            print(f"{action.capitalize()} recording {self.camera_label} @ {self.record_api_url}: "
+                  f"{result.status_code} ({result.elapsed_ms:.0f} ms)")
+            if action == 'start':
+                self.set_record_status(f"● recording {grid_name}", '#cc0000')
+            elif (self.app_reference and self.app_reference.controller.recording_grid is None
+                  and self.app_reference.controller.pending_grid is None):
+                self.set_record_status("")
         else:
-            print(f"Skipping recording for {self.camera_label} - stream not running")
-
-    def stop_recording(self, grid_name):
-        params = {'grid_name': grid_name}
-        try:
-            r = requests.get(f"{self.record_api_url}/record/stop", params=params)
-            print(f"Stopped recording {self.camera_label} @ {self.record_api_url}: {r.status_code}")
-        except Exception as e:
-            print(f"Failed to stop recording {self.camera_label}: {e}")
+            reason = result.error or f"HTTP {result.status_code}"
+            print(f"Failed to {action} recording {self.camera_label}: {reason}")
+            self.set_record_status(f"{action} failed", '#aa6600')
 
 
 class RTSPPlayerApp:
-    def __init__(self, master, stream_infos):
+    def __init__(self, master, stream_infos, controller_port=0):
         self.master = master
         master.title("Multi RTSP Stream Player")
         master.geometry("1400x700")
@@ -164,13 +190,14 @@ class RTSPPlayerApp:
 
         self.vlc_instance = vlc.Instance()
         self.streams = []
+        self.recorder = RecorderClient(master)
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        self.grid_numbers = [str(i) for i in range(1, 53)]
-        self.grid_suffixes = ['A', 'B']
-        self.current_grid_index = 0
-        self.current_prefix = 'A'
-        self.recording_enabled = False
-        self.currently_recording_grid = None
+        # Grid sequencing lives in the controller; cameras join recordings once their stream runs
+        self.controller = GridController([api for _, api in stream_infos], client=self.recorder,
+                                         settle_seconds=GRID_SETTLE_SECONDS, active=False)
+        self.controller.add_listener(self._on_controller_event)
+        self.controller_api = start_api_server(self.controller, port=controller_port) if controller_port else None
 
         # === UI Setup ===
         self._create_ui()
@@ -179,9 +206,14 @@ class RTSPPlayerApp:
         for idx, (rtsp_url, record_api_url) in enumerate(stream_infos):
             stream = RTSPStream(self.grid_frame, self.vlc_instance, rtsp_url, record_api_url, idx)
             stream.app_reference = self
+            stream.recorder = self.recorder
             self.streams.append(stream)
 
         self._layout_streams()
+        for stream in self.streams:
+            stream.follow_recorder_events()
+        # Pick up the grid the recorders journaled before a crash or restart
+        self.controller.resume_last_session()
         self.update_grid_display()
 
     def _create_ui(self):
@@ -247,43 +279,33 @@ class RTSPPlayerApp:
         for idx, stream in enumerate(self.streams):
             stream.container.grid(row=0, column=idx, padx=10, pady=10, sticky="nsew")
 
-    def get_current_label(self):
-        num_idx = self.current_grid_index // 2
-        suffix_idx = self.current_grid_index % 2
-        return f"{self.current_prefix}-{self.grid_numbers[num_idx]}-{self.grid_suffixes[suffix_idx]}"
+    def update_grid_display(self, state=None):
+        state = state or self.controller.state()
+        self.grid_label.config(text=state['grid'])
 
-    def update_grid_display(self):
-        label = self.get_current_label()
-        self.grid_label.config(text=label)
+        self.back_button.config(state=tk.NORMAL if state['can_go_back'] else tk.DISABLED)
+        self.forward_button.config(state=tk.NORMAL if state['can_go_forward'] else tk.DISABLED)
 
-        self.back_button.config(state=tk.NORMAL if self.current_grid_index > 0 else tk.DISABLED)
-        self.forward_button.config(
-            state=tk.NORMAL if self.current_grid_index < len(self.grid_numbers) * 2 - 1 else tk.DISABLED
-        )
-
-        if self.recording_enabled:
-            self.start_recording_current_grid()
+        if state['recording_enabled']:
+            self.toggle_record_button.config(text="Stop Recording All", bg='#ffcccc', fg='#cc0000', relief='sunken')
+        else:
+            self.toggle_record_button.config(text="Start Recording All", bg='#f0f0f0', fg='black', relief='raised')
 
-    def next_grid(self): self.current_grid_index += 1; self.update_grid_display()
-    def previous_grid(self): self.current_grid_index -= 1; self.update_grid_display()
-    def toggle_prefix(self): self.current_prefix = 'B' if self.current_prefix == 'A' else 'A'; self.update_grid_display()
+    def next_grid(self): self.controller.next_grid()
+    def previous_grid(self): self.controller.previous_grid()
+    def toggle_prefix(self): self.controller.toggle_prefix()
 
     def handle_individual_stream_start(self, idx):
-        if self.recording_enabled and self.currently_recording_grid:
-            grid_name = self.get_current_label()
-            counter = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-")
-            self.streams[idx].start_recording(grid_name, f"{counter}{idx}")
+        self.controller.set_camera_active(idx, True)
 
     def handle_individual_stream_stop(self, idx):
-        if self.recording_enabled and self.currently_recording_grid:
-            grid_name = self.get_current_label()
-            self.streams[idx].stop_recording(grid_name)
+        self.controller.set_camera_active(idx, False)
 
     def toggle_all_streams(self):
         is_running = self.streams[0].stream_running if self.streams else False
         target_state = not is_running
 
-        for stream in self.streams:
+        for idx, stream in enumerate(self.streams):
             if target_state and not stream.stream_running:
                 stream.start()
                 if hasattr(stream, 'individual_button') and stream.individual_button:
@@ -292,6 +314,8 @@ class RTSPPlayerApp:
                 stream.stop()
                 if hasattr(stream, 'individual_button') and stream.individual_button:
                     stream._update_button_text("Start", '#f0f0f0', 'black', 'raised')
+            # Only cameras with a running stream are recorded
+            self.controller.set_camera_active(idx, stream.stream_running)
 
         self.toggle_streams_button.config(
             text="Stop All Streams" if target_state else "Start All Streams",
@@ -301,38 +325,28 @@ class RTSPPlayerApp:
         )
 
     def toggle_recording(self):
-        if self.recording_enabled:
-            self.stop_recording_current_grid()
-            self.recording_enabled = False
-            self.toggle_record_button.config(
-                text="Start Recording All",
-                bg='#f0f0f0', fg='black', relief='raised'
-            )
-        else:
-            self.recording_enabled = True
-            self.toggle_record_button.config(
-                text="Stop Recording All",
-                bg='#ffcccc', fg='#cc0000', relief='sunken'
-            )
-            self.start_recording_current_grid()
-
-    def start_recording_current_grid(self):
-        grid_name = self.get_current_label()
-        if self.currently_recording_grid and self.currently_recording_grid != grid_name:
-            self.stop_recording_grid(self.currently_recording_grid)
-        self.currently_recording_grid = grid_name
-        counter = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-")
-        for idx, stream in enumerate(self.streams):
-            stream.start_recording(grid_name, f"{counter}{idx}")
-
-    def stop_recording_current_grid(self):
-        if self.currently_recording_grid:
-            self.stop_recording_grid(self.currently_recording_grid)
-            self.currently_recording_grid = None
-
-    def stop_recording_grid(self, grid_name):
-        for stream in self.streams:
-            stream.stop_recording(grid_name)
+        self.controller.toggle_recording()
+
+    def _on_controller_event(self, event, data):
+        """Render controller events; runs on the Tk thread"""
+        if event == 'state':
+            self.update_grid_display(data)
+        elif event == 'pending':
+            for stream in self.streams:
+                stream.set_record_status(f"waiting for {data}...", 'gray30')
+        elif event == 'request' and data['action'] == 'start':
+            self.streams[data['camera']].set_record_status(f"starting {data['grid']}...", 'gray30')
+        elif event == 'result':
+            self.streams[data['camera']]._on_record_result(data['result'], data['action'], data['grid'])
+
+    def on_close(self):
+        """Stop any recording and let queued recorder requests finish before exiting"""
+        if self.controller_api:
+            self.controller_api.shutdown()
+        self.controller.stop_recording()
+        self.controller.close()
+        self.recorder.shutdown(wait=True)
+        self.master.destroy()
 
 
 # === CLI & Main ===
@@ -340,6 +354,8 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--devices', nargs='+', required=True, help='List of RTSP URLs')
     parser.add_argument('--record-api', nargs='+', required=True, help='List of API URLs (by position)')
+    parser.add_argument('--controller-port', type=int, default=0,
+                        help='Also serve the grid controller API on this port (default: off)')
     return parser.parse_args()
 
 
@@ -351,7 +367,7 @@ def main():
 
     stream_infos = list(zip(args.devices, args.record_api))
     root = tk.Tk()
-    app = RTSPPlayerApp(root, stream_infos)
+    app = RTSPPlayerApp(root, stream_infos, args.controller_port)
     root.mainloop()
 
 
@@ -32,6 +32,7 @@ export USER="${USER:-$(whoami)}"
 # Configuration parameters for local USB cameras
 RTSP_BASE_PORT=8554
 RECORD_API_BASE_PORT=5000
+RELAY_BASE_PORT=8654
 RTSP_CHECK_TIMEOUT=5
 FFPLAY_TEST_DURATION=3
 
@@ -41,6 +42,7 @@ DEFAULT_FPS=15
 DEFAULT_BOTTOM_CAMERA=""
 DEFAULT_MIDDLE_CAMERA=""
 DEFAULT_TOP_CAMERA=""
+DEFAULT_RELAY=true
 
 # Configuration variables
 CONFIG_RESOLUTION="$DEFAULT_RESOLUTION"
@@ -48,6 +50,7 @@ CONFIG_FPS="$DEFAULT_FPS"
 CONFIG_BOTTOM_CAMERA="$DEFAULT_BOTTOM_CAMERA"
 CONFIG_MIDDLE_CAMERA="$DEFAULT_MIDDLE_CAMERA"
 CONFIG_TOP_CAMERA="$DEFAULT_TOP_CAMERA"
+USE_RELAY="$DEFAULT_RELAY"
 
 # Arrays to track devices and services
 PLAYABLE_DEVICES=()
@@ -56,6 +59,8 @@ RTSP_SERVERS=()
 RECORD_APIS=()
 RTSP_PIDS=()
 RECORD_API_PIDS=()
+RELAY_PIDS=()
+CAMERA_URLS=()  # what the UI and recorders read: the relay, or the RTSP server directly
 
 # Function to display error messages without exiting
 show_error() {
@@ -113,6 +118,10 @@ read_config() {
                     CONFIG_TOP_CAMERA="$value"
                     info_msg "Config: topcamera=$CONFIG_TOP_CAMERA"
                     ;;
+                "relay")
+                    USE_RELAY="$value"
+                    info_msg "Config: relay=$USE_RELAY"
+                    ;;
                 *)
                     warning_msg "Unknown config key: $key"
                     ;;
@@ -143,6 +152,14 @@ cleanup() {
         fi
     done
     
+    # Kill relay processes
+    for pid in "${RELAY_PIDS[@]}"; do
+        if kill -0 "$pid" 2>/dev/null; then
+            kill "$pid" 2>/dev/null
+            info_msg "Stopped relay process $pid"
+        fi
+    done
+    
     # Kill RTSP server processes
     for pid in "${RTSP_PIDS[@]}"; do
         if kill -0 "$pid" 2>/dev/null; then
@@ -271,37 +288,53 @@ detect_cameras() {
     local temp_devices=()
     local temp_serials=()
     
-    for dev in /dev/video*; do 
-        if [ -e "$dev" ]; then
-            # Use your original approach: check USB device and test playability in one go
-            if udevadm info --query=all --name="$dev" 2>/dev/null | grep -q 'ID_BUS=usb'; then
-                # Check if device is accessible with v4l2-ctl
-                if timeout 3s v4l2-ctl --device="$dev" --list-formats-ext >/dev/null 2>&1; then
-                    # Test playability using your approach
-                    if [ "$HAS_FFPLAY" = true ]; then
-                        if ! timeout 3s ffplay -f v4l2 -i "$dev" -t 1 -nodisp -loglevel error 2>&1 | grep -q "Inappropriate ioctl for device"; then
+    # Cameras known to device_cache.py come straight from sysfs (new ones are
+    # probed and cached by it); the per-device probes below are the fallback
+    local cached_cameras=""
+    if [ -f "./device_cache.py" ]; then
+        cached_cameras=$(python3 ./device_cache.py list --plain 2>/dev/null)
+    fi
+    
+    if [ -n "$cached_cameras" ]; then
+        while read -r dev serial; do
+            [ "$serial" = "unknown" ] && serial=""
+            temp_devices+=("$dev")
+            temp_serials+=("$serial")
+            success_msg "Found playable camera: $dev (Serial: $serial)"
+        done <<< "$cached_cameras"
+    else
+        for dev in /dev/video*; do 
+            if [ -e "$dev" ]; then
+                # Use your original approach: check USB device and test playability in one go
+                if udevadm info --query=all --name="$dev" 2>/dev/null | grep -q 'ID_BUS=usb'; then
+                    # Check if device is accessible with v4l2-ctl
+                    if timeout 3s v4l2-ctl --device="$dev" --list-formats-ext >/dev/null 2>&1; then
+                        # Test playability using your approach
+                        if [ "$HAS_FFPLAY" = true ]; then
+                            if ! timeout 3s ffplay -f v4l2 -i "$dev" -t 1 -nodisp -loglevel error 2>&1 | grep -q "Inappropriate ioctl for device"; then
+                                local serial=$(get_device_serial "$dev")
+                                temp_devices+=("$dev")
+                                temp_serials+=("$serial")
+                                success_msg "Found playable camera: $dev (Serial: $serial)"
+                            else
+                                warning_msg "Device $dev failed playability test (Inappropriate ioctl for device)"
+                            fi
+                        else
+                            # If ffplay is not available, assume device is playable if v4l2-ctl works
                             local serial=$(get_device_serial "$dev")
                             temp_devices+=("$dev")
                             temp_serials+=("$serial")
-                            success_msg "Found playable camera: $dev (Serial: $serial)"
-                        else
-                            warning_msg "Device $dev failed playability test (Inappropriate ioctl for device)"
+                            warning_msg "ffplay not available, assuming $dev is playable based on v4l2-ctl test (Serial: $serial)"
                         fi
                     else
-                        # If ffplay is not available, assume device is playable if v4l2-ctl works
-                        local serial=$(get_device_serial "$dev")
-                        temp_devices+=("$dev")
-                        temp_serials+=("$serial")
-                        warning_msg "ffplay not available, assuming $dev is playable based on v4l2-ctl test (Serial: $serial)"
+                        warning_msg "Device $dev is not accessible with v4l2-ctl"
                     fi
                 else
-                    warning_msg "Device $dev is not accessible with v4l2-ctl"
+                    info_msg "Skipping non-USB device: $dev"
                 fi
-            else
-                info_msg "Skipping non-USB device: $dev"
             fi
-        fi
-    done
+        done
+    fi
     
     if [ ${#temp_devices[@]} -eq 0 ]; then
         show_error "No playable USB cameras detected."
@@ -437,11 +470,46 @@ check_rtsp_stream() {
     fi
 }
 
+# Function to start the local fan-out relay for one camera
+start_rtsp_relay() {
+    local rtsp_url=$1
+    local relay_port=$2
+    local log_file="/tmp/rtsp_relay_${relay_port}.log"
+    local relay_script="./rtsp_relay.py"
+    
+    if [ ! -f "$relay_script" ]; then
+        warning_msg "Relay script not found: $relay_script"
+        return 1
+    fi
+    
+    info_msg "Starting relay on port $relay_port for $rtsp_url..."
+    python3 "$relay_script" --source "$rtsp_url" --port "$relay_port" > "$log_file" 2>&1 &
+    local pid=$!
+    
+    # Wait until the relay is receiving the camera stream
+    for attempt in $(seq 1 $RTSP_CHECK_TIMEOUT); do
+        sleep 1
+        if ! kill -0 "$pid" 2>/dev/null; then
+            show_error "Relay on port $relay_port exited"
+            cat "$log_file"
+            return 1
+        fi
+        if curl -s --max-time 1 "http://localhost:$relay_port/status" | grep -q '"source_up": true'; then
+            RELAY_PIDS+=($pid)
+            success_msg "Relay ready on port $relay_port (PID: $pid)"
+            return 0
+        fi
+    done
+    
+    show_error "Relay on port $relay_port did not receive the stream within ${RTSP_CHECK_TIMEOUT}s"
+    kill "$pid" 2>/dev/null
+    return 1
+}
+
 # Function to start record API
 start_record_api() {
-    local rtsp_port=$1
+    local rtsp_url=$1
     local api_port=$2
-    local rtsp_url="rtsp://localhost:$rtsp_port/unicast"
     local log_file="/tmp/record_api_${api_port}.log"
     local api_script="./rtsp_record_api.py"
     local max_retries=2
@@ -499,6 +567,18 @@ info_msg "Starting local USB camera RTSP setup..."
 # Detect and filter cameras
 detect_cameras
 
+# supervisor.py owns the RTSP servers, relays and record APIs from here on:
+# it restarts any that die or stop answering and stops them all with the UI
+if [ -f "./supervisor.py" ]; then
+    SUPERVISOR_ARGS=(run --devices "${PLAYABLE_DEVICES[@]}")
+    if [ "$USE_RELAY" != true ]; then
+        SUPERVISOR_ARGS+=(--no-relay)
+    fi
+    info_msg "Starting supervised services for: ${PLAYABLE_DEVICES[*]}"
+    trap - EXIT INT TERM
+    exec python3 ./supervisor.py "${SUPERVISOR_ARGS[@]}"
+fi
+
 # Start RTSP servers for each playable camera (now in configured order)
 current_rtsp_port=$RTSP_BASE_PORT
 for i in "${!PLAYABLE_DEVICES[@]}"; do
@@ -532,12 +612,27 @@ if [ ${#RTSP_SERVERS[@]} -eq 0 ]; then
     exit 1
 fi
 
-# Start record APIs for each RTSP server
+# Start one relay per camera so the preview and the recorder share a single RTSP session
+for rtsp_url in "${RTSP_SERVERS[@]}"; do
+    rtsp_port="${rtsp_url##*:}"
+    rtsp_port="${rtsp_port%%/*}"
+    relay_port=$((RELAY_BASE_PORT + rtsp_port - RTSP_BASE_PORT))
+    
+    if [ "$USE_RELAY" = true ] && start_rtsp_relay "$rtsp_url" $relay_port; then
+        CAMERA_URLS+=("http://localhost:$relay_port/stream.ts")
+    else
+        if [ "$USE_RELAY" = true ]; then
+            warning_msg "Relay on port $relay_port unavailable, using $rtsp_url directly"
+        fi
+        CAMERA_URLS+=("$rtsp_url")
+    fi
+done
+
+# Start record APIs for each camera
 current_api_port=$RECORD_API_BASE_PORT
-rtsp_port=$RTSP_BASE_PORT
 
-for i in "${!RTSP_SERVERS[@]}"; do
-    if start_record_api $rtsp_port $current_api_port; then
+for i in "${!CAMERA_URLS[@]}"; do
+    if start_record_api "${CAMERA_URLS[$i]}" $current_api_port; then
         RECORD_APIS+=("http://localhost:$current_api_port")
         success_msg "Record API ready on port $current_api_port"
     else
@@ -545,12 +640,11 @@ for i in "${!RTSP_SERVERS[@]}"; do
     fi
     
     ((current_api_port++))
-    ((rtsp_port++))
 done
 
 # Prepare arguments for UI (following the original script pattern)
 DEVICE_ARGS=""
-for device in "${RTSP_SERVERS[@]}"; do
+for device in "${CAMERA_URLS[@]}"; do
     DEVICE_ARGS="$DEVICE_ARGS $device"
 done
 
@@ -560,6 +654,7 @@ for api in "${RECORD_APIS[@]}"; do
 done
 
 info_msg "RTSP Servers: ${RTSP_SERVERS[*]}"
+info_msg "Camera URLs: ${CAMERA_URLS[*]}"
 info_msg "Record APIs: ${RECORD_APIS[*]}"
 
 # Launch UI application (following original script pattern)
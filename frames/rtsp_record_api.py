@@ -1,70 +1,171 @@
-from flask import Flask, Response, request
+from flask import Flask, Response, request, jsonify
 import threading
 import subprocess
 import time
+import json
+import queue
+from collections import deque
 import argparse
 from datetime import datetime
 import os
 import getpass
 import signal
 import sys
+from recording_journal import (RecordingJournal, journal_path, log_tail, process_start_time, recover,
+                               repair_frames)
+from frame_staging import FLUSH_INTERVAL, STAGE_ROOT, FrameStager, flush_leftovers, stage_dir_for, stage_root_for
 
 # Global variables
 USERNAME = getpass.getuser()
 POSITION = "top"
 REC_WIDTH = 1920
 REC_HEIGHT = 1080
+FRAME_INTERVAL = 0.7  # seconds between saved frames at full quality
+STATUS_INTERVAL = 1.0  # seconds between status events on /events
+EVENT_QUEUE_SIZE = 8  # status events buffered per /events client; the oldest are dropped
+FPS_WINDOW = 10  # seconds of frames used for the frames/s figure
 port = 0
 CURRENT_DATE = datetime.today().strftime('%Y-%m-%d')
+SAVE_ROOT = f"/home/{USERNAME}/Desktop/scout-videos"
 print(f"Running as user: {USERNAME}")
 
 
+def input_options(url):
+    """ffmpeg input options: RTSP over TCP, nothing for the local relay's HTTP stream"""
+    return ['-rtsp_transport', 'tcp'] if url.startswith('rtsp://') else []
+
+
 class RTSPStream:
-    def __init__(self, rtsp_url="rtsp://192.168.1.20:8554/", resolution=(REC_WIDTH, REC_HEIGHT)):
+    def __init__(self, rtsp_url="rtsp://192.168.1.20:8554/", resolution=(REC_WIDTH, REC_HEIGHT), journal=None,
+                 stage_root=None, flush_interval=FLUSH_INTERVAL):
         self.rtsp_url = rtsp_url
         self.resolution = resolution
+        # RAM staging area for frames (frame_staging.py), None to write straight to the SD card
+        self.stage_root = stage_root
+        self.flush_interval = flush_interval
         self.active_recordings = {}  # Dictionary to track recordings by grid_name
         self.recording_lock = threading.Lock()
+        self.restart_lock = threading.Lock()  # serializes capture-settings restarts
+        # Write-ahead journal of recording lifecycles, replayed by recover_from_journal() on startup
+        self.journal = journal or RecordingJournal(journal_path(port))
+        self.recovered = []
+        # Capture settings, lowered by recording_governor.py while the Pi is throttled
+        self.frame_interval = FRAME_INTERVAL
+        self.keyframes_only = False
+        # Push status for /events subscribers
+        self.subscribers = set()
+        self.subscribers_lock = threading.Lock()
+        self.status_changed = threading.Event()
+        self.last_error = None
+        threading.Thread(target=self._publish_status_loop, daemon=True).start()
 
     def start_recording(self, counter, grid_name):
-        with self.recording_lock:
-            if grid_name in self.active_recordings:
-                return f"Grid {grid_name} is already recording"
-
-            print(f"Starting recording with counter: {counter}, grid: {grid_name}")
-
-            save_dir = f"/home/{USERNAME}/Desktop/scout-videos/recordings_{CURRENT_DATE}/{grid_name}-{POSITION}/"
-            os.makedirs(save_dir, exist_ok=True)
-
-            # Clean up any existing malformed files
-            import glob
-            cleanup_pattern = os.path.join(save_dir, "*%04d.jpg")
-            for file_path in glob.glob(cleanup_pattern):
-                try:
-                    os.remove(file_path)
-                    print(f"Removed malformed file: {file_path}")
-                except Exception as e:
-                    print(f"Could not remove file {file_path}: {e}")
-
-            start_time = datetime.now()
-            start_time_str = start_time.strftime('%Y%m%d_%H%M%S')
-
-            filename_prefix = (
-                f"ABC_GRID_{grid_name}_{counter}_recording_"
-                f"{start_time_str}_{POSITION}_frame_"
-            )
-
-            output_pattern = os.path.join(save_dir, filename_prefix + "%04d.jpg")
-
-            def record():
-                print(f"Recording images every 0.7s to: {output_pattern}")
-
-                cmd = [
-                    'ffmpeg',
-                    '-y',
-                    '-rtsp_transport', 'tcp',
+        stopping = []
+        try:
+            with self.recording_lock:
+                if grid_name in self.active_recordings:
+                    return f"Grid {grid_name} is already recording"
+
+                # One recording per camera: starting a new grid ends the previous one first.
+                # Requests are serialized by recording_lock, so overlapping start/stop calls queue up;
+                # the previous ffmpeg is only signalled here and finishes once the lock is released.
+                for other_grid in [g for g in self.active_recordings if g != grid_name]:
+                    print(f"Stopping grid {other_grid} before starting {grid_name}")
+                    stopping.append(self._stop_single_recording(other_grid))
+
+                print(f"Starting recording with counter: {counter}, grid: {grid_name}")
+                self.last_error = None
+
+                save_dir = f"{SAVE_ROOT}/recordings_{CURRENT_DATE}/{grid_name}-{POSITION}/"
+                os.makedirs(save_dir, exist_ok=True)
+                # ffmpeg writes into the RAM staging area when there is one; frames reach save_dir in batches
+                frame_dir = save_dir
+                if self.stage_root:
+                    frame_dir = stage_dir_for(save_dir, self.stage_root, SAVE_ROOT)
+                    os.makedirs(frame_dir, exist_ok=True)
+
+                # Clean up any existing malformed files
+                import glob
+                cleanup_pattern = os.path.join(save_dir, "*%04d.jpg")
+                for file_path in glob.glob(cleanup_pattern):
+                    try:
+                        os.remove(file_path)
+                        print(f"Removed malformed file: {file_path}")
+                    except Exception as e:
+                        print(f"Could not remove file {file_path}: {e}")
+
+                start_time = datetime.now()
+                start_time_str = start_time.strftime('%Y%m%d_%H%M%S')
+
+                filename_prefix = (
+                    f"ABC_GRID_{grid_name}_{counter}_recording_"
+                    f"{start_time_str}_{POSITION}_frame_"
+                )
+
+                output_pattern = os.path.join(frame_dir, filename_prefix + "%04d.jpg")
+
+                frame_interval = self.frame_interval
+                keyframes_only = self.keyframes_only
+
+                session = f"{grid_name}_{start_time.strftime('%Y%m%d_%H%M%S_%f')}"
+                self.journal.record('intent', session, grid=grid_name, counter=counter, output=output_pattern,
+                                    dest=save_dir, rtsp_url=self.rtsp_url, frame_interval=frame_interval,
+                                    keyframes_only=keyframes_only)
+                self._register_recording(grid_name, {
+                    'session': session,
+                    'output_path': output_pattern,
+                    'save_dir': save_dir,
+                    'start_time': start_time,
+                    'counter': counter,
+                    'frame_interval': frame_interval,
+                    'keyframes_only': keyframes_only,
+                })
+
+                return f"Started recording grid {grid_name} to {output_pattern}"
+        finally:
+            self._wait_stopped(stopping)
+
+    def _register_recording(self, grid_name, recording_info, process=None):
+        """Track a recording and start its thread; process is an adopted ffmpeg, or None to launch one"""
+        recording_thread = threading.Thread(target=self._record, args=(grid_name, recording_info, process),
+                                            daemon=True)
+        frame_dir = os.path.dirname(recording_info['output_path'])
+        save_dir = recording_info.get('save_dir') or frame_dir
+        recording_info.update({
+            'thread': recording_thread,
+            'process': None,  # will be filled in by `_record`
+            'frames': 0,
+            'frame_times': deque(maxlen=64),
+            'stager': FrameStager(frame_dir, save_dir, self.flush_interval)
+                      if os.path.normpath(frame_dir) != os.path.normpath(save_dir) else None,
+        })
+        self.active_recordings[grid_name] = recording_info
+        recording_thread.start()
+        self.status_changed.set()
+
+    def _record(self, grid_name, recording_info, process=None):
+        output_pattern = recording_info['output_path']
+        filename_prefix = os.path.basename(output_pattern).split('%', 1)[0]
+        frame_interval = recording_info['frame_interval']
+        keyframes_only = recording_info['keyframes_only']
+        session = recording_info['session']
+        stager = recording_info['stager']
+        log_path = self.journal.log_path(session)
+
+        try:
+            if process is None:
+                print(f"Recording images every {frame_interval}s to: {output_pattern}"
+                      f"{' (keyframes only)' if keyframes_only else ''}")
+
+                # stderr goes to a per-session log file, not a pipe, so an ffmpeg that outlives
+                # a crashed recorder keeps recording until it is adopted or stopped
+                cmd = ['ffmpeg', '-y', '-nostats', '-loglevel', 'error'] + input_options(self.rtsp_url)
+                if keyframes_only:
+                    # Decode only keyframes, skipping the decode cost of every other frame
+                    cmd += ['-skip_frame', 'nokey']
+                cmd += [
                     '-i', self.rtsp_url,
-                    '-vf', f'fps=1/0.7,scale={self.resolution[0]}:{self.resolution[1]}',
+                    '-vf', f'fps=1/{frame_interval},scale={self.resolution[0]}:{self.resolution[1]}',
                     '-q:v', '2',
                     '-f', 'image2',
                     '-start_number', '1',
@@ -73,75 +174,125 @@ class RTSPStream:
 
                 print(f"FFmpeg command: {' '.join(cmd)}")
 
-                try:
+                with open(log_path, 'w') as log_file:
                     process = subprocess.Popen(
                         cmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        universal_newlines=True
+                        stdout=subprocess.DEVNULL,
+                        stderr=log_file,
                     )
-
-                    with self.recording_lock:
-                        if grid_name in self.active_recordings:
-                            self.active_recordings[grid_name]['process'] = process
-
-                    output_dir = os.path.dirname(output_pattern)
-                    existing_files = set()
-
-                    while True:
-                        if process.poll() is not None:
-                            break
-
-                        with self.recording_lock:
-                            if grid_name not in self.active_recordings:
-                                break
-
-                        for fname in os.listdir(output_dir):
-                            if fname.endswith(".jpg") and fname not in existing_files:
-                                full_path = os.path.join(output_dir, fname)
-                                timestamp = int(time.time())
-                                new_name = f"{os.path.splitext(fname)[0]}_{timestamp}.jpg"
-                                new_path = os.path.join(output_dir, new_name)
-                                try:
-                                    os.rename(full_path, new_path)
-                                    existing_files.add(new_name)
-                                    print(f"Renamed {fname} → {new_name}")
-                                except Exception as e:
-                                    print(f"Failed to rename {fname}: {e}")
-                        time.sleep(0.2)
-
-                    stdout, stderr = process.communicate()
-                    if process.returncode != 0:
-                        print(f"FFmpeg error for grid {grid_name}:")
-                        print(f"Return code: {process.returncode}")
-                        print(f"STDOUT: {stdout}")
-                        print(f"STDERR: {stderr}")
-                    else:
-                        print(f"Recording completed successfully for grid {grid_name}")
-
-                except Exception as e:
-                    print(f"Exception in recording thread for grid {grid_name}: {e}")
-                finally:
-                    with self.recording_lock:
-                        if grid_name in self.active_recordings:
-                            del self.active_recordings[grid_name]
-                    print(f"Recording thread ended for grid {grid_name}")
-
-            # Create and start the thread
-            recording_thread = threading.Thread(target=record, daemon=True)
-
-            # Register the recording
-            self.active_recordings[grid_name] = {
-                'thread': recording_thread,
-                'process': None,  # will be filled in by `record`
-                'output_path': output_pattern,
-                'start_time': start_time
-            }
-
-            recording_thread.start()
-
-            return f"Started recording grid {grid_name} to {output_pattern}"
-
+                self.journal.record('started', session, pid=process.pid, pid_start=process_start_time(process.pid))
+            else:
+                print(f"Resuming frame recording to: {output_pattern} (ffmpeg {process.pid})")
+
+            with self.recording_lock:
+                owns_recording = self._owns_recording(grid_name)
+                if owns_recording:
+                    self.active_recordings[grid_name]['process'] = process
+            if not owns_recording:
+                # Stopped before ffmpeg was running; don't leave it orphaned
+                print(f"Recording for grid {grid_name} was stopped during startup, terminating ffmpeg")
+                process.terminate()
+                # The stop was journaled before our 'started' entry; close the session again after it
+                self.journal.record('stopped', session, returncode=None)
+
+            output_dir = os.path.dirname(output_pattern)
+            existing_files = set()
+
+            while True:
+                if process.poll() is not None:
+                    break
+
+                with self.recording_lock:
+                    if not self._owns_recording(grid_name):
+                        break
+
+                for fname in os.listdir(output_dir):
+                    # Only frames of this recording that do not have a timestamp yet
+                    frame_number = fname[len(filename_prefix):-len(".jpg")]
+                    if (fname.startswith(filename_prefix) and fname.endswith(".jpg")
+                            and frame_number.isdigit() and fname not in existing_files):
+                        full_path = os.path.join(output_dir, fname)
+                        timestamp = int(time.time())
+                        new_name = f"{os.path.splitext(fname)[0]}_{timestamp}.jpg"
+                        new_path = os.path.join(output_dir, new_name)
+                        try:
+                            os.rename(full_path, new_path)
+                            existing_files.add(new_name)
+                            recording_info['frames'] += 1
+                            recording_info['frame_times'].append(time.time())
+                            print(f"Renamed {fname} → {new_name}")
+                            if stager:
+                                stager.add(new_path)
+                        except Exception as e:
+                            print(f"Failed to rename {fname}: {e}")
+                if stager and stager.poll():
+                    flush = stager.last_flush
+                    print(f"Flushed {flush['files']} frames ({flush['bytes'] / 1e6:.1f} MB) to the card "
+                          f"in {flush['seconds']}s [{flush['reason']}]")
+                time.sleep(0.2)
+
+            process.wait()
+            with self.recording_lock:
+                died = self._owns_recording(grid_name)  # still registered: nobody stopped it
+            stderr_tail = log_tail(log_path)
+            if process.returncode != 0:
+                print(f"FFmpeg error for grid {grid_name}:")
+                print(f"Return code: {process.returncode}")
+                print(f"STDERR ({log_path}):")
+                for line in stderr_tail:
+                    print(f"  {line}")
+            else:
+                print(f"Recording completed successfully for grid {grid_name}")
+            if died:
+                last_line = stderr_tail[-1].strip() if stderr_tail else ''
+                self.last_error = {
+                    'grid': grid_name,
+                    'message': f"ffmpeg exited with code {process.returncode}: {last_line}"[:200],
+                    'time': time.time(),
+                }
+
+        except Exception as e:
+            print(f"Exception in recording thread for grid {grid_name}: {e}")
+            self.last_error = {'grid': grid_name, 'message': str(e)[:200], 'time': time.time()}
+        finally:
+            if stager:
+                # Even after an error, so the last batch does not wait in RAM for a restart
+                self._flush_staged(grid_name, recording_info, filename_prefix)
+            with self.recording_lock:
+                # A restart may already have registered a new recording for this grid
+                if self._owns_recording(grid_name):
+                    del self.active_recordings[grid_name]
+                    self.journal.record('exited', session, returncode=process.returncode if process else None)
+            print(f"Recording thread ended for grid {grid_name}")
+
+    def _flush_staged(self, grid_name, recording_info, filename_prefix):
+        """Timestamp the frames ffmpeg wrote after the last scan and flush everything staged"""
+        stager = recording_info['stager']
+        output_dir = stager.stage_dir
+        try:
+            names = sorted(os.listdir(output_dir))
+        except OSError as e:
+            print(f"Failed to list {output_dir}: {e}")
+            names = []
+        for fname in names:
+            frame_number = fname[len(filename_prefix):-len(".jpg")]
+            if fname.startswith(filename_prefix) and fname.endswith(".jpg") and frame_number.isdigit():
+                new_path = os.path.join(output_dir, f"{os.path.splitext(fname)[0]}_{int(time.time())}.jpg")
+                try:
+                    os.rename(os.path.join(output_dir, fname), new_path)
+                except OSError as e:
+                    print(f"Failed to rename {fname}: {e}")
+                    continue
+                recording_info['frames'] += 1
+                stager.add(new_path)
+        result = stager.flush(final=True)
+        if result:
+            print(f"Flushed the last {result['files']} frames of grid {grid_name} to {stager.save_dir}")
+
+    def _owns_recording(self, grid_name):
+        """True if the calling recording thread is the one registered for grid_name"""
+        info = self.active_recordings.get(grid_name)
+        return info is not None and info['thread'] is threading.current_thread()
 
     def stop_recording(self, grid_name=None):
         with self.recording_lock:
@@ -150,43 +301,197 @@ class RTSPStream:
                 if not self.active_recordings:
                     return "No recordings are active"
 
-                stopped_grids = []
-                for grid in list(self.active_recordings.keys()):
-                    result = self._stop_single_recording(grid)
-                    stopped_grids.append(grid)
-
-                return f"Stopped recording for grids: {', '.join(stopped_grids)}"
+                stopped = [self._stop_single_recording(grid) for grid in list(self.active_recordings)]
+                message = f"Stopped recording for grids: {', '.join(grid for grid, _ in stopped)}"
             else:
                 # Stop specific grid recording
                 if grid_name not in self.active_recordings:
                     return f"Grid {grid_name} is not currently recording"
 
-                return self._stop_single_recording(grid_name)
+                stopped = [self._stop_single_recording(grid_name)]
+                message = f"Recording stopped for grid {grid_name}"
+        self._wait_stopped(stopped)
+        return message
 
     def _stop_single_recording(self, grid_name):
-        """Helper method to stop a single recording"""
-        if grid_name not in self.active_recordings:
-            return f"Grid {grid_name} is not recording"
+        """Unregister a recording and signal its ffmpeg; the caller holds recording_lock.
 
-        recording_info = self.active_recordings[grid_name]
+        Returns (grid_name, recording_info) for _wait_stopped(), which the caller runs
+        after releasing the lock so status requests and the next start don't wait on ffmpeg.
+        """
+        recording_info = self.active_recordings.pop(grid_name)
         process = recording_info.get('process')
 
         print(f"Stopping recording for grid: {grid_name}")
         if process and process.poll() is None:  # Check if process is still running
             # Send SIGTERM first for graceful shutdown
             process.terminate()
-            try:
-                process.wait(timeout=5)  # Wait up to 5 seconds for graceful termination
-                print(f"Process terminated gracefully for grid {grid_name}")
-            except subprocess.TimeoutExpired:
-                print(f"Process didn't terminate gracefully, killing for grid {grid_name}")
-                process.kill()  # Force kill if it doesn't terminate gracefully
-                process.wait()  # Wait for it to be killed
+        self.status_changed.set()
+        return grid_name, recording_info
+
+    def _wait_stopped(self, stopped):
+        """Wait for stopped recordings' ffmpeg to finish (killing it after 5 s) and journal the stops"""
+        for grid_name, recording_info in stopped:
+            process = recording_info.get('process')
+            if process:
+                try:
+                    process.wait(timeout=5)  # Wait up to 5 seconds for graceful termination
+                    print(f"Process terminated gracefully for grid {grid_name}")
+                except subprocess.TimeoutExpired:
+                    print(f"Process didn't terminate gracefully, killing for grid {grid_name}")
+                    process.kill()  # Force kill if it doesn't terminate gracefully
+                    process.wait()  # Wait for it to be killed
+            self.journal.record('stopped', recording_info['session'],
+                                returncode=process.returncode if process else None)
+
+    def recover_from_journal(self, orphans='adopt'):
+        """Adopt or stop ffmpeg processes left by a previous run and finalize their frames"""
+        def adopt(session, process):
+            with self.recording_lock:
+                self._register_recording(session['grid'], {
+                    'session': session['session'],
+                    'output_path': session['output'],
+                    'save_dir': session.get('dest'),
+                    'start_time': datetime.fromtimestamp(session['opened']),
+                    'counter': session.get('counter'),
+                    'frame_interval': session.get('frame_interval', self.frame_interval),
+                    'keyframes_only': session.get('keyframes_only', self.keyframes_only),
+                }, process)
+
+        self.recovered = recover(self.journal, self.rtsp_url, orphans, adopt, repair_frames)
+        self.flush_staged_leftovers()
+        return self.recovered
+
+    def flush_staged_leftovers(self):
+        """Move frames a previous run left in the staging area to the card (skipping adopted recordings)"""
+        if not self.stage_root:
+            return
+        with self.recording_lock:
+            active = {os.path.normpath(os.path.dirname(info['output_path'])) for info in self.active_recordings.values()}
+        directories, files = flush_leftovers(self.stage_root, SAVE_ROOT, active)
+        if files:
+            print(f"✓ Flushed {files} frames left in {self.stage_root} ({directories} folders)")
+
+    def shutdown(self, timeout=10):
+        """Stop all recordings and give their threads time to flush staged frames"""
+        with self.recording_lock:
+            threads = [info['thread'] for info in self.active_recordings.values()]
+        self.stop_recording()
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def get_session(self):
+        """Last journaled session, current recordings and startup recovery, for the UI to resume from"""
+        with self.recording_lock:
+            recording = [{'grid': grid, 'counter': info['counter']} for grid, info in self.active_recordings.items()]
+        return {
+            'position': POSITION,
+            'last': self.journal.last_session(),
+            'recording': recording,
+            'recovered': self.recovered,
+        }
+
+    def get_capture_settings(self):
+        with self.recording_lock:
+            return {
+                'fps': round(1 / self.frame_interval, 3),
+                'frame_interval': self.frame_interval,
+                'keyframes_only': self.keyframes_only,
+                'recordings': {grid: {'frame_interval': info['frame_interval'],
+                                      'keyframes_only': info['keyframes_only']}
+                               for grid, info in self.active_recordings.items()}
+            }
 
-        # Remove from active recordings
-        del self.active_recordings[grid_name]
+    def set_capture_settings(self, fps=None, keyframes_only=None, restart=True):
+        """Change frame rate / keyframe-only decode; restart active recordings so they take effect.
 
-        return f"Recording stopped for grid {grid_name}"
+        Restarts run in the background: stopping ffmpeg can take several seconds per
+        recording, longer than the governor waits for a reply.
+        """
+        with self.recording_lock:
+            if fps is not None:
+                self.frame_interval = round(1 / fps, 3)
+            if keyframes_only is not None:
+                self.keyframes_only = keyframes_only
+        print(f"Capture settings: every {self.frame_interval}s, keyframes only: {self.keyframes_only}")
+
+        if restart:
+            threading.Thread(target=self._restart_stale_recordings, daemon=True).start()
+        return self.get_capture_settings()
+
+    def _restart_stale_recordings(self):
+        """Restart recordings whose capture settings differ from the current ones"""
+        # One pass at a time; a pass started later sees the newest settings
+        with self.restart_lock:
+            with self.recording_lock:
+                stale = [(grid, info['counter']) for grid, info in self.active_recordings.items()
+                         if info['frame_interval'] != self.frame_interval
+                         or info['keyframes_only'] != self.keyframes_only]
+            for grid_name, counter in stale:
+                print(f"Restarting recording for grid {grid_name} with new capture settings")
+                self.stop_recording(grid_name)
+                self.start_recording(counter, grid_name)
+
+    def get_status_snapshot(self):
+        """Per-recording frame counts and rates, pushed to /events subscribers"""
+        now = time.time()
+        recordings = []
+        with self.recording_lock:
+            for grid_name, info in self.active_recordings.items():
+                duration = (datetime.now() - info['start_time']).total_seconds()
+                window = min(FPS_WINDOW, duration)
+                recent = [t for t in info['frame_times'] if t >= now - FPS_WINDOW]
+                process = info['process']
+                recordings.append({
+                    'grid': grid_name,
+                    'duration': round(duration, 1),
+                    'frames': info['frames'],
+                    'fps': round(len(recent) / window, 2) if window > 0 else 0.0,
+                    'last_frame_age': round(now - info['frame_times'][-1], 1) if info['frame_times'] else None,
+                    'ffmpeg_running': process is not None and process.poll() is None,
+                    'staging': info['stager'].status() if info['stager'] else None,
+                })
+        return {
+            'position': POSITION,
+            'recording': bool(recordings),
+            'recordings': recordings,
+            'error': self.last_error,
+            'frame_interval': self.frame_interval,
+            'keyframes_only': self.keyframes_only,
+            'time': now,
+        }
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self.subscribers_lock:
+            self.subscribers.add(subscriber)
+        self.status_changed.set()  # send the current state right away
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.subscribers_lock:
+            self.subscribers.discard(subscriber)
+
+    def _publish_status_loop(self):
+        """Push a status snapshot every STATUS_INTERVAL, or immediately after a change"""
+        while True:
+            self.status_changed.wait(STATUS_INTERVAL)
+            self.status_changed.clear()
+            with self.subscribers_lock:
+                subscribers = list(self.subscribers)
+            if not subscribers:
+                continue
+            data = json.dumps(self.get_status_snapshot())
+            for subscriber in subscribers:
+                try:
+                    subscriber.put_nowait(data)
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                        subscriber.put_nowait(data)
+                    except (queue.Empty, queue.Full):
+                        pass
 
     def get_recording_status(self):
         """Get status of all active recordings"""
@@ -205,10 +510,11 @@ class RTSPStream:
                 duration_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
                 
                 # Check if images are being created
-                output_dir = os.path.dirname(info['output_path'])
+                output_dir = info.get('save_dir') or os.path.dirname(info['output_path'])
                 if os.path.exists(output_dir):
                     image_count = len([f for f in os.listdir(output_dir) if f.endswith('.jpg')])
-                    status_lines.append(f"Grid {grid_name}: Recording for {duration_str} ({image_count} images)")
+                    staged = f", {info['stager'].pending} staged in RAM" if info['stager'] else ""
+                    status_lines.append(f"Grid {grid_name}: Recording for {duration_str} ({image_count} images{staged})")
                 else:
                     status_lines.append(f"Grid {grid_name}: Recording for {duration_str} (directory not found)")
 
@@ -345,8 +651,16 @@ def index():
                     }});
             }}
 
-            // Auto-refresh status every 10 seconds
-            setInterval(getStatus, 10000);
+            // Live status pushed by the recorder
+            const events = new EventSource('/events');
+            events.addEventListener('status', event => {{
+                const status = JSON.parse(event.data);
+                const parts = status.recordings.map(r =>
+                    r.grid + ': ' + r.frames + ' frames, ' + r.fps + ' fps' +
+                    (r.last_frame_age !== null ? ', last frame ' + r.last_frame_age + 's ago' : ''));
+                if (status.error) parts.push('Error: ' + status.error.message);
+                document.getElementById('status').textContent = parts.length ? parts.join(' | ') : 'Not recording';
+            }});
         </script>
     </body>
     </html>
@@ -375,12 +689,60 @@ def status():
     return rtsp_stream.get_recording_status()
 
 
+@app.route('/session')
+def session():
+    """Last recorded grid and what was recovered at startup (JSON)"""
+    return jsonify(rtsp_stream.get_session())
+
+
+@app.route('/events')
+def events():
+    """Server-sent events stream of recording status (one persistent connection per client)"""
+    subscriber = rtsp_stream.subscribe()
+
+    def stream():
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    data = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: status\ndata: {data}\n\n"
+        finally:
+            rtsp_stream.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/governor', methods=['GET', 'POST'])
+def governor():
+    """Get or change capture settings (used by recording_governor.py).
+
+    Parameters: fps (frames saved per second), keyframes (1/0),
+    restart (1/0, restart active recordings in the background, default 1)
+    """
+    params = request.values
+    try:
+        fps = float(params['fps']) if 'fps' in params else None
+    except ValueError:
+        return "Invalid fps", 400
+    if fps is not None and not 0 < fps <= 30:
+        return "fps must be between 0 and 30", 400
+    keyframes = params['keyframes'] in ('1', 'true', 'yes') if 'keyframes' in params else None
+    if fps is None and keyframes is None:
+        return jsonify(rtsp_stream.get_capture_settings())
+    restart = params.get('restart', '1') in ('1', 'true', 'yes')
+    return jsonify(rtsp_stream.set_capture_settings(fps, keyframes, restart))
+
+
 @app.route('/cleanup')
 def cleanup_files():
     """Cleanup malformed files with literal %04d pattern"""
     try:
         import glob
-        base_dir = f"/home/{USERNAME}/Desktop/scout-videos/recordings_{CURRENT_DATE}/"
+        base_dir = f"{SAVE_ROOT}/recordings_{CURRENT_DATE}/"
         
         if not os.path.exists(base_dir):
             return "No recordings directory found"
@@ -409,9 +771,7 @@ def test_connection():
     """Test RTSP connection endpoint"""
     try:
         # Test if we can connect to the RTSP stream
-        test_cmd = [
-            'ffmpeg',
-            '-rtsp_transport', 'tcp',
+        test_cmd = ['ffmpeg'] + input_options(rtsp_stream.rtsp_url) + [
             '-i', rtsp_stream.rtsp_url,
             '-t', '5',  # Test for 5 seconds
             '-f', 'null',
@@ -443,12 +803,12 @@ def signal_handler(sig, frame):
     """Handle shutdown signals"""
     print("\nShutting down gracefully...")
     if rtsp_stream:
-        rtsp_stream.stop_recording()  # Stop all recordings
+        rtsp_stream.shutdown()  # Stop all recordings and flush their staged frames
     sys.exit(0)
 
 
 def main():
-    global rtsp_stream, port, POSITION
+    global rtsp_stream, port, POSITION, SAVE_ROOT
 
     # Set up signal handlers for graceful shutdown
     signal.signal(signal.SIGINT, signal_handler)
@@ -456,9 +816,18 @@ def main():
 
     parser = argparse.ArgumentParser(description='RTSP Camera Frame Recorder')
     parser.add_argument('--port', type=int, default=5000, help='Port number (default: 5000)')
-    parser.add_argument('--rtsp-url', type=str, default='rtsp://192.168.1.20:8554/unicast', help='RTSP stream URL')
+    parser.add_argument('--rtsp-url', type=str, default='rtsp://192.168.1.20:8554/unicast', help='RTSP stream or local relay URL')
     parser.add_argument('--width', type=int, default=REC_WIDTH, help='Recording width (default: 1920)')
     parser.add_argument('--height', type=int, default=REC_HEIGHT, help='Recording height (default: 1080)')
+    parser.add_argument('--orphans', choices=['adopt', 'stop'], default='adopt',
+                        help='ffmpeg left running by a crashed recorder: adopt it or stop it (default: adopt)')
+    parser.add_argument('--save-root', type=str, default=None,
+                        help=f'Capture root, with the recording journal in its journal/ folder (default: {SAVE_ROOT})')
+    parser.add_argument('--stage-dir', type=str, default=STAGE_ROOT,
+                        help=f'RAM (tmpfs) staging area for frames (default: {STAGE_ROOT})')
+    parser.add_argument('--no-staging', action='store_true', help='Write frames straight to the SD card')
+    parser.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL,
+                        help=f'Seconds of staged frames per batch written to the card (default: {FLUSH_INTERVAL})')
     args = parser.parse_args()
 
     port = args.port
@@ -469,18 +838,43 @@ def main():
     elif port == 5002:
         POSITION = "top"
 
-    rtsp_stream = RTSPStream(rtsp_url=args.rtsp_url, resolution=(args.width, args.height))
+    journal = None
+    if args.save_root:
+        SAVE_ROOT = os.path.abspath(args.save_root)
+        try:
+            journal = RecordingJournal(journal_path(port, os.path.join(SAVE_ROOT, 'journal')))
+        except RuntimeError as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+
+    stage_root = None
+    if not args.no_staging:
+        stage_root = stage_root_for(port, args.stage_dir)
+        try:
+            os.makedirs(stage_root, exist_ok=True)
+        except OSError as e:
+            print(f"✗ Cannot use staging area {stage_root} ({e}), writing frames straight to the card")
+            stage_root = None
+
+    try:
+        rtsp_stream = RTSPStream(rtsp_url=args.rtsp_url, resolution=(args.width, args.height), journal=journal,
+                                 stage_root=stage_root, flush_interval=args.flush_interval)
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    rtsp_stream.recover_from_journal(args.orphans)
 
     print(f"Starting RTSP Frame Recorder on port {args.port}")
     print(f"RTSP URL: {args.rtsp_url}")
     print(f"Resolution: {args.width}x{args.height}")
     print(f"Position: {POSITION}")
+    print(f"Frame staging: {stage_root + f' (flushed every {args.flush_interval}s)' if stage_root else 'off'}")
 
     try:
         app.run(host='0.0.0.0', port=args.port, threaded=True)
     finally:
         if rtsp_stream:
-            rtsp_stream.stop_recording()  # This will stop all recordings
+            rtsp_stream.shutdown()  # This will stop all recordings
 
 
 if __name__ == '__main__':
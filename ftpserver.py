@@ -1,16 +1,20 @@
 #!/usr/bin/env python3
 """
 Raspberry Pi Network Keep-Alive and FTP Server Script
-Pings macOS device every 10 seconds to prevent network sleep
+Probes macOS device every 10 seconds to prevent network sleep
 Runs FTP server on ~/Desktop/scout-videos directory
+Use --performance for tuned buffers, bandwidth profiles and worker processes
 """
 
+import argparse
+import socket
 import subprocess
 import threading
 import time
 import os
 import sys
 import pwd
+import json
 from pathlib import Path
 
 # Configuration
@@ -20,159 +24,137 @@ PING_INTERVAL = 10  # seconds
 FTP_PORT = 21
 FTP_USERNAME = "pirecorder"
 FTP_PASSWORD = "recorderpi"
+
+# Performance mode settings (used with --performance)
+SERVER_MODES = ("single", "threaded", "multiprocess", "prefork")
+DEFAULT_SERVER_MODE = "multiprocess"
+PREFORK_WORKERS = 4
+SOCKET_SNDBUF = 4 * 1024 * 1024  # bytes, data connections
+SOCKET_RCVBUF = 1 * 1024 * 1024  # bytes, data connections
+DTP_BUFFER_SIZE = 256 * 1024  # used when sendfile() is not possible
+
+# Bandwidth profiles as (read_limit, write_limit) in bytes/s, 0 = unlimited
+BANDWIDTH_PROFILES = {
+    "unlimited": (0, 0),
+    "lan": (0, 0),
+    "wifi": (4 * 1024 * 1024, 4 * 1024 * 1024),
+    "background": (1024 * 1024, 1024 * 1024),
+}
+DEFAULT_PROFILE = "unlimited"
+CLIENT_PROFILES = {}  # e.g. {"192.168.1.3": "wifi"}
+# Profile forced on new data connections while the keep-alive link is degraded
+LINK_QUALITY_PROFILES = {"degraded": "background", "down": "background"}
+# Profile used while recording_governor.py asks for background transfers
+GOVERNOR_BACKGROUND_PROFILE = "background"
+
+# Ownership repair state (directories verified since the last run)
+OWNERSHIP_STATE_FILE = os.path.join(".catalog", "ownership.json")
+FTP_OWNER = None  # (uid, gid) files are handed back to when running as root
 # FTP_ROOT_DIR will be determined dynamically based on the actual user
 
 def get_ip_from_mac(mac_address):
-    """Get IP address from MAC address using manual ping sweep and ARP table"""
-    try:
-        print("Performing manual network scan to populate ARP cache...")
-        
-        # Get local network range using ip route
-        result = subprocess.run(['ip', 'route', 'show'], capture_output=True, text=True)
-        network_base = None
-        
-        for line in result.stdout.split('\n'):
-            # Look for default route or local network
-            if 'src' in line and ('192.168' in line or '10.' in line or '172.' in line):
-                parts = line.split()
-                for part in parts:
-                    if ('192.168' in part or '10.' in part or '172.' in part):
-                        # Extract base network (e.g., 192.168.1 from 192.168.1.40)
-                        if '/' in part:
-                            network_base = part.split('/')[0].rsplit('.', 1)[0]
-                        else:
-                            network_base = part.rsplit('.', 1)[0]
-                        break
-                if network_base:
-                    break
-        
-        if not network_base:
-            # Try to get it from current IP
-            result = subprocess.run(['hostname', '-I'], capture_output=True, text=True)
-            if result.returncode == 0 and result.stdout.strip():
-                current_ip = result.stdout.strip().split()[0]
-                network_base = current_ip.rsplit('.', 1)[0]
-                print(f"Using current IP to determine network: {current_ip}")
-        
-        if not network_base:
-            # Final fallback
-            network_base = "192.168.1"
-            print(f"Could not detect network, using fallback: {network_base}.x")
-        else:
-            print(f"Detected network base: {network_base}.x")
-        
-        # Manual ping sweep to populate ARP cache
-        print("Pinging all possible IPs to populate ARP cache...")
-        
-        # Use threading to ping multiple IPs simultaneously
-        import threading
-        import queue
-        
-        def ping_worker(ip_queue):
-            while True:
-                try:
-                    ip = ip_queue.get(timeout=1)
-                    # Quick ping with 1 second timeout
-                    subprocess.run(['ping', '-c', '1', '-W', '1', ip], 
-                                 capture_output=True, text=True)
-                    ip_queue.task_done()
-                except queue.Empty:
-                    break
-                except:
-                    ip_queue.task_done()
-        
-        # Create queue and add all IPs to ping
-        ip_queue = queue.Queue()
-        
-        # Add common IP ranges
-        for i in range(1, 255):
-            ip_queue.put(f"{network_base}.{i}")
-        
-        # Start worker threads
-        threads = []
-        for _ in range(20):  # 20 parallel ping threads
-            t = threading.Thread(target=ping_worker, args=(ip_queue,))
-            t.daemon = True
-            t.start()
-            threads.append(t)
-        
-        # Wait for all pings to complete (max 15 seconds)
-        try:
-            ip_queue.join()
-        except KeyboardInterrupt:
-            print("Ping sweep interrupted")
-        
-        print("Ping sweep completed, checking ARP table...")
-        
-        # Now check ARP table for our MAC address
-        arp_result = subprocess.run(['arp', '-a'], capture_output=True, text=True)
-        
-        if arp_result.returncode == 0:
-            print("Searching ARP table for target MAC...")
-            for line in arp_result.stdout.split('\n'):
-                if mac_address.lower() in line.lower():
-                    # Extract IP address from line like: hostname (192.168.1.100) at 14:98:77:7c:8f:08 [ether] on wlan0
-                    import re
-                    ip_match = re.search(r'\(([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)\)', line)
-                    if ip_match:
-                        found_ip = ip_match.group(1)
-                        print(f"✓ Found target MAC {mac_address} at IP {found_ip}")
-                        return found_ip
-        
-        # If still not found, try arp-scan as final attempt
-        print("MAC not found in ARP table, trying arp-scan as backup...")
+    """Get IP address from MAC address using the neighbor table, cache and a UDP probe sweep"""
+    from net_discovery import resolve_mac
+    return resolve_mac(mac_address)
+
+def start_link_monitor(ip_address, mac_address):
+    """Run the in-process keep-alive prober in a background thread"""
+    import asyncio
+    from link_monitor import LinkMonitor
+
+    monitor = LinkMonitor(ip_address, mac_address, interval=PING_INTERVAL)
+
+    def run():
         try:
-            arpscan_result = subprocess.run(['sudo', 'arp-scan', '--localnet'], 
-                                          capture_output=True, text=True, timeout=20)
-            
-            if arpscan_result.returncode == 0:
-                for line in arpscan_result.stdout.split('\n'):
-                    if mac_address.lower() in line.lower():
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            ip_address = parts[0]
-                            found_mac = parts[1]
-                            print(f"✓ Found device via arp-scan: {ip_address} -> {found_mac}")
-                            return ip_address
-        except FileNotFoundError:
-            print("arp-scan not available, that's ok")
+            asyncio.run(monitor.run())
         except Exception as e:
-            print(f"arp-scan failed: {e}")
-        
-        # Show debugging info
-        print(f"\n✗ Target MAC address {mac_address} not found")
-        print("Devices currently in ARP table:")
-        if arp_result.returncode == 0:
-            for line in arp_result.stdout.split('\n'):
-                if '(' in line and 'at' in line and ':' in line:
-                    print(f"  {line.strip()}")
-        
-        return None
-        
-    except Exception as e:
-        print(f"Error during network scan: {e}")
-        return None
+            print(f"Link monitor stopped: {e}")
+
+    monitor_thread = threading.Thread(target=run, daemon=True)
+    monitor_thread.start()
+    return monitor
+
+def load_ownership_state(state_path):
+    """Load the per-directory mtimes recorded by the last ownership repair"""
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        return state.get('verified_dirs', {})
+    except (OSError, ValueError):
+        return {}
+
+def save_ownership_state(state_path, verified_dirs, user_uid, user_gid):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'last_run': time.time(), 'verified_dirs': verified_dirs}, f)
+    os.replace(tmp_path, state_path)
+    for path in (os.path.dirname(state_path), state_path):
+        os.chown(path, user_uid, user_gid)
+
+def repair_ownership(ftp_root, user_uid, user_gid):
+    """Hand files created as root back to the user, skipping directories verified before.
 
-def ping_device(ip_address):
-    """Ping device to keep connection alive"""
-    while True:
+    A directory's mtime changes whenever an entry is created, renamed or
+    removed in it, so only directories whose mtime differs from the last
+    verified value are listed and have their entries stat'ed and chowned.
+    The subdirectories of an unchanged directory are the ones recorded last
+    time; each is still stat'ed, as its own contents may have changed.
+    """
+    start = time.time()
+    state_path = os.path.join(ftp_root, OWNERSHIP_STATE_FILE)
+    state_dir = os.path.dirname(OWNERSHIP_STATE_FILE)
+    verified = load_ownership_state(state_path)
+    subdirs = {}
+    for relpath in verified:
+        if relpath != '.':
+            subdirs.setdefault(os.path.dirname(relpath) or '.', []).append(relpath)
+    if os.path.isdir(os.path.join(ftp_root, state_dir)):
+        subdirs.setdefault('.', []).append(state_dir)  # not recorded, always checked
+    new_verified = {}
+    checked_dirs = 0
+    fixed = 0
+
+    def fix(path, st):
+        nonlocal fixed
+        if st.st_uid != user_uid or st.st_gid != user_gid:
+            os.lchown(path, user_uid, user_gid)
+            fixed += 1
+
+    stack = [ftp_root]
+    while stack:
+        directory = stack.pop()
         try:
-            # Use ping command (works on Linux/Raspberry Pi)
-            result = subprocess.run(['ping', '-c', '1', '-W', '2', ip_address], 
-                                  capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                print(f"✓ Ping successful to {ip_address} at {time.strftime('%H:%M:%S')}")
+            dir_stat = os.stat(directory)
+            fix(directory, dir_stat)
+            relpath = os.path.relpath(directory, ftp_root)
+            # The state directory changes on every run and only holds a few files
+            changed = relpath == state_dir or verified.get(relpath) != dir_stat.st_mtime_ns
+            if changed:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            fix(entry.path, entry.stat(follow_symlinks=False))
+                checked_dirs += 1
             else:
-                print(f"✗ Ping failed to {ip_address} at {time.strftime('%H:%M:%S')}")
-                
-        except Exception as e:
-            print(f"Error pinging {ip_address}: {e}")
-        
-        time.sleep(PING_INTERVAL)
+                stack.extend(os.path.join(ftp_root, child) for child in subdirs.get(relpath, ()))
+            if relpath != state_dir:
+                new_verified[relpath] = dir_stat.st_mtime_ns
+        except OSError as e:
+            print(f"Warning: Could not change ownership in {directory}: {e}")
+
+    try:
+        save_ownership_state(state_path, new_verified, user_uid, user_gid)
+    except OSError as e:
+        print(f"Warning: Could not save ownership state: {e}")
+    print(f"Ownership repair finished in {time.time() - start:.1f}s: "
+          f"{checked_dirs} changed directories checked, {fixed} entries fixed")
 
 def setup_ftp_directory():
     """Create FTP directory if it doesn't exist and handle permissions"""
+    global FTP_OWNER
     # Get the original user who called sudo
     original_user = os.environ.get('SUDO_USER', 'pi')  # fallback to 'pi'
     
@@ -195,41 +177,205 @@ def setup_ftp_directory():
     ftp_path = Path(ftp_root)
     ftp_path.mkdir(parents=True, exist_ok=True)
     
-    # Change ownership back to the original user if running as root
+    # Change ownership back to the original user if running as root.
+    # Only directories changed since the last run are checked, in the
+    # background so the FTP server can accept connections immediately.
     if os.geteuid() == 0:  # Running as root
-        try:
-            # Change ownership of the directory and all contents
-            for root, dirs, files in os.walk(ftp_root):
-                os.chown(root, user_uid, user_gid)
-                for dir_name in dirs:
-                    os.chown(os.path.join(root, dir_name), user_uid, user_gid)
-                for file_name in files:
-                    os.chown(os.path.join(root, file_name), user_uid, user_gid)
-        except OSError as e:
-            print(f"Warning: Could not change ownership: {e}")
+        FTP_OWNER = (user_uid, user_gid)
+        repair_thread = threading.Thread(target=repair_ownership, args=(ftp_root, user_uid, user_gid), daemon=True)
+        repair_thread.start()
+        print("Ownership repair started in background")
     
     print(f"FTP directory ready: {ftp_root}")
     print(f"Directory owner: {original_user}")
     return ftp_root
 
-def start_ftp_server(ftp_root_dir):
+def tune_socket(sock):
+    """Enlarge kernel socket buffers and disable Nagle on a data connection"""
+    for option, size in ((socket.SO_SNDBUF, SOCKET_SNDBUF), (socket.SO_RCVBUF, SOCKET_RCVBUF)):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, size)
+        except OSError as e:
+            print(f"Warning: Could not set socket buffer size: {e}")
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        pass
+
+def get_client_profile(remote_ip, default_profile=DEFAULT_PROFILE):
+    """Return (bandwidth profile name, reason or None) for a client IP.
+
+    Reads the link and governor status files, so it is cheap enough to call
+    for every data connection.
+    """
+    profile, reason = CLIENT_PROFILES.get(remote_ip, default_profile), None
+    try:
+        from link_monitor import read_link_status
+        status = read_link_status()
+        if status.get('target_ip') == remote_ip and status['quality'] in LINK_QUALITY_PROFILES:
+            profile = LINK_QUALITY_PROFILES[status['quality']]
+            reason = f"link to {remote_ip} is {status['quality']}"
+    except ImportError:
+        pass
+    try:
+        from recording_governor import read_governor_status
+        governor = read_governor_status()
+        if governor['transfers'] != 'normal':
+            profile = GOVERNOR_BACKGROUND_PROFILE
+            reason = f"recording governor is at '{governor['name']}'"
+    except ImportError:
+        pass
+    if profile not in BANDWIDTH_PROFILES:
+        print(f"Warning: Unknown bandwidth profile '{profile}', using unlimited")
+        profile = "unlimited"
+    return profile, reason
+
+def build_performance_handler(default_profile=DEFAULT_PROFILE):
+    """Create an FTP handler with tuned buffers and per-connection bandwidth profiles"""
+    from pyftpdlib.handlers import FTPHandler, DTPHandler, ThrottledDTPHandler
+
+    class TunedDTPHandler(DTPHandler):
+        ac_in_buffer_size = DTP_BUFFER_SIZE
+        ac_out_buffer_size = DTP_BUFFER_SIZE
+
+        def __init__(self, sock, cmd_channel):
+            tune_socket(sock)
+            super().__init__(sock, cmd_channel)
+
+    class TunedThrottledDTPHandler(ThrottledDTPHandler):
+        ac_in_buffer_size = DTP_BUFFER_SIZE
+        ac_out_buffer_size = DTP_BUFFER_SIZE
+
+        def __init__(self, sock, cmd_channel):
+            tune_socket(sock)
+            super().__init__(sock, cmd_channel)
+
+    # One data handler class per profile; throttled transfers cannot use sendfile()
+    dtp_handlers = {}
+    for name, (read_limit, write_limit) in BANDWIDTH_PROFILES.items():
+        if not read_limit and not write_limit:
+            dtp_handlers[name] = TunedDTPHandler
+            continue
+        dtp_handlers[name] = type(f"{name.capitalize()}DTPHandler", (TunedThrottledDTPHandler,), {
+            'read_limit': read_limit,
+            'write_limit': write_limit,
+        })
+
+    class PerformanceFTPHandler(FTPHandler):
+        dtp_handler = TunedDTPHandler
+
+        def on_connect(self):
+            self.profile, reason = get_client_profile(self.remote_ip, default_profile)
+            # pyftpdlib calls dtp_handler(sock, cmd_channel) for each data connection, so every
+            # transfer gets the profile for the link and governor state at that moment
+            self.dtp_handler = self._open_data_channel
+            print(f"Client {self.remote_ip} connected (bandwidth profile: {self.profile}"
+                  f"{f', {reason}' if reason else ''})")
+
+        def _open_data_channel(self, sock, cmd_channel):
+            profile, reason = get_client_profile(self.remote_ip, default_profile)
+            if profile != self.profile:
+                print(f"Client {self.remote_ip} now using '{profile}' profile "
+                      f"({reason or 'conditions recovered'})")
+                self.profile = profile
+            return dtp_handlers[profile](sock, cmd_channel)
+
+    return PerformanceFTPHandler
+
+def make_owner_handler(handler_class, user_uid, user_gid):
+    """Return a handler subclass that hands uploaded files and created directories to the user
+    at write time"""
+
+    def chown(path):
+        try:
+            os.chown(path, user_uid, user_gid)
+        except OSError as e:
+            print(f"Warning: Could not change ownership of {path}: {e}")
+
+    class OwnerFTPHandler(handler_class):
+        def on_file_received(self, file):
+            super().on_file_received(file)
+            chown(file)
+
+        def on_incomplete_file_received(self, file):
+            # The partial file stays for the client to resume (REST/APPE)
+            super().on_incomplete_file_received(file)
+            chown(file)
+
+        def ftp_MKD(self, path):
+            created = super().ftp_MKD(path)
+            if created is not None:
+                chown(created)
+            return created
+
+    return OwnerFTPHandler
+
+def make_governor_handler(handler_class):
+    """Return a handler subclass that refuses new transfers while the governor pauses them"""
+    from recording_governor import read_governor_status
+
+    class GovernedFTPHandler(handler_class):
+        def _transfers_paused(self):
+            governor = read_governor_status()
+            if governor['transfers'] == 'paused':
+                # 450 is transient, clients retry later
+                self.respond(f"450 Transfers paused while the Pi is {governor['name']}, try again later.")
+                return True
+            return False
+
+        def ftp_RETR(self, file):
+            if not self._transfers_paused():
+                return super().ftp_RETR(file)
+
+        def ftp_STOR(self, file, mode='w'):
+            if not self._transfers_paused():
+                return super().ftp_STOR(file, mode)
+
+    return GovernedFTPHandler
+
+def start_ftp_server(ftp_root_dir, performance=False, server_mode=DEFAULT_SERVER_MODE,
+                     workers=PREFORK_WORKERS, default_profile=DEFAULT_PROFILE, catalog=False):
     """Start FTP server using pyftpdlib"""
     try:
         from pyftpdlib.authorizers import DummyAuthorizer
         from pyftpdlib.handlers import FTPHandler
-        from pyftpdlib.servers import FTPServer
+        from pyftpdlib import servers
         
         # Create authorizer and add user
         authorizer = DummyAuthorizer()
         authorizer.add_user(FTP_USERNAME, FTP_PASSWORD, ftp_root_dir, perm='elradfmwMT')
         
         # Create handler and server
-        handler = FTPHandler
+        if performance:
+            handler = build_performance_handler(default_profile)
+        else:
+            handler = FTPHandler
+            server_mode = "single"
+        # Downloads are always recorded: retention.py only deletes downloaded sessions
+        from catalog_ftp import make_catalog_handler
+        handler = make_catalog_handler(handler, views=catalog)
+        if FTP_OWNER:
+            handler = make_owner_handler(handler, *FTP_OWNER)
+            # The upload state is rewritten by retention.py, which runs as the user
+            from capture_catalog import get_catalog
+            get_catalog(ftp_root_dir).owner = FTP_OWNER
+        try:
+            handler = make_governor_handler(handler)
+        except ImportError:
+            pass
         handler.authorizer = authorizer
         handler.banner = "Raspberry Pi Scout Videos FTP Server"
         
         # Create server
-        server = FTPServer(('0.0.0.0', FTP_PORT), handler)
+        if server_mode == "threaded":
+            server = servers.ThreadedFTPServer(('0.0.0.0', FTP_PORT), handler)
+        elif server_mode == "multiprocess" and hasattr(servers, 'MultiprocessFTPServer'):
+            server = servers.MultiprocessFTPServer(('0.0.0.0', FTP_PORT), handler)
+        else:
+            if server_mode == "multiprocess":
+                print("Warning: MultiprocessFTPServer not available, using prefork workers")
+                server_mode = "prefork"
+            server = servers.FTPServer(('0.0.0.0', FTP_PORT), handler)
         server.max_cons = 256
         server.max_cons_per_ip = 5
         
@@ -237,9 +383,20 @@ def start_ftp_server(ftp_root_dir):
         print(f"Username: {FTP_USERNAME}")
         print(f"Password: {FTP_PASSWORD}")
         print(f"Root directory: {ftp_root_dir}")
+        if performance:
+            unthrottled = sorted(name for name, limits in BANDWIDTH_PROFILES.items() if not any(limits))
+            sendfile = f"{', '.join(unthrottled)} profiles" if handler.use_sendfile else "off"
+            print(f"Performance mode: server={server_mode}, sendfile: {sendfile}, "
+                  f"default profile={default_profile}")
+        print(f"Downloads are recorded in {os.path.join(ftp_root_dir, '.catalog')} for retention.py")
+        if catalog:
+            print("Catalog filesystem enabled: /by-grid/, /by-camera/, /pending-upload/")
         print("FTP server is running...")
         
-        server.serve_forever()
+        if server_mode == "prefork":
+            server.serve_forever(worker_processes=workers)
+        else:
+            server.serve_forever()
         
     except ImportError:
         print("Error: pyftpdlib not installed. Installing...")
@@ -254,33 +411,60 @@ def start_ftp_server(ftp_root_dir):
         print(f"Error starting FTP server: {e}")
         sys.exit(1)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Raspberry Pi Network Keep-Alive and FTP Server')
+    parser.add_argument('--port', type=int, default=FTP_PORT, help=f'FTP port (default: {FTP_PORT})')
+    parser.add_argument('--root', type=str, default=None, help='FTP root directory (default: ~/Desktop/scout-videos)')
+    parser.add_argument('--no-keepalive', action='store_true', help='Do not look up or ping the target device')
+    parser.add_argument('--performance', action='store_true',
+                        help='Enable tuned socket buffers, bandwidth profiles and a concurrent server')
+    parser.add_argument('--server-mode', choices=SERVER_MODES, default=DEFAULT_SERVER_MODE,
+                        help=f'Server variant used with --performance (default: {DEFAULT_SERVER_MODE})')
+    parser.add_argument('--workers', type=int, default=PREFORK_WORKERS,
+                        help=f'Worker processes for prefork mode (default: {PREFORK_WORKERS})')
+    parser.add_argument('--profile', choices=sorted(BANDWIDTH_PROFILES), default=DEFAULT_PROFILE,
+                        help=f'Default bandwidth profile for clients (default: {DEFAULT_PROFILE})')
+    parser.add_argument('--catalog', action='store_true',
+                        help='Serve listings from the capture catalog and expose virtual views')
+    return parser.parse_args()
+
 def main():
+    global FTP_PORT
+    args = parse_args()
+    FTP_PORT = args.port
+
     print("Raspberry Pi Network Keep-Alive and FTP Server")
     print("=" * 50)
     
     # Setup FTP directory with proper permissions
-    ftp_root_dir = setup_ftp_directory()
-    
-    # Get IP address from MAC address
-    print(f"Looking up IP address for MAC: {MAC_ADDRESS}")
-    target_ip = get_ip_from_mac(MAC_ADDRESS)
+    if args.root:
+        ftp_root_dir = os.path.abspath(args.root)
+        os.makedirs(ftp_root_dir, exist_ok=True)
+        print(f"FTP directory ready: {ftp_root_dir}")
+    else:
+        ftp_root_dir = setup_ftp_directory()
     
-    if not target_ip:
-        print(f"Could not find IP address for MAC: {MAC_ADDRESS}")
-        print(f"Using fallback IP address: {FALLBACK_IP}")
-        target_ip = FALLBACK_IP
-    
-    print(f"Target IP: {target_ip}")
-    print(f"Will ping every {PING_INTERVAL} seconds")
-    
-    # Start ping thread
-    ping_thread = threading.Thread(target=ping_device, args=(target_ip,), daemon=True)
-    ping_thread.start()
-    print("Network keep-alive pinging started")
+    if not args.no_keepalive:
+        # Get IP address from MAC address
+        print(f"Looking up IP address for MAC: {MAC_ADDRESS}")
+        target_ip = get_ip_from_mac(MAC_ADDRESS)
+        
+        if not target_ip:
+            print(f"Could not find IP address for MAC: {MAC_ADDRESS}")
+            print(f"Using fallback IP address: {FALLBACK_IP}")
+            target_ip = FALLBACK_IP
+        
+        print(f"Target IP: {target_ip}")
+        print(f"Will probe every {PING_INTERVAL} seconds")
+        
+        # Start in-process keep-alive monitor
+        start_link_monitor(target_ip, MAC_ADDRESS)
+        print("Network keep-alive monitor started")
     
     # Start FTP server (this will block)
     try:
-        start_ftp_server(ftp_root_dir)
+        start_ftp_server(ftp_root_dir, performance=args.performance, server_mode=args.server_mode,
+                         workers=args.workers, default_profile=args.profile, catalog=args.catalog)
     except KeyboardInterrupt:
         print("\nShutting down...")
         sys.exit(0)
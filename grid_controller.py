@@ -0,0 +1,678 @@
+#!/usr/bin/env python3
+"""
+Grid Sequencing Controller
+Headless version of the UI's grid walk: the A/B prefix, the 52 x 2 grid
+labels, debounced recording starts and per-camera start/stop against the
+recorder APIs. The Tk UI drives one in-process; `serve` exposes it on a
+small local HTTP API for scripts and button boxes, and `replay` walks a
+grid schedule at a fixed rate against N recorders and reports
+per-transition latency.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from recorder_client import RecorderClient
+
+GRID_NUMBERS = [str(i) for i in range(1, 53)]
+GRID_SUFFIXES = ['A', 'B']
+PREFIXES = ['A', 'B']
+GRID_COUNT = len(GRID_NUMBERS) * len(GRID_SUFFIXES)
+GRID_SETTLE_SECONDS = 0.8  # a grid must stay selected this long before recording starts
+CONTROLLER_PORT = 8091
+POSITIONS = ['bottom', 'middle', 'top']
+TRANSITION_HISTORY = 1000  # transitions kept for /stats and replay reports
+REPLAY_DRAIN_TIMEOUT = 15  # seconds to wait for the last transition after a replay
+
+
+def grid_label(prefix, index):
+    """Return the label for a grid index (0 .. GRID_COUNT - 1), e.g. A-1-A, A-1-B, A-2-A"""
+    return f"{prefix}-{GRID_NUMBERS[index // 2]}-{GRID_SUFFIXES[index % 2]}"
+
+
+def parse_grid_label(label):
+    """Return (prefix, index) for a grid label; raises ValueError for anything else"""
+    parts = label.strip().split('-')
+    if len(parts) != 3 or parts[0] not in PREFIXES or parts[1] not in GRID_NUMBERS or parts[2] not in GRID_SUFFIXES:
+        raise ValueError(f"Invalid grid label: {label!r}")
+    return parts[0], GRID_NUMBERS.index(parts[1]) * 2 + GRID_SUFFIXES.index(parts[2])
+
+
+def grid_walk(prefixes=('A',)):
+    """The full grid walk for each prefix, in UI order"""
+    return [grid_label(prefix, index) for prefix in prefixes for index in range(GRID_COUNT)]
+
+
+def position_name(index):
+    return POSITIONS[index] if index < len(POSITIONS) else f"camera_{index + 1}"
+
+
+def latest_session(replies):
+    """(grid, still recording) of the newest session across recorder /session replies, or (None, False).
+
+    A grid some recorder is still recording wins over a newer one that ended.
+    """
+    best = None
+    for reply in replies:
+        last = reply.get('last') if reply else None
+        if not last or not last.get('grid'):
+            continue
+        recording = last['grid'] in [r['grid'] for r in reply.get('recording', [])]
+        key = (recording, last.get('opened', 0))
+        if best is None or key > best[0]:
+            best = (key, last['grid'], recording)
+    return (best[1], best[2]) if best else (None, False)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))]
+
+
+class Camera:
+    """One recorder API and whether it takes part in recordings"""
+
+    def __init__(self, api_url, position, active=True):
+        self.api_url = api_url
+        self.position = position
+        self.active = active
+
+
+class Transition:
+    """Timing of one grid change: navigation -> stop previous grid -> start on every active camera"""
+
+    def __init__(self, transition_id, from_grid, to_grid):
+        self.id = transition_id
+        self.from_grid = from_grid
+        self.to_grid = to_grid
+        self.requested = time.monotonic()
+        self.start_issued = None
+        self.completed = None
+        self.outcome = 'pending'  # pending, ok, failed, superseded or idle
+        self.waiting = 0  # start requests still in flight
+        self.cameras = {}  # position -> {'stop_ms', 'start_ms', 'ok', 'error'}
+
+    def total_ms(self):
+        return (self.completed - self.requested) * 1000 if self.completed and self.start_issued else None
+
+    def start_ms(self):
+        return (self.completed - self.start_issued) * 1000 if self.completed and self.start_issued else None
+
+    def as_dict(self):
+        total, start = self.total_ms(), self.start_ms()
+        return {
+            'id': self.id,
+            'from_grid': self.from_grid,
+            'to_grid': self.to_grid,
+            'outcome': self.outcome,
+            'total_ms': round(total, 1) if total is not None else None,
+            'start_ms': round(start, 1) if start is not None else None,
+            'cameras': self.cameras,
+        }
+
+
+class GridController:
+    """Grid navigation and recording sequencing, independent of any UI.
+
+    Listeners are called as listener(event, data) through the RecorderClient,
+    i.e. on the Tk thread when the client has a Tk root. Events: 'state'
+    (state() dict), 'pending' (grid waiting to settle), 'request'
+    ({camera, action, grid}), 'result' ({camera, action, grid, result}) and
+    'transition' (Transition.as_dict()).
+    """
+
+    def __init__(self, record_apis, client=None, settle_seconds=GRID_SETTLE_SECONDS, active=True):
+        self.client = client if client is not None else RecorderClient()
+        self.cameras = [Camera(url, position_name(i), active) for i, url in enumerate(record_apis)]
+        self.settle_seconds = settle_seconds
+        self.prefix = PREFIXES[0]
+        self.grid_index = 0
+        self.recording_enabled = False
+        self.recording_grid = None
+        self.pending_grid = None
+        self.pending_timer = None
+        self.listeners = []
+        self.lock = threading.RLock()
+        self.transitions = deque(maxlen=TRANSITION_HISTORY)
+        self.transition = None  # the latest transition
+        self.transition_count = 0
+
+    # --- State
+
+    @property
+    def label(self):
+        return grid_label(self.prefix, self.grid_index)
+
+    def state(self):
+        with self.lock:
+            return {
+                'grid': self.label,
+                'prefix': self.prefix,
+                'index': self.grid_index,
+                'can_go_back': self.grid_index > 0,
+                'can_go_forward': self.grid_index < GRID_COUNT - 1,
+                'recording_enabled': self.recording_enabled,
+                'recording_grid': self.recording_grid,
+                'pending_grid': self.pending_grid,
+                'cameras': [{'position': c.position, 'api_url': c.api_url, 'active': c.active}
+                            for c in self.cameras],
+            }
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def _notify(self, event, data):
+        for listener in self.listeners:
+            self.client.deliver(lambda value, listener=listener: listener(event, value), data)
+
+    # --- Navigation
+
+    def next_grid(self):
+        with self.lock:
+            if self.grid_index < GRID_COUNT - 1:
+                self.grid_index += 1
+                self._grid_changed()
+
+    def previous_grid(self):
+        with self.lock:
+            if self.grid_index > 0:
+                self.grid_index -= 1
+                self._grid_changed()
+
+    def toggle_prefix(self):
+        with self.lock:
+            self.prefix = PREFIXES[(PREFIXES.index(self.prefix) + 1) % len(PREFIXES)]
+            self._grid_changed()
+
+    def set_prefix(self, prefix):
+        if prefix not in PREFIXES:
+            raise ValueError(f"Invalid prefix: {prefix!r}")
+        with self.lock:
+            if prefix != self.prefix:
+                self.prefix = prefix
+                self._grid_changed()
+
+    def goto(self, label):
+        prefix, index = parse_grid_label(label)
+        with self.lock:
+            if (prefix, index) != (self.prefix, self.grid_index):
+                self.prefix, self.grid_index = prefix, index
+                self._grid_changed()
+
+    def resume(self, label, recording=False):
+        """Pick up where a previous session left off (see the recorders' /session).
+
+        With recording=True the grid is recorded again right away; recorders that
+        adopted a still-running ffmpeg for it answer "already recording", so only
+        cameras that lost their recording are started.
+        """
+        prefix, index = parse_grid_label(label)
+        with self.lock:
+            self._cancel_pending()
+            self.prefix, self.grid_index = prefix, index
+            if recording and not self.recording_enabled:
+                self.recording_enabled = True
+                self._begin_transition(self.label)
+                self._start_current_grid()
+            self._notify('state', self.state())
+
+    def resume_last_session(self):
+        """Ask every recorder for its journaled session and resume the most recent grid.
+
+        Nothing is resumed if the grid or recording state changed before all recorders answered.
+        """
+        with self.lock:
+            baseline = (self.label, self.recording_enabled)
+        replies = []
+
+        def on_reply(result):
+            session = None
+            if result.ok:
+                try:
+                    session = json.loads(result.text)
+                except ValueError:
+                    pass
+            with self.lock:
+                replies.append(session)
+                if len(replies) < len(self.cameras) or (self.label, self.recording_enabled) != baseline:
+                    return
+                label, recording = latest_session(replies)
+                if label is None:
+                    return
+                try:
+                    self.resume(label, recording)
+                except ValueError as e:
+                    print(f"Not resuming last session: {e}")
+                    return
+                print(f"Resumed grid {label}{' (recording)' if recording else ''}")
+
+        for camera in self.cameras:
+            self.client.submit(camera.api_url, '/session', callback=on_reply)
+
+    def _grid_changed(self):
+        if self.recording_enabled:
+            self._schedule_recording()
+        self._notify('state', self.state())
+
+    # --- Recording
+
+    def start_recording(self):
+        with self.lock:
+            if self.recording_enabled:
+                return
+            self.recording_enabled = True
+            self._begin_transition(self.label)
+            self._start_current_grid()
+            self._notify('state', self.state())
+
+    def stop_recording(self):
+        with self.lock:
+            if not self.recording_enabled:
+                return
+            self._cancel_pending()
+            if self.recording_grid:
+                self._stop_grid(self.recording_grid, None)
+                self.recording_grid = None
+            self.recording_enabled = False
+            self._notify('state', self.state())
+
+    def toggle_recording(self):
+        with self.lock:
+            if self.recording_enabled:
+                self.stop_recording()
+            else:
+                self.start_recording()
+
+    def set_camera_active(self, index, active):
+        """Include or exclude a camera; joins or leaves the grid being recorded right away"""
+        with self.lock:
+            camera = self.cameras[index]
+            if camera.active == active:
+                return
+            camera.active = active
+            if self.recording_enabled and self.recording_grid:
+                if active:
+                    counter = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-")
+                    self._send(index, 'start', self.recording_grid,
+                               {'counter': f"{counter}{index}", 'grid_name': self.recording_grid}, None)
+                else:
+                    self._send(index, 'stop', self.recording_grid, {'grid_name': self.recording_grid}, None)
+            self._notify('state', self.state())
+
+    def _schedule_recording(self):
+        """Stop the previous grid now; start the selected grid once navigation settles.
+
+        Rapid navigation collapses into a single start for the grid it stops on,
+        instead of an ffmpeg start/stop per camera per step.
+        """
+        grid = self.label
+        self._cancel_pending()
+        if self.recording_grid == grid:
+            return
+        transition = self._begin_transition(grid)
+        if self.recording_grid:
+            self._stop_grid(self.recording_grid, transition)
+            self.recording_grid = None
+        if self.settle_seconds <= 0:
+            self._start_current_grid()
+            return
+        self.pending_grid = grid
+        self.pending_timer = threading.Timer(self.settle_seconds, self._start_settled_grid, args=(grid,))
+        self.pending_timer.daemon = True
+        self.pending_timer.start()
+        self._notify('pending', grid)
+
+    def _cancel_pending(self):
+        if self.pending_timer:
+            self.pending_timer.cancel()
+        self.pending_timer = None
+        self.pending_grid = None
+
+    def _start_settled_grid(self, grid):
+        with self.lock:
+            if self.pending_grid != grid:
+                return  # cancelled or superseded while the timer fired
+            self.pending_timer = None
+            self.pending_grid = None
+            if self.recording_enabled and self.recording_grid != grid and self.label == grid:
+                self._start_current_grid()
+                self._notify('state', self.state())
+
+    def _start_current_grid(self):
+        grid = self.label
+        if self.recording_grid and self.recording_grid != grid:
+            self._stop_grid(self.recording_grid, None)
+        self.recording_grid = grid
+        transition = self.transition
+        if transition is None or transition.to_grid != grid or transition.start_issued:
+            transition = self._begin_transition(grid)
+        transition.start_issued = time.monotonic()
+        counter = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-")
+        active = [i for i, camera in enumerate(self.cameras) if camera.active]
+        transition.waiting = len(active)
+        if not active:
+            transition.outcome = 'idle'  # no camera to start; not counted in the latency stats
+            transition.completed = transition.start_issued
+        for index in active:
+            self._send(index, 'start', grid, {'counter': f"{counter}{index}", 'grid_name': grid}, transition)
+
+    def _stop_grid(self, grid, transition):
+        for index in range(len(self.cameras)):
+            self._send(index, 'stop', grid, {'grid_name': grid}, transition)
+
+    def _send(self, index, action, grid, params, transition):
+        camera = self.cameras[index]
+        self._notify('request', {'camera': index, 'action': action, 'grid': grid})
+        self.client.submit(camera.api_url, f'/record/{action}', params,
+                           lambda result: self._on_result(index, action, grid, transition, result))
+
+    def _on_result(self, index, action, grid, transition, result):
+        with self.lock:
+            if transition is not None:
+                entry = transition.cameras.setdefault(self.cameras[index].position, {})
+                entry[f'{action}_ms'] = round(result.elapsed_ms, 1)
+                if action == 'start':
+                    entry['ok'] = result.ok
+                    if not result.ok:
+                        entry['error'] = str(result.error or f"HTTP {result.status_code}")
+                    transition.waiting -= 1
+                    if transition.waiting <= 0 and transition.outcome == 'pending':
+                        self._finish_transition(transition)
+        self._notify('result', {'camera': index, 'action': action, 'grid': grid, 'result': result})
+
+    # --- Transitions
+
+    def _begin_transition(self, grid):
+        previous = self.transition
+        from_grid = self.recording_grid or (previous.to_grid if previous else None)
+        if previous and previous.outcome == 'pending' and not previous.start_issued:
+            # Navigated on before the previous grid settled; it never started recording
+            previous.outcome = 'superseded'
+            previous.completed = time.monotonic()
+            from_grid = self.recording_grid or previous.from_grid
+        self.transition_count += 1
+        self.transition = Transition(self.transition_count, from_grid, grid)
+        self.transitions.append(self.transition)
+        return self.transition
+
+    def _finish_transition(self, transition):
+        transition.completed = time.monotonic()
+        ok = all(entry.get('ok', True) for entry in transition.cameras.values())
+        transition.outcome = 'ok' if ok else 'failed'
+        self._notify('transition', transition.as_dict())
+
+    def stats(self):
+        """Latency summary over the recorded transitions"""
+        with self.lock:
+            transitions = list(self.transitions)
+        done = [t for t in transitions if t.outcome in ('ok', 'failed')]
+        total = [t.total_ms() for t in done]
+        start = [t.start_ms() for t in done]
+        cameras = {}
+        for t in done:
+            for position, entry in t.cameras.items():
+                if 'start_ms' in entry:
+                    cameras.setdefault(position, []).append(entry['start_ms'])
+
+        def summary(values):
+            values = [v for v in values if v is not None]
+            if not values:
+                return None
+            return {'p50': round(percentile(values, 0.5), 1), 'p95': round(percentile(values, 0.95), 1),
+                    'p99': round(percentile(values, 0.99), 1), 'max': round(max(values), 1)}
+
+        return {
+            'transitions': len(transitions),
+            'completed': len(done),
+            'failed': sum(1 for t in done if t.outcome == 'failed'),
+            'superseded': sum(1 for t in transitions if t.outcome == 'superseded'),
+            'pending': sum(1 for t in transitions if t.outcome == 'pending'),
+            'total_ms': summary(total),
+            'start_ms': summary(start),
+            'camera_start_ms': {c.position: summary(cameras[c.position])
+                                for c in self.cameras if c.position in cameras},
+        }
+
+    def close(self):
+        with self.lock:
+            self._cancel_pending()
+
+
+def start_api_server(controller, host='127.0.0.1', port=CONTROLLER_PORT):
+    """Serve the controller's local HTTP API from a background thread; returns the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    actions = {
+        '/next': lambda q: controller.next_grid(),
+        '/previous': lambda q: controller.previous_grid(),
+        '/prefix': lambda q: controller.set_prefix(q['value']) if 'value' in q else controller.toggle_prefix(),
+        '/goto': lambda q: controller.goto(q.get('grid', '')),
+        '/record/start': lambda q: controller.start_recording(),
+        '/record/stop': lambda q: controller.stop_recording(),
+        '/record/toggle': lambda q: controller.toggle_recording(),
+        '/camera': lambda q: controller.set_camera_active(int(q.get('index', '')), q.get('active', '1') == '1'),
+    }
+
+    class ControllerHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, data):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _query(self):
+            url = urlparse(self.path)
+            return url.path, {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        def do_GET(self):
+            path, query = self._query()
+            if path in ('/', '/state'):
+                self._send_json(200, controller.state())
+            elif path == '/stats':
+                self._send_json(200, controller.stats())
+            elif path == '/transitions':
+                limit = int(query.get('limit', 20))
+                with controller.lock:
+                    recent = list(controller.transitions)[-limit:]
+                self._send_json(200, [t.as_dict() for t in recent])
+            else:
+                self._send_json(404, {'error': f"Unknown path {path}"})
+
+        def do_POST(self):
+            path, query = self._query()
+            action = actions.get(path)
+            if action is None:
+                self._send_json(404, {'error': f"Unknown action {path}"})
+                return
+            try:
+                action(query)
+            except (ValueError, IndexError) as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            self._send_json(200, controller.state())
+
+    server = ThreadingHTTPServer((host, port), ControllerHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="grid-controller-api").start()
+    return server
+
+
+def load_schedule(path, prefix='A'):
+    """Grid labels from a file (one per line, # comments), or the full walk for prefix"""
+    if not path:
+        return grid_walk((prefix,))
+    schedule = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                parse_grid_label(line)
+                schedule.append(line)
+    return schedule
+
+
+def replay(record_apis, schedule, rate, settle_seconds, output=None):
+    """Walk schedule at rate grids/s against the recorders and print per-transition latency"""
+    controller = GridController(record_apis, settle_seconds=settle_seconds)
+    interval = 1.0 / rate
+    print(f"Replaying {len(schedule)} grids at {rate:g}/s (settle {settle_seconds:g}s) "
+          f"against {len(record_apis)} recorder(s)")
+    started = time.monotonic()
+    try:
+        controller.goto(schedule[0])
+        controller.start_recording()
+        deadline = time.monotonic()
+        for label in schedule[1:]:
+            deadline += interval
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            controller.goto(label)
+        # Let the last grid settle and its starts complete
+        drain_until = time.monotonic() + settle_seconds + REPLAY_DRAIN_TIMEOUT
+        while time.monotonic() < drain_until:
+            with controller.lock:
+                last = controller.transition
+                if last is None or last.outcome != 'pending':
+                    break
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        print("\nReplay interrupted")
+    finally:
+        controller.stop_recording()
+        controller.close()
+        controller.client.shutdown(wait=True)
+    elapsed = time.monotonic() - started
+
+    stats = controller.stats()
+    print(f"\nDone in {elapsed:.1f}s: {stats['completed']} transitions completed, {stats['failed']} failed, "
+          f"{stats['superseded']} superseded by faster navigation, {stats['pending']} unfinished")
+    for key, title in (('total_ms', 'Navigation -> all cameras started'), ('start_ms', 'Start issued -> all acked')):
+        s = stats[key]
+        if s:
+            print(f"  {title:<34} p50 {s['p50']:7.1f} ms  p95 {s['p95']:7.1f} ms  "
+                  f"p99 {s['p99']:7.1f} ms  max {s['max']:7.1f} ms")
+    for position, s in stats['camera_start_ms'].items():
+        if s:
+            print(f"  {position + ' start request':<34} p50 {s['p50']:7.1f} ms  p95 {s['p95']:7.1f} ms  "
+                  f"p99 {s['p99']:7.1f} ms  max {s['max']:7.1f} ms")
+    failures = [t for t in controller.transitions if t.outcome == 'failed']
+    for t in failures[:10]:
+        errors = ', '.join(f"{p}: {e['error']}" for p, e in t.cameras.items() if 'error' in e)
+        print(f"  ✗ {t.to_grid}: {errors}")
+
+    if output:
+        with open(output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            positions = [c.position for c in controller.cameras]
+            writer.writerow(['id', 'from_grid', 'to_grid', 'outcome', 'total_ms', 'start_ms'] +
+                            [f'{p}_{k}' for p in positions for k in ('stop_ms', 'start_ms', 'ok')])
+            for t in controller.transitions:
+                row = t.as_dict()
+                writer.writerow([row['id'], row['from_grid'], row['to_grid'], row['outcome'], row['total_ms'],
+                                 row['start_ms']] +
+                                [t.cameras.get(p, {}).get(k) for p in positions for k in ('stop_ms', 'start_ms', 'ok')])
+        print(f"✓ Transitions written to {output}")
+    return stats
+
+
+def send(controller_url, action, grid=None):
+    """Call a running controller's API and print the response"""
+    import requests
+    if action in ('state', 'stats', 'transitions'):
+        response = requests.get(f"{controller_url}/{action}", timeout=5)
+    else:
+        path = {'start': '/record/start', 'stop': '/record/stop', 'toggle': '/record/toggle',
+                'toggle-prefix': '/prefix'}.get(action, f"/{action}")
+        response = requests.post(f"{controller_url}{path}", params={'grid': grid} if grid else None, timeout=5)
+    print(json.dumps(response.json(), indent=2))
+    return response.ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless grid sequencing controller')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run the controller with a local HTTP API')
+    serve_parser.add_argument('--record-api', nargs='+', required=True, help='Recorder API URLs (by position)')
+    serve_parser.add_argument('--port', type=int, default=CONTROLLER_PORT,
+                              help=f'API port (default: {CONTROLLER_PORT})')
+    serve_parser.add_argument('--host', type=str, default='127.0.0.1', help='API bind address (default: 127.0.0.1)')
+    serve_parser.add_argument('--settle', type=float, default=GRID_SETTLE_SECONDS,
+                              help=f'Seconds a grid must stay selected before recording (default: {GRID_SETTLE_SECONDS})')
+    serve_parser.add_argument('--no-resume', dest='resume', action='store_false',
+                              help="Don't resume the recorders' last grid on startup")
+
+    replay_parser = subparsers.add_parser('replay', help='Replay a grid schedule and report transition latency')
+    replay_parser.add_argument('--record-api', nargs='+', required=True, help='Recorder API URLs (by position)')
+    replay_parser.add_argument('--schedule', type=str, default=None,
+                               help='File with one grid label per line (default: the full walk)')
+    replay_parser.add_argument('--prefix', type=str, default='A', choices=PREFIXES,
+                               help='Prefix for the default full walk (default: A)')
+    replay_parser.add_argument('--rate', type=float, default=1.0, help='Grid changes per second (default: 1)')
+    replay_parser.add_argument('--count', type=int, default=None, help='Only replay the first N grids')
+    replay_parser.add_argument('--settle', type=float, default=0.0,
+                               help='Debounce before each start; 0 starts immediately (default: 0)')
+    replay_parser.add_argument('-o', '--output', type=str, default=None, help='Write per-transition CSV')
+
+    send_parser = subparsers.add_parser('send', help='Send a command to a running controller')
+    send_parser.add_argument('action', choices=['state', 'stats', 'transitions', 'next', 'previous', 'toggle-prefix',
+                                                'goto', 'start', 'stop', 'toggle'])
+    send_parser.add_argument('grid', nargs='?', default=None, help='Grid label for goto')
+    send_parser.add_argument('--controller', type=str, default=f'http://localhost:{CONTROLLER_PORT}',
+                             help=f'Controller URL (default: http://localhost:{CONTROLLER_PORT})')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        controller = GridController(args.record_api, settle_seconds=args.settle)
+        controller.add_listener(lambda event, data: event == 'transition' and print(
+            f"{data['from_grid']} -> {data['to_grid']}: {data['outcome']}, {data['total_ms']} ms"))
+        server = start_api_server(controller, args.host, args.port)
+        if args.resume:
+            controller.resume_last_session()
+        print(f"Grid controller on http://{args.host}:{args.port} for {', '.join(args.record_api)}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\nStopping controller")
+        finally:
+            server.shutdown()
+            controller.stop_recording()
+            controller.close()
+            controller.client.shutdown(wait=True)
+    elif args.command == 'replay':
+        try:
+            schedule = load_schedule(args.schedule, args.prefix)
+        except (OSError, ValueError) as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+        if args.count:
+            schedule = schedule[:args.count]
+        if not schedule:
+            print("✗ Empty schedule")
+            sys.exit(1)
+        stats = replay(args.record_api, schedule, args.rate, args.settle, args.output)
+        sys.exit(1 if stats['failed'] or not stats['completed'] else 0)
+    else:
+        if args.action == 'goto' and not args.grid:
+            parser.error('goto needs a grid label')
+        sys.exit(0 if send(args.controller, args.action, args.grid) else 1)
+
+
+if __name__ == "__main__":
+    main()
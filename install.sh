@@ -172,8 +172,24 @@ main() {
         "videos/desktopmultiv5.sh"
         "delete_except_newest.sh"
         "ftpserver.py"
+        "capture_catalog.py"
+        "catalog_ftp.py"
+        "net_discovery.py"
+        "link_monitor.py"
         "requirements.txt"
         "system_monitor.py"
+        "metrics_store.py"
+        "recording_governor.py"
+        "recorder_client.py"
+        "rtsp_relay.py"
+        "grid_controller.py"
+        "recording_journal.py"
+        "frame_staging.py"
+        "launcher.py"
+        "device_cache.py"
+        "supervisor.py"
+        "retention.py"
+        "tiering.py"
         "v4l2rtspserver"
         "configure_cameras.sh"
     )
@@ -204,6 +220,14 @@ main() {
     # Copy other files from root
     # copy_file "v4l2rtspserver" "$HOME/Desktop/usb_raspi_package/"
     # copy_file "configure_cameras.sh" "$HOME/Desktop/usb_raspi_package/"
+    # copy_file "recorder_client.py" "$HOME/Desktop/usb_raspi_package/"
+    # copy_file "rtsp_relay.py" "$HOME/Desktop/usb_raspi_package/"
+    # copy_file "grid_controller.py" "$HOME/Desktop/usb_raspi_package/"
+    # copy_file "recording_journal.py" "$HOME/Desktop/usb_raspi_package/"
+    # copy_file "frame_staging.py" "$HOME/Desktop/usb_raspi_package/"
+    # copy_file "launcher.py" "$HOME/Desktop/usb_raspi_package/"
+    # copy_file "device_cache.py" "$HOME/Desktop/usb_raspi_package/"
+    # copy_file "supervisor.py" "$HOME/Desktop/usb_raspi_package/"
 
     
     # Make shell scripts executable
@@ -222,12 +246,22 @@ main() {
     # Copy other files from root
     copy_file "v4l2rtspserver" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
     copy_file "configure_cameras.sh" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
+    copy_file "recorder_client.py" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
+    copy_file "rtsp_relay.py" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
+    copy_file "grid_controller.py" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
+    copy_file "recording_journal.py" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
+    copy_file "frame_staging.py" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
+    copy_file "launcher.py" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
+    copy_file "device_cache.py" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
+    copy_file "supervisor.py" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
     
     # Copy config.txt if it exists
     copy_file_optional "config.txt" "$HOME/Desktop/usb_raspi_package_camerafixed_frame/"
     
     # Make shell scripts executable
     make_executable "$HOME/Desktop/usb_raspi_package_camerafixed_frame/desktopmultiv5.sh"
+    make_executable "$HOME/Desktop/usb_raspi_package_camerafixed_frame/launcher.py"
+    make_executable "$HOME/Desktop/usb_raspi_package_camerafixed_frame/supervisor.py"
     make_executable "$HOME/Desktop/usb_raspi_package_camerafixed_frame/v4l2rtspserver"
     make_executable "$HOME/Desktop/usb_raspi_package_camerafixed_frame/configure_cameras.sh"
     
@@ -244,7 +278,16 @@ main() {
     
     home_files=(
         "ftpserver.py"
+        "capture_catalog.py"
+        "catalog_ftp.py"
+        "net_discovery.py"
+        "link_monitor.py"
         "system_monitor.py"
+        "metrics_store.py"
+        "recording_governor.py"
+        "recording_journal.py"
+        "retention.py"
+        "tiering.py"
         "requirements.txt"
     )
     
@@ -332,6 +375,104 @@ EOF
     else
         print_warning "Failed to start system monitor service (this might be normal if dependencies aren't ready)"
     fi
+
+    # Recording governor service (lowers recorder fps and pauses transfers while throttled)
+    GOVERNOR_SERVICE_FILE="/tmp/recording-governor.service"
+    cat > "$GOVERNOR_SERVICE_FILE" << EOF
+[Unit]
+Description=Recording Governor Service
+After=network.target
+
+[Service]
+Type=simple
+User=$USER
+WorkingDirectory=$HOME
+Environment=PATH=$HOME/Desktop/gr-robo/venv/bin:/usr/local/bin:/usr/bin:/bin
+Environment=PYTHONUNBUFFERED=1
+ExecStart=$HOME/Desktop/gr-robo/venv/bin/python $HOME/recording_governor.py
+Restart=always
+RestartSec=10
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+    if sudo cp "$GOVERNOR_SERVICE_FILE" /etc/systemd/system/ && sudo systemctl daemon-reload \
+        && sudo systemctl enable --now recording-governor.service; then
+        print_success "Recording governor service enabled and started"
+    else
+        print_warning "Failed to set up recording governor service"
+    fi
+
+    # Retention service (deletes downloaded recordings by age and free space, at idle I/O priority).
+    # Only captures ftpserver.py has served are deleted, so run the FTP server the clients download from.
+    # It deletes captures, so it is installed but left to the operator to enable (an existing
+    # enabled unit stays enabled).
+    RETENTION_SERVICE_FILE="/tmp/scout-retention.service"
+    cat > "$RETENTION_SERVICE_FILE" << EOF
+[Unit]
+Description=Scout Recording Retention Service
+After=network.target
+
+[Service]
+Type=simple
+User=$USER
+WorkingDirectory=$HOME
+Environment=PATH=$HOME/Desktop/gr-robo/venv/bin:/usr/local/bin:/usr/bin:/bin
+Environment=PYTHONUNBUFFERED=1
+ExecStart=$HOME/Desktop/gr-robo/venv/bin/python $HOME/retention.py
+Nice=10
+IOSchedulingClass=idle
+Restart=always
+RestartSec=30
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+    if sudo cp "$RETENTION_SERVICE_FILE" /etc/systemd/system/ && sudo systemctl daemon-reload; then
+        if systemctl is-enabled --quiet scout-retention.service; then
+            sudo systemctl restart scout-retention.service
+            print_success "Retention service updated and restarted"
+        else
+            print_warning "Retention service installed but NOT enabled: it deletes downloaded recordings"
+            print_warning "(older than 14 days, or when free space drops below 15%). Preview, then enable:"
+            echo "    python3 ~/retention.py --once --dry-run"
+            echo "    sudo systemctl enable --now scout-retention.service"
+        fi
+    else
+        print_warning "Failed to set up retention service"
+    fi
+
+    # Tiering service (moves finished sessions to a USB SSD mounted at /mnt/scout-ssd; idle without it)
+    TIERING_SERVICE_FILE="/tmp/scout-tiering.service"
+    cat > "$TIERING_SERVICE_FILE" << EOF
+[Unit]
+Description=Scout Recording Tiering Service
+After=network.target local-fs.target
+
+[Service]
+Type=simple
+User=$USER
+WorkingDirectory=$HOME
+Environment=PATH=$HOME/Desktop/gr-robo/venv/bin:/usr/local/bin:/usr/bin:/bin
+Environment=PYTHONUNBUFFERED=1
+ExecStart=$HOME/Desktop/gr-robo/venv/bin/python $HOME/tiering.py --target /mnt/scout-ssd/scout-videos
+Nice=10
+IOSchedulingClass=idle
+Restart=always
+RestartSec=30
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+    if sudo cp "$TIERING_SERVICE_FILE" /etc/systemd/system/ && sudo systemctl daemon-reload \
+        && sudo systemctl enable --now scout-tiering.service; then
+        print_success "Tiering service enabled and started"
+    else
+        print_warning "Failed to set up tiering service"
+    fi
     
     # Final cleanup
     cleanup
@@ -344,7 +485,7 @@ EOF
     print_success "Files installed in the following locations:"
     echo "  • ~/Desktop/usb_raspi_package/ - Main application files (videos version)"
     echo "  • ~/Desktop/usb_raspi_package_camerafixed_frame/ - Main application files (frames version)"
-    echo "  • ~/Desktop/delete_except_newest.sh - Cleanup script"
+    echo "  • ~/Desktop/delete_except_newest.sh - Cleanup script (now one retention.py pass: only downloaded sessions)"
     echo "  • ~/Desktop/configure_cameras.sh - Camera configuration script"
     echo "  • ~/ - FTP server, system monitor, and requirements"
     echo "  • ~/Desktop/gr-robo/venv/ - Python virtual environment"
@@ -352,6 +493,10 @@ EOF
     print_success "System monitor service has been installed and started"
     echo "  • Status: sudo systemctl status system-monitor.service"
     echo "  • Logs: sudo journalctl -u system-monitor.service -f"
+    echo "  • Governor logs: sudo journalctl -u recording-governor.service -f"
+    echo "  • Retention (off until enabled): sudo systemctl enable --now scout-retention.service"
+    echo "  • Retention logs: sudo journalctl -u scout-retention.service -f"
+    echo "  • Tiering logs: sudo journalctl -u scout-tiering.service -f"
     echo
     print_success "Camera configuration script is ready to use"
     echo "  • Configure cameras: ~/Desktop/configure_cameras.sh"
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Camera Launcher
+Python version of desktopmultiv5.sh: finds the USB cameras, starts
+v4l2rtspserver, the local relay and the recorder API for each of them and
+launches the UI. Known cameras come from the device cache (device_cache.py),
+new ones are probed concurrently, and every camera is brought up in its
+own thread; instead of fixed sleeps each service is
+polled until it actually answers (an RTSP OPTIONS + DESCRIBE returning a
+video SDP, the relay's /status reporting its source up, the recorder's
+/status returning 200). A startup timing breakdown is printed and saved
+as JSON.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from device_cache import DeviceCache, discover, run, scan_camera, supports
+
+RTSP_BASE_PORT = 8554
+RECORD_API_BASE_PORT = 5000
+RELAY_BASE_PORT = 8654
+RTSP_READY_TIMEOUT = 15  # seconds for v4l2rtspserver to serve a stream
+RELAY_READY_TIMEOUT = 10  # seconds for the relay to receive the camera stream
+RECORDER_READY_TIMEOUT = 10  # seconds for a recorder API to answer
+POLL_INTERVAL = 0.1  # seconds between readiness checks
+START_ATTEMPTS = 2  # the port is cleared between attempts
+STOP_TIMEOUT = 5  # seconds for services to exit before they are killed
+POSITIONS = ['bottom', 'middle', 'top']
+VENV_PATH = os.path.expanduser("~/Desktop/gr-robo/venv")
+TIMINGS_FILE = "/tmp/launcher_timings.json"
+UI_SCRIPT = "UI-May17-v16.py"
+
+DEFAULT_CONFIG = {
+    'resolution': '1920x1080',
+    'fps': '15',
+    'bottomcamera': '',
+    'middlecamera': '',
+    'topcamera': '',
+    'relay': 'true',
+}
+
+
+class Timeline:
+    """Start offset and duration of each launcher step, relative to launch"""
+
+    def __init__(self):
+        self.t0 = time.monotonic()
+        self.steps = []
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.monotonic() - self.t0
+
+    @contextmanager
+    def step(self, name):
+        """Time a step; the yielded dict takes 'ok' and 'detail' for the report"""
+        entry = {'step': name, 'start': self.now(), 'ok': True, 'detail': ''}
+        try:
+            yield entry
+        except Exception as e:
+            entry['ok'], entry['detail'] = False, str(e)
+            raise
+        finally:
+            entry['duration'] = self.now() - entry['start']
+            with self.lock:
+                self.steps.append(entry)
+
+    def log(self, message):
+        print(f"[{self.now():6.2f}s] {message}", flush=True)
+
+    def report(self):
+        print("\nStartup timing (seconds since launch):")
+        print(f"  {'start':>6}  {'took':>6}  step")
+        for entry in sorted(self.steps, key=lambda e: e['start']):
+            mark = '✓' if entry['ok'] else '✗'
+            detail = f"  ({entry['detail']})" if entry['detail'] else ''
+            print(f"  {entry['start']:6.2f}  {entry['duration']:6.2f}  {mark} {entry['step']}{detail}")
+        print(f"  total {self.now():.2f}s")
+
+    def save(self, path):
+        data = {'total': round(self.now(), 3),
+                'steps': [dict(e, start=round(e['start'], 3), duration=round(e['duration'], 3))
+                          for e in sorted(self.steps, key=lambda e: e['start'])]}
+        try:
+            with open(path, 'w') as f:
+                json.dump(data, f, indent=2)
+        except OSError as e:
+            print(f"✗ Could not write {path}: {e}")
+
+
+def read_config(path):
+    """config.txt as used by desktopmultiv5.sh (key=value, # comments)"""
+    config = dict(DEFAULT_CONFIG)
+    try:
+        with open(path) as f:
+            for line in f:
+                if not line.strip() or line.strip().startswith('#') or '=' not in line:
+                    continue
+                key, value = (part.strip() for part in line.split('=', 1))
+                if key in config:
+                    config[key] = value
+                else:
+                    print(f"Unknown config key: {key}")
+    except OSError:
+        print(f"Configuration file not found: {path}, using defaults")
+    try:
+        width, height = (int(v) for v in config['resolution'].split('x'))
+    except ValueError:
+        print(f"Invalid resolution format: {config['resolution']}. Using default 1920x1080")
+        width, height = 1920, 1080
+    config['width'], config['height'] = width, height
+    if not config['fps'].isdigit():
+        print(f"Invalid fps: {config['fps']}. Using default {DEFAULT_CONFIG['fps']}")
+        config['fps'] = DEFAULT_CONFIG['fps']
+    config['relay'] = config['relay'].lower() == 'true'
+    return config
+
+
+# --- Device probing
+
+def detect_cameras(config, timeline, rescan=False):
+    """[(device, serial)] in bottom/middle/top order.
+
+    Cameras known to the device cache are taken from sysfs without probing;
+    new or changed ones are probed concurrently and cached.
+    """
+    def scan(nodes):
+        with timeline.step(f"probe {nodes[0]['serial'] or nodes[0]['device']}") as step:
+            entry = scan_camera(nodes)
+            step['ok'] = entry['playable']
+            step['detail'] = f"{len(nodes)} nodes, {len(entry['formats'])} formats"
+            return entry
+
+    cameras = discover(DeviceCache(), rescan=rescan, scan=scan)
+    for camera in cameras:
+        timeline.log(f"✓ Found playable camera: {camera['device']} (Serial: {camera['serial']}"
+                     f"{', cached' if camera['cached'] else ''})")
+        if not supports(camera['formats'], config['width'], config['height'], float(config['fps'])):
+            timeline.log(f"✗ {camera['device']} does not list {config['width']}x{config['height']} "
+                         f"at {config['fps']} fps")
+    return order_cameras([(c['device'], c['serial']) for c in cameras],
+                         [config['bottomcamera'], config['middlecamera'], config['topcamera']])
+
+
+def order_cameras(cameras, configured_serials):
+    """Configured serials first (bottom, middle, top), then any other camera"""
+    ordered = []
+    for serial in configured_serials:
+        for camera in cameras:
+            if serial and camera[1] == serial and camera not in ordered:
+                ordered.append(camera)
+                break
+    for camera in cameras:
+        if camera not in ordered:
+            print(f"Added unconfigured camera {camera[0]} (Serial: {camera[1]}) at the end")
+            ordered.append(camera)
+    return ordered
+
+
+# --- Readiness checks
+
+def rtsp_request(sock, method, url, cseq):
+    """Send one RTSP request on sock; returns (status code, headers, body)"""
+    request = f"{method} {url} RTSP/1.0\r\nCSeq: {cseq}\r\nUser-Agent: scout-launcher\r\n"
+    if method == 'DESCRIBE':
+        request += "Accept: application/sdp\r\n"
+    sock.sendall((request + "\r\n").encode())
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    head, body = data.split(b'\r\n\r\n', 1)
+    lines = head.decode(errors='replace').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {k.strip().lower(): v.strip() for k, v in (line.split(':', 1) for line in lines[1:] if ':' in line)}
+    length = int(headers.get('content-length', 0))
+    while len(body) < length:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        body += chunk
+    return status, headers, body[:length].decode(errors='replace')
+
+
+def rtsp_ready(url, timeout=2):
+    """True once the server answers OPTIONS and DESCRIBE with a video stream in the SDP"""
+    parsed = urlparse(url)
+    try:
+        with socket.create_connection((parsed.hostname, parsed.port or 554), timeout=timeout) as sock:
+            sock.settimeout(timeout)
+            status, _, _ = rtsp_request(sock, 'OPTIONS', url, 1)
+            if status != 200:
+                return False
+            status, _, sdp = rtsp_request(sock, 'DESCRIBE', url, 2)
+            return status == 200 and 'm=video' in sdp
+    except (OSError, ValueError, IndexError):
+        return False
+
+
+def http_json(url, timeout=1):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read().decode(errors='replace')
+    except OSError:
+        return None, ''
+
+
+def relay_ready(port):
+    status, body = http_json(f"http://localhost:{port}/status")
+    try:
+        return status == 200 and json.loads(body).get('source_up') is True
+    except ValueError:
+        return False
+
+
+def recorder_ready(port):
+    return http_json(f"http://localhost:{port}/status")[0] == 200
+
+
+def wait_until(check, process, timeout):
+    """Poll check() until it passes; False on timeout or if process exits first"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        if process.poll() is not None:
+            return False
+        time.sleep(POLL_INTERVAL)
+    return check()
+
+
+# --- Services
+
+class Services:
+    """The processes started by the launcher, stopped in reverse order on exit"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.processes = []  # (name, Popen)
+        self.lock = threading.Lock()
+
+    def start(self, name, cmd, log_file):
+        with open(log_file, 'w') as log:
+            process = subprocess.Popen(cmd, cwd=self.directory, stdout=log, stderr=subprocess.STDOUT)
+        with self.lock:
+            self.processes.append((name, process))
+        return process
+
+    def discard(self, process):
+        stop_process(process)
+        with self.lock:
+            self.processes = [(n, p) for n, p in self.processes if p is not process]
+
+    def stop_all(self):
+        with self.lock:
+            processes, self.processes = list(reversed(self.processes)), []
+        for name, process in processes:
+            if process.poll() is None:
+                process.terminate()
+                print(f"Stopped {name} (PID: {process.pid})")
+        for name, process in processes:
+            stop_process(process)
+
+
+def stop_process(process):
+    process.terminate()
+    try:
+        process.wait(timeout=STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def free_port(port):
+    """Terminate whatever is listening on port (like kill_port_processes in the shell launcher)"""
+    returncode, output = run(['lsof', '-t', f'-i:{port}'])
+    for pid in output.split() if returncode == 0 else []:
+        try:
+            os.kill(int(pid), signal.SIGTERM)
+            print(f"Terminated process {pid} using port {port}")
+        except (ValueError, OSError):
+            pass
+
+
+def log_tail(log_file, lines=10):
+    try:
+        with open(log_file, errors='replace') as f:
+            return ''.join(f.readlines()[-lines:])
+    except OSError:
+        return ''
+
+
+def start_service(services, timeline, name, cmd, log_file, port, ready, timeout, keep_unready=False):
+    """Start a service and wait until ready(); retried once after clearing the port.
+
+    Returns the process, or None. With keep_unready a process that is still
+    running but not ready after the timeout is kept (it may come up later).
+    """
+    for attempt in range(1, START_ATTEMPTS + 1):
+        with timeline.step(f"{name} :{port}") as step:
+            process = services.start(name, cmd, log_file)
+            if wait_until(ready, process, timeout):
+                step['detail'] = f"PID {process.pid}"
+                timeline.log(f"✓ {name} ready on port {port} (PID: {process.pid})")
+                return process
+            step['ok'] = False
+            if process.poll() is None and keep_unready and attempt == START_ATTEMPTS:
+                step['detail'] = f"not ready after {timeout}s, kept running"
+                timeline.log(f"✗ {name} on port {port} not ready after {timeout}s, continuing anyway")
+                return process
+            step['detail'] = f"attempt {attempt} failed"
+            timeline.log(f"✗ {name} on port {port} failed (attempt {attempt}/{START_ATTEMPTS})\n{log_tail(log_file)}")
+            services.discard(process)
+        if attempt < START_ATTEMPTS:
+            free_port(port)
+    return None
+
+
+def bring_up_camera(index, device, config, services, timeline, python):
+    """RTSP server -> relay -> recorder API for one camera; returns (camera_url, record_api) or None"""
+    rtsp_port = RTSP_BASE_PORT + index
+    rtsp_url = f"rtsp://localhost:{rtsp_port}/unicast"
+    server = start_service(
+        services, timeline, "v4l2rtspserver",
+        ['./v4l2rtspserver', '-P', str(rtsp_port), '-W', str(config['width']), '-H', str(config['height']),
+         '-F', str(config['fps']), device],
+        f"/tmp/rtsp_{rtsp_port}.log", rtsp_port, lambda: rtsp_ready(rtsp_url), RTSP_READY_TIMEOUT,
+        keep_unready=True)
+    if server is None:
+        return None
+
+    camera_url = rtsp_url
+    if config['relay']:
+        relay_port = RELAY_BASE_PORT + index
+        relay = start_service(
+            services, timeline, "relay",
+            [python, './rtsp_relay.py', '--source', rtsp_url, '--port', str(relay_port)],
+            f"/tmp/rtsp_relay_{relay_port}.log", relay_port, lambda: relay_ready(relay_port), RELAY_READY_TIMEOUT)
+        if relay:
+            camera_url = f"http://localhost:{relay_port}/stream.ts"
+        else:
+            timeline.log(f"Relay on port {relay_port} unavailable, using {rtsp_url} directly")
+
+    api_port = RECORD_API_BASE_PORT + index
+    recorder = start_service(
+        services, timeline, "record API",
+        [python, './rtsp_record_api.py', '--port', str(api_port), '--rtsp-url', camera_url],
+        f"/tmp/record_api_{api_port}.log", api_port, lambda: recorder_ready(api_port), RECORDER_READY_TIMEOUT)
+    if recorder is None:
+        return None
+    return camera_url, f"http://localhost:{api_port}"
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Start the cameras, relays, recorder APIs and UI')
+    parser.add_argument('--dir', type=str, default=script_dir,
+                        help='Package directory with v4l2rtspserver and the scripts (default: this script\'s)')
+    parser.add_argument('--config', type=str, default=None, help='Config file (default: <dir>/config.txt)')
+    parser.add_argument('--devices', nargs='+', default=None,
+                        help='Use these video devices instead of probing /dev/video*')
+    parser.add_argument('--rescan', action='store_true', help='Probe every camera again instead of using the device cache')
+    parser.add_argument('--no-relay', action='store_true', help='Record and preview straight from RTSP')
+    parser.add_argument('--no-ui', action='store_true', help='Start the services and wait instead of launching the UI')
+    parser.add_argument('--timings', type=str, default=TIMINGS_FILE,
+                        help=f'Write the startup timing breakdown here (default: {TIMINGS_FILE})')
+    args = parser.parse_args()
+
+    timeline = Timeline()
+    config = read_config(args.config or os.path.join(args.dir, 'config.txt'))
+    if args.no_relay:
+        config['relay'] = False
+    timeline.log(f"Using resolution: {config['width']}x{config['height']}, FPS: {config['fps']}, "
+                 f"relay: {config['relay']}")
+
+    if not os.access(os.path.join(args.dir, 'v4l2rtspserver'), os.X_OK):
+        print(f"✗ v4l2rtspserver not found in {args.dir}")
+        sys.exit(1)
+
+    if args.devices:
+        cameras = [(device, '') for device in args.devices]
+    else:
+        with timeline.step("detect cameras") as step:
+            cameras = detect_cameras(config, timeline, args.rescan)
+            step['detail'] = f"{len(cameras)} found"
+    if not cameras:
+        print("✗ No playable USB cameras detected.")
+        print("You can check with: ls -la /dev/video* && v4l2-ctl --list-devices")
+        sys.exit(1)
+    for index, (device, serial) in enumerate(cameras):
+        position = POSITIONS[index] if index < len(POSITIONS) else f"camera {index + 1}"
+        timeline.log(f"{position}: {device} (Serial: {serial or 'unknown'})")
+
+    def on_signal(sig, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, on_signal)
+    services = Services(args.dir)
+    python = sys.executable or 'python3'
+    try:
+        with timeline.step("bring up cameras") as step:
+            with ThreadPoolExecutor(max_workers=len(cameras)) as pool:
+                futures = [pool.submit(bring_up_camera, index, device, config, services, timeline, python)
+                           for index, (device, _) in enumerate(cameras)]
+                ready = [future.result() for future in futures]
+            ready = [camera for camera in ready if camera]
+            step['ok'] = bool(ready)
+            step['detail'] = f"{len(ready)}/{len(cameras)} ready"
+        if not ready:
+            print("✗ No cameras came up.")
+            timeline.report()
+            timeline.save(args.timings)
+            sys.exit(1)
+
+        camera_urls = [url for url, _ in ready]
+        record_apis = [api for _, api in ready]
+        timeline.log(f"Camera URLs: {' '.join(camera_urls)}")
+        timeline.log(f"Record APIs: {' '.join(record_apis)}")
+
+        if args.no_ui:
+            timeline.report()
+            timeline.save(args.timings)
+            print("Services running, Ctrl+C to stop")
+            while True:
+                time.sleep(1)
+
+        # The UI runs in the gr-robo virtual environment when there is one (it has python-vlc)
+        ui_python = os.path.join(VENV_PATH, 'bin', 'python3')
+        if not os.path.exists(ui_python):
+            ui_python = python
+        cmd = [ui_python, f'./{UI_SCRIPT}', '--devices', *camera_urls, '--record-api', *record_apis]
+        timeline.log(f"Command: {' '.join(cmd)}")
+        with timeline.step("launch UI"):
+            ui = subprocess.Popen(cmd, cwd=args.dir)
+        timeline.report()
+        timeline.save(args.timings)
+        ui.wait()
+        if ui.returncode != 0:
+            print(f"✗ UI exited with code {ui.returncode}")
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        services.stop_all()
+
+
+if __name__ == "__main__":
+    main()
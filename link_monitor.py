@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Network Keep-Alive Link Monitor
+Probes the target device in-process (ICMP echo, falling back to a TCP
+connect) instead of forking ping. Keeps rolling latency and loss stats,
+re-discovers the device by MAC after repeated failures, and publishes link
+quality to LINK_STATUS_PATH so the FTP server can throttle transfers while
+the link is degraded.
+"""
+
+import argparse
+import asyncio
+import errno
+import json
+import os
+import socket
+import statistics
+import struct
+import time
+from collections import deque
+
+LINK_STATUS_PATH = "/tmp/scout-link-status.json"
+PROBE_INTERVAL = 10  # seconds
+PROBE_TIMEOUT = 2  # seconds
+WINDOW_SIZE = 30  # probes kept for rolling stats
+FAILURE_THRESHOLD = 3  # consecutive failures before MAC re-discovery
+TCP_PROBE_PORTS = (445, 22, 80)  # a refused connection still proves the host is up
+DEGRADED_LOSS = 20.0  # percent
+DEGRADED_RTT = 150.0  # milliseconds (p95)
+STATUS_MAX_AGE = 3 * PROBE_INTERVAL  # status older than this is treated as unknown
+
+QUALITY_GOOD = "good"
+QUALITY_DEGRADED = "degraded"
+QUALITY_DOWN = "down"
+QUALITY_UNKNOWN = "unknown"
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def _open_icmp_socket():
+    """Return (socket, is_raw) for ICMP echo, or (None, False) if not permitted"""
+    try:
+        # Unprivileged ICMP, allowed by net.ipv4.ping_group_range
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except OSError:
+        pass
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+    except OSError:
+        return None, False
+
+
+class LinkMonitor:
+    """Async keep-alive prober with rolling stats and automatic re-discovery"""
+
+    def __init__(self, target_ip, mac_address=None, interval=PROBE_INTERVAL, timeout=PROBE_TIMEOUT,
+                 failure_threshold=FAILURE_THRESHOLD, status_path=LINK_STATUS_PATH, verbose=True):
+        self.target_ip = target_ip
+        self.mac_address = mac_address
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.status_path = status_path
+        self.verbose = verbose
+        self.samples = deque(maxlen=WINDOW_SIZE)  # rtt in ms, or None for a lost probe
+        self.consecutive_failures = 0
+        self.rediscoveries = 0
+        self.sequence = 0
+        self.icmp_sock, self.icmp_raw = _open_icmp_socket()
+        self.method = "icmp" if self.icmp_sock else "tcp"
+        if self.icmp_sock:
+            self.icmp_sock.setblocking(False)
+
+    # --- Probes
+
+    async def _recvfrom(self, loop):
+        """Next datagram on the ICMP socket (loop.sock_recvfrom needs Python 3.11)"""
+        fd = self.icmp_sock.fileno()
+        while True:
+            try:
+                return self.icmp_sock.recvfrom(1024)
+            except BlockingIOError:
+                pass
+            readable = loop.create_future()
+            loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+            try:
+                await readable
+            finally:
+                loop.remove_reader(fd)
+
+    async def _probe_icmp(self):
+        loop = asyncio.get_running_loop()
+        self.sequence = (self.sequence + 1) & 0xffff
+        ident = os.getpid() & 0xffff
+        payload = struct.pack("!d", time.time())
+        header = struct.pack("!BBHHH", 8, 0, 0, ident, self.sequence)
+        packet = struct.pack("!BBHHH", 8, 0, _checksum(header + payload), ident, self.sequence) + payload
+        start = time.perf_counter()
+        self.icmp_sock.sendto(packet, (self.target_ip, 0))
+        deadline = start + self.timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None
+            try:
+                data, addr = await asyncio.wait_for(self._recvfrom(loop), remaining)
+            except asyncio.TimeoutError:
+                return None
+            if self.icmp_raw:
+                data = data[(data[0] & 0x0f) * 4:]  # strip IP header
+            if addr[0] != self.target_ip or len(data) < 8:
+                continue
+            icmp_type, _, _, reply_ident, sequence = struct.unpack("!BBHHH", data[:8])
+            # A raw socket sees every echo reply on the host; ping sockets only get ours
+            # (with the ident rewritten by the kernel)
+            if self.icmp_raw and reply_ident != ident:
+                continue
+            if icmp_type == 0 and sequence == self.sequence:
+                return (time.perf_counter() - start) * 1000
+
+    async def _probe_tcp(self):
+        for port in TCP_PROBE_PORTS:
+            start = time.perf_counter()
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(self.target_ip, port), self.timeout)
+                writer.close()
+                return (time.perf_counter() - start) * 1000
+            except ConnectionRefusedError:
+                return (time.perf_counter() - start) * 1000
+            except OSError as e:
+                if e.errno in (errno.EHOSTUNREACH, errno.ENETUNREACH):
+                    return None
+            except asyncio.TimeoutError:
+                continue
+        return None
+
+    async def probe(self):
+        """Send one probe; return the round-trip time in ms or None"""
+        try:
+            if self.icmp_sock:
+                return await self._probe_icmp()
+            return await self._probe_tcp()
+        except Exception as e:
+            # A failed probe counts as lost; it must not end the monitor
+            if self.verbose:
+                print(f"Error probing {self.target_ip}: {e}")
+            return None
+
+    # --- Stats
+
+    def stats(self):
+        rtts = [s for s in self.samples if s is not None]
+        total = len(self.samples)
+        loss = 100.0 * (total - len(rtts)) / total if total else 0.0
+        if not total:
+            quality = QUALITY_UNKNOWN
+        elif self.consecutive_failures >= self.failure_threshold:
+            quality = QUALITY_DOWN
+        else:
+            p95 = sorted(rtts)[int(0.95 * (len(rtts) - 1))] if rtts else None
+            degraded = loss >= DEGRADED_LOSS or (p95 is not None and p95 >= DEGRADED_RTT)
+            quality = QUALITY_DEGRADED if degraded or self.consecutive_failures else QUALITY_GOOD
+        return {
+            'target_ip': self.target_ip,
+            'mac_address': self.mac_address,
+            'method': self.method,
+            'quality': quality,
+            'loss_percent': round(loss, 1),
+            'rtt_last_ms': round(self.samples[-1], 2) if total and self.samples[-1] is not None else None,
+            'rtt_avg_ms': round(statistics.mean(rtts), 2) if rtts else None,
+            'rtt_min_ms': round(min(rtts), 2) if rtts else None,
+            'rtt_max_ms': round(max(rtts), 2) if rtts else None,
+            'jitter_ms': round(statistics.pstdev(rtts), 2) if len(rtts) > 1 else None,
+            'consecutive_failures': self.consecutive_failures,
+            'rediscoveries': self.rediscoveries,
+            'samples': total,
+            'updated': time.time(),
+        }
+
+    def publish(self, stats):
+        tmp_path = f"{self.status_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(stats, f)
+            os.replace(tmp_path, self.status_path)
+        except OSError as e:
+            print(f"Could not write link status: {e}")
+
+    # --- Main loop
+
+    async def rediscover(self):
+        if not self.mac_address:
+            return
+        from net_discovery import discover, save_cache
+        print(f"{self.consecutive_failures} consecutive failures, re-discovering {self.mac_address}...")
+        entry = await discover(self.mac_address, use_cache=False)
+        self.rediscoveries += 1
+        if entry and entry[0] != self.target_ip:
+            print(f"✓ Device moved from {self.target_ip} to {entry[0]}")
+            self.target_ip = entry[0]
+            self.samples.clear()
+            self.consecutive_failures = 0
+            save_cache(self.mac_address, entry[0], entry[1])
+        elif not entry:
+            print(f"✗ {self.mac_address} not found, keeping {self.target_ip}")
+
+    async def run(self):
+        print(f"Link monitor probing {self.target_ip} every {self.interval}s via {self.method}")
+        while True:
+            rtt = await self.probe()
+            self.samples.append(rtt)
+            if rtt is None:
+                self.consecutive_failures += 1
+            else:
+                self.consecutive_failures = 0
+            stats = self.stats()
+            self.publish(stats)
+            if self.verbose:
+                if rtt is not None:
+                    print(f"✓ {self.target_ip} {rtt:.1f} ms (loss {stats['loss_percent']}%, "
+                          f"{stats['quality']}) at {time.strftime('%H:%M:%S')}")
+                else:
+                    print(f"✗ No reply from {self.target_ip} (loss {stats['loss_percent']}%, "
+                          f"{stats['quality']}) at {time.strftime('%H:%M:%S')}")
+            if self.consecutive_failures and self.consecutive_failures % self.failure_threshold == 0:
+                await self.rediscover()
+            await asyncio.sleep(self.interval)
+
+
+def read_link_status(status_path=LINK_STATUS_PATH, max_age=STATUS_MAX_AGE):
+    """Return the latest published link stats; quality is 'unknown' if missing or stale"""
+    try:
+        with open(status_path) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return {'quality': QUALITY_UNKNOWN}
+    if time.time() - status.get('updated', 0) > max_age:
+        status['quality'] = QUALITY_UNKNOWN
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep-alive link monitor')
+    parser.add_argument('target_ip', help='IP address to probe')
+    parser.add_argument('--mac', type=str, default=None, help='MAC address used for re-discovery')
+    parser.add_argument('--interval', type=float, default=PROBE_INTERVAL,
+                        help=f'Seconds between probes (default: {PROBE_INTERVAL})')
+    parser.add_argument('--status-path', type=str, default=LINK_STATUS_PATH,
+                        help=f'Status file (default: {LINK_STATUS_PATH})')
+    args = parser.parse_args()
+    monitor = LinkMonitor(args.target_ip, args.mac, interval=args.interval, status_path=args.status_path)
+    try:
+        asyncio.run(monitor.run())
+    except KeyboardInterrupt:
+        print("\nLink monitor stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Columnar Metrics Store
+Append-only storage for system monitor samples: one fixed-width binary file
+per column per day, readable with numpy.memmap without parsing text.
+1-minute and 1-hour min/avg/max rollups are written as samples arrive; a
+monitor restarted mid-bucket writes a second row for that bucket, which
+readers merge.
+
+Layout:
+    <root>/<YYYY-MM-DD>/raw/<column>.bin
+    <root>/<YYYY-MM-DD>/1m/<column>_{min,avg,max}.bin  (+ timestamp.bin, count.bin)
+    <root>/<YYYY-MM-DD>/1h/...
+"""
+
+import argparse
+import csv
+import getpass
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+USERNAME = getpass.getuser()
+STORE_DIR = f"/home/{USERNAME}/Desktop/systemlogs/store/"
+FLUSH_INTERVAL = 5  # seconds between writes of buffered samples
+SCHEMA_FILE = "schema.json"
+
+# Column name -> numpy dtype. Missing floats are NaN, missing flags are FLAG_MISSING.
+SYSTEM_COLUMNS = {
+    'timestamp': '<f8',  # unix time
+    'cpu_percent': '<f4',
+    'cpu_freq_current': '<f4',
+    'cpu_freq_min': '<f4',
+    'cpu_freq_max': '<f4',
+    'memory_total': '<u8',
+    'memory_available': '<u8',
+    'memory_percent': '<f4',
+    'disk_total': '<u8',
+    'disk_used': '<u8',
+    'disk_percent': '<f4',
+    'cpu_temperature': '<f4',
+    'voltage': '<f4',
+    'under_voltage': 'u1',
+    'arm_freq_capped': 'u1',
+    'currently_throttled': 'u1',
+    'soft_temp_limit': 'u1',
+    'disk_read_bytes_s': '<f4',
+    'disk_write_bytes_s': '<f4',
+    'disk_read_iops': '<f4',
+    'disk_write_iops': '<f4',
+    'disk_read_await_ms': '<f4',
+    'disk_write_await_ms': '<f4',
+    'disk_queue_depth': '<f4',
+    'disk_util_percent': '<f4',
+    'disk_in_flight': '<f4',
+    'dirty_bytes': '<f8',  # f4 cannot hold byte counts above 16 MiB exactly
+    'writeback_bytes': '<f8',
+    'write_probe_ms': '<f4',
+}
+FLAG_MISSING = 255
+ROLLUPS = {'1m': 60, '1h': 3600}
+ROLLUP_STATS = ('min', 'avg', 'max')
+RESOLUTIONS = ('raw',) + tuple(ROLLUPS)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def rollup_columns(columns):
+    """Column -> dtype mapping for a rollup table built from the given raw columns"""
+    result = {'timestamp': '<f8', 'count': '<u4'}
+    for name, dtype in columns.items():
+        if name != 'timestamp':
+            for stat in ROLLUP_STATS:
+                result[f"{name}_{stat}"] = '<f8' if np.dtype(dtype).itemsize == 8 else '<f4'
+    return result
+
+
+def to_unix_time(value):
+    if value is None:
+        return time.time()
+    if isinstance(value, str):
+        return datetime.strptime(value, TIMESTAMP_FORMAT).timestamp()
+    return float(value)
+
+
+def _to_float(value):
+    if value is None:
+        return np.nan
+    return float(value)
+
+
+def _cast(values, dtype):
+    """Cast a float64 column to its storage dtype, mapping NaN to the missing marker"""
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return values.astype(dtype)
+    missing = np.isnan(values)
+    if dtype == np.uint8:
+        return np.where(missing, FLAG_MISSING, values).astype(dtype)
+    return np.where(missing, 0, values).astype(dtype)
+
+
+def _as_float(values, dtype):
+    """Inverse of _cast for aggregation: missing markers become NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    if np.dtype(dtype) == np.uint8:
+        values[values == FLAG_MISSING] = np.nan
+    return values
+
+
+class ColumnTable:
+    """One directory of append-only column files"""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        os.makedirs(path, exist_ok=True)
+        schema_path = os.path.join(path, SCHEMA_FILE)
+        try:
+            with open(schema_path) as f:
+                schema = json.load(f)
+        except (OSError, ValueError):
+            schema = {}
+        if schema != columns:
+            self._pad_new_columns(schema)
+            self._convert_changed_columns(schema, schema_path)
+            with open(schema_path, 'w') as f:
+                json.dump(columns, f)
+        self.files = {name: open(os.path.join(path, f"{name}.bin"), 'ab') for name in columns}
+
+    def _pad_new_columns(self, schema):
+        """Fill columns added since the table was created with missing values for existing rows"""
+        try:
+            rows = os.path.getsize(os.path.join(self.path, 'timestamp.bin')) // np.dtype('<f8').itemsize
+        except OSError:
+            return
+        for name, dtype in self.columns.items():
+            if name not in schema and rows:
+                with open(os.path.join(self.path, f"{name}.bin"), 'wb') as f:
+                    f.write(_cast(np.full(rows, np.nan), dtype).tobytes())
+
+    def _convert_changed_columns(self, schema, schema_path):
+        """Rewrite columns stored with a dtype that has changed since the table was created"""
+        for name, dtype in self.columns.items():
+            old_dtype = schema.get(name)
+            if old_dtype is None or np.dtype(old_dtype) == np.dtype(dtype):
+                continue
+            path = os.path.join(self.path, f"{name}.bin")
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            itemsize = np.dtype(old_dtype).itemsize
+            values = np.frombuffer(data[:len(data) - len(data) % itemsize], dtype=old_dtype)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(_cast(_as_float(values, old_dtype), dtype).tobytes())
+            os.replace(tmp_path, path)
+            # Record each conversion at once so a crash part way never converts a column twice
+            schema[name] = dtype
+            with open(schema_path, 'w') as f:
+                json.dump(schema, f)
+
+    def append(self, rows):
+        """Append a 2D float64 array with one column per entry of self.columns"""
+        if not len(rows):
+            return
+        for index, (name, dtype) in enumerate(self.columns.items()):
+            self.files[name].write(_cast(rows[:, index], dtype).tobytes())
+        for f in self.files.values():
+            f.flush()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+
+class Rollup:
+    """Running min/sum/max for the current time bucket"""
+
+    def __init__(self, seconds, width):
+        self.seconds = seconds
+        self.width = width
+        self.bucket = None
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.minimum = np.full(self.width, np.inf)
+        self.maximum = np.full(self.width, -np.inf)
+        self.total = np.zeros(self.width)
+        self.present = np.zeros(self.width)
+
+    def add(self, timestamp, values):
+        """Add one sample; return the finished row for the previous bucket, if any"""
+        # Buckets start on local minutes/hours, like the daily files (UTC+05:30 hours start at :30 UTC)
+        offset = time.localtime(timestamp).tm_gmtoff
+        bucket = timestamp - ((timestamp + offset) % self.seconds)
+        finished = None
+        if self.bucket is not None and bucket != self.bucket:
+            finished = self.finish()
+        self.bucket = bucket
+        valid = ~np.isnan(values)
+        self.count += 1
+        self.minimum = np.where(valid, np.fmin(self.minimum, values), self.minimum)
+        self.maximum = np.where(valid, np.fmax(self.maximum, values), self.maximum)
+        self.total += np.where(valid, values, 0)
+        self.present += valid
+        return finished
+
+    def finish(self):
+        """Return the current bucket as [timestamp, count, min, avg, max, ...] and reset"""
+        if self.bucket is None or not self.count:
+            return None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = self.total / self.present
+        has_data = self.present > 0
+        stats = np.stack([np.where(has_data, self.minimum, np.nan),
+                          np.where(has_data, average, np.nan),
+                          np.where(has_data, self.maximum, np.nan)], axis=1).ravel()
+        row = np.concatenate([[self.bucket, self.count], stats])
+        self.bucket = None
+        self._reset()
+        return row
+
+
+class MetricsStore:
+    """Buffered writer for daily column tables with automatic rollups"""
+
+    def __init__(self, root=STORE_DIR, columns=SYSTEM_COLUMNS, flush_interval=FLUSH_INTERVAL):
+        self.root = root
+        self.columns = columns
+        self.value_columns = [name for name in columns if name != 'timestamp']
+        self.rollup_columns = rollup_columns(columns)
+        self.flush_interval = flush_interval
+        self.day = None
+        self.tables = {}
+        self.pending = {resolution: [] for resolution in RESOLUTIONS}
+        self.rollups = {name: Rollup(seconds, len(self.value_columns)) for name, seconds in ROLLUPS.items()}
+        self.last_flush = time.monotonic()
+
+    def _open(self, day):
+        self._finish_rollups()
+        self.flush()
+        self._close_tables()
+        day_dir = os.path.join(self.root, day)
+        self.tables = {'raw': ColumnTable(os.path.join(day_dir, 'raw'), self.columns)}
+        for name in ROLLUPS:
+            self.tables[name] = ColumnTable(os.path.join(day_dir, name), self.rollup_columns)
+        self.day = day
+
+    def append(self, metrics):
+        timestamp = to_unix_time(metrics.get('timestamp'))
+        day = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+        if day != self.day:
+            self._open(day)
+        values = np.array([_to_float(metrics.get(name)) for name in self.value_columns])
+        self.pending['raw'].append(np.concatenate([[timestamp], values]))
+        for name, rollup in self.rollups.items():
+            row = rollup.add(timestamp, values)
+            if row is not None:
+                self.pending[name].append(row)
+        now = time.monotonic()
+        if now - self.last_flush >= self.flush_interval:
+            self.flush()
+            self.last_flush = now
+
+    def _finish_rollups(self):
+        for name, rollup in self.rollups.items():
+            row = rollup.finish()
+            if row is not None:
+                self.pending[name].append(row)
+
+    def flush(self):
+        for resolution, rows in self.pending.items():
+            if rows and resolution in self.tables:
+                self.tables[resolution].append(np.vstack(rows))
+            rows.clear()
+
+    def _close_tables(self):
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+
+    def close(self):
+        """Flush buffered samples and the partial rollup buckets"""
+        self._finish_rollups()
+        self.flush()
+        self._close_tables()
+
+
+# --- Reading
+
+def list_days(root=STORE_DIR):
+    try:
+        return sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d, 'raw')))
+    except OSError:
+        return []
+
+
+def merge_buckets(data):
+    """Merge consecutive rollup rows for the same bucket into one row.
+
+    A monitor restarted part way through a bucket writes a row for it on
+    shutdown and another one later. Averages are weighted by sample count
+    when the count column is loaded.
+    """
+    timestamps = np.asarray(data['timestamp'])
+    if len(timestamps) < 2 or (np.diff(timestamps) != 0).all():
+        return data
+    starts = np.flatnonzero(np.concatenate([[True], np.diff(timestamps) != 0]))
+    weights = np.asarray(data['count'], dtype=np.float64) if 'count' in data else np.ones(len(timestamps))
+    merged = {}
+    for name, values in data.items():
+        if name == 'timestamp':
+            merged[name] = timestamps[starts]
+        elif name == 'count':
+            merged[name] = np.add.reduceat(np.asarray(values), starts).astype(values.dtype)
+        else:
+            values = np.asarray(values, dtype=np.float64)
+            if name.endswith('_min'):
+                result = np.fmin.reduceat(values, starts)
+            elif name.endswith('_max'):
+                result = np.fmax.reduceat(values, starts)
+            else:
+                valid = ~np.isnan(values)
+                total = np.add.reduceat(np.where(valid, values * weights, 0), starts)
+                present = np.add.reduceat(np.where(valid, weights, 0), starts)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result = np.where(present > 0, total / present, np.nan)
+            merged[name] = result.astype(data[name].dtype)
+    return merged
+
+
+def load_day(day, resolution='raw', columns=None, root=STORE_DIR):
+    """Return {column: memmap} for one day; columns are trimmed to a common length.
+
+    Rollup rows written twice for one bucket are merged (into plain arrays).
+    """
+    path = os.path.join(root, day, resolution)
+    try:
+        with open(os.path.join(path, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    names = ['timestamp'] + [c for c in (columns or schema) if c != 'timestamp' and c in schema]
+    # Rollups are merged by sample count even if the caller did not ask for it
+    extra = ['count'] if resolution != 'raw' and 'count' in schema and 'count' not in names else []
+    names += extra
+    sizes = {}
+    for name in names:
+        try:
+            sizes[name] = os.path.getsize(os.path.join(path, f"{name}.bin")) // np.dtype(schema[name]).itemsize
+        except OSError:
+            sizes[name] = 0
+    # A crash between column writes can leave some files one flush ahead
+    length = min(sizes.values()) if sizes else 0
+    result = {}
+    for name in names:
+        if length:
+            result[name] = np.memmap(os.path.join(path, f"{name}.bin"), dtype=schema[name], mode='r',
+                                     shape=(length,))
+        else:
+            result[name] = np.empty(0, dtype=schema[name])
+    if resolution != 'raw' and length:
+        result = merge_buckets(result)
+    for name in extra:
+        del result[name]
+    return result
+
+
+def query(start, end, resolution='raw', columns=None, root=STORE_DIR):
+    """Return {column: array} for samples with start <= timestamp < end (datetimes)"""
+    parts = []
+    day = start.date()
+    while day <= end.date():
+        data = load_day(day.strftime('%Y-%m-%d'), resolution, columns, root)
+        if data and len(data['timestamp']):
+            timestamps = data['timestamp']
+            lo = np.searchsorted(timestamps, start.timestamp(), side='left')
+            hi = np.searchsorted(timestamps, end.timestamp(), side='left')
+            parts.append({name: values[lo:hi] for name, values in data.items()})
+        day += timedelta(days=1)
+    if not parts:
+        return {}
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def export_csv(data, output):
+    """Write a query result as CSV (flags and missing values as in the monitor's CSV)"""
+    names = list(data)
+    writer = csv.writer(output)
+    writer.writerow(names)
+    columns = []
+    for name in names:
+        values = data[name]
+        if name == 'timestamp':
+            columns.append([datetime.fromtimestamp(t).strftime(TIMESTAMP_FORMAT)[:-3] for t in values])
+        elif values.dtype == np.uint8:
+            columns.append(['' if v == FLAG_MISSING else str(bool(v)) for v in values])
+        elif values.dtype.kind == 'f':
+            columns.append(['' if np.isnan(v) else f"{v:.6g}" for v in values])
+        else:
+            columns.append(values.tolist())
+    writer.writerows(zip(*columns))
+
+
+def summarize(data):
+    """Print min/avg/max per column of a query result"""
+    count = len(data.get('timestamp', []))
+    if not count:
+        print("No samples in range")
+        return
+    first = datetime.fromtimestamp(data['timestamp'][0]).strftime('%Y-%m-%d %H:%M:%S')
+    last = datetime.fromtimestamp(data['timestamp'][-1]).strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{count} rows from {first} to {last}")
+    for name, values in data.items():
+        if name == 'timestamp':
+            continue
+        values = _as_float(values, values.dtype)
+        if np.isnan(values).all():
+            print(f"  {name:<28} no data")
+            continue
+        print(f"  {name:<28} min {np.nanmin(values):>14.6g}  avg {np.nanmean(values):>14.6g}  "
+              f"max {np.nanmax(values):>14.6g}")
+
+
+def parse_time(value, day):
+    """Parse HH:MM[:SS] relative to day, or a full 'YYYY-MM-DD HH:MM[:SS]'"""
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%H:%M:%S', '%H:%M'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt.startswith('%H'):
+            parsed = datetime.combine(day, parsed.time())
+        return parsed
+    raise argparse.ArgumentTypeError(f"Invalid time: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the columnar system metrics store')
+    parser.add_argument('command', choices=['days', 'query', 'export'], help='Action to run')
+    parser.add_argument('--root', type=str, default=STORE_DIR, help=f'Store directory (default: {STORE_DIR})')
+    parser.add_argument('--day', type=str, default=datetime.now().strftime('%Y-%m-%d'),
+                        help='Day to read, YYYY-MM-DD (default: today)')
+    parser.add_argument('--start', type=str, default=None, help='Start time, HH:MM or "YYYY-MM-DD HH:MM"')
+    parser.add_argument('--end', type=str, default=None, help='End time, HH:MM or "YYYY-MM-DD HH:MM"')
+    parser.add_argument('--resolution', choices=RESOLUTIONS, default='1m', help='Table to read (default: 1m)')
+    parser.add_argument('--columns', type=str, default=None, help='Comma separated columns (default: all)')
+    parser.add_argument('--output', '-o', type=str, default=None, help='CSV file for export (default: stdout)')
+    args = parser.parse_args()
+
+    if args.command == 'days':
+        for day in list_days(args.root):
+            print(day)
+        return
+
+    day = datetime.strptime(args.day, '%Y-%m-%d')
+    start = parse_time(args.start, day.date()) if args.start else day
+    end = parse_time(args.end, day.date()) if args.end else day + timedelta(days=1)
+    columns = args.columns.split(',') if args.columns else None
+    if columns and args.resolution != 'raw':
+        columns = [f"{c}_{stat}" for c in columns for stat in ROLLUP_STATS if c != 'timestamp'] + ['count']
+    data = query(start, end, args.resolution, columns, args.root)
+
+    if args.command == 'query':
+        summarize(data)
+    elif args.output:
+        with open(args.output, 'w', newline='') as f:
+            export_csv(data, f)
+        print(f"✓ Exported {len(data.get('timestamp', []))} rows to {args.output}")
+    else:
+        export_csv(data, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
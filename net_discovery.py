@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+LAN Device Discovery
+Resolves a MAC address to an IP without spawning ping/arp processes:
+sends one batch of UDP probes to the local subnet so the kernel fills its
+neighbor table, then reads /proc/net/arp. Results are cached on disk so the
+common case resolves from the cache in a few milliseconds.
+"""
+
+import argparse
+import asyncio
+import fcntl
+import ipaddress
+import json
+import os
+import socket
+import struct
+import time
+
+CACHE_PATH = "/var/tmp/scout-mac-cache.json"
+PROBE_PORT = 9  # discard service; the probe only needs to trigger ARP
+SWEEP_TIMEOUT = 1.0  # seconds to wait for ARP replies after a sweep
+VERIFY_TIMEOUT = 0.3  # seconds to wait after probing a cached IP
+POLL_INTERVAL = 0.02
+MAX_SWEEP_PREFIX = 24  # larger subnets are swept as the /24 around our address
+ARP_FLAG_COMPLETE = 0x2
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+
+
+def normalize_mac(mac_address):
+    return mac_address.strip().lower().replace('-', ':')
+
+
+def read_arp_table():
+    """Return {mac: (ip, interface)} for complete entries in /proc/net/arp"""
+    table = {}
+    try:
+        with open('/proc/net/arp') as f:
+            next(f)  # header
+            for line in f:
+                parts = line.split()
+                if len(parts) < 6:
+                    continue
+                ip, _, flags, mac, _, iface = parts[:6]
+                if int(flags, 16) & ARP_FLAG_COMPLETE and mac != "00:00:00:00:00:00":
+                    table[mac.lower()] = (ip, iface)
+    except OSError as e:
+        print(f"Could not read ARP table: {e}")
+    return table
+
+
+def _interface_ipv4(iface, request):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        packed = fcntl.ioctl(s.fileno(), request, struct.pack('256s', iface[:15].encode()))
+    return socket.inet_ntoa(packed[20:24])
+
+
+def get_local_networks():
+    """Return a list of (interface, IPv4Interface) for up, non-loopback interfaces"""
+    networks = []
+    try:
+        with open('/proc/net/route') as f:
+            next(f)  # header
+            ifaces = []
+            for line in f:
+                iface = line.split()[0]
+                if iface != 'lo' and iface not in ifaces:
+                    ifaces.append(iface)
+    except OSError:
+        ifaces = [name for _, name in socket.if_nameindex() if name != 'lo']
+
+    for iface in ifaces:
+        try:
+            address = _interface_ipv4(iface, SIOCGIFADDR)
+            netmask = _interface_ipv4(iface, SIOCGIFNETMASK)
+        except OSError:
+            continue
+        interface = ipaddress.IPv4Interface(f"{address}/{netmask}")
+        if interface.network.prefixlen < MAX_SWEEP_PREFIX:
+            interface = ipaddress.IPv4Interface(f"{address}/{MAX_SWEEP_PREFIX}")
+        networks.append((iface, interface))
+    return networks
+
+
+def load_cache(cache_path=CACHE_PATH):
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(mac_address, ip, iface, cache_path=CACHE_PATH):
+    cache = load_cache(cache_path)
+    cache[normalize_mac(mac_address)] = {'ip': ip, 'iface': iface, 'seen': time.time()}
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+        os.chmod(cache_path, 0o666)
+    except OSError as e:
+        print(f"Could not save MAC cache: {e}")
+
+
+async def _wait_writable(sock):
+    """Wait until a non-blocking socket can send again (loop.sock_sendto needs Python 3.11)"""
+    loop = asyncio.get_running_loop()
+    writable = loop.create_future()
+    loop.add_writer(sock.fileno(), lambda: writable.done() or writable.set_result(None))
+    try:
+        await writable
+    finally:
+        loop.remove_writer(sock.fileno())
+
+
+async def _send_probes(addresses):
+    """Send one empty UDP datagram to every address from a single socket"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        for address in addresses:
+            while True:
+                try:
+                    sock.sendto(b'', (str(address), PROBE_PORT))
+                except BlockingIOError:
+                    await _wait_writable(sock)  # send buffer full, retry this address
+                    continue
+                except OSError:
+                    pass  # unreachable hosts or a full neighbor queue are expected
+                break
+
+
+async def _wait_for_mac(mac_address, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        entry = read_arp_table().get(mac_address)
+        if entry or time.monotonic() >= deadline:
+            return entry
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def discover(mac_address, cache_path=CACHE_PATH, use_cache=True):
+    """Resolve a MAC address to (ip, interface), or None"""
+    mac_address = normalize_mac(mac_address)
+
+    # 1. Already in the neighbor table
+    entry = read_arp_table().get(mac_address)
+    if entry:
+        return entry
+
+    # 2. Probe the last known IP only
+    cached = load_cache(cache_path).get(mac_address) if use_cache else None
+    if cached:
+        await _send_probes([cached['ip']])
+        entry = await _wait_for_mac(mac_address, VERIFY_TIMEOUT)
+        if entry:
+            return entry
+
+    # 3. Sweep every local subnet in one batch
+    networks = get_local_networks()
+    addresses = []
+    for _, interface in networks:
+        addresses.extend(h for h in interface.network.hosts() if h != interface.ip)
+    if not addresses:
+        print("No local IPv4 networks found for discovery")
+        return None
+    print(f"Probing {len(addresses)} addresses on {', '.join(str(i.network) for _, i in networks)}...")
+    await _send_probes(addresses)
+    return await _wait_for_mac(mac_address, SWEEP_TIMEOUT)
+
+
+def resolve_mac(mac_address, cache_path=CACHE_PATH, use_cache=True):
+    """Synchronous wrapper: return the IP for a MAC address, or None"""
+    start = time.monotonic()
+    try:
+        entry = asyncio.run(discover(mac_address, cache_path, use_cache))
+    except Exception as e:
+        print(f"Error during network discovery: {e}")
+        return None
+    elapsed = (time.monotonic() - start) * 1000
+    if not entry:
+        print(f"✗ Target MAC {mac_address} not found ({elapsed:.0f} ms)")
+        return None
+    ip, iface = entry
+    print(f"✓ Found target MAC {mac_address} at IP {ip} on {iface} ({elapsed:.0f} ms)")
+    save_cache(mac_address, ip, iface, cache_path)
+    return ip
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve a MAC address to an IP on the local network')
+    parser.add_argument('mac', help='MAC address, e.g. 14:98:77:7c:8f:08')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore the on-disk MAC cache')
+    parser.add_argument('--cache', type=str, default=CACHE_PATH, help=f'Cache file (default: {CACHE_PATH})')
+    args = parser.parse_args()
+    ip = resolve_mac(args.mac, cache_path=args.cache, use_cache=not args.no_cache)
+    if not ip:
+        raise SystemExit(1)
+    print(ip)
+
+
+if __name__ == "__main__":
+    main()
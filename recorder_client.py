@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Recorder API Client
+Non-blocking control of the per-camera recorder APIs for the Tk UI.
+Requests run on one worker thread per camera (so start/stop for a camera
+stay in order while cameras are driven concurrently), over a keep-alive
+session with strict timeouts. Each camera's /events status stream is read
+over one persistent connection. Results and events are handed back to the
+Tk main loop through a queue drained with after(), never touching widgets
+from a worker. Without a Tk root (headless use, e.g. grid_controller.py)
+callbacks run directly on the worker threads.
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = 1.0  # seconds; the APIs are on localhost or the LAN
+READ_TIMEOUT = 8.0  # seconds; a stop waits up to 5s for ffmpeg to exit
+POLL_INTERVAL_MS = 50  # how often the Tk loop picks up finished requests
+EVENT_READ_TIMEOUT = 30.0  # seconds; recorders send a keep-alive every 15s
+EVENT_RETRY_MIN = 1.0  # seconds before reconnecting a dropped event stream
+EVENT_RETRY_MAX = 15.0
+
+RecorderResult = namedtuple('RecorderResult', ['api_url', 'path', 'ok', 'status_code', 'text', 'error',
+                                               'elapsed_ms'])
+
+
+class RecorderClient:
+    """Dispatches recorder API calls off the Tk thread and delivers results with after()"""
+
+    def __init__(self, tk_root=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        self.tk_root = tk_root
+        self.timeout = timeout
+        self.workers = {}  # api_url -> (executor, session)
+        self.lock = threading.Lock()
+        self.results = queue.Queue()
+        self.closed = False
+        if self.tk_root is not None:
+            self.tk_root.after(POLL_INTERVAL_MS, self._deliver)
+
+    def _worker(self, api_url):
+        with self.lock:
+            if api_url not in self.workers:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"recorder-{len(self.workers)}")
+                self.workers[api_url] = (executor, session)
+            return self.workers[api_url]
+
+    def _request(self, session, api_url, path, params):
+        start = time.perf_counter()
+        try:
+            response = session.get(f"{api_url}{path}", params=params, timeout=self.timeout)
+            return RecorderResult(api_url, path, response.ok, response.status_code, response.text, None,
+                                  (time.perf_counter() - start) * 1000)
+        except requests.RequestException as e:
+            return RecorderResult(api_url, path, False, None, None, e, (time.perf_counter() - start) * 1000)
+
+    def submit(self, api_url, path, params=None, callback=None):
+        """Queue GET api_url + path; callback(result) runs on the Tk thread when it completes"""
+        if self.closed:
+            return None
+        executor, session = self._worker(api_url)
+
+        def run():
+            result = self._request(session, api_url, path, params)
+            self.deliver(callback, result)
+
+        return executor.submit(run)
+
+    def submit_all(self, requests_by_url, callback=None):
+        """Send one request per camera concurrently: {api_url: (path, params)}"""
+        for api_url, (path, params) in requests_by_url.items():
+            self.submit(api_url, path, params, callback)
+
+    def subscribe_events(self, api_url, callback, path='/events'):
+        """Follow api_url's server-sent status events; callback(status) runs on the Tk thread.
+
+        status is the decoded event data, or None while the recorder is unreachable.
+        The connection is re-opened with backoff until shutdown().
+        """
+        thread = threading.Thread(target=self._event_loop, args=(api_url, path, callback), daemon=True,
+                                  name=f"recorder-events-{api_url}")
+        thread.start()
+        return thread
+
+    def _event_loop(self, api_url, path, callback):
+        session = requests.Session()
+        backoff = EVENT_RETRY_MIN
+        while not self.closed:
+            try:
+                with session.get(f"{api_url}{path}", stream=True,
+                                 timeout=(self.timeout[0], EVENT_READ_TIMEOUT)) as response:
+                    response.raise_for_status()
+                    backoff = EVENT_RETRY_MIN
+                    data_lines = []
+                    # chunk_size=1 hands over each event as soon as it arrives instead of
+                    # waiting for a full read buffer; events are a few hundred bytes a second
+                    for line in response.iter_lines(chunk_size=1, decode_unicode=True):
+                        if self.closed:
+                            return
+                        if line.startswith('data:'):
+                            data_lines.append(line[5:].lstrip())
+                        elif not line and data_lines:
+                            self.deliver(callback, json.loads('\n'.join(data_lines)))
+                            data_lines = []
+            except (requests.RequestException, ValueError):
+                pass
+            if self.closed:
+                return
+            self.deliver(callback, None)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, EVENT_RETRY_MAX)
+
+    def deliver(self, callback, result):
+        """Run callback(result) on the Tk thread, or right away when headless"""
+        if self.tk_root is None:
+            self._call(callback, result)
+        else:
+            self.results.put((callback, result))
+
+    def _call(self, callback, result):
+        if callback:
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"Error handling recorder response: {e}")
+
+    def _deliver(self):
+        while True:
+            try:
+                callback, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self._call(callback, result)
+        if not self.closed:
+            self.tk_root.after(POLL_INTERVAL_MS, self._deliver)
+
+    def shutdown(self, wait=False):
+        """Stop accepting requests; with wait=True queued requests finish first, otherwise they are dropped"""
+        self.closed = True
+        for executor, session in self.workers.values():
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+            if wait:
+                session.close()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Recording Governor
+Watches temperature and the firmware throttle/under-voltage flags and applies
+graded degradation through the frame recorder API (lower fps, keyframe-only
+decode) and a transfer pause flag read by ftpserver.py. Settings are restored
+step by step once the Pi has recovered for RECOVERY_SECONDS.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+GOVERNOR_STATUS_PATH = "/tmp/scout-governor.json"
+CHECK_INTERVAL = 2  # seconds between checks
+RECOVERY_SECONDS = 60  # conditions must stay below a level this long before stepping down
+REAPPLY_INTERVAL = 30  # seconds; re-send settings so restarted recorders pick them up
+TEMP_HYSTERESIS = 5.0  # degrees C below a level's threshold before it counts as recovered
+RECORDER_PORTS = (5000, 5001, 5002)  # bottom, middle, top
+REQUEST_TIMEOUT = 3  # seconds; recorders store new settings and restart ffmpeg in the background
+STATUS_MAX_AGE = 5 * CHECK_INTERVAL  # status older than this is treated as normal
+
+# Graded policies, mildest first. A level is entered when any of its flags is
+# set or the temperature reaches its threshold.
+LEVELS = [
+    {'name': 'normal', 'temperature': None, 'flags': (),
+     'fps': 1 / 0.7, 'keyframes_only': False, 'transfers': 'normal'},
+    {'name': 'warm', 'temperature': 75.0, 'flags': ('soft_temp_limit', 'arm_freq_capped'),
+     'fps': 1.0, 'keyframes_only': False, 'transfers': 'background'},
+    {'name': 'throttled', 'temperature': 80.0, 'flags': ('currently_throttled',),
+     'fps': 0.5, 'keyframes_only': True, 'transfers': 'paused'},
+    {'name': 'critical', 'temperature': 84.0, 'flags': ('under_voltage',),
+     'fps': 0.25, 'keyframes_only': True, 'transfers': 'paused'},
+]
+
+
+def log(message):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+
+
+def level_for(metrics, temperature_offset=0.0):
+    """Return (level index, reasons) for a metrics sample"""
+    level, reasons = 0, []
+    temperature = metrics.get('cpu_temperature')
+    for index, policy in enumerate(LEVELS[1:], start=1):
+        triggered = [flag for flag in policy['flags'] if metrics.get(flag)]
+        threshold = policy['temperature']
+        if temperature is not None and threshold is not None and temperature >= threshold - temperature_offset:
+            triggered.append(f"temperature {temperature:.1f}C")
+        if triggered:
+            level, reasons = index, triggered
+    return level, reasons
+
+
+class RecordingGovernor:
+    """Maps system health to a degradation level and applies its policy"""
+
+    def __init__(self, host='localhost', ports=RECORDER_PORTS, status_path=GOVERNOR_STATUS_PATH,
+                 recovery_seconds=RECOVERY_SECONDS, dry_run=False):
+        self.host = host
+        self.ports = ports
+        self.status_path = status_path
+        self.recovery_seconds = recovery_seconds
+        self.dry_run = dry_run
+        self.level = 0
+        self.reasons = []
+        self.recovered_since = None
+        self.applied = {}  # port -> (level, monotonic time) last applied successfully
+        self.failed = {}  # port -> (level, monotonic time) of the last failed attempt
+        self.session = None
+
+    def update(self, metrics):
+        """Escalate immediately; step down one level after a sustained recovery"""
+        target, reasons = level_for(metrics)
+        now = time.monotonic()
+        if target > self.level:
+            log(f"Escalating {LEVELS[self.level]['name']} -> {LEVELS[target]['name']}: {', '.join(reasons)}")
+            self.level, self.reasons = target, reasons
+            self.recovered_since = None
+            return True
+
+        # Still at the current level (with hysteresis) means not recovered yet
+        held, held_reasons = level_for(metrics, temperature_offset=TEMP_HYSTERESIS)
+        if self.level == 0 or held >= self.level:
+            self.recovered_since = None
+            if held_reasons:
+                self.reasons = held_reasons
+            return False
+        if self.recovered_since is None:
+            self.recovered_since = now
+            return False
+        if now - self.recovered_since < self.recovery_seconds:
+            return False
+        log(f"Recovered for {self.recovery_seconds}s, stepping down "
+            f"{LEVELS[self.level]['name']} -> {LEVELS[self.level - 1]['name']}")
+        self.level -= 1
+        self.reasons = held_reasons
+        self.recovered_since = now if self.level > 0 else None
+        return True
+
+    def apply_recorders(self, force=False):
+        import requests
+        if self.session is None:
+            self.session = requests.Session()
+        policy = LEVELS[self.level]
+        now = time.monotonic()
+        for port in self.ports:
+            last = self.applied.get(port)
+            if not force and last and last[0] == self.level and now - last[1] < REAPPLY_INTERVAL:
+                continue
+            # An offline recorder, or a video recorder without /governor, is retried
+            # every REAPPLY_INTERVAL (or on the next level change), not on every check
+            failed = self.failed.get(port)
+            if failed and failed[0] == self.level and now - failed[1] < REAPPLY_INTERVAL:
+                continue
+            params = {'fps': f"{policy['fps']:.3f}", 'keyframes': int(policy['keyframes_only'])}
+            if self.dry_run:
+                log(f"(dry run) recorder :{port} <- {params}")
+                self.applied[port] = (self.level, now)
+                continue
+            try:
+                response = self.session.post(f"http://{self.host}:{port}/governor", data=params,
+                                             timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                if failed is None:
+                    if getattr(e.response, 'status_code', None) == 404:
+                        log(f"Recorder :{port} has no /governor endpoint (video mode), "
+                            f"checking again every {REAPPLY_INTERVAL}s")
+                    else:
+                        log(f"✗ Could not apply {policy['name']} policy to recorder :{port}: {e}")
+                self.failed[port] = (self.level, now)
+                continue
+            self.failed.pop(port, None)
+            if last is None or last[0] != self.level or failed:
+                log(f"✓ Recorder :{port} set to {policy['fps']:.2f} fps"
+                    f"{', keyframes only' if policy['keyframes_only'] else ''}")
+            self.applied[port] = (self.level, now)
+
+    def publish(self, metrics):
+        policy = LEVELS[self.level]
+        status = {
+            'level': self.level,
+            'name': policy['name'],
+            'reasons': self.reasons,
+            'fps': policy['fps'],
+            'keyframes_only': policy['keyframes_only'],
+            'transfers': policy['transfers'],
+            'cpu_temperature': metrics.get('cpu_temperature'),
+            'updated': time.time(),
+        }
+        tmp_path = f"{self.status_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(status, f)
+            os.replace(tmp_path, self.status_path)
+        except OSError as e:
+            log(f"Could not write governor status: {e}")
+
+    def run(self, interval=CHECK_INTERVAL):
+        from system_monitor import Sampler
+        sampler = Sampler()
+        log(f"Recording governor checking every {interval}s, recorders on ports "
+            f"{', '.join(str(p) for p in self.ports)}")
+        try:
+            while True:
+                metrics = sampler.sample()
+                changed = self.update(metrics)
+                if changed:
+                    log(f"Transfers: {LEVELS[self.level]['transfers']}")
+                self.apply_recorders(force=changed)
+                self.publish(metrics)
+                time.sleep(interval)
+        finally:
+            sampler.close()
+
+
+def read_governor_status(status_path=GOVERNOR_STATUS_PATH, max_age=STATUS_MAX_AGE):
+    """Return the published governor state; missing or stale state means normal operation"""
+    try:
+        with open(status_path) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return {'level': 0, 'name': 'normal', 'transfers': 'normal'}
+    if time.time() - status.get('updated', 0) > max_age:
+        return {'level': 0, 'name': 'normal', 'transfers': 'normal'}
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Thermal and under-voltage aware recording governor')
+    parser.add_argument('--interval', type=float, default=CHECK_INTERVAL,
+                        help=f'Seconds between checks (default: {CHECK_INTERVAL})')
+    parser.add_argument('--host', type=str, default='localhost', help='Recorder API host (default: localhost)')
+    parser.add_argument('--ports', type=str, default=','.join(str(p) for p in RECORDER_PORTS),
+                        help='Comma separated recorder API ports (default: 5000,5001,5002)')
+    parser.add_argument('--recovery', type=float, default=RECOVERY_SECONDS,
+                        help=f'Seconds of recovery before stepping down a level (default: {RECOVERY_SECONDS})')
+    parser.add_argument('--status-path', type=str, default=GOVERNOR_STATUS_PATH,
+                        help=f'Status file (default: {GOVERNOR_STATUS_PATH})')
+    parser.add_argument('--dry-run', action='store_true', help='Log actions without calling the recorders')
+    args = parser.parse_args()
+
+    governor = RecordingGovernor(args.host, [int(p) for p in args.ports.split(',')], args.status_path,
+                                 args.recovery, args.dry_run)
+    try:
+        governor.run(args.interval)
+    except KeyboardInterrupt:
+        print("\nGovernor stopped")
+
+
+if __name__ == "__main__":
+    main()
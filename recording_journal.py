@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Recording Journal
+Write-ahead journal of recording lifecycle events for the recorder APIs.
+Each recorder appends one JSON line per event (intent before ffmpeg is
+launched, started with its pid, stopped/exited when it ends) and fsyncs it,
+so after a crash the next recorder process can find ffmpeg children that
+outlived it, adopt or stop them, repair their partial output and tell the
+UI which grid was being recorded. ffmpeg's stderr goes to a per-session
+log file next to the journal rather than a pipe, so an orphan outlives its
+recorder without SIGPIPE.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import signal
+import threading
+import time
+
+JOURNAL_DIR = os.path.expanduser("~/Desktop/scout-videos/journal")
+OPEN_STATES = ('intent', 'started')  # sessions in these states had no clean end
+KEEP_SESSIONS = 50  # sessions kept when the journal is compacted
+COMPACT_LINES = 4 * KEEP_SESSIONS  # lines appended before a session end compacts the journal
+CLOSING_EVENTS = ('stopped', 'exited', 'recovered')
+JPEG_END = b'\xff\xd9'
+MP4_FRAGMENT_END = (b'moov', b'mdat', b'mfra')  # a box that completes the init segment or a fragment
+
+
+def journal_path(port, journal_dir=JOURNAL_DIR):
+    return os.path.join(journal_dir, f"recorder_{port}.jsonl")
+
+
+def process_start_time(pid):
+    """Start time of pid in clock ticks since boot (from /proc), or None if it is not running"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces; fields after it are space separated
+    fields = stat[stat.rindex(')') + 2:].split()
+    if fields[0] == 'Z':
+        return None
+    return int(fields[19])
+
+
+def process_cmdline(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", 'rb') as f:
+            return [arg.decode(errors='replace') for arg in f.read().split(b'\0') if arg]
+    except OSError:
+        return []
+
+
+class OrphanProcess:
+    """Popen-like handle for an ffmpeg left behind by a previous recorder process.
+
+    It is not our child, so exit is detected by polling /proc; the pid's
+    start time guards against the pid having been reused.
+    """
+
+    def __init__(self, pid, start_time):
+        self.pid = pid
+        self.start_time = start_time
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None and process_start_time(self.pid) != self.start_time:
+            self.returncode = 0  # the real exit status went to init
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                import subprocess
+                raise subprocess.TimeoutExpired(f"pid {self.pid}", timeout)
+            time.sleep(0.1)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class RecordingJournal:
+    """Append-only JSONL journal of recording sessions for one recorder"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One recorder per journal: a second instance on the same port must not
+        # adopt or stop the first one's ffmpeg
+        self.lock_file = open(f"{path}.lock", 'w')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.lock_file.close()
+            raise RuntimeError(f"{path} is in use by another recorder")
+        self.file = open(path, 'a')
+        self.appended = 0  # lines written since the journal was last compacted
+
+    def log_path(self, session):
+        """Where the session's ffmpeg writes its stderr"""
+        return f"{self.path[:-len('.jsonl')]}_{session}.log"
+
+    def record(self, event, session, **fields):
+        """Append an event for a session and fsync it before returning.
+
+        Ending a session compacts the journal once COMPACT_LINES have been
+        appended, so it (and /session, which replays it) stays small on a
+        recorder that runs for weeks.
+        """
+        entry = {'time': round(time.time(), 3), 'event': event, 'session': session, **fields}
+        line = json.dumps(entry) + '\n'
+        with self.lock:
+            try:
+                self.file.write(line)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.appended += 1
+                if event in CLOSING_EVENTS and self.appended >= COMPACT_LINES:
+                    self._compact()
+            except OSError as e:
+                print(f"✗ Could not write recording journal {self.path}: {e}")
+        return entry
+
+    def sessions(self):
+        """Replay the journal into {session: merged state}, in the order sessions were opened"""
+        return read_sessions(self.path)
+
+    def open_sessions(self):
+        return [s for s in self.sessions().values() if s['event'] in OPEN_STATES]
+
+    def last_session(self):
+        sessions = list(self.sessions().values())
+        return sessions[-1] if sessions else None
+
+    def compact(self):
+        """Rewrite the journal with one line per session, keeping the most recent ones"""
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        sessions = list(self.sessions().values())
+        # Open sessions are kept however old; their ffmpeg may still need recovering
+        kept = [s for i, s in enumerate(sessions)
+                if i >= len(sessions) - KEEP_SESSIONS or s['event'] in OPEN_STATES]
+        with open(tmp_path, 'w') as f:
+            for session in kept:
+                f.write(json.dumps(session) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.file.close()
+        self.file = open(self.path, 'a')
+        self.appended = 0
+        kept_names = {s['session'] for s in kept}
+        for session in sessions:
+            if session['session'] not in kept_names:
+                try:
+                    os.remove(self.log_path(session['session']))
+                except OSError:
+                    pass
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+            self.lock_file.close()
+
+
+def read_sessions(path):
+    sessions = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from a crash mid-write
+                session = sessions.setdefault(entry.get('session'), {'opened': entry.get('time')})
+                session.update(entry)
+    except OSError:
+        pass
+    return sessions
+
+
+def is_ffmpeg_writing(pid, output):
+    cmdline = process_cmdline(pid)
+    return bool(cmdline) and os.path.basename(cmdline[0]) == 'ffmpeg' and output in cmdline
+
+
+def find_orphan(session):
+    """Return an OrphanProcess if the session's ffmpeg is still running, else None"""
+    output = session.get('output')
+    pid, start_time = session.get('pid'), session.get('pid_start')
+    if pid:
+        if start_time is not None and process_start_time(pid) == start_time and is_ffmpeg_writing(pid, output):
+            return OrphanProcess(pid, start_time)
+        return None
+    # Crashed between launching ffmpeg and journaling its pid: look for it by output path
+    for name in os.listdir('/proc'):
+        if name.isdigit() and is_ffmpeg_writing(int(name), output):
+            start_time = process_start_time(int(name))
+            if start_time is not None:
+                return OrphanProcess(int(name), start_time)
+    return None
+
+
+def log_tail(path, lines=20):
+    """Last lines of an ffmpeg log, or [] if there is none"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(0, os.path.getsize(path) - 4096))
+            return f.read().decode(errors='replace').splitlines()[-lines:]
+    except OSError:
+        return []
+
+
+def stop_process(process, timeout=5):
+    """SIGTERM so ffmpeg finalizes its output; SIGKILL if it does not exit in time"""
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+        return True
+    except Exception:
+        process.kill()
+        return False
+
+
+def repair_frames(output_pattern):
+    """Finalize frames left by an interrupted frame recording.
+
+    Complete frames that never got their timestamp suffix are renamed the
+    way the recorder would have (using the file's mtime); a truncated last
+    frame is removed. Returns {'renamed': n, 'removed': n}.
+    """
+    directory = os.path.dirname(output_pattern)
+    prefix = os.path.basename(output_pattern).split('%', 1)[0]
+    renamed = removed = 0
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return {'renamed': renamed, 'removed': removed}
+    for name in names:
+        number = name[len(prefix):-len('.jpg')]
+        if not (name.startswith(prefix) and name.endswith('.jpg') and number.isdigit()):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path, 'rb') as f:
+                f.seek(max(0, os.path.getsize(path) - 2))
+                complete = f.read(2) == JPEG_END
+            if complete:
+                os.rename(path, os.path.join(directory, f"{name[:-len('.jpg')]}_{int(os.path.getmtime(path))}.jpg"))
+                renamed += 1
+            else:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            print(f"Could not repair {path}: {e}")
+    return {'renamed': renamed, 'removed': removed}
+
+
+def repair_fragmented_mp4(path):
+    """Truncate a fragmented MP4 after its last complete fragment.
+
+    Returns 'ok' (already complete), 'truncated', 'missing' or 'unrecoverable'
+    (no init segment, e.g. a plain MP4 whose moov was never written).
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 'missing'
+    good_end, has_moov, offset = 0, False, 0
+    with open(path, 'rb') as f:
+        while offset + 8 <= size:
+            f.seek(offset)
+            header = f.read(16)
+            box_size = int.from_bytes(header[:4], 'big')
+            box_type = header[4:8]
+            if box_size == 1 and len(header) == 16:
+                box_size = int.from_bytes(header[8:16], 'big')
+            elif box_size == 0:
+                box_size = size - offset  # box runs to the end of the file
+            if box_size < 8 or offset + box_size > size:
+                break
+            offset += box_size
+            if box_type == b'moov':
+                has_moov = True
+            if box_type in MP4_FRAGMENT_END:
+                good_end = offset
+    if not has_moov:
+        return 'unrecoverable'
+    if good_end == size:
+        return 'ok'
+    with open(path, 'r+b') as f:
+        f.truncate(good_end)
+        f.flush()
+        os.fsync(f.fileno())
+    return 'truncated'
+
+
+def recover(journal, rtsp_url, policy, adopt, repair):
+    """Settle the sessions a previous recorder process left open.
+
+    With policy 'adopt', the newest open session whose ffmpeg is still
+    running from the same source is handed to adopt(session, process) and
+    stays open in the journal. Every other survivor is stopped, its output
+    passed to repair(output), and the session closed as 'recovered'. The
+    journal is compacted afterwards. Returns one summary dict per session.
+    """
+    open_sessions = journal.open_sessions()
+    summaries = []
+    for i, session in enumerate(open_sessions):
+        name = session['session']
+        process = find_orphan(session)
+        newest = i == len(open_sessions) - 1
+        summary = {'session': name, 'grid': session.get('grid'), 'output': session.get('output')}
+        if process and policy == 'adopt' and newest and session.get('rtsp_url') == rtsp_url:
+            print(f"✓ Adopting ffmpeg {process.pid} still recording grid {session.get('grid')}")
+            journal.record('started', name, pid=process.pid, pid_start=process.start_time, adopted=True)
+            adopt(session, process)
+            summary['action'] = 'adopted'
+        else:
+            if process:
+                print(f"Stopping orphaned ffmpeg {process.pid} for grid {session.get('grid')}")
+                stop_process(process)
+            summary['action'] = 'stopped' if process else 'gone'
+            summary['repair'] = repair(session.get('output')) if session.get('output') else None
+            print(f"Recovered grid {session.get('grid')}: ffmpeg {summary['action']}, repair: {summary['repair']}")
+            journal.record('recovered', name, action=summary['action'], repair=summary['repair'])
+        summaries.append(summary)
+    journal.compact()
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect recorder journals')
+    parser.add_argument('--port', type=int, default=None, help='Recorder API port (default: all journals)')
+    parser.add_argument('--journal-dir', type=str, default=JOURNAL_DIR, help=f'Journal directory (default: {JOURNAL_DIR})')
+    args = parser.parse_args()
+
+    if args.port is not None:
+        paths = [journal_path(args.port, args.journal_dir)]
+    else:
+        try:
+            paths = sorted(os.path.join(args.journal_dir, name) for name in os.listdir(args.journal_dir)
+                           if name.endswith('.jsonl'))
+        except OSError:
+            paths = []
+    if not paths:
+        print(f"No journals in {args.journal_dir}")
+        return
+    for path in paths:
+        print(f"{os.path.basename(path)}:")
+        for session in list(read_sessions(path).values())[-10:]:
+            running = " (ffmpeg still running)" if session['event'] in OPEN_STATES and find_orphan(session) else ""
+            print(f"  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(session['time']))}  "
+                  f"{session.get('grid', '?'):<10} {session['event']:<10}{running}  {session.get('output', '')}")
+
+
+if __name__ == "__main__":
+    main()
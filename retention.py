@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Recording Retention Manager
+Frees space under ~/Desktop/scout-videos while the recorders keep running,
+replacing delete_except_newest.sh. Sessions (a frame folder
+recordings_<date>/<grid>-<position>/ or a video file) are removed oldest
+first when they are older than --max-age-days, when the captures exceed
+--max-size-gb, or when free space drops below --min-free-percent (until
+--target-free-percent is reached). A session is only ever deleted once the
+FTP server has recorded all of its captures as downloaded, and never while
+a recorder journal has it open or it was written to recently; inside a
+session only downloaded captures are removed, so frames a re-recorded grid
+adds meanwhile stay. Captures moved to the SSD by tiering.py (symlinks)
+count as 0 bytes towards the SD card limits: the size and free-space
+policies only delete files on the card, and the tiered copies are only
+deleted by age or by --tier-max-size-gb, which caps the tier volume.
+
+Directories are read with os.scandir in small batches and files are
+unlinked in batches with pauses, at idle I/O priority, so the SD card
+keeps serving the recorders.
+
+    python3 retention.py --once --dry-run    # what would be deleted now
+    python3 retention.py                     # service: check every 10 minutes
+"""
+
+import argparse
+import os
+import shutil
+import stat
+import subprocess
+import time
+from datetime import datetime
+
+from capture_catalog import SESSION_PREFIX, CaptureCatalog, parse_capture_name
+from recording_journal import JOURNAL_DIR, OPEN_STATES, read_sessions
+
+CAPTURE_ROOT = os.path.expanduser("~/Desktop/scout-videos")
+CHECK_INTERVAL = 600  # seconds between full retention passes
+FREE_CHECK_INTERVAL = 60  # seconds between free-space checks; low space triggers a pass early
+MAX_AGE_DAYS = 14  # downloaded sessions older than this are deleted (0 disables)
+MAX_SIZE_GB = 0  # cap on the total size of all captures on the SD card (0 disables)
+TIER_MAX_SIZE_GB = 0  # cap on the captures tiering.py moved to the tier volume (0 disables)
+MIN_FREE_PERCENT = 15  # free-space low watermark that starts deleting
+TARGET_FREE_PERCENT = 20  # deleting for free space stops here
+RECENT_SECONDS = 600  # sessions written to within this window are still in use
+SCAN_BATCH = 256  # directory entries read between pauses
+SCAN_PAUSE = 0.02  # seconds
+DELETE_BATCH = 64  # files unlinked between pauses
+DELETE_PAUSE = 0.05  # seconds
+NICENESS = 10
+
+
+def log(message):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+
+def lower_priority():
+    """Run at idle I/O priority (and a lower CPU priority) so the recorders' writes go first"""
+    try:
+        os.nice(NICENESS)
+    except OSError:
+        pass
+    if shutil.which('ionice') is None:
+        log("ionice not found, deleting at normal I/O priority")
+        return
+    try:
+        subprocess.run(['ionice', '-c', '3', '-p', str(os.getpid())], check=True, timeout=5,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.SubprocessError):
+        log("Could not set idle I/O priority, deleting at normal I/O priority")
+
+
+def scan_batched(path):
+    """Yield the entries of a directory, pausing after every SCAN_BATCH"""
+    with os.scandir(path) as it:
+        for count, entry in enumerate(it, start=1):
+            yield entry
+            if count % SCAN_BATCH == 0:
+                time.sleep(SCAN_PAUSE)
+
+
+def free_space(path):
+    st = os.statvfs(path)
+    return st.f_bavail * st.f_frsize, st.f_blocks * st.f_frsize
+
+
+def open_outputs(journal_dir=JOURNAL_DIR):
+    """Output paths (and save folders of RAM-staged frame recordings) a recorder journal still has open"""
+    outputs = set()
+    try:
+        names = [entry.name for entry in os.scandir(journal_dir) if entry.name.endswith('.jsonl')]
+    except OSError:
+        return outputs
+    for name in names:
+        for session in read_sessions(os.path.join(journal_dir, name)).values():
+            if session.get('event') in OPEN_STATES and session.get('output'):
+                outputs.add(session['output'])
+                if session.get('dest'):
+                    outputs.add(os.path.normpath(session['dest']))
+    return outputs
+
+
+class Session:
+    """A frame folder or a video file, with the totals retention needs"""
+
+    def __init__(self, path, is_dir):
+        self.path = path
+        self.is_dir = is_dir
+        self.size = 0  # bytes on this filesystem
+        self.tiered_size = 0  # bytes of the copies on the tier volume
+        self.files = 0
+        self.captures = 0
+        self.pending = 0  # captures not downloaded yet
+        self.newest = 0.0  # newest mtime of anything in it
+        self.local = 0  # files still on this filesystem (the rest were moved by tiering.py)
+
+    def add(self, st, capture, uploaded, local=True):
+        """Count a file; size is what it takes on this filesystem, so tiered files count as 0"""
+        self.size += st.st_blocks * 512 if local else 0
+        self.tiered_size += 0 if local else st.st_blocks * 512
+        self.files += 1
+        self.local += 1 if local else 0
+        self.newest = max(self.newest, st.st_mtime)
+        if capture:
+            self.captures += 1
+            self.pending += 0 if uploaded else 1
+
+
+def file_stat(path):
+    """(stat, local) for a regular file or a symlink to one (a capture moved by tiering.py), else None"""
+    st = os.stat(path, follow_symlinks=False)
+    if stat.S_ISREG(st.st_mode):
+        return st, True
+    if stat.S_ISLNK(st.st_mode):
+        try:
+            target = os.stat(path)
+        except OSError:
+            return None  # dangling: the tier volume is not mounted
+        if stat.S_ISREG(target.st_mode):
+            return target, False
+    return None
+
+
+class RetentionManager:
+    """Applies the age, size and free-space policies to the capture tree"""
+
+    def __init__(self, root=CAPTURE_ROOT, journal_dir=JOURNAL_DIR, max_age_days=MAX_AGE_DAYS,
+                 max_size_gb=MAX_SIZE_GB, min_free_percent=MIN_FREE_PERCENT,
+                 target_free_percent=TARGET_FREE_PERCENT, dry_run=False, tier_max_size_gb=TIER_MAX_SIZE_GB):
+        self.root = os.path.abspath(root)
+        self.journal_dir = journal_dir
+        self.max_age = max_age_days * 86400
+        self.max_size = max_size_gb * 1024 ** 3
+        self.tier_max_size = tier_max_size_gb * 1024 ** 3
+        self.min_free_percent = min_free_percent
+        self.target_free_percent = max(target_free_percent, min_free_percent)
+        self.dry_run = dry_run
+        self.catalog = CaptureCatalog(self.root)
+
+    def free_percent(self):
+        free, total = free_space(self.root)
+        return 100.0 * free / total if total else 100.0
+
+    def low_on_space(self):
+        return self.min_free_percent > 0 and self.free_percent() < self.min_free_percent
+
+    def _relpath(self, path):
+        return os.path.relpath(path, self.root)
+
+    def scan(self):
+        """Every session under the recordings_<date> folders, oldest first"""
+        uploaded = self.catalog.uploaded_paths()
+        sessions = []
+        try:
+            day_dirs = sorted(e.path for e in scan_batched(self.root)
+                              if e.name.startswith(SESSION_PREFIX) and e.is_dir(follow_symlinks=False))
+        except OSError as e:
+            log(f"Cannot read {self.root}: {e}")
+            return sessions
+        for day_dir in day_dirs:
+            try:
+                entries = list(scan_batched(day_dir))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        session = Session(entry.path, True)
+                        for child in scan_batched(entry.path):
+                            found = file_stat(child.path)
+                            if found:
+                                session.add(found[0], parse_capture_name(child.name) is not None,
+                                            self._relpath(child.path) in uploaded, found[1])
+                    else:
+                        found = file_stat(entry.path)
+                        if not found:
+                            continue
+                        session = Session(entry.path, False)
+                        session.add(found[0], parse_capture_name(entry.name) is not None,
+                                    self._relpath(entry.path) in uploaded, found[1])
+                    if session.is_dir and not session.files:
+                        session.newest = entry.stat(follow_symlinks=False).st_mtime
+                except OSError:
+                    continue  # removed while scanning
+                sessions.append(session)
+        return sorted(sessions, key=lambda s: s.newest)
+
+    def protection(self, session, active_outputs, now):
+        """Why a session must be kept, or None if it may be deleted"""
+        if session.path in active_outputs:
+            return 'recording'
+        if now - session.newest < RECENT_SECONDS:
+            return 'recent'
+        if session.pending:
+            return 'not downloaded'
+        return None
+
+    def _delete(self, session, active_outputs, scope='all'):
+        """Unlink the session's downloaded captures (and stale leftovers).
+
+        scope 'local' only touches files on the SD card (tiered captures keep their
+        link and copy), 'tiered' only the links and their copies on the tier volume.
+        Returns (bytes freed on the card, bytes freed on the tier volume, paths).
+        """
+        if self.protection(session, active_outputs, time.time()) is not None:
+            return 0, 0, []
+        uploaded = self.catalog.uploaded_paths()
+        now = time.time()
+        if session.is_dir:
+            try:
+                candidates = list(scan_batched(session.path))
+            except OSError:
+                return 0, 0, []
+        else:
+            candidates = [session.path]
+        freed, tier_freed, deleted = 0, 0, []
+        for path in [getattr(c, 'path', c) for c in candidates]:
+            try:
+                found = file_stat(path)
+            except OSError:
+                continue
+            if not found:
+                continue
+            st, local = found
+            if (scope == 'local' and not local) or (scope == 'tiered' and local):
+                continue
+            name = os.path.basename(path)
+            if parse_capture_name(name) is not None:
+                if self._relpath(path) not in uploaded:
+                    continue  # added after the scan (a re-recorded grid), not downloaded yet
+            elif now - st.st_mtime < RECENT_SECONDS:
+                continue
+            if not self.dry_run:
+                try:
+                    if not local:
+                        os.unlink(os.path.realpath(path))  # the copy on the tier volume
+                    os.unlink(path)
+                except OSError as e:
+                    log(f"Could not delete {path}: {e}")
+                    continue
+            freed += st.st_blocks * 512 if local else 0
+            tier_freed += 0 if local else st.st_blocks * 512
+            deleted.append(path)
+            if len(deleted) % DELETE_BATCH == 0:
+                time.sleep(DELETE_PAUSE)
+        if session.is_dir and not self.dry_run:
+            try:
+                os.rmdir(session.path)
+            except OSError:
+                pass  # something new arrived (or tiered captures stay); it stays
+        return freed, tier_freed, deleted
+
+    def run_once(self):
+        started = time.monotonic()
+        now = time.time()
+        free_before = self.free_percent()
+        free_bytes, disk_bytes = free_space(self.root)
+        # Below the low watermark, delete until the target is reached
+        free_needed = 0
+        if self.min_free_percent and free_before < self.min_free_percent:
+            free_needed = disk_bytes * self.target_free_percent / 100 - free_bytes
+        sessions = self.scan()
+        active_outputs = open_outputs(self.journal_dir)
+        # A frame session is recorded as a %04d pattern inside its folder
+        active_outputs |= {os.path.dirname(path) for path in active_outputs}
+        total = sum(s.size for s in sessions)
+        tier_total = sum(s.tiered_size for s in sessions)
+
+        kept = {}
+        candidates = []
+        for session in sessions:
+            reason = self.protection(session, active_outputs, now)
+            if reason:
+                kept[reason] = kept.get(reason, 0) + 1
+            else:
+                candidates.append(session)
+
+        deleted_sessions, freed, tier_freed, deleted_paths = 0, 0, 0, []
+        reasons = {}
+        for session in candidates:
+            # The SD card policies skip fully tiered sessions: deleting them frees nothing
+            # on the card and would only destroy the copy on the tier volume
+            if self.max_age and now - session.newest > self.max_age:
+                reason, scope = 'age', 'all'
+            elif self.max_size and session.size and total - freed > self.max_size:
+                reason, scope = 'size', 'local'
+            elif session.size and freed < free_needed:
+                reason, scope = 'free space', 'local'
+            elif self.tier_max_size and session.tiered_size and tier_total - tier_freed > self.tier_max_size:
+                reason, scope = 'tier size', 'tiered'
+            else:
+                continue
+            session_freed, session_tier_freed, paths = self._delete(session, active_outputs, scope)
+            if not paths:
+                continue
+            action = 'Would delete' if self.dry_run else 'Deleted'
+            log(f"{action} {self._relpath(session.path)} ({len(paths)} files, {session_freed / 1024 ** 2:.1f} MB"
+                f"{f' + {session_tier_freed / 1024 ** 2:.1f} MB tiered' if session_tier_freed else ''}, {reason})")
+            freed += session_freed
+            tier_freed += session_tier_freed
+            deleted_paths += paths
+            deleted_sessions += 1
+            reasons[reason] = reasons.get(reason, 0) + 1
+
+        if not self.dry_run:
+            if deleted_paths:
+                try:
+                    self.catalog.forget_uploaded(deleted_paths)
+                except OSError as e:
+                    log(f"Could not update the upload state: {e}")
+            self._remove_empty_days()
+
+        free_after = self.free_percent()
+        summary = ', '.join(f"{n} {r}" for r, n in sorted(kept.items())) or 'none'
+        log(f"{len(sessions)} sessions, {total / 1024 ** 3:.2f} GB; kept: {summary}; "
+            f"{'would delete' if self.dry_run else 'deleted'} {deleted_sessions} "
+            f"({', '.join(f'{n} {r}' for r, n in sorted(reasons.items())) or 'nothing due'}), "
+            f"{freed / 1024 ** 2:.1f} MB; free {free_before:.1f}% -> {free_after:.1f}% "
+            f"in {time.monotonic() - started:.1f}s")
+        if free_after < self.min_free_percent:
+            pending = kept.get('not downloaded', 0)
+            log(f"✗ Free space still below {self.min_free_percent}%: {pending} sessions are waiting to be downloaded")
+            if pending and not self.catalog.uploaded_paths():
+                log("✗ ftpserver.py has not recorded any downloads; retention cannot free space without it")
+        return {'sessions': len(sessions), 'deleted': deleted_sessions, 'freed': freed, 'kept': kept}
+
+    def _remove_empty_days(self):
+        today = f"{SESSION_PREFIX}{datetime.now().strftime('%Y-%m-%d')}"
+        try:
+            day_dirs = [e.path for e in scan_batched(self.root)
+                        if e.name.startswith(SESSION_PREFIX) and e.name != today and e.is_dir(follow_symlinks=False)]
+        except OSError:
+            return
+        for day_dir in day_dirs:
+            try:
+                os.rmdir(day_dir)  # only succeeds when empty
+                log(f"Removed empty {os.path.basename(day_dir)}")
+            except OSError:
+                pass
+
+    def run(self, interval=CHECK_INTERVAL):
+        log(f"Retention for {self.root}: max age {self.max_age / 86400:g} days, "
+            f"max size {self.max_size / 1024 ** 3:g} GB, tiered {self.tier_max_size / 1024 ** 3:g} GB (0 = off), free space {self.min_free_percent:g}% -> "
+            f"{self.target_free_percent:g}%, pass every {interval:g}s")
+        if not self.catalog.uploaded_paths():
+            log(f"✗ No download state in {self.catalog.state_dir}: nothing is deleted until ftpserver.py "
+                f"has served the captures (is the FTP server running on this root?)")
+        next_pass = 0
+        while True:
+            now = time.monotonic()
+            if now >= next_pass or self.low_on_space():
+                self.run_once()
+                next_pass = time.monotonic() + interval
+            time.sleep(min(FREE_CHECK_INTERVAL, interval))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Delete downloaded recordings by age, size and free space')
+    parser.add_argument('--root', type=str, default=CAPTURE_ROOT, help=f'Capture directory (default: {CAPTURE_ROOT})')
+    parser.add_argument('--journal-dir', type=str, default=JOURNAL_DIR,
+                        help=f'Recorder journals (default: {JOURNAL_DIR})')
+    parser.add_argument('--max-age-days', type=float, default=MAX_AGE_DAYS,
+                        help=f'Delete downloaded sessions older than this, 0 disables (default: {MAX_AGE_DAYS})')
+    parser.add_argument('--max-size-gb', type=float, default=MAX_SIZE_GB,
+                        help=f'Keep the captures under this size, 0 disables (default: {MAX_SIZE_GB})')
+    parser.add_argument('--tier-max-size-gb', type=float, default=TIER_MAX_SIZE_GB,
+                        help=f'Keep the captures tiering.py moved under this size, 0 disables (default: {TIER_MAX_SIZE_GB})')
+    parser.add_argument('--min-free-percent', type=float, default=MIN_FREE_PERCENT,
+                        help=f'Start deleting below this much free space, 0 disables (default: {MIN_FREE_PERCENT})')
+    parser.add_argument('--target-free-percent', type=float, default=TARGET_FREE_PERCENT,
+                        help=f'Stop deleting for free space here (default: {TARGET_FREE_PERCENT})')
+    parser.add_argument('--interval', type=float, default=CHECK_INTERVAL,
+                        help=f'Seconds between passes (default: {CHECK_INTERVAL})')
+    parser.add_argument('--once', action='store_true', help='Run one pass and exit')
+    parser.add_argument('--dry-run', action='store_true', help='Log what would be deleted without deleting')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"Error: Directory {args.root} does not exist.")
+        raise SystemExit(1)
+    lower_priority()
+    manager = RetentionManager(args.root, args.journal_dir, args.max_age_days, args.max_size_gb,
+                               args.min_free_percent, args.target_free_percent, args.dry_run, args.tier_max_size_gb)
+    try:
+        if args.once:
+            manager.run_once()
+        else:
+            manager.run(args.interval)
+    except KeyboardInterrupt:
+        print("\nRetention stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
-from flask import Flask, Response, request
+from flask import Flask, Response, request, jsonify
 import threading
 import subprocess
 import time
+import json
+import queue
 import argparse
 from datetime import datetime
 import os
 import getpass
+import sys
+from recording_journal import RecordingJournal, journal_path, process_start_time, recover, repair_fragmented_mp4
 
 # Global variables
 USERNAME = getpass.getuser()
@@ -14,69 +18,132 @@ REC_WIDTH = 1920
 REC_HEIGHT = 1080
 port = 0
 CURRENT_DATE = datetime.today().strftime('%Y-%m-%d')
+SAVE_ROOT = f"/home/{USERNAME}/Desktop/scout-videos"
+STATUS_INTERVAL = 1.0  # seconds between status events on /events
+EVENT_QUEUE_SIZE = 8  # status events buffered per /events client; the oldest are dropped
 print(f"Running as user: {USERNAME}")
 
 
 class RTSPStream:
-    def __init__(self, rtsp_url="rtsp://192.168.1.20:8554/", resolution=(REC_WIDTH, REC_HEIGHT)):
+    def __init__(self, rtsp_url="rtsp://192.168.1.20:8554/", resolution=(REC_WIDTH, REC_HEIGHT), journal=None):
         self.rtsp_url = rtsp_url
         self.resolution = resolution
         self.active_recordings = {}  # Dictionary to track recordings by grid_name
         self.recording_lock = threading.Lock()
+        # Write-ahead journal of recording lifecycles, replayed by recover_from_journal() on startup
+        self.journal = journal or RecordingJournal(journal_path(port))
+        self.recovered = []
+        # Push status for /events subscribers
+        self.subscribers = set()
+        self.subscribers_lock = threading.Lock()
+        self.status_changed = threading.Event()
+        self.last_error = None
+        threading.Thread(target=self._publish_status_loop, daemon=True).start()
 
     def start_recording(self, counter, grid_name):
+        stopping = []
+        try:
+            with self.recording_lock:
+                if grid_name in self.active_recordings:
+                    return f"Grid {grid_name} is already recording"
+
+                # One recording per camera: starting a new grid ends the previous one first.
+                # Requests are serialized by recording_lock, so overlapping start/stop calls queue up;
+                # the previous ffmpeg is only signalled here and finishes once the lock is released.
+                for other_grid in [g for g in self.active_recordings if g != grid_name]:
+                    print(f"Stopping grid {other_grid} before starting {grid_name}")
+                    stopping.append(self._stop_single_recording(other_grid))
+
+                print(f"Starting recording with counter: {counter}, grid: {grid_name}")
+                self.last_error = None
+
+                save_dir = f"{SAVE_ROOT}/recordings_{CURRENT_DATE}/"
+                os.makedirs(save_dir, exist_ok=True)
+
+                start_time = datetime.now()
+                filename = (
+                    f"ABC_GRID_{grid_name}_{counter}_recording_"
+                    f"{start_time.strftime('%Y%m%d_%H%M%S')}_{POSITION}.mp4"
+                )
+                output_path = os.path.join(save_dir, filename)
+
+                session = f"{grid_name}_{start_time.strftime('%Y%m%d_%H%M%S_%f')}"
+                self.journal.record('intent', session, grid=grid_name, counter=counter, output=output_path,
+                                    rtsp_url=self.rtsp_url)
+                self._register_recording(grid_name, {
+                    'session': session,
+                    'output_path': output_path,
+                    'start_time': start_time,
+                    'counter': counter,
+                })
+
+                return f"Started recording grid {grid_name} to {output_path}"
+        finally:
+            self._wait_stopped(stopping)
+
+    def _register_recording(self, grid_name, recording_info, process=None):
+        """Track a recording and start its thread; process is an adopted ffmpeg, or None to launch one"""
+        recording_thread = threading.Thread(target=self._record, args=(grid_name, recording_info, process),
+                                            daemon=True)
+        recording_info.update({
+            'thread': recording_thread,
+            'process': None,  # Will be set by the recording thread
+            'last_size': None  # (bytes, time) at the previous status snapshot
+        })
+        self.active_recordings[grid_name] = recording_info
+        recording_thread.start()
+        self.status_changed.set()
+
+    def _record(self, grid_name, recording_info, process=None):
+        output_path = recording_info['output_path']
+        session = recording_info['session']
+        if process is None:
+            print(f"Recording started: {output_path}")
+            # Fragmented MP4: the file is playable up to the last fragment even if ffmpeg is killed
+            process = subprocess.Popen([
+                'ffmpeg',
+                '-i', self.rtsp_url,
+                '-c', 'copy',
+                '-f', 'mp4',
+                '-movflags', '+frag_keyframe+empty_moov+default_base_moof',
+                output_path
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+            self.journal.record('started', session, pid=process.pid, pid_start=process_start_time(process.pid))
+        else:
+            print(f"Recording resumed: {output_path} (ffmpeg {process.pid})")
+
+        # Store the process in the recording info
         with self.recording_lock:
-            if grid_name in self.active_recordings:
-                return f"Grid {grid_name} is already recording"
-
-            print(f"Starting recording with counter: {counter}, grid: {grid_name}")
-
-            save_dir = f"/home/{USERNAME}/Desktop/scout-videos/recordings_{CURRENT_DATE}/"
-            os.makedirs(save_dir, exist_ok=True)
-
-            start_time = datetime.now()
-            filename = (
-                f"ABC_GRID_{grid_name}_{counter}_recording_"
-                f"{start_time.strftime('%Y%m%d_%H%M%S')}_{POSITION}.mp4"
-            )
-            output_path = os.path.join(save_dir, filename)
-
-            def record():
-                print(f"Recording started: {output_path}")
-                process = subprocess.Popen([
-                    'ffmpeg',
-                    '-i', self.rtsp_url,
-                    '-c', 'copy',
-                    '-f', 'mp4',
-                    output_path
-                ], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
-
-                # Store the process in the recording info
-                with self.recording_lock:
-                    if grid_name in self.active_recordings:
-                        self.active_recordings[grid_name]['process'] = process
-
-                process.wait()
-                print(f"Recording process ended: {output_path}")
-                
-                # Clean up the recording entry when process ends
-                with self.recording_lock:
-                    if grid_name in self.active_recordings:
-                        del self.active_recordings[grid_name]
-
-            recording_thread = threading.Thread(target=record, daemon=True)
-            
-            # Store recording information
-            self.active_recordings[grid_name] = {
-                'thread': recording_thread,
-                'process': None,  # Will be set by the recording thread
-                'output_path': output_path,
-                'start_time': start_time
-            }
-            
-            recording_thread.start()
+            owns_recording = self._owns_recording(grid_name)
+            if owns_recording:
+                self.active_recordings[grid_name]['process'] = process
+        if not owns_recording:
+            # Stopped before ffmpeg was running; don't leave it orphaned
+            print(f"Recording for grid {grid_name} was stopped during startup, terminating ffmpeg")
+            process.terminate()
+            # The stop was journaled before our 'started' entry; close the session again after it
+            self.journal.record('stopped', session, returncode=None)
+
+        process.wait()
+        print(f"Recording process ended: {output_path}")
 
-            return f"Started recording grid {grid_name} to {output_path}"
+        # Clean up the recording entry when process ends (unless a new one replaced it)
+        with self.recording_lock:
+            if self._owns_recording(grid_name):
+                # Still registered: ffmpeg exited without being stopped
+                del self.active_recordings[grid_name]
+                self.journal.record('exited', session, returncode=process.returncode)
+                self.last_error = {
+                    'grid': grid_name,
+                    'message': f"ffmpeg exited with code {process.returncode}",
+                    'time': time.time(),
+                }
+        self.status_changed.set()
+
+    def _owns_recording(self, grid_name):
+        """True if the calling recording thread is the one registered for grid_name"""
+        info = self.active_recordings.get(grid_name)
+        return info is not None and info['thread'] is threading.current_thread()
 
     def stop_recording(self, grid_name=None):
         with self.recording_lock:
@@ -84,40 +151,134 @@ class RTSPStream:
                 # Stop all recordings if no grid specified
                 if not self.active_recordings:
                     return "No recordings are active"
-                
-                stopped_grids = []
-                for grid in list(self.active_recordings.keys()):
-                    result = self._stop_single_recording(grid)
-                    stopped_grids.append(grid)
-                
-                return f"Stopped recording for grids: {', '.join(stopped_grids)}"
+
+                stopped = [self._stop_single_recording(grid) for grid in list(self.active_recordings)]
+                message = f"Stopped recording for grids: {', '.join(grid for grid, _ in stopped)}"
             else:
                 # Stop specific grid recording
                 if grid_name not in self.active_recordings:
                     return f"Grid {grid_name} is not currently recording"
-                
-                return self._stop_single_recording(grid_name)
+
+                stopped = [self._stop_single_recording(grid_name)]
+                message = f"Recording stopped for grid {grid_name}"
+        self._wait_stopped(stopped)
+        return message
 
     def _stop_single_recording(self, grid_name):
-        """Helper method to stop a single recording"""
-        if grid_name not in self.active_recordings:
-            return f"Grid {grid_name} is not recording"
+        """Unregister a recording and signal its ffmpeg; the caller holds recording_lock.
 
-        recording_info = self.active_recordings[grid_name]
+        Returns (grid_name, recording_info) for _wait_stopped(), which the caller runs
+        after releasing the lock so status requests and the next start don't wait on ffmpeg.
+        """
+        recording_info = self.active_recordings.pop(grid_name)
         process = recording_info.get('process')
-        
+
         print(f"Stopping recording for grid: {grid_name}")
-        if process:
+        if process and process.poll() is None:  # Check if process is still running
+            # Send SIGTERM first for graceful shutdown
             process.terminate()
-            try:
-                process.wait(timeout=5)  # Wait up to 5 seconds for graceful termination
-            except subprocess.TimeoutExpired:
-                process.kill()  # Force kill if it doesn't terminate gracefully
-        
-        # Remove from active recordings
-        del self.active_recordings[grid_name]
-        
-        return f"Recording stopped for grid {grid_name}"
+        self.status_changed.set()
+        return grid_name, recording_info
+
+    def _wait_stopped(self, stopped):
+        """Wait for stopped recordings' ffmpeg to finish (killing it after 5 s) and journal the stops"""
+        for grid_name, recording_info in stopped:
+            process = recording_info.get('process')
+            if process:
+                try:
+                    process.wait(timeout=5)  # Wait up to 5 seconds for graceful termination
+                except subprocess.TimeoutExpired:
+                    process.kill()  # Force kill if it doesn't terminate gracefully
+                    process.wait()  # Wait for it to be killed
+            self.journal.record('stopped', recording_info['session'],
+                                returncode=process.returncode if process else None)
+
+    def get_status_snapshot(self):
+        """Per-recording output size and write rate, pushed to /events subscribers"""
+        now = time.time()
+        recordings = []
+        with self.recording_lock:
+            for grid_name, info in self.active_recordings.items():
+                try:
+                    st = os.stat(info['output_path'])
+                    size, last_write_age = st.st_size, round(now - st.st_mtime, 1)
+                except OSError:
+                    size, last_write_age = 0, None
+                last = info['last_size']
+                rate = (size - last[0]) / (now - last[1]) if last and now > last[1] else None
+                info['last_size'] = (size, now)
+                process = info['process']
+                recordings.append({
+                    'grid': grid_name,
+                    'duration': round((datetime.now() - info['start_time']).total_seconds(), 1),
+                    'bytes': size,
+                    'bytes_per_s': round(rate) if rate is not None else None,
+                    'last_write_age': last_write_age,
+                    'ffmpeg_running': process is not None and process.poll() is None,
+                })
+        return {
+            'position': POSITION,
+            'recording': bool(recordings),
+            'recordings': recordings,
+            'error': self.last_error,
+            'time': now,
+        }
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self.subscribers_lock:
+            self.subscribers.add(subscriber)
+        self.status_changed.set()  # send the current state right away
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.subscribers_lock:
+            self.subscribers.discard(subscriber)
+
+    def _publish_status_loop(self):
+        """Push a status snapshot every STATUS_INTERVAL, or immediately after a change"""
+        while True:
+            self.status_changed.wait(STATUS_INTERVAL)
+            self.status_changed.clear()
+            with self.subscribers_lock:
+                subscribers = list(self.subscribers)
+            if not subscribers:
+                continue
+            data = json.dumps(self.get_status_snapshot())
+            for subscriber in subscribers:
+                try:
+                    subscriber.put_nowait(data)
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                        subscriber.put_nowait(data)
+                    except (queue.Empty, queue.Full):
+                        pass
+
+    def recover_from_journal(self, orphans='adopt'):
+        """Adopt or stop ffmpeg processes left by a previous run and repair their files"""
+        def adopt(session, process):
+            with self.recording_lock:
+                self._register_recording(session['grid'], {
+                    'session': session['session'],
+                    'output_path': session['output'],
+                    'start_time': datetime.fromtimestamp(session['opened']),
+                    'counter': session.get('counter'),
+                }, process)
+
+        self.recovered = recover(self.journal, self.rtsp_url, orphans, adopt, repair_fragmented_mp4)
+        return self.recovered
+
+    def get_session(self):
+        """Last journaled session, current recordings and startup recovery, for the UI to resume from"""
+        with self.recording_lock:
+            recording = [{'grid': grid, 'counter': info['counter']} for grid, info in self.active_recordings.items()]
+        return {
+            'position': POSITION,
+            'last': self.journal.last_session(),
+            'recording': recording,
+            'recovered': self.recovered,
+        }
 
     def get_recording_status(self):
         """Get status of all active recordings"""
@@ -207,6 +368,17 @@ def index():
                         console.log(data);
                     });
             }
+
+            // Live status pushed by the recorder
+            const events = new EventSource('/events');
+            events.addEventListener('status', event => {
+                const status = JSON.parse(event.data);
+                const parts = status.recordings.map(r =>
+                    r.grid + ': ' + (r.bytes / 1048576).toFixed(1) + ' MB' +
+                    (r.bytes_per_s !== null ? ', ' + (r.bytes_per_s / 1048576).toFixed(2) + ' MB/s' : ''));
+                if (status.error) parts.push('Error: ' + status.error.message);
+                document.getElementById('status').textContent = parts.length ? parts.join(' | ') : 'Not recording';
+            });
         </script>
     </body>
     </html>
@@ -235,14 +407,45 @@ def status():
     return rtsp_stream.get_recording_status()
 
 
+@app.route('/session')
+def session():
+    """Last recorded grid and what was recovered at startup (JSON)"""
+    return jsonify(rtsp_stream.get_session())
+
+
+@app.route('/events')
+def events():
+    """Server-sent events stream of recording status (one persistent connection per client)"""
+    subscriber = rtsp_stream.subscribe()
+
+    def stream():
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    data = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: status\ndata: {data}\n\n"
+        finally:
+            rtsp_stream.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
 def main():
-    global rtsp_stream, port, POSITION
+    global rtsp_stream, port, POSITION, SAVE_ROOT
 
     parser = argparse.ArgumentParser(description='RTSP Camera Recorder')
     parser.add_argument('--port', type=int, default=5000, help='Port number (default: 5000)')
-    parser.add_argument('--rtsp-url', type=str, default='rtsp://192.168.1.20:8554/unicast', help='RTSP stream URL')
+    parser.add_argument('--rtsp-url', type=str, default='rtsp://192.168.1.20:8554/unicast', help='RTSP stream or local relay URL')
     parser.add_argument('--width', type=int, default=REC_WIDTH, help='Recording width (default: 1920)')
     parser.add_argument('--height', type=int, default=REC_HEIGHT, help='Recording height (default: 1080)')
+    parser.add_argument('--orphans', choices=['adopt', 'stop'], default='adopt',
+                        help='ffmpeg left running by a crashed recorder: adopt it or stop it (default: adopt)')
+    parser.add_argument('--save-root', type=str, default=None,
+                        help=f'Capture root, with the recording journal in its journal/ folder (default: {SAVE_ROOT})')
     args = parser.parse_args()
 
     port = args.port
@@ -253,7 +456,21 @@ def main():
     elif port == 5002:
         POSITION = "top"
 
-    rtsp_stream = RTSPStream(rtsp_url=args.rtsp_url, resolution=(args.width, args.height))
+    journal = None
+    if args.save_root:
+        SAVE_ROOT = os.path.abspath(args.save_root)
+        try:
+            journal = RecordingJournal(journal_path(port, os.path.join(SAVE_ROOT, 'journal')))
+        except RuntimeError as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+
+    try:
+        rtsp_stream = RTSPStream(rtsp_url=args.rtsp_url, resolution=(args.width, args.height), journal=journal)
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    rtsp_stream.recover_from_journal(args.orphans)
 
     try:
         print(f"Starting server on port {args.port}")
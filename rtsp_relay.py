@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Local RTSP Fan-out Relay
+Pulls one camera's RTSP stream from v4l2rtspserver once (ffmpeg, -c copy,
+no re-encode) and re-serves it as MPEG-TS over local HTTP to any number of
+consumers: the UI preview, the recorder's ffmpeg and connection tests.
+Every consumer has a bounded chunk queue, so a slow consumer never stalls
+the camera session or the other consumers. A slow preview loses its oldest
+chunks (and is dropped if it stays behind); a recorder (ffmpeg) is never
+given a stream with gaps, it gets a longer queue and is disconnected when
+that fills. New consumers start from the cached group of pictures so they
+can decode immediately.
+"""
+
+import argparse
+import json
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+RELAY_BASE_PORT = 8654  # relay for the camera on RTSP port 8554 + n listens on 8654 + n
+TS_PACKET_SIZE = 188
+CHUNK_SIZE = TS_PACKET_SIZE * 348  # ~64 KiB max per read; ffmpeg flushes about once per frame
+CONSUMER_QUEUE_CHUNKS = 256  # per-consumer backlog (~10s at 15 fps) before the oldest chunks are dropped
+RECORDER_QUEUE_CHUNKS = 1024  # a recorder's backlog (~1 min at 15 fps) before it is disconnected
+RECORDER_AGENTS = ('Lavf',)  # User-Agent of ffmpeg's HTTP client, i.e. the recorders
+MAX_CONSECUTIVE_DROPS = 256  # a consumer this far behind is disconnected
+MAX_CONSUMERS = 8
+GOP_CACHE_BYTES = 8 * 1024 * 1024  # give up caching if no keyframe arrives within this much data
+PMT_PID = 0x1000  # ffmpeg's default -mpegts_pmt_start_pid
+RESTART_MIN = 1.0  # seconds before restarting a failed source
+RESTART_MAX = 30.0
+SNAPSHOT_TIMEOUT = 10  # seconds
+STREAM_PATH = '/stream.ts'
+
+
+def log(message):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+
+
+class Consumer:
+    """One HTTP client of the relay and its bounded chunk queue"""
+
+    def __init__(self, client, lossless=False):
+        self.client = client
+        # A recorder must not write a stream with chunks missing from the middle of a GOP
+        self.lossless = lossless
+        self.queue = queue.Queue(maxsize=RECORDER_QUEUE_CHUNKS if lossless else CONSUMER_QUEUE_CHUNKS)
+        self.connected = time.time()
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.consecutive_drops = 0
+        self.closed = False
+
+    def offer(self, chunk):
+        """Queue a chunk without blocking; if the consumer is behind, drop the oldest
+        one, or close a lossless consumer"""
+        try:
+            self.queue.put_nowait(chunk)
+            self.consecutive_drops = 0
+            return
+        except queue.Full:
+            pass
+        if self.lossless:
+            self.closed = True
+            return
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.dropped += 1
+        self.consecutive_drops += 1
+        if self.consecutive_drops >= MAX_CONSECUTIVE_DROPS:
+            self.closed = True
+        try:
+            self.queue.put_nowait(chunk)
+        except queue.Full:
+            pass
+
+
+class StreamRelay:
+    """Single ffmpeg pull of an RTSP source, fanned out to Consumers"""
+
+    def __init__(self, source_url):
+        self.source_url = source_url
+        self.consumers = set()
+        self.lock = threading.Lock()
+        self.process = None
+        self.running = False
+        self.thread = None
+        self.source_up = False
+        self.restarts = 0
+        self.bytes_in = 0
+        self.started = None
+        self.last_data = None
+        self.stderr_tail = deque(maxlen=10)
+        # Cache from the most recent keyframe so new consumers can start decoding at once
+        self.gop = []
+        self.gop_bytes = 0
+        self.pat = None
+        self.pmt = None
+
+    def _command(self):
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error']
+        if self.source_url.startswith('rtsp://'):
+            cmd += ['-rtsp_transport', 'tcp']
+        return cmd + [
+            '-i', self.source_url,
+            '-c', 'copy',
+            '-f', 'mpegts',
+            '-flush_packets', '1',
+            'pipe:1'
+        ]
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name="relay-source")
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        process = self.process
+        if process and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        with self.lock:
+            for consumer in self.consumers:
+                consumer.closed = True
+
+    def _run(self):
+        backoff = RESTART_MIN
+        while self.running:
+            started = time.monotonic()
+            self._pull()
+            if not self.running:
+                break
+            self.source_up = False
+            if time.monotonic() - started > RESTART_MAX:
+                backoff = RESTART_MIN
+            reason = self.stderr_tail[-1] if self.stderr_tail else "no output"
+            log(f"✗ Source {self.source_url} ended ({reason}), restarting in {backoff:.0f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, RESTART_MAX)
+            self.restarts += 1
+
+    def _pull(self):
+        log(f"Pulling {self.source_url}")
+        try:
+            self.process = subprocess.Popen(self._command(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            self.stderr_tail.append(str(e))
+            return
+        process = self.process
+        threading.Thread(target=self._drain_stderr, args=(process,), daemon=True).start()
+        with self.lock:
+            self._reset_gop()
+        fd = process.stdout.fileno()
+        pending = b''
+        try:
+            while self.running:
+                data = os.read(fd, CHUNK_SIZE)
+                if not data:
+                    break
+                if not self.source_up:
+                    self.source_up = True
+                    self.started = time.time()
+                    log(f"✓ Source {self.source_url} is up")
+                self.bytes_in += len(data)
+                self.last_data = time.time()
+                # Only hand out whole TS packets so dropped chunks never split one
+                data = pending + data
+                cut = len(data) - len(data) % TS_PACKET_SIZE
+                pending = data[cut:]
+                if cut:
+                    self._publish(data[:cut])
+        except OSError as e:
+            self.stderr_tail.append(str(e))
+        finally:
+            if process.poll() is None:
+                process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def _drain_stderr(self, process):
+        for line in process.stderr:
+            line = line.decode(errors='replace').strip()
+            if line:
+                self.stderr_tail.append(line)
+
+    def _reset_gop(self):
+        self.gop = []
+        self.gop_bytes = 0
+        self.pat = None
+        self.pmt = None
+
+    def _keyframe_offset(self, chunk):
+        """Track PAT/PMT packets and return the offset of the last random access point, or None"""
+        keyframe = None
+        for offset in range(0, len(chunk), TS_PACKET_SIZE):
+            if chunk[offset] != 0x47:
+                continue
+            pid = ((chunk[offset + 1] & 0x1f) << 8) | chunk[offset + 2]
+            if pid == 0:
+                self.pat = chunk[offset:offset + TS_PACKET_SIZE]
+            elif pid == PMT_PID:
+                self.pmt = chunk[offset:offset + TS_PACKET_SIZE]
+            # adaptation field present, non-empty, random_access_indicator set
+            elif chunk[offset + 3] & 0x20 and chunk[offset + 4] and chunk[offset + 5] & 0x40:
+                keyframe = offset
+        return keyframe
+
+    def _publish(self, chunk):
+        with self.lock:
+            keyframe = self._keyframe_offset(chunk)
+            if keyframe is not None and self.pat and self.pmt:
+                self.gop = [self.pat + self.pmt, chunk[keyframe:]]
+                self.gop_bytes = sum(len(c) for c in self.gop)
+            elif self.gop:
+                self.gop.append(chunk)
+                self.gop_bytes += len(chunk)
+                if self.gop_bytes > GOP_CACHE_BYTES:
+                    self.gop, self.gop_bytes = [], 0
+            stale = []
+            for consumer in self.consumers:
+                consumer.offer(chunk)
+                if consumer.closed:
+                    stale.append(consumer)
+            for consumer in stale:
+                self.consumers.discard(consumer)
+                if consumer.lossless:
+                    log(f"✗ Disconnected {consumer.client}: {consumer.queue.qsize()} chunks behind, "
+                        f"closing its stream rather than recording a gap")
+                else:
+                    log(f"✗ Dropped {consumer.client}: {consumer.dropped} chunks behind")
+
+    def subscribe(self, client, lossless=False):
+        """Return a Consumer primed with the cached GOP, or None if the consumer limit is reached"""
+        with self.lock:
+            if len(self.consumers) >= MAX_CONSUMERS:
+                return None
+            consumer = Consumer(client, lossless)
+            if self.gop:
+                consumer.queue.put_nowait(b''.join(self.gop))
+            self.consumers.add(consumer)
+        log(f"+ {client}{' (lossless)' if lossless else ''} ({len(self.consumers)} consumers)")
+        return consumer
+
+    def unsubscribe(self, consumer):
+        with self.lock:
+            self.consumers.discard(consumer)
+        log(f"- {consumer.client} ({consumer.bytes_sent / 1048576:.1f} MB sent, "
+            f"{consumer.dropped} chunks dropped)")
+
+    def snapshot(self):
+        """Decode the cached keyframe to JPEG without touching the camera; None if unavailable"""
+        with self.lock:
+            data = b''.join(self.gop)
+        if not data:
+            return None
+        try:
+            result = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'mpegts', '-i', 'pipe:0',
+                 '-frames:v', '1', '-f', 'image2', '-c:v', 'mjpeg', 'pipe:1'],
+                input=data, capture_output=True, timeout=SNAPSHOT_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        return result.stdout or None
+
+    def status(self):
+        now = time.time()
+        with self.lock:
+            consumers = [{
+                'client': c.client,
+                'connected_s': round(now - c.connected, 1),
+                'bytes_sent': c.bytes_sent,
+                'queued_chunks': c.queue.qsize(),
+                'dropped_chunks': c.dropped,
+                'lossless': c.lossless,
+            } for c in self.consumers]
+            gop_bytes = self.gop_bytes
+        uptime = now - self.started if self.source_up and self.started else None
+        return {
+            'source': self.source_url,
+            'source_up': self.source_up,
+            'restarts': self.restarts,
+            'bytes_in': self.bytes_in,
+            'last_data_age': round(now - self.last_data, 1) if self.last_data else None,
+            'uptime_s': round(uptime, 1) if uptime is not None else None,
+            'gop_cache_bytes': gop_bytes,
+            'last_error': self.stderr_tail[-1] if self.stderr_tail else None,
+            'consumers': consumers,
+        }
+
+
+def start_http_server(relay, host='127.0.0.1', port=RELAY_BASE_PORT):
+    """Serve /stream.ts, /snapshot.jpg and /status; returns the server (serve_forever not started)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class RelayHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass  # consumers are logged by the relay
+
+        def _send(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, data):
+            self._send(status, 'application/json', json.dumps(data).encode())
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == STREAM_PATH:
+                self._stream()
+            elif path == '/snapshot.jpg':
+                image = relay.snapshot()
+                if image:
+                    self._send(200, 'image/jpeg', image)
+                else:
+                    self._send_json(503, {'error': 'No keyframe cached yet'})
+            elif path in ('/', '/status'):
+                self._send_json(200, relay.status())
+            else:
+                self._send_json(404, {'error': f"Unknown path {path}"})
+
+        def _stream(self):
+            agent = self.headers.get('User-Agent', '').split('/', 1)[0] or 'client'
+            consumer = relay.subscribe(f"{agent}@{self.client_address[0]}:{self.client_address[1]}",
+                                       lossless=agent in RECORDER_AGENTS)
+            if consumer is None:
+                self._send_json(503, {'error': 'Too many consumers'})
+                return
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'video/mp2t')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                while relay.running and not consumer.closed:
+                    try:
+                        chunk = consumer.queue.get(timeout=1)
+                    except queue.Empty:
+                        continue  # source restarting; keep the consumer attached
+                    self.wfile.write(chunk)
+                    consumer.bytes_sent += len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                relay.unsubscribe(consumer)
+
+    server = ThreadingHTTPServer((host, port), RelayHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local RTSP fan-out relay (one camera)')
+    parser.add_argument('--source', type=str, default='rtsp://localhost:8554/unicast',
+                        help='RTSP stream to pull (default: rtsp://localhost:8554/unicast)')
+    parser.add_argument('--port', type=int, default=RELAY_BASE_PORT,
+                        help=f'HTTP port to serve on (default: {RELAY_BASE_PORT})')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Address to bind (default: 127.0.0.1, local consumers only)')
+    args = parser.parse_args()
+
+    def handle_signal(sig, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    relay = StreamRelay(args.source)
+    server = start_http_server(relay, args.host, args.port)
+    relay.start()
+    log(f"Relaying {args.source} on http://{args.host}:{args.port}{STREAM_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nRelay stopped")
+    finally:
+        relay.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""
+Camera Stack Supervisor
+Owns every process of the camera stack (v4l2rtspserver, the relay and the
+recorder API per camera, then the UI) instead of leaving them in the
+background. Each service runs in its own process group and is watched from
+its own thread: a readiness probe decides when it is up (the same checks as
+launcher.py), a liveness probe every few seconds catches a hung process, and
+a service that exits or stops answering is restarted with exponential
+backoff. A service is only (re)started while the services it depends on are
+up (RTSP server -> relay -> recorder). On exit the stack is stopped in
+reverse dependency order, each process group with SIGTERM and then SIGKILL.
+
+    python3 supervisor.py run                      # like launcher.py, but supervised
+    python3 supervisor.py run --devices /dev/video0 /dev/video2 --no-ui
+    python3 supervisor.py status                   # services, states, restarts
+    python3 supervisor.py restart recorder-top
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from launcher import (POSITIONS, RECORD_API_BASE_PORT, RECORDER_READY_TIMEOUT, RELAY_BASE_PORT, RELAY_READY_TIMEOUT,
+                      RTSP_BASE_PORT, RTSP_READY_TIMEOUT, TIMINGS_FILE, UI_SCRIPT, VENV_PATH, Timeline, detect_cameras,
+                      free_port, http_json, log_tail, read_config, recorder_ready, relay_ready, rtsp_ready)
+
+SUPERVISOR_PORT = 8092
+MONITOR_INTERVAL = 0.5  # seconds between process exit checks
+LIVENESS_INTERVAL = 5  # seconds between liveness probes of a running service
+LIVENESS_FAILURES = 3  # consecutive failed probes before a service is restarted
+BACKOFF_INITIAL = 1  # seconds before the first restart
+BACKOFF_MAX = 30  # restart delay cap
+STABLE_AFTER = 60  # seconds up before the backoff is reset
+FREE_PORT_AFTER = 2  # consecutive failures before whatever holds the port is terminated
+STOP_TIMEOUT = 5  # seconds for a service to exit after SIGTERM
+GROUP_STOP_TIMEOUT = 2  # seconds for the rest of its process group after SIGTERM
+
+
+def position_name(index):
+    return POSITIONS[index] if index < len(POSITIONS) else f"camera{index + 1}"
+
+
+def signal_group(pgid, sig):
+    try:
+        os.killpg(pgid, sig)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def group_alive(pgid):
+    return signal_group(pgid, 0)
+
+
+def wait_group(pgid, timeout):
+    deadline = time.monotonic() + timeout
+    while group_alive(pgid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not group_alive(pgid)
+
+
+class Service:
+    """One supervised process and the thread that starts, probes and restarts it.
+
+    ready() decides when the service is up and alive() whether it still
+    answers (defaults to ready()). With keep_unready a service that runs
+    but is not ready after ready_timeout counts as up anyway, like
+    v4l2rtspserver in the launchers. With adopt_children the process group
+    of a crashed service is left alone, so the recorder's journal can
+    adopt the ffmpeg it leaves behind.
+    """
+
+    def __init__(self, name, cmd, log_file, cwd=None, port=None, ready=None, alive=None, depends=(),
+                 ready_timeout=10, keep_unready=False, adopt_children=False):
+        self.name = name
+        self.cmd = cmd
+        self.log_file = log_file
+        self.cwd = cwd
+        self.port = port
+        self.ready_check = ready or (lambda: True)
+        self.alive_check = alive or self.ready_check
+        self.depends = list(depends)
+        self.ready_timeout = ready_timeout
+        self.keep_unready = keep_unready
+        self.adopt_children = adopt_children
+
+        self.lock = threading.Lock()
+        self.up = threading.Event()  # ready, or running with keep_unready; dependents wait for this
+        self.stopping = threading.Event()
+        self.restart_requested = threading.Event()
+        self.process = None
+        self.state = 'waiting'
+        self.detail = ''
+        self.restarts = 0
+        self.failures = 0
+        self.started_at = None
+        self.last_exit = None
+        self.last_restart = None
+        self.stale_groups = []  # groups of crashed processes left for adoption, stopped on shutdown
+        self.thread = None
+
+    def _set_state(self, state, detail=''):
+        with self.lock:
+            changed = state != self.state
+            self.state, self.detail = state, detail
+        if changed:
+            print(f"[{time.strftime('%H:%M:%S')}] {self.name}: {state}{f' ({detail})' if detail else ''}", flush=True)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"supervise-{self.name}")
+        self.thread.start()
+
+    def _spawn(self):
+        mode = 'a' if self.restarts or self.failures else 'w'
+        with open(self.log_file, mode) as log:
+            if mode == 'a':
+                log.write(f"\n--- restarted by supervisor at {time.strftime('%H:%M:%S')}: {self.last_restart} ---\n")
+                log.flush()
+            process = subprocess.Popen(self.cmd, cwd=self.cwd, stdout=log, stderr=subprocess.STDOUT,
+                                       start_new_session=True)
+        with self.lock:
+            self.process = process
+            self.started_at = time.monotonic()
+        return process
+
+    def _run(self):
+        while not self.stopping.is_set():
+            waiting = [dep.name for dep in self.depends if not dep.up.is_set()]
+            if waiting:
+                self._set_state('waiting', f"for {', '.join(waiting)}")
+                self.stopping.wait(MONITOR_INTERVAL)
+                continue
+            if self.failures >= FREE_PORT_AFTER and self.port:
+                free_port(self.port)
+            self._set_state('starting')
+            with self.lock:
+                self.started_at = None
+            try:
+                process = self._spawn()
+            except OSError as e:
+                reason = f"could not start: {e}"
+            else:
+                reason = self._watch(process)
+            self.up.clear()
+            if self.stopping.is_set():
+                break
+
+            with self.lock:
+                uptime = time.monotonic() - self.started_at if self.started_at else 0
+                self.last_restart = reason
+                if self.restart_requested.is_set() or uptime >= STABLE_AFTER:
+                    self.failures = 0
+                self.failures += 0 if self.restart_requested.is_set() else 1
+                self.restarts += 1
+                delay = 0 if not self.failures else min(BACKOFF_MAX, BACKOFF_INITIAL * 2 ** (self.failures - 1))
+            self.restart_requested.clear()
+            self._set_state('backoff', f"{reason}, restarting in {delay:g}s")
+            if reason.startswith('exited'):
+                # Only the output of the run that just ended
+                tail = log_tail(self.log_file, 5).split('--- restarted by supervisor')[-1].split('---\n', 1)[-1]
+                if tail.strip():
+                    print(tail.rstrip(), flush=True)
+            self.stopping.wait(delay)
+        self._set_state('stopped')
+
+    def _watch(self, process):
+        """Probe the running process until it has to be restarted; returns the reason"""
+        deadline = time.monotonic() + self.ready_timeout
+        ready = False
+        next_probe = 0
+        probe_failures = 0
+        while not self.stopping.is_set():
+            returncode = process.poll()
+            if returncode is not None:
+                with self.lock:
+                    self.last_exit = returncode
+                self._release(process)
+                return f"exited with code {returncode}"
+            if self.restart_requested.is_set():
+                self._stop(process)
+                return "restart requested"
+
+            now = time.monotonic()
+            if not ready and now >= next_probe:
+                if self.ready_check():
+                    ready = True
+                    self.up.set()
+                    self._set_state('ready', f"PID {process.pid}")
+                    next_probe = now + LIVENESS_INTERVAL
+                elif now >= deadline and self.state == 'starting':
+                    if not self.keep_unready:
+                        self._stop(process)
+                        return f"not ready after {self.ready_timeout}s"
+                    self.up.set()
+                    self._set_state('unready', f"PID {process.pid}, not ready after {self.ready_timeout}s")
+                    next_probe = now + LIVENESS_INTERVAL
+                elif self.state == 'unready':
+                    next_probe = now + LIVENESS_INTERVAL
+            elif ready and now >= next_probe:
+                next_probe = now + LIVENESS_INTERVAL
+                if self.alive_check():
+                    if probe_failures:
+                        self._set_state('ready', f"PID {process.pid}")
+                    probe_failures = 0
+                else:
+                    probe_failures += 1
+                    self._set_state('unhealthy', f"{probe_failures}/{LIVENESS_FAILURES} probes failed")
+                    if probe_failures >= LIVENESS_FAILURES:
+                        self._stop(process)
+                        return f"liveness probe failed {probe_failures} times"
+            self.stopping.wait(MONITOR_INTERVAL)
+        return "stopping"
+
+    def _release(self, process):
+        """After an exit: stop what is left of the group, unless it is kept for adoption"""
+        if not group_alive(process.pid):
+            return
+        if self.adopt_children:
+            with self.lock:
+                self.stale_groups.append(process.pid)
+        else:
+            signal_group(process.pid, signal.SIGTERM)
+            if not wait_group(process.pid, GROUP_STOP_TIMEOUT):
+                signal_group(process.pid, signal.SIGKILL)
+
+    def _stop(self, process):
+        """SIGTERM the service, then its process group, then SIGKILL whatever is left"""
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                pass
+        if signal_group(process.pid, signal.SIGTERM) and not wait_group(process.pid, GROUP_STOP_TIMEOUT):
+            signal_group(process.pid, signal.SIGKILL)
+            print(f"Killed process group {process.pid} of {self.name}")
+        process.wait()
+
+    def request_restart(self):
+        self.restart_requested.set()
+
+    def stop(self):
+        """Stop supervising and stop the process and any groups left behind"""
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=STOP_TIMEOUT + GROUP_STOP_TIMEOUT + LIVENESS_INTERVAL)
+        with self.lock:
+            process, stale, self.stale_groups = self.process, self.stale_groups, []
+        if process is not None:
+            was_running = process.poll() is None
+            self._stop(process)
+            if was_running:
+                print(f"Stopped {self.name} (PID: {process.pid})")
+        for pgid in stale:
+            if signal_group(pgid, signal.SIGTERM) and not wait_group(pgid, GROUP_STOP_TIMEOUT):
+                signal_group(pgid, signal.SIGKILL)
+        self.up.clear()
+        self._set_state('stopped')
+
+    def status(self):
+        with self.lock:
+            running = self.process is not None and self.process.poll() is None
+            return {
+                'name': self.name,
+                'state': self.state,
+                'detail': self.detail,
+                'pid': self.process.pid if running else None,
+                'port': self.port,
+                'depends': [dep.name for dep in self.depends],
+                'uptime': round(time.monotonic() - self.started_at, 1) if running and self.started_at else None,
+                'restarts': self.restarts,
+                'last_exit': self.last_exit,
+                'last_restart': self.last_restart,
+                'log': self.log_file,
+            }
+
+
+class Supervisor:
+    """The supervised services, started as they are added and stopped in reverse order"""
+
+    def __init__(self):
+        self.services = []
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def add(self, service):
+        with self.lock:
+            self.services.append(service)
+        service.start()
+        return service
+
+    def remove(self, service):
+        service.stop()
+        with self.lock:
+            self.services = [s for s in self.services if s is not service]
+
+    def get(self, name):
+        with self.lock:
+            return next((s for s in self.services if s.name == name), None)
+
+    def stop_all(self):
+        """Dependents before their dependencies: every service is stopped after all that depend on it"""
+        with self.lock:
+            remaining = list(self.services)
+        while remaining:
+            needed = {dep for service in remaining for dep in service.depends}
+            batch = [service for service in remaining if service not in needed] or remaining
+            threads = [threading.Thread(target=service.stop) for service in batch]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            remaining = [service for service in remaining if service not in batch]
+
+    def status(self):
+        with self.lock:
+            services = list(self.services)
+        return {'uptime': round(time.monotonic() - self.started, 1),
+                'services': [service.status() for service in services]}
+
+
+def start_status_server(supervisor, host='127.0.0.1', port=SUPERVISOR_PORT):
+    """Serve GET /status and POST /restart?service=<name> from a background thread; returns the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    class SupervisorHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, data):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path in ('/', '/status'):
+                self._send_json(200, supervisor.status())
+            else:
+                self._send_json(404, {'error': f"Unknown path {path}"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != '/restart':
+                self._send_json(404, {'error': f"Unknown action {url.path}"})
+                return
+            name = parse_qs(url.query).get('service', [''])[-1]
+            service = supervisor.get(name)
+            if service is None:
+                self._send_json(404, {'error': f"Unknown service {name!r}"})
+                return
+            service.request_restart()
+            self._send_json(200, service.status())
+
+    server = ThreadingHTTPServer((host, port), SupervisorHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="supervisor-api").start()
+    return server
+
+
+def relay_alive(port):
+    """The relay process answers, whether or not its camera stream is currently up"""
+    return http_json(f"http://localhost:{port}/status")[0] == 200
+
+
+def add_camera(supervisor, index, device, config, directory, python, timeline):
+    """RTSP server -> relay -> recorder API for one camera; returns (camera_url, record_api) or None"""
+    position = position_name(index)
+    rtsp_port = RTSP_BASE_PORT + index
+    rtsp_url = f"rtsp://localhost:{rtsp_port}/unicast"
+    with timeline.step(f"rtsp-{position} :{rtsp_port}") as step:
+        rtsp = supervisor.add(Service(
+            f"rtsp-{position}",
+            ['./v4l2rtspserver', '-P', str(rtsp_port), '-W', str(config['width']), '-H', str(config['height']),
+             '-F', str(config['fps']), device],
+            f"/tmp/rtsp_{rtsp_port}.log", cwd=directory, port=rtsp_port, ready=lambda: rtsp_ready(rtsp_url),
+            ready_timeout=RTSP_READY_TIMEOUT, keep_unready=True))
+        step['ok'] = rtsp.up.wait(RTSP_READY_TIMEOUT * 2)
+    if not step['ok']:
+        timeline.log(f"✗ RTSP server for {device} did not come up\n{log_tail(rtsp.log_file)}")
+        supervisor.remove(rtsp)
+        return None
+
+    camera_url, source = rtsp_url, rtsp
+    if config['relay']:
+        relay_port = RELAY_BASE_PORT + index
+        with timeline.step(f"relay-{position} :{relay_port}") as step:
+            relay = supervisor.add(Service(
+                f"relay-{position}",
+                [python, './rtsp_relay.py', '--source', rtsp_url, '--port', str(relay_port)],
+                f"/tmp/rtsp_relay_{relay_port}.log", cwd=directory, port=relay_port,
+                ready=lambda: relay_ready(relay_port), alive=lambda: relay_alive(relay_port), depends=[rtsp],
+                ready_timeout=RELAY_READY_TIMEOUT))
+            step['ok'] = relay.up.wait(RELAY_READY_TIMEOUT * 2)
+        if step['ok']:
+            camera_url, source = f"http://localhost:{relay_port}/stream.ts", relay
+        else:
+            timeline.log(f"Relay on port {relay_port} unavailable, using {rtsp_url} directly")
+            supervisor.remove(relay)
+
+    api_port = RECORD_API_BASE_PORT + index
+    with timeline.step(f"recorder-{position} :{api_port}") as step:
+        recorder = supervisor.add(Service(
+            f"recorder-{position}",
+            [python, './rtsp_record_api.py', '--port', str(api_port), '--rtsp-url', camera_url],
+            f"/tmp/record_api_{api_port}.log", cwd=directory, port=api_port,
+            ready=lambda: recorder_ready(api_port), depends=[source],
+            ready_timeout=RECORDER_READY_TIMEOUT, adopt_children=True))
+        step['ok'] = recorder.up.wait(RECORDER_READY_TIMEOUT * 2)
+    if not step['ok']:
+        # Still supervised: it keeps being restarted and may come up later
+        timeline.log(f"✗ Recorder on port {api_port} not ready\n{log_tail(recorder.log_file)}")
+    return camera_url, f"http://localhost:{api_port}"
+
+
+def print_status(status):
+    print(f"Supervisor up {status['uptime']:.0f}s")
+    print(f"  {'service':<16} {'state':<10} {'pid':>7} {'uptime':>8} {'restarts':>8}  detail")
+    for service in status['services']:
+        uptime = f"{service['uptime']:.0f}s" if service['uptime'] is not None else '-'
+        print(f"  {service['name']:<16} {service['state']:<10} {service['pid'] or '-':>7} {uptime:>8} "
+              f"{service['restarts']:>8}  {service['detail'] or service['last_restart'] or ''}")
+
+
+def run(args):
+    timeline = Timeline()
+    config = read_config(args.config or os.path.join(args.dir, 'config.txt'))
+    if args.no_relay:
+        config['relay'] = False
+    timeline.log(f"Using resolution: {config['width']}x{config['height']}, FPS: {config['fps']}, "
+                 f"relay: {config['relay']}")
+
+    if not os.access(os.path.join(args.dir, 'v4l2rtspserver'), os.X_OK):
+        print(f"✗ v4l2rtspserver not found in {args.dir}")
+        sys.exit(1)
+
+    if args.devices:
+        cameras = [(device, '') for device in args.devices]
+    else:
+        with timeline.step("detect cameras") as step:
+            cameras = detect_cameras(config, timeline, args.rescan)
+            step['detail'] = f"{len(cameras)} found"
+    if not cameras:
+        print("✗ No playable USB cameras detected.")
+        print("You can check with: ls -la /dev/video* && v4l2-ctl --list-devices")
+        sys.exit(1)
+    for index, (device, serial) in enumerate(cameras):
+        timeline.log(f"{position_name(index)}: {device} (Serial: {serial or 'unknown'})")
+
+    def on_signal(sig, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, on_signal)
+    supervisor = Supervisor()
+    server = None
+    python = sys.executable or 'python3'
+    try:
+        if args.port:
+            try:
+                server = start_status_server(supervisor, args.host, args.port)
+                timeline.log(f"Supervisor status on http://{args.host}:{args.port}/status")
+            except OSError as e:
+                timeline.log(f"✗ Status endpoint unavailable on port {args.port}: {e}")
+
+        with timeline.step("bring up cameras") as step:
+            results = [None] * len(cameras)
+
+            def bring_up(index, device):
+                results[index] = add_camera(supervisor, index, device, config, args.dir, python, timeline)
+
+            threads = [threading.Thread(target=bring_up, args=(index, device))
+                       for index, (device, _) in enumerate(cameras)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            ready = [camera for camera in results if camera]
+            step['ok'] = bool(ready)
+            step['detail'] = f"{len(ready)}/{len(cameras)} up"
+        if not ready:
+            print("✗ No cameras came up.")
+            timeline.report()
+            timeline.save(args.timings)
+            sys.exit(1)
+
+        camera_urls = [url for url, _ in ready]
+        record_apis = [api for _, api in ready]
+        timeline.log(f"Camera URLs: {' '.join(camera_urls)}")
+        timeline.log(f"Record APIs: {' '.join(record_apis)}")
+
+        if args.no_ui:
+            timeline.report()
+            timeline.save(args.timings)
+            print("Services supervised, Ctrl+C to stop")
+            while True:
+                time.sleep(1)
+
+        # The UI is not restarted: closing it ends the session
+        ui_python = os.path.join(VENV_PATH, 'bin', 'python3')
+        if not os.path.exists(ui_python):
+            ui_python = python
+        cmd = [ui_python, f'./{UI_SCRIPT}', '--devices', *camera_urls, '--record-api', *record_apis]
+        timeline.log(f"Command: {' '.join(cmd)}")
+        with timeline.step("launch UI"):
+            ui = subprocess.Popen(cmd, cwd=args.dir)
+        timeline.report()
+        timeline.save(args.timings)
+        ui.wait()
+        if ui.returncode != 0:
+            print(f"✗ UI exited with code {ui.returncode}")
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        if server:
+            server.shutdown()
+        supervisor.stop_all()
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Start and supervise the camera stack')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Start the services and the UI and keep them running')
+    run_parser.add_argument('--dir', type=str, default=script_dir,
+                            help='Package directory with v4l2rtspserver and the scripts (default: this script\'s)')
+    run_parser.add_argument('--config', type=str, default=None, help='Config file (default: <dir>/config.txt)')
+    run_parser.add_argument('--devices', nargs='+', default=None,
+                            help='Use these video devices (in bottom/middle/top order) instead of probing')
+    run_parser.add_argument('--rescan', action='store_true',
+                            help='Probe every camera again instead of using the device cache')
+    run_parser.add_argument('--no-relay', action='store_true', help='Record and preview straight from RTSP')
+    run_parser.add_argument('--no-ui', action='store_true', help='Supervise the services without launching the UI')
+    run_parser.add_argument('--host', type=str, default='127.0.0.1', help='Status bind address (default: 127.0.0.1)')
+    run_parser.add_argument('--port', type=int, default=SUPERVISOR_PORT,
+                            help=f'Status endpoint port, 0 disables it (default: {SUPERVISOR_PORT})')
+    run_parser.add_argument('--timings', type=str, default=TIMINGS_FILE,
+                            help=f'Write the startup timing breakdown here (default: {TIMINGS_FILE})')
+
+    for name, help_text in (('status', 'Show the supervised services'), ('restart', 'Restart one service')):
+        sub = subparsers.add_parser(name, help=help_text)
+        if name == 'restart':
+            sub.add_argument('service', help='Service name, e.g. recorder-top')
+        sub.add_argument('--supervisor', type=str, default=f'http://localhost:{SUPERVISOR_PORT}',
+                         help=f'Supervisor URL (default: http://localhost:{SUPERVISOR_PORT})')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args)
+        return
+    try:
+        if args.command == 'status':
+            with urllib.request.urlopen(f"{args.supervisor}/status", timeout=5) as response:
+                print_status(json.loads(response.read()))
+        else:
+            request = urllib.request.Request(f"{args.supervisor}/restart?service={args.service}", method='POST')
+            with urllib.request.urlopen(request, timeout=5) as response:
+                print(f"✓ Restarting {json.loads(response.read())['name']}")
+    except OSError as e:
+        print(f"✗ {args.supervisor}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,118 +1,830 @@
 import psutil
 import csv
+import json
+import queue
+import threading
 import time
 import subprocess
+import argparse
 from datetime import datetime
 import os
+import re
+import signal
 import getpass
 
 USERNAME = getpass.getuser()
+LOG_DIR = f"/home/{USERNAME}/Desktop/systemlogs/"
+SAMPLE_INTERVAL = 10  # seconds; 0.1-1 gives 1-10 Hz sampling
+FLUSH_INTERVAL = 5  # seconds between flushes of the CSV buffer
+VCGENCMD_INTERVAL = 10  # seconds between vcgencmd get_throttled calls, only without the sysfs node
+VOLTAGE_INTERVAL = 60  # seconds between vcgencmd measure_volts calls (no sysfs source)
+OUTPUT_FORMATS = ('store', 'csv', 'both')  # store = columnar files from metrics_store.py
 
-def get_voltage_info():
+# Live metrics HTTP endpoint (GET /snapshot, GET /events as server-sent events)
+HTTP_PORT = 8090
+CLIENT_QUEUE_SIZE = 32  # events buffered per subscriber; the oldest are dropped when full
+MAX_SUBSCRIBERS = 32
+SSE_KEEPALIVE = 15  # seconds between keep-alive comments on an idle stream
+
+# Optional active write-latency probe (--write-probe DIR)
+WRITE_PROBE_INTERVAL = 30  # seconds between probes
+WRITE_PROBE_SIZE = 4096  # bytes written and fsync'ed per probe
+
+# sysfs sources (read with pread on descriptors kept open between ticks)
+PROC_STAT = '/proc/stat'
+PROC_DISKSTATS = '/proc/diskstats'
+PROC_MEMINFO = '/proc/meminfo'
+SECTOR_SIZE = 512  # /proc/diskstats always counts 512-byte sectors
+THERMAL_PATH = '/sys/class/thermal/thermal_zone0/temp'
+CPUFREQ_DIR = '/sys/devices/system/cpu/cpu0/cpufreq'
+THROTTLED_PATH = '/sys/devices/platform/soc/soc:firmware/get_throttled'
+
+# Camera stack process tagging (ports follow desktopmultiv5.sh: bottom, middle, top)
+POSITIONS = ['bottom', 'middle', 'top']
+RTSP_BASE_PORT = 8554
+RECORD_API_BASE_PORT = 5000
+RELAY_BASE_PORT = 8654  # rtsp_relay.py, one per camera
+PROCESS_SCAN_INTERVAL = 2  # seconds between scans for new camera stack processes
+GRID_PATTERN = re.compile(r'ABC_GRID_([^_/]+)_')
+RTSP_PORT_PATTERN = re.compile(r'rtsp://[^/:]+:(\d+)')
+RELAY_PORT_PATTERN = re.compile(r'http://[^/:]+:(\d+)/stream\.ts')
+
+PROCESS_FIELDNAMES = [
+    'timestamp', 'pid', 'role', 'position', 'grid', 'cpu_percent', 'rss', 'read_bytes', 'write_bytes',
+    'read_rate', 'write_rate', 'ctx_voluntary', 'ctx_involuntary', 'num_threads'
+]
+
+FIELDNAMES = [
+    'timestamp', 'cpu_percent', 'cpu_freq_current', 'cpu_freq_min', 'cpu_freq_max',
+    'memory_total', 'memory_available', 'memory_percent', 'disk_total', 'disk_used', 'disk_percent',
+    'cpu_temperature', 'voltage', 'under_voltage', 'arm_freq_capped', 'currently_throttled', 'soft_temp_limit',
+    'disk_read_bytes_s', 'disk_write_bytes_s', 'disk_read_iops', 'disk_write_iops', 'disk_read_await_ms',
+    'disk_write_await_ms', 'disk_queue_depth', 'disk_util_percent', 'disk_in_flight', 'dirty_bytes',
+    'writeback_bytes', 'write_probe_ms'
+]
+
+
+def decode_throttled(throttled):
+    """Decode the get_throttled bit field"""
+    return {
+        'under_voltage': bool(throttled & 0x1),
+        'arm_freq_capped': bool(throttled & 0x2),
+        'currently_throttled': bool(throttled & 0x4),
+        'soft_temp_limit': bool(throttled & 0x8)
+    }
+
+
+def get_core_voltage():
+    """Core voltage from vcgencmd measure_volts, or None"""
     try:
-        # Get voltage information using vcgencmd
         voltage = subprocess.check_output(['vcgencmd', 'measure_volts']).decode('utf-8')
-        voltage = float(voltage.split('=')[1].strip('V\n'))
-        
-        # Get throttling status
+        return float(voltage.split('=')[1].strip('V\n'))
+    except Exception as e:
+        print(f"Error getting core voltage: {e}")
+        return None
+
+
+def get_throttled_flags():
+    """Throttle flags from vcgencmd get_throttled, each None if unavailable"""
+    try:
         throttled = subprocess.check_output(['vcgencmd', 'get_throttled']).decode('utf-8')
-        throttled = int(throttled.split('=')[1].strip(), 16)
-        
-        # Decode throttling flags
-        under_voltage = bool(throttled & 0x1)
-        arm_freq_capped = bool(throttled & 0x2)
-        currently_throttled = bool(throttled & 0x4)
-        soft_temp_limit = bool(throttled & 0x8)
-        
-        return {
-            'voltage': voltage,
-            'under_voltage': under_voltage,
-            'arm_freq_capped': arm_freq_capped,
-            'currently_throttled': currently_throttled,
-            'soft_temp_limit': soft_temp_limit
-        }
+        return decode_throttled(int(throttled.split('=')[1].strip(), 16))
     except Exception as e:
-        print(f"Error getting voltage info: {e}")
+        print(f"Error getting throttling status: {e}")
+        return dict.fromkeys(('under_voltage', 'arm_freq_capped', 'currently_throttled', 'soft_temp_limit'))
+
+
+class SysfsValue:
+    """A sysfs/procfs file kept open and re-read with pread"""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self.fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            self.fd = None
+
+    @property
+    def available(self):
+        return self.fd is not None
+
+    def read(self, size=4096):
+        if self.fd is None:
+            return None
+        try:
+            return os.pread(self.fd, size, 0).decode('ascii', 'replace')
+        except OSError:
+            return None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def block_device_for(path):
+    """Return the /proc/diskstats name of the whole disk holding path (e.g. mmcblk0), or None"""
+    try:
+        st = os.stat(path)
+        sys_path = os.path.realpath(f"/sys/dev/block/{os.major(st.st_dev)}:{os.minor(st.st_dev)}")
+    except OSError:
+        return None
+    if not os.path.exists(sys_path):
+        return None
+    # Partitions (mmcblk0p2, sda1) sit inside their disk's sysfs directory
+    if os.path.exists(os.path.join(sys_path, 'partition')):
+        sys_path = os.path.dirname(sys_path)
+    return os.path.basename(sys_path)
+
+
+class DiskStats:
+    """Throughput, IOPS, await and queue depth for one block device from /proc/diskstats deltas"""
+
+    def __init__(self, path='/'):
+        self.device = block_device_for(path)
+        self.diskstats = SysfsValue(PROC_DISKSTATS)
+        self.meminfo = SysfsValue(PROC_MEMINFO)
+        self.last = self._read()
+
+    def _read(self):
+        if not self.device:
+            return None
+        text = self.diskstats.read(256 * 1024)
+        if not text:
+            return None
+        for line in text.splitlines():
+            fields = line.split()
+            if len(fields) >= 14 and fields[2] == self.device:
+                return time.monotonic(), [int(v) for v in fields[3:14]]
+        return None
+
+    def _dirty_writeback(self):
+        text = self.meminfo.read(8192) or ''
+        values = {}
+        for line in text.splitlines():
+            name, _, rest = line.partition(':')
+            if name in ('Dirty', 'Writeback'):
+                values[name] = int(rest.split()[0]) * 1024
+        return values.get('Dirty'), values.get('Writeback')
+
+    def sample(self):
+        current = self._read()
+        last, self.last = self.last, current
+        dirty, writeback = self._dirty_writeback()
+        result = dict.fromkeys(('disk_read_bytes_s', 'disk_write_bytes_s', 'disk_read_iops', 'disk_write_iops',
+                                'disk_read_await_ms', 'disk_write_await_ms', 'disk_queue_depth',
+                                'disk_util_percent', 'disk_in_flight'))
+        result.update({'dirty_bytes': dirty, 'writeback_bytes': writeback})
+        if current is None:
+            return result
+        # Fields: reads, reads merged, sectors read, ms reading, writes, writes merged,
+        # sectors written, ms writing, in flight, ms doing I/O, weighted ms doing I/O
+        result['disk_in_flight'] = current[1][8]
+        if last is None or current[0] <= last[0]:
+            return result
+        elapsed = current[0] - last[0]
+        delta = [c - l for c, l in zip(current[1], last[1])]
+        reads, writes = delta[0], delta[4]
+        result.update({
+            'disk_read_bytes_s': round(delta[2] * SECTOR_SIZE / elapsed),
+            'disk_write_bytes_s': round(delta[6] * SECTOR_SIZE / elapsed),
+            'disk_read_iops': round(reads / elapsed, 1),
+            'disk_write_iops': round(writes / elapsed, 1),
+            'disk_read_await_ms': round(delta[3] / reads, 2) if reads else 0.0,
+            'disk_write_await_ms': round(delta[7] / writes, 2) if writes else 0.0,
+            'disk_queue_depth': round(delta[10] / (elapsed * 1000), 2),
+            'disk_util_percent': round(min(100.0, delta[9] / (elapsed * 10)), 1),
+        })
+        return result
+
+    def close(self):
+        self.diskstats.close()
+        self.meminfo.close()
+
+
+class WriteLatencyProbe:
+    """Background thread timing a small write + fsync on the recording filesystem.
+
+    Runs off the sampling thread because a stalled SD card can block fsync
+    for seconds; the sampler only reads the latest result.
+    """
+
+    def __init__(self, directory, interval=WRITE_PROBE_INTERVAL, size=WRITE_PROBE_SIZE):
+        self.path = os.path.join(directory, '.write_probe')
+        self.interval = interval
+        self.data = os.urandom(size)
+        self.latency_ms = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def probe(self):
+        start = time.perf_counter()
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, self.data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return round((time.perf_counter() - start) * 1000, 2)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.latency_ms = self.probe()
+            except OSError as e:
+                print(f"Write probe failed: {e}")
+                self.latency_ms = None
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class Sampler:
+    """Non-blocking metrics sampler.
+
+    CPU usage is computed from /proc/stat deltas between ticks, so a sample
+    never sleeps. Temperature, frequency and throttle flags come from sysfs.
+    vcgencmd is forked every VOLTAGE_INTERVAL seconds for the core voltage,
+    and every VCGENCMD_INTERVAL seconds for the throttle flags only on
+    kernels without the sysfs node.
+    """
+
+    def __init__(self, disk_path='/', write_probe=None):
+        self.disk_path = disk_path
+        self.disk_stats = DiskStats(disk_path)
+        self.write_probe = write_probe
+        self.proc_stat = SysfsValue(PROC_STAT)
+        self.thermal = SysfsValue(THERMAL_PATH)
+        self.freq_current = SysfsValue(os.path.join(CPUFREQ_DIR, 'scaling_cur_freq'))
+        self.freq_min = SysfsValue(os.path.join(CPUFREQ_DIR, 'cpuinfo_min_freq'))
+        self.freq_max = SysfsValue(os.path.join(CPUFREQ_DIR, 'cpuinfo_max_freq'))
+        self.throttled = SysfsValue(THROTTLED_PATH)
+        self.last_cpu_times = self._read_cpu_times()
+        self.voltage = None
+        self.voltage_time = None
+        self.throttled_cache = None
+        self.throttled_time = None
+
+    def _read_cpu_times(self):
+        text = self.proc_stat.read(512)
+        if not text:
+            return None
+        fields = [int(v) for v in text.split('\n', 1)[0].split()[1:]]
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+        # guest time is already included in user/nice
+        return sum(fields[:8]), idle
+
+    def cpu_percent(self):
+        times = self._read_cpu_times()
+        if times is None:
+            return psutil.cpu_percent(interval=None)
+        last, self.last_cpu_times = self.last_cpu_times, times
+        if last is None:
+            return None
+        total = times[0] - last[0]
+        idle = times[1] - last[1]
+        return round(100.0 * (total - idle) / total, 1) if total > 0 else 0.0
+
+    def _read_int(self, value):
+        text = value.read(64)
+        try:
+            return int(text.strip()) if text else None
+        except ValueError:
+            return None
+
+    def cpu_temperature(self):
+        millidegrees = self._read_int(self.thermal)
+        return millidegrees / 1000.0 if millidegrees is not None else None
+
+    def cpu_freq(self):
+        current = self._read_int(self.freq_current)
+        if current is None:
+            freq = psutil.cpu_freq()
+            return (freq.current, freq.min, freq.max) if freq else (None, None, None)
+        minimum = self._read_int(self.freq_min)
+        maximum = self._read_int(self.freq_max)
+        return (current / 1000.0,
+                minimum / 1000.0 if minimum is not None else None,
+                maximum / 1000.0 if maximum is not None else None)
+
+    def voltage_info(self):
+        now = time.monotonic()
+        if self.voltage_time is None or now - self.voltage_time >= VOLTAGE_INTERVAL:
+            self.voltage = get_core_voltage()
+            self.voltage_time = now
+        throttled = self.throttled.read(64)
+        try:
+            flags = decode_throttled(int(throttled.strip(), 16)) if throttled else None
+        except ValueError:
+            flags = None
+        if flags is None:
+            if self.throttled_time is None or now - self.throttled_time >= VCGENCMD_INTERVAL:
+                self.throttled_cache = get_throttled_flags()
+                self.throttled_time = now
+            flags = self.throttled_cache
+        return {'voltage': self.voltage, **flags}
+
+    def sample(self):
+        cpu_freq = self.cpu_freq()
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        voltage_info = self.voltage_info()
         return {
-            'voltage': None,
-            'under_voltage': None,
-            'arm_freq_capped': None,
-            'currently_throttled': None,
-            'soft_temp_limit': None
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            'cpu_percent': self.cpu_percent(),
+            'cpu_freq_current': cpu_freq[0],
+            'cpu_freq_min': cpu_freq[1],
+            'cpu_freq_max': cpu_freq[2],
+            'memory_total': memory.total,
+            'memory_available': memory.available,
+            'memory_percent': memory.percent,
+            'disk_total': disk.total,
+            'disk_used': disk.used,
+            'disk_percent': disk.percent,
+            'cpu_temperature': self.cpu_temperature(),
+            'voltage': voltage_info['voltage'],
+            'under_voltage': voltage_info['under_voltage'],
+            'arm_freq_capped': voltage_info['arm_freq_capped'],
+            'currently_throttled': voltage_info['currently_throttled'],
+            'soft_temp_limit': voltage_info['soft_temp_limit'],
+            **self.disk_stats.sample(),
+            'write_probe_ms': self.write_probe.latency_ms if self.write_probe else None
         }
 
+    def close(self):
+        for value in (self.proc_stat, self.thermal, self.freq_current, self.freq_min,
+                      self.freq_max, self.throttled):
+            value.close()
+        self.disk_stats.close()
+        if self.write_probe:
+            self.write_probe.stop()
+
+
+_default_sampler = None
+
+
 def get_system_metrics():
-    # CPU metrics
-    cpu_percent = psutil.cpu_percent(interval=1)
-    cpu_freq = psutil.cpu_freq()
-    
-    # Memory metrics
-    memory = psutil.virtual_memory()
-    
-    # Disk metrics
-    disk = psutil.disk_usage('/')
-    
-    # Temperature (Raspberry Pi specific)
-    try:
-        temp = psutil.sensors_temperatures()
-        cpu_temp = temp['cpu_thermal'][0].current if 'cpu_thermal' in temp else None
-    except:
-        cpu_temp = None
-    
-    # Get voltage and throttling information
-    voltage_info = get_voltage_info()
-    
-    return {
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'cpu_percent': cpu_percent,
-        'cpu_freq_current': cpu_freq.current if cpu_freq else None,
-        'cpu_freq_min': cpu_freq.min if cpu_freq else None,
-        'cpu_freq_max': cpu_freq.max if cpu_freq else None,
-        'memory_total': memory.total,
-        'memory_available': memory.available,
-        'memory_percent': memory.percent,
-        'disk_total': disk.total,
-        'disk_used': disk.used,
-        'disk_percent': disk.percent,
-        'cpu_temperature': cpu_temp,
-        'voltage': voltage_info['voltage'],
-        'under_voltage': voltage_info['under_voltage'],
-        'arm_freq_capped': voltage_info['arm_freq_capped'],
-        'currently_throttled': voltage_info['currently_throttled'],
-        'soft_temp_limit': voltage_info['soft_temp_limit']
-    }
+    global _default_sampler
+    if _default_sampler is None:
+        _default_sampler = Sampler()
+        time.sleep(0.1)  # give the first CPU delta something to measure
+    return _default_sampler.sample()
+
+
+def position_for_port(port, base_port):
+    index = port - base_port
+    if 0 <= index < len(POSITIONS):
+        return POSITIONS[index]
+    return f"camera_{index + 1}"
+
+
+def classify_process(cmdline):
+    """Return (role, position, grid) for a camera stack process, or None"""
+    if not cmdline:
+        return None
+    executable = os.path.basename(cmdline[0])
+    args = cmdline[1:]
+
+    def arg_value(flag):
+        if flag in args and args.index(flag) + 1 < len(args):
+            return args[args.index(flag) + 1]
+        return None
+
+    if executable == 'v4l2rtspserver':
+        port = arg_value('-P')
+        position = position_for_port(int(port), RTSP_BASE_PORT) if port and port.isdigit() else None
+        return 'v4l2rtspserver', position, None
+
+    if executable == 'ffmpeg':
+        source = arg_value('-i') or ''
+        match = RTSP_PORT_PATTERN.search(source)
+        relay_match = RELAY_PORT_PATTERN.search(source)
+        if match:
+            position = position_for_port(int(match.group(1)), RTSP_BASE_PORT)
+        elif relay_match:
+            position = position_for_port(int(relay_match.group(1)), RELAY_BASE_PORT)
+        else:
+            position = None
+        if cmdline[-1] == 'pipe:1':
+            return 'relay_ffmpeg', position, None
+        grid_match = GRID_PATTERN.search(cmdline[-1])
+        return 'ffmpeg', position, grid_match.group(1) if grid_match else None
+
+    script = next((os.path.basename(a) for a in cmdline if a.endswith('.py')), None)
+    if script == 'rtsp_record_api.py':
+        port = arg_value('--port')
+        position = position_for_port(int(port), RECORD_API_BASE_PORT) if port and port.isdigit() else None
+        return 'recorder', position, None
+    if script == 'rtsp_relay.py':
+        port = arg_value('--port')
+        position = position_for_port(int(port), RELAY_BASE_PORT) if port and port.isdigit() else None
+        return 'relay', position, None
+    if script and script.startswith('UI-'):
+        return 'ui', None, None
+    return None
+
+
+class ProcessSampler:
+    """Per-process resource sampling for the camera stack (RTSP servers, relays, recorders, ffmpeg, UI).
+
+    psutil.Process objects are kept between ticks so CPU percent and I/O
+    rates are deltas; the process table is rescanned for new processes every
+    PROCESS_SCAN_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.processes = {}  # pid -> (psutil.Process, role, position, grid)
+        self.last_io = {}  # pid -> (monotonic time, read_bytes, write_bytes)
+        self.last_scan = 0
+
+    def scan(self):
+        for proc in psutil.process_iter(['pid', 'cmdline']):
+            pid = proc.info['pid']
+            if pid in self.processes:
+                continue
+            tags = classify_process(proc.info['cmdline'])
+            if tags:
+                proc.cpu_percent(interval=None)  # prime the CPU delta
+                self.processes[pid] = (proc, *tags)
+        self.last_scan = time.monotonic()
+
+    def sample(self):
+        now = time.monotonic()
+        if now - self.last_scan >= PROCESS_SCAN_INTERVAL:
+            self.scan()
+
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        rows = []
+        for pid, (proc, role, position, grid) in list(self.processes.items()):
+            try:
+                with proc.oneshot():
+                    cpu = proc.cpu_percent(interval=None)
+                    rss = proc.memory_info().rss
+                    ctx = proc.num_ctx_switches()
+                    threads = proc.num_threads()
+                    try:
+                        io = proc.io_counters()
+                        read_bytes, write_bytes = io.read_bytes, io.write_bytes
+                    except (psutil.AccessDenied, AttributeError):
+                        read_bytes = write_bytes = None
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                del self.processes[pid]
+                self.last_io.pop(pid, None)
+                continue
+            except psutil.AccessDenied:
+                continue
+
+            read_rate = write_rate = None
+            if read_bytes is not None:
+                last = self.last_io.get(pid)
+                if last and now > last[0]:
+                    read_rate = round((read_bytes - last[1]) / (now - last[0]))
+                    write_rate = round((write_bytes - last[2]) / (now - last[0]))
+                self.last_io[pid] = (now, read_bytes, write_bytes)
+
+            rows.append({
+                'timestamp': timestamp,
+                'pid': pid,
+                'role': role,
+                'position': position,
+                'grid': grid,
+                'cpu_percent': cpu,
+                'rss': rss,
+                'read_bytes': read_bytes,
+                'write_bytes': write_bytes,
+                'read_rate': read_rate,
+                'write_rate': write_rate,
+                'ctx_voluntary': ctx.voluntary,
+                'ctx_involuntary': ctx.involuntary,
+                'num_threads': threads,
+            })
+        return rows
+
+
+class CSVMetricsWriter:
+    """Daily CSV file kept open with buffered writes, flushed every FLUSH_INTERVAL seconds"""
+
+    def __init__(self, log_dir=LOG_DIR, prefix='system_metrics', fieldnames=FIELDNAMES,
+                 flush_interval=FLUSH_INTERVAL):
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.fieldnames = fieldnames
+        self.flush_interval = flush_interval
+        self.file = None
+        self.writer = None
+        self.day = None
+        self.last_flush = time.monotonic()
+
+    def _open(self, day):
+        self.close()
+        os.makedirs(self.log_dir, exist_ok=True)
+        filename = os.path.join(self.log_dir, f"{self.prefix}_{day}.csv")
+        file_exists = os.path.isfile(filename) and os.path.getsize(filename) > 0
+        self.file = open(filename, 'a', newline='', buffering=64 * 1024)
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames, extrasaction='ignore')
+        if not file_exists:
+            self.writer.writeheader()
+        self.day = day
+
+    def write(self, metrics):
+        day = datetime.now().strftime('%Y-%m-%d')
+        if day != self.day:
+            self._open(day)
+        self.writer.writerow(metrics)
+        now = time.monotonic()
+        if now - self.last_flush >= self.flush_interval:
+            self.flush()
+            self.last_flush = now
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.flush()
+            self.file.close()
+            self.file = None
+
 
 def save_to_csv(metrics, filename='system_metrics.csv'):
     file_exists = os.path.isfile(filename)
-    
+
     with open(filename, 'a', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=metrics.keys())
-        
+
         if not file_exists:
             writer.writeheader()
-        
+
         writer.writerow(metrics)
-        
-        # Print warning if under voltage is detected
-        if metrics['under_voltage']:
-            print(f"WARNING: Under voltage detected at {metrics['timestamp']}!")
-        if metrics['currently_throttled']:
-            print(f"WARNING: System is currently throttled at {metrics['timestamp']}!")
+    warn_if_throttled(metrics)
+
+
+def warn_if_throttled(metrics, previous=None):
+    """Print warnings for under voltage/throttling (only on change when previous is given)"""
+    for key, message in (('under_voltage', "Under voltage detected"),
+                         ('currently_throttled', "System is currently throttled")):
+        if metrics[key] and (previous is None or not previous.get(key)):
+            print(f"WARNING: {message} at {metrics['timestamp']}!")
+
+
+class StoreMetricsWriter:
+    """Adapter giving metrics_store.MetricsStore the CSVMetricsWriter interface"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def write(self, metrics):
+        self.store.append(metrics)
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        self.store.close()
+
+
+def open_writers(log_dir, output_format):
+    """Return the system metrics writers for the chosen format, falling back to CSV without numpy"""
+    writers = []
+    if output_format in ('store', 'both'):
+        try:
+            from metrics_store import MetricsStore
+            writers.append(StoreMetricsWriter(MetricsStore(os.path.join(log_dir, 'store'))))
+        except ImportError as e:
+            print(f"Columnar store unavailable ({e}), writing CSV instead")
+            output_format = 'csv'
+    if output_format in ('csv', 'both'):
+        writers.append(CSVMetricsWriter(log_dir))
+    return writers
+
+
+class MetricsBroadcaster:
+    """Fans samples out to subscribers without ever blocking the sampler.
+
+    Each event is encoded once; every subscriber gets a bounded queue and a
+    slow client loses its oldest events instead of holding up sampling.
+    """
+
+    def __init__(self, queue_size=CLIENT_QUEUE_SIZE, max_subscribers=MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.latest = {}  # event name -> (event id, encoded data)
+        self.event_id = 0
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        """Return a new subscriber queue, or None if the subscriber limit is reached"""
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            subscriber = queue.Queue(maxsize=self.queue_size)
+            self.subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        encoded = json.dumps(data)
+        with self.lock:
+            self.event_id += 1
+            message = (self.event_id, event, encoded)
+            self.latest[event] = message
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    pass
+
+    def snapshot(self):
+        with self.lock:
+            return {event: json.loads(encoded) for event, (_, _, encoded) in self.latest.items()}
+
+
+def start_http_server(broadcaster, host='0.0.0.0', port=HTTP_PORT):
+    """Serve /snapshot (latest samples as JSON) and /events (SSE stream) in a background thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass  # one line per request would flood the journal
+
+        def _send_json(self, status, data):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path in ('/', '/snapshot'):
+                self._send_json(200, broadcaster.snapshot())
+            elif path == '/events':
+                self._stream_events()
+            else:
+                self._send_json(404, {'error': f"Unknown path {path}"})
+
+        def _stream_events(self):
+            subscriber = broadcaster.subscribe()
+            if subscriber is None:
+                self._send_json(503, {'error': 'Too many subscribers'})
+                return
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.close_connection = True
+                # Start with the latest sample so clients can render immediately
+                with broadcaster.lock:
+                    initial = sorted(broadcaster.latest.values())
+                for message in initial:
+                    self._write_event(*message)
+                while True:
+                    try:
+                        message = subscriber.get(timeout=SSE_KEEPALIVE)
+                    except queue.Empty:
+                        self.wfile.write(b': keep-alive\n\n')
+                        self.wfile.flush()
+                        continue
+                    self._write_event(*message)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                broadcaster.unsubscribe(subscriber)
+
+        def _write_event(self, event_id, event, encoded):
+            self.wfile.write(f"id: {event_id}\nevent: {event}\ndata: {encoded}\n\n".encode())
+            self.wfile.flush()
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"Live metrics at http://{host}:{port}/snapshot and /events")
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Raspberry Pi system monitor')
+    parser.add_argument('--interval', type=float, default=SAMPLE_INTERVAL,
+                        help=f'Seconds between samples (default: {SAMPLE_INTERVAL}; 0.1 = 10 Hz)')
+    parser.add_argument('--log-dir', type=str, default=LOG_DIR, help=f'Output directory (default: {LOG_DIR})')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv',
+                        help='System metrics output: daily CSV, columnar store or both (default: csv)')
+    parser.add_argument('--http-port', type=int, default=HTTP_PORT,
+                        help=f'Port for the live /snapshot and /events endpoint (default: {HTTP_PORT}, 0 disables)')
+    parser.add_argument('--http-host', type=str, default='0.0.0.0', help='Address for the live endpoint')
+    parser.add_argument('--disk-path', type=str, default='/',
+                        help='Path whose filesystem and block device are monitored (default: /)')
+    parser.add_argument('--write-probe', type=str, default=None, metavar='DIR',
+                        help='Time a 4 KiB write + fsync in DIR periodically (off by default)')
+    parser.add_argument('--write-probe-interval', type=float, default=WRITE_PROBE_INTERVAL,
+                        help=f'Seconds between write probes (default: {WRITE_PROBE_INTERVAL})')
+    parser.add_argument('--process-interval', type=float, default=SAMPLE_INTERVAL,
+                        help='Seconds between per-process samples of the camera stack (0 disables)')
+    return parser.parse_args()
+
 
 def main():
+    args = parse_args()
     print("Starting system monitoring...")
+    print(f"Sampling every {args.interval}s, writing to {args.log_dir}")
     print("Press Ctrl+C to stop")
-    
+
+    def handle_signal(sig, frame):
+        raise KeyboardInterrupt
+
+    # systemctl stop sends SIGTERM; close the writers so buffered rows and rollups are saved
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    write_probe = None
+    if args.write_probe:
+        write_probe = WriteLatencyProbe(args.write_probe, args.write_probe_interval).start()
+    sampler = Sampler(args.disk_path, write_probe)
+    print(f"Block device: {sampler.disk_stats.device or 'not found'}")
+    writers = open_writers(args.log_dir, args.format)
+    process_sampler = ProcessSampler() if args.process_interval > 0 else None
+    process_writer = CSVMetricsWriter(args.log_dir, prefix='process_metrics', fieldnames=PROCESS_FIELDNAMES)
+    last_process_sample = 0
+    broadcaster = MetricsBroadcaster()
+    http_server = None
+    if args.http_port:
+        try:
+            http_server = start_http_server(broadcaster, args.http_host, args.http_port)
+        except OSError as e:
+            print(f"Could not start live metrics endpoint on port {args.http_port}: {e}")
+    previous = None
+    last_report = 0
+    samples = 0
+
     try:
+        # Prime the /proc/stat delta so the first row's CPU figure covers a whole interval
+        sampler.cpu_percent()
+        time.sleep(args.interval)
+        next_tick = time.monotonic()
         while True:
-            metrics = get_system_metrics()
-            os.makedirs(f"/home/{USERNAME}/Desktop/systemlogs/", exist_ok=True)
-            filename = f"/home/{USERNAME}/Desktop/systemlogs/system_metrics_{datetime.now().strftime('%Y-%m-%d')}.csv"
-            save_to_csv(metrics, filename)
-            print(f"Metrics recorded at {metrics['timestamp']}")
-            time.sleep(10)  # Wait for 1 minute
+            metrics = sampler.sample()
+            for writer in writers:
+                writer.write(metrics)
+            broadcaster.publish('system', metrics)
+            warn_if_throttled(metrics, previous)
+            previous = metrics
+            samples += 1
+
+            now = time.monotonic()
+            if process_sampler and now - last_process_sample >= args.process_interval:
+                rows = process_sampler.sample()
+                for row in rows:
+                    process_writer.write(row)
+                broadcaster.publish('processes', rows)
+                last_process_sample = now
+
+            if now - last_report >= max(args.interval, FLUSH_INTERVAL):
+                print(f"Metrics recorded at {metrics['timestamp']} ({samples} samples)")
+                last_report = now
+
+            # Fixed-rate schedule; skip missed ticks instead of bursting
+            next_tick += args.interval
+            if next_tick < now:
+                next_tick = now + args.interval
+            time.sleep(max(0, next_tick - time.monotonic()))
     except KeyboardInterrupt:
         print("\nMonitoring stopped by user")
+    finally:
+        for writer in writers:
+            writer.close()
+        process_writer.close()
+        sampler.close()
+        if http_server:
+            http_server.shutdown()
 
 if __name__ == "__main__":
-    main() 
+    main()
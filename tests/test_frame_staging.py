@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import frame_staging
+from frame_staging import FrameStager, flush_leftovers, frame_key
+from recording_journal import JPEG_END
+
+JPEG = b'\xff\xd8' + bytes(64) + JPEG_END
+PREFIX = 'ABC_GRID_A-1_0_recording_20250517_101112_top_frame_'
+
+
+@pytest.fixture(autouse=True)
+def no_memory_pressure(monkeypatch):
+    monkeypatch.setattr(frame_staging, 'mem_available_mb', lambda: None)
+    monkeypatch.setattr(frame_staging, 'free_mb', lambda path: None)
+
+
+def stage(directory, number, data=JPEG, epoch=1747476672):
+    suffix = f'_{epoch}' if epoch else ''
+    path = directory / f'{PREFIX}{number:04d}{suffix}.jpg'
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_frame_key_orders_past_four_digits():
+    names = [f'{PREFIX}{n:04d}_1.jpg' for n in (10000, 9999, 2)]
+    assert sorted(names, key=frame_key) == [names[2], names[1], names[0]]
+
+
+def test_newest_frame_waits_until_a_newer_one_appears(tmp_path):
+    stage_dir, save_dir = tmp_path / 'stage', tmp_path / 'save'
+    stage_dir.mkdir()
+    stager = FrameStager(str(stage_dir), str(save_dir), flush_interval=0)
+    stager.add(stage(stage_dir, 1))
+    assert stager.poll() is None  # only the frame ffmpeg may still be writing
+    stager.add(stage(stage_dir, 2))
+
+    assert stager.poll() == {'files': 1, 'bytes': len(JPEG)}
+    assert os.listdir(save_dir) == [f'{PREFIX}0001_1747476672.jpg']
+    assert sorted(os.listdir(stage_dir)) == [f'{PREFIX}0002_1747476672.jpg']
+
+
+def test_final_flush_writes_everything_and_drops_a_truncated_last_frame(tmp_path):
+    stage_dir, save_dir = tmp_path / 'stage', tmp_path / 'save'
+    stage_dir.mkdir()
+    stager = FrameStager(str(stage_dir), str(save_dir))
+    for number in (1, 2):
+        stager.add(stage(stage_dir, number))
+    stager.add(stage(stage_dir, 3, JPEG[:20]))
+
+    assert stager.flush(final=True) == {'files': 2, 'bytes': 2 * len(JPEG)}
+    assert sorted(os.listdir(save_dir)) == [f'{PREFIX}0001_1747476672.jpg', f'{PREFIX}0002_1747476672.jpg']
+    assert os.listdir(stage_dir) == []
+    assert stager.pending == 0
+
+
+def test_a_failed_flush_keeps_the_frames_staged(tmp_path):
+    stage_dir, save_dir = tmp_path / 'stage', tmp_path / 'save'
+    stage_dir.mkdir()
+    save_dir.write_text('not a directory')
+    stager = FrameStager(str(stage_dir), str(save_dir))
+    for number in (1, 2):
+        stager.add(stage(stage_dir, number))
+
+    assert stager.flush(final=True) is None
+    assert len(os.listdir(stage_dir)) == 2
+    assert stager.pending == 2
+
+
+def test_flush_leftovers_after_a_crash(tmp_path):
+    stage_root, save_root = tmp_path / 'stage', tmp_path / 'save'
+    crashed = stage_root / 'recordings_2025-05-17' / 'A-1-top'
+    running = stage_root / 'recordings_2025-05-17' / 'B-2-top'
+    crashed.mkdir(parents=True)
+    running.mkdir(parents=True)
+    stage(crashed, 1)
+    stage(crashed, 2, epoch=None)  # written, never renamed
+    stage(crashed, 3, JPEG[:20], epoch=None)  # cut off mid-write
+    stage(running, 1)
+
+    directories, files = flush_leftovers(str(stage_root), str(save_root), skip={str(running)})
+
+    assert (directories, files) == (1, 2)
+    saved = sorted(os.listdir(save_root / 'recordings_2025-05-17' / 'A-1-top'))
+    assert saved[0] == f'{PREFIX}0001_1747476672.jpg'
+    assert saved[1].startswith(f'{PREFIX}0002_') and len(saved) == 2
+    assert not crashed.exists()
+    assert len(os.listdir(running)) == 1
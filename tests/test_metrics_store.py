@@ -0,0 +1,98 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from metrics_store import SYSTEM_COLUMNS, MetricsStore, Rollup, list_days, load_day, merge_buckets
+
+
+@pytest.fixture
+def hour_start():
+    """Start of a local hour two hours ago, so every sample lands on one day and in known buckets"""
+    now = time.time()
+    start = now - (now + time.localtime(now).tm_gmtoff) % 3600 - 7200
+    if time.localtime(start).tm_mday != time.localtime(start + 3599).tm_mday:
+        start -= 3600
+    return start
+
+
+def write(root, start, seconds, columns=SYSTEM_COLUMNS, **values):
+    store = MetricsStore(str(root), columns, flush_interval=0)
+    for t in range(*seconds):
+        store.append({'timestamp': start + t, **values})
+    store.close()
+
+
+def test_rollup_buckets_are_aligned_to_local_time(hour_start):
+    rollup = Rollup(60, 1)
+    assert rollup.add(hour_start + 59, np.array([1.0])) is None
+    row = rollup.add(hour_start + 60, np.array([3.0]))
+    assert row[0] == hour_start and row[1] == 1
+    assert list(rollup.finish()[2:]) == [3.0, 3.0, 3.0]
+
+
+def test_rollup_ignores_missing_values():
+    rollup = Rollup(60, 2)
+    rollup.add(0, np.array([1.0, np.nan]))
+    rollup.add(1, np.array([3.0, np.nan]))
+    row = rollup.finish()
+    assert row[1] == 2
+    assert list(row[2:5]) == [1.0, 2.0, 3.0]
+    assert np.isnan(row[5:]).all()
+
+
+def test_raw_samples_and_rollups_round_trip(tmp_path, hour_start):
+    write(tmp_path, hour_start, (0, 120), cpu_percent=50, under_voltage=True)
+    [day] = list_days(str(tmp_path))
+
+    raw = load_day(day, 'raw', ['cpu_percent', 'under_voltage', 'voltage'], str(tmp_path))
+    assert len(raw['timestamp']) == 120
+    assert (raw['cpu_percent'] == 50).all()
+    assert (raw['under_voltage'] == 1).all()
+    assert np.isnan(raw['voltage']).all()
+    minutes = load_day(day, '1m', ['cpu_percent_avg', 'count'], str(tmp_path))
+    assert list(minutes['count']) == [60, 60]
+    assert list(minutes['timestamp']) == [hour_start, hour_start + 60]
+
+
+def test_restart_mid_bucket_merges_into_one_row(tmp_path, hour_start):
+    write(tmp_path, hour_start, (0, 30), cpu_percent=10)
+    write(tmp_path, hour_start, (30, 90), cpu_percent=40)
+    [day] = list_days(str(tmp_path))
+
+    minutes = load_day(day, '1m', ['cpu_percent_min', 'cpu_percent_avg', 'cpu_percent_max'], str(tmp_path))
+
+    assert list(minutes['timestamp']) == [hour_start, hour_start + 60]
+    assert list(minutes['cpu_percent_min']) == [10, 40]
+    assert list(minutes['cpu_percent_avg']) == [25, 40]  # weighted by the 30 and 30 samples
+    assert list(minutes['cpu_percent_max']) == [40, 40]
+    assert 'count' not in minutes
+    hours = load_day(day, '1h', None, str(tmp_path))
+    assert list(hours['count']) == [90]
+
+
+def test_merge_buckets_leaves_unique_rows_alone():
+    data = {'timestamp': np.array([0.0, 60.0]), 'count': np.array([1, 2], dtype='<u4')}
+    assert merge_buckets(data) is data
+
+
+def test_byte_counters_keep_full_precision(tmp_path, hour_start):
+    write(tmp_path, hour_start, (0, 2), dirty_bytes=123456789)
+    [day] = list_days(str(tmp_path))
+
+    assert load_day(day, 'raw', ['dirty_bytes'], str(tmp_path))['dirty_bytes'][0] == 123456789
+    assert load_day(day, '1m', ['dirty_bytes_max'], str(tmp_path))['dirty_bytes_max'][0] == 123456789
+
+
+def test_columns_from_an_older_schema_are_converted(tmp_path, hour_start):
+    old_columns = dict(SYSTEM_COLUMNS, dirty_bytes='<f4', writeback_bytes='<f4')
+    write(tmp_path, hour_start, (0, 10), old_columns, dirty_bytes=1000)
+    write(tmp_path, hour_start, (10, 20), dirty_bytes=123456789)
+    [day] = list_days(str(tmp_path))
+
+    with open(tmp_path / day / 'raw' / 'schema.json') as f:
+        assert json.load(f)['dirty_bytes'] == '<f8'
+    values = load_day(day, 'raw', ['dirty_bytes'], str(tmp_path))['dirty_bytes']
+    assert len(values) == 20
+    assert list(values[[0, -1]]) == [1000, 123456789]
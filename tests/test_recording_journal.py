@@ -0,0 +1,157 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import recording_journal
+from recording_journal import (JPEG_END, RecordingJournal, process_start_time, read_sessions, recover,
+                               repair_fragmented_mp4, repair_frames)
+
+RTSP_URL = 'http://localhost:8654/stream.ts'
+JPEG = b'\xff\xd8' + bytes(64) + JPEG_END
+
+
+def box(kind, payload=0):
+    return (payload + 8).to_bytes(4, 'big') + kind + bytes(payload)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = RecordingJournal(str(tmp_path / 'journal' / 'recorder_5000.jsonl'))
+    yield journal
+    journal.close()
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    """Start a process whose argv[0] is named ffmpeg, writing to the given output"""
+    link = tmp_path / 'bin' / 'ffmpeg'
+    link.parent.mkdir()
+    link.symlink_to(sys.executable)
+    processes = []
+
+    def start(output):
+        process = subprocess.Popen([str(link), '-c', 'import time; time.sleep(60)', output])
+        processes.append(process)
+        return process
+
+    yield start
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def test_replay_merges_events_and_skips_a_torn_line(journal):
+    journal.record('intent', 'a', grid='A-1', output='/x/a.mp4')
+    journal.record('started', 'a', pid=123, pid_start=1)
+    journal.record('intent', 'b', grid='B-2', output='/x/b.mp4')
+    journal.record('stopped', 'a', returncode=0)
+    with open(journal.path, 'a') as f:
+        f.write('{"time": 1, "event": "exi')
+
+    sessions = read_sessions(journal.path)
+    assert list(sessions) == ['a', 'b']
+    assert sessions['a']['event'] == 'stopped'
+    assert sessions['a']['grid'] == 'A-1' and sessions['a']['pid'] == 123
+    assert [s['session'] for s in journal.open_sessions()] == ['b']
+    assert journal.last_session()['session'] == 'b'
+
+
+def test_second_recorder_on_the_same_journal_is_refused(journal):
+    with pytest.raises(RuntimeError):
+        RecordingJournal(journal.path)
+
+
+def test_compaction_keeps_open_sessions_and_removes_dropped_logs(journal, monkeypatch):
+    monkeypatch.setattr(recording_journal, 'KEEP_SESSIONS', 3)
+    monkeypatch.setattr(recording_journal, 'COMPACT_LINES', 10)
+    journal.record('intent', 'open', output='/x/open.mp4')
+    for i in range(8):
+        with open(journal.log_path(f's{i}'), 'w') as f:
+            f.write('error\n')
+        journal.record('intent', f's{i}')
+        journal.record('exited', f's{i}', returncode=1)
+
+    sessions = journal.sessions()
+    assert 'open' in sessions
+    assert len(sessions) <= 3 + 1 + 4  # kept sessions plus those appended since compacting
+    with open(journal.path) as f:
+        assert len(f.readlines()) < 17
+    assert not os.path.exists(journal.log_path('s0'))
+    assert os.path.exists(journal.log_path('s7'))
+
+
+def test_recover_adopts_the_newest_running_ffmpeg(journal, fake_ffmpeg, tmp_path):
+    output = str(tmp_path / 'a.mp4')
+    process = fake_ffmpeg(output)
+    journal.record('intent', 'old', grid='A-1', output=str(tmp_path / 'old.mp4'), rtsp_url=RTSP_URL)
+    journal.record('intent', 'a', grid='B-2', output=output, rtsp_url=RTSP_URL)
+    journal.record('started', 'a', pid=process.pid, pid_start=process_start_time(process.pid))
+    adopted, repaired = [], []
+
+    summaries = recover(journal, RTSP_URL, 'adopt', lambda s, p: adopted.append((s, p)), repaired.append)
+
+    assert [s['action'] for s in summaries] == ['gone', 'adopted']
+    assert adopted[0][0]['session'] == 'a' and adopted[0][1].pid == process.pid
+    assert adopted[0][1].poll() is None
+    assert repaired == [str(tmp_path / 'old.mp4')]
+    sessions = journal.sessions()
+    assert sessions['a']['event'] == 'started' and sessions['a']['adopted']
+    assert sessions['old']['event'] == 'recovered'
+
+
+def test_recover_stops_an_orphan_from_another_source(journal, fake_ffmpeg, tmp_path):
+    output = str(tmp_path / 'a.mp4')
+    process = fake_ffmpeg(output)
+    journal.record('intent', 'a', grid='A-1', output=output, rtsp_url='rtsp://other:8554/unicast')
+    journal.record('started', 'a', pid=process.pid, pid_start=process_start_time(process.pid))
+
+    summaries = recover(journal, RTSP_URL, 'adopt', lambda s, p: pytest.fail('adopted'), lambda path: 'ok')
+
+    assert summaries[0]['action'] == 'stopped'
+    assert process.wait(timeout=5) is not None
+    assert journal.sessions()['a']['event'] == 'recovered'
+
+
+def test_recover_ignores_a_reused_pid(journal, tmp_path):
+    journal.record('intent', 'a', grid='A-1', output=str(tmp_path / 'a.mp4'), rtsp_url=RTSP_URL)
+    # Our own pid is running, but it is not an ffmpeg writing a.mp4
+    journal.record('started', 'a', pid=os.getpid(), pid_start=process_start_time(os.getpid()))
+
+    summaries = recover(journal, RTSP_URL, 'adopt', lambda s, p: pytest.fail('adopted'), lambda path: None)
+
+    assert summaries[0]['action'] == 'gone'
+
+
+def test_repair_fragmented_mp4_truncates_after_the_last_fragment(tmp_path):
+    path = tmp_path / 'a.mp4'
+    complete = box(b'ftyp', 16) + box(b'moov', 32) + box(b'moof', 8) + box(b'mdat', 100)
+    path.write_bytes(complete + box(b'moof', 8) + box(b'mdat', 100)[:50])
+
+    assert repair_fragmented_mp4(str(path)) == 'truncated'
+    assert path.read_bytes() == complete
+    assert repair_fragmented_mp4(str(path)) == 'ok'
+
+
+def test_repair_fragmented_mp4_without_init_segment(tmp_path):
+    path = tmp_path / 'a.mp4'
+    path.write_bytes(box(b'ftyp', 16) + box(b'mdat', 100))
+
+    assert repair_fragmented_mp4(str(path)) == 'unrecoverable'
+    assert repair_fragmented_mp4(str(tmp_path / 'missing.mp4')) == 'missing'
+
+
+def test_repair_frames_renames_complete_frames_and_removes_a_truncated_one(tmp_path):
+    prefix = 'ABC_GRID_A-1_0_recording_20250517_101112_top_frame_'
+    (tmp_path / f'{prefix}0001.jpg').write_bytes(JPEG)
+    (tmp_path / f'{prefix}0002.jpg').write_bytes(JPEG[:20])
+    (tmp_path / f'{prefix}0003_1747476672.jpg').write_bytes(JPEG)
+    (tmp_path / 'other_0001.jpg').write_bytes(JPEG[:20])
+    os.utime(tmp_path / f'{prefix}0001.jpg', (1747476000, 1747476000))
+
+    result = repair_frames(str(tmp_path / f'{prefix}%04d.jpg'))
+
+    assert result == {'renamed': 1, 'removed': 1}
+    assert sorted(os.listdir(tmp_path)) == [f'{prefix}0001_1747476000.jpg', f'{prefix}0003_1747476672.jpg',
+                                            'other_0001.jpg']
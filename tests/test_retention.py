@@ -0,0 +1,166 @@
+import os
+import time
+
+import pytest
+
+import retention
+from capture_catalog import CaptureCatalog
+from retention import RetentionManager
+
+DAY = 86400
+BLOCK = 4096
+
+
+def capture(root, day, name, age_days, size=BLOCK, grid='A-1'):
+    """Write a frame capture of a session folder, aged by age_days"""
+    session = root / f'recordings_{day}' / f'{grid}-top'
+    session.mkdir(parents=True, exist_ok=True)
+    path = session / name
+    path.write_bytes(b'\xff' * size)
+    mtime = time.time() - age_days * DAY
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def frame(grid, number):
+    return f'ABC_GRID_{grid}_0_recording_20250517_101112_top_frame_{number:04d}_1747476672.jpg'
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, 'DELETE_PAUSE', 0)
+    root = tmp_path / 'scout-videos'
+    root.mkdir()
+    return root
+
+
+def manager(root, tmp_path, **kwargs):
+    kwargs.setdefault('max_age_days', 14)
+    kwargs.setdefault('min_free_percent', 0)
+    return RetentionManager(str(root), journal_dir=str(tmp_path / 'journal'), **kwargs)
+
+
+def mark(root, *paths):
+    catalog = CaptureCatalog(str(root))
+    for path in paths:
+        catalog.mark_uploaded(str(path))
+
+
+def test_age_policy_deletes_only_downloaded_sessions(root, tmp_path):
+    old = capture(root, '2025-05-01', frame('A-1', 1), age_days=20, grid='A-1')
+    pending = capture(root, '2025-05-01', frame('B-2', 1), age_days=20, grid='B-2')
+    recent = capture(root, '2025-05-30', frame('C-3', 1), age_days=1, grid='C-3')
+    mark(root, old, recent)
+
+    result = manager(root, tmp_path).run_once()
+
+    assert result['deleted'] == 1
+    assert not old.exists() and not old.parent.exists()
+    assert pending.exists() and recent.exists()
+    assert result['kept'] == {'not downloaded': 1}
+    assert os.path.relpath(old, root) not in CaptureCatalog(str(root)).uploaded_paths()
+
+
+def test_open_journal_session_is_never_deleted(root, tmp_path):
+    from recording_journal import RecordingJournal, journal_path
+    old = capture(root, '2025-05-01', frame('A-1', 1), age_days=20)
+    mark(root, old)
+    journal = RecordingJournal(journal_path(5000, str(tmp_path / 'journal')))
+    journal.record('intent', 'a', output=str(old.parent / 'ABC_GRID_A-1_0_recording_x_top_frame_%04d.jpg'))
+    journal.close()
+
+    result = manager(root, tmp_path).run_once()
+
+    assert result['deleted'] == 0 and result['kept'] == {'recording': 1}
+    assert old.exists()
+
+
+def test_a_capture_added_after_the_scan_is_kept(root, tmp_path):
+    old = capture(root, '2025-05-01', frame('A-1', 1), age_days=20)
+    mark(root, old)
+    rm = manager(root, tmp_path)
+    session = rm.scan()[0]
+    late = capture(root, '2025-05-01', frame('A-1', 2), age_days=20)
+
+    freed, tier_freed, deleted = rm._delete(session, set())
+
+    assert deleted == [str(old)]
+    assert late.exists()
+
+
+def test_size_policy_deletes_oldest_first_until_under_the_cap(root, tmp_path):
+    paths = [capture(root, f'2025-05-0{i}', frame(f'G-{i}', 1), age_days=10 - i, size=BLOCK * 256, grid=f'G-{i}')
+             for i in range(1, 5)]
+    mark(root, *paths)
+    rm = manager(root, tmp_path, max_age_days=0)
+    rm.max_size = 2 * BLOCK * 256
+
+    result = rm.run_once()
+
+    assert result['deleted'] == 2
+    assert [p.exists() for p in paths] == [False, False, True, True]
+
+
+def test_dry_run_deletes_nothing(root, tmp_path):
+    old = capture(root, '2025-05-01', frame('A-1', 1), age_days=20)
+    mark(root, old)
+
+    result = manager(root, tmp_path, dry_run=True).run_once()
+
+    assert result['deleted'] == 1
+    assert old.exists()
+    assert os.path.relpath(old, root) in CaptureCatalog(str(root)).uploaded_paths()
+
+
+def tier(path, tier_root, root):
+    """Move a capture to the tier volume and leave a symlink, like tiering.py"""
+    destination = tier_root / os.path.relpath(path, root)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    os.rename(path, destination)
+    os.symlink(destination, path)
+    return destination
+
+
+def test_free_space_policy_leaves_tiered_copies_alone(root, tmp_path, monkeypatch):
+    tier_root = tmp_path / 'ssd'
+    tiered = capture(root, '2025-05-01', frame('A-1', 1), age_days=5, grid='A-1')
+    mixed_local = capture(root, '2025-05-02', frame('B-2', 1), age_days=4, grid='B-2')
+    mixed_tiered = capture(root, '2025-05-02', frame('B-2', 2), age_days=4, grid='B-2')
+    mark(root, tiered, mixed_local, mixed_tiered)
+    tiered_copy = tier(tiered, tier_root, root)
+    mixed_copy = tier(mixed_tiered, tier_root, root)
+    # 10% free of 100 GB: 10 GB short of the 20% target
+    monkeypatch.setattr(retention, 'free_space', lambda path: (10 * 1024 ** 3, 100 * 1024 ** 3))
+
+    result = manager(root, tmp_path, max_age_days=0, min_free_percent=15, target_free_percent=20).run_once()
+
+    assert result['deleted'] == 1
+    assert os.path.islink(tiered) and tiered_copy.exists()
+    assert not mixed_local.exists()
+    assert os.path.islink(mixed_tiered) and mixed_copy.exists()
+
+
+def test_tier_size_policy_deletes_the_oldest_tiered_copies(root, tmp_path):
+    tier_root = tmp_path / 'ssd'
+    old = capture(root, '2025-05-01', frame('A-1', 1), age_days=5, size=BLOCK * 256, grid='A-1')
+    new = capture(root, '2025-05-02', frame('B-2', 1), age_days=4, size=BLOCK * 256, grid='B-2')
+    mark(root, old, new)
+    old_copy, new_copy = tier(old, tier_root, root), tier(new, tier_root, root)
+    rm = manager(root, tmp_path, max_age_days=0)
+    rm.tier_max_size = BLOCK * 256
+
+    result = rm.run_once()
+
+    assert result['deleted'] == 1
+    assert not os.path.lexists(old) and not old_copy.exists()
+    assert os.path.islink(new) and new_copy.exists()
+
+
+def test_age_policy_deletes_link_and_tiered_copy(root, tmp_path):
+    old = capture(root, '2025-05-01', frame('A-1', 1), age_days=20)
+    mark(root, old)
+    copy = tier(old, tmp_path / 'ssd', root)
+
+    manager(root, tmp_path).run_once()
+
+    assert not os.path.lexists(old) and not copy.exists()
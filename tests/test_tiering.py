@@ -0,0 +1,134 @@
+import os
+
+import pytest
+
+import tiering
+from retention import RetentionManager
+from tiering import LINK_SUFFIX, PART_SUFFIX, TierIndex, Tiering, verify
+
+NAME = 'ABC_GRID_A-1_0_recording_20250517_101112_top_frame_{:04d}_1747476672.jpg'
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root, target = tmp_path / 'scout-videos', tmp_path / 'ssd'
+    session = root / 'recordings_2025-05-17' / 'A-1-top'
+    session.mkdir(parents=True)
+    target.mkdir()
+    return root, target, session
+
+
+@pytest.fixture
+def tier(tree, monkeypatch):
+    root, target, _ = tree
+    tier = Tiering(str(root), str(target), min_age=0)
+    monkeypatch.setattr(tier.throttle, 'wait', lambda nbytes: None)  # no SD card load to follow here
+    yield tier
+    tier.close()
+
+
+def test_copy_file_verifies_and_keeps_the_mtime(tree, tier):
+    root, target, session = tree
+    source = session / NAME.format(1)
+    source.write_bytes(os.urandom(3 * tiering.COPY_BLOCK // 2))
+    os.utime(source, (1747476672, 1747476672))
+    destination = target / 'copy.jpg'
+
+    sha256, size = tier.copy_file(str(source), str(destination))
+
+    assert destination.read_bytes() == source.read_bytes()
+    assert size == source.stat().st_size
+    assert sha256 == tiering.file_sha256(str(source))
+    assert destination.stat().st_mtime == 1747476672
+    assert not os.path.exists(str(destination) + PART_SUFFIX)
+
+
+def test_copy_file_leaves_a_changing_source_in_place(tree, tier, monkeypatch):
+    root, target, session = tree
+    source = session / NAME.format(1)
+    source.write_bytes(b'x' * 1000)
+    destination = target / 'copy.jpg'
+
+    def grow(nbytes):
+        # ffmpeg appends while the first block is copied
+        if source.stat().st_size == 1000:
+            with open(source, 'ab') as f:
+                f.write(b'more')
+
+    monkeypatch.setattr(tier.throttle, 'wait', grow)
+
+    assert tier.copy_file(str(source), str(destination)) is None
+    assert not destination.exists()
+    assert not os.path.exists(str(destination) + PART_SUFFIX)
+
+
+def test_swap_in_link_replaces_the_file_atomically(tree, tier):
+    root, target, session = tree
+    source = session / NAME.format(1)
+    source.write_bytes(b'old')
+    destination = target / 'copy.jpg'
+    destination.write_bytes(b'old')
+    (session / (NAME.format(1) + LINK_SUFFIX)).symlink_to('/nonexistent')  # left by a crash
+
+    tier.swap_in_link(str(source), str(destination))
+
+    assert os.path.islink(source) and os.readlink(source) == str(destination)
+    assert source.read_bytes() == b'old'
+    assert sorted(os.listdir(session)) == [NAME.format(1)]
+
+
+def test_move_session_tiers_captures_and_records_them(tree, tier):
+    root, target, session = tree
+    for number in (1, 2):
+        (session / NAME.format(number)).write_bytes(os.urandom(1000))
+    unrenamed = session / 'ABC_GRID_A-1_0_recording_20250517_101112_top_frame_0003.jpg'
+    unrenamed.write_bytes(b'partial')
+    contents = {name: (session / name).read_bytes() for name in os.listdir(session)}
+    [scanned] = RetentionManager(str(root)).scan()
+
+    files, nbytes = tier.move_session(scanned, set())
+
+    assert (files, nbytes) == (2, 2000)
+    for number in (1, 2):
+        link = session / NAME.format(number)
+        assert os.path.islink(link)
+        assert link.read_bytes() == contents[NAME.format(number)]
+    assert not os.path.islink(unrenamed)
+    index = TierIndex(str(root)).load()
+    assert index['targets'] == [str(target)]
+    relpath = os.path.relpath(session / NAME.format(1), root)
+    assert index['files'][relpath]['target'] == str(target / relpath)
+    assert verify(str(root)) == 0
+
+
+def test_move_session_skips_a_recording_session(tree, tier):
+    root, target, session = tree
+    (session / NAME.format(1)).write_bytes(b'x' * 100)
+    [scanned] = RetentionManager(str(root)).scan()
+
+    assert tier.move_session(scanned, {str(session)}) == (0, 0)
+    assert not os.path.islink(session / NAME.format(1))
+
+
+def test_verify_reports_a_corrupted_copy(tree, tier):
+    root, target, session = tree
+    (session / NAME.format(1)).write_bytes(b'x' * 100)
+    [scanned] = RetentionManager(str(root)).scan()
+    tier.move_session(scanned, set())
+    os.truncate(os.path.realpath(session / NAME.format(1)), 10)
+
+    assert verify(str(root)) == 1
+
+
+def test_prune_index_forgets_deleted_links(tree, tier):
+    root, target, session = tree
+    (session / NAME.format(1)).write_bytes(b'x' * 100)
+    [scanned] = RetentionManager(str(root)).scan()
+    tier.move_session(scanned, set())
+    link = session / NAME.format(1)
+    os.unlink(os.path.realpath(link))
+    os.unlink(link)
+
+    assert tier.prune_index() == 1
+    assert TierIndex(str(root)).load()['files'] == {}
+    assert not (target / 'recordings_2025-05-17').exists()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Tiered Storage
+Moves finished recording sessions from the SD card to a second volume
+(usually a USB SSD) in the background, so recording keeps the SD card to
+itself and old captures stop filling it. Each capture is copied
+sequentially in large blocks to the same relative path under --target,
+fsynced, read back and compared by SHA-256, and then replaced on the SD
+card by a symlink to the copy with an atomic rename. Paths and the upload
+state stay unchanged, and ftpserver.py (with or without --catalog) follows
+the links into the targets listed in .catalog/tiered.json, where every
+moved file is recorded with its checksum. Other FTP servers refuse links
+that leave their root, so tiered captures need ftpserver.py.
+
+Copying is throttled from /proc/diskstats of the SD card: the more the
+recorders are writing, the slower it copies, and it pauses while write
+latency or the queue is high or the recording governor has paused
+transfers.
+
+    python3 tiering.py --target /mnt/scout-ssd/scout-videos --once
+    python3 tiering.py --target /mnt/scout-ssd/scout-videos     # service
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import stat
+import time
+from datetime import datetime
+
+from capture_catalog import STATE_DIR, TIER_INDEX_FILE, open_state_lock, parse_capture_name
+from recording_governor import read_governor_status
+from retention import CAPTURE_ROOT, RECENT_SECONDS, RetentionManager, free_space, lower_priority, open_outputs
+
+TARGET_ROOT = "/mnt/scout-ssd/scout-videos"
+CHECK_INTERVAL = 300  # seconds between passes
+COPY_BLOCK = 4 * 1024 * 1024  # bytes per read/write
+MAX_RATE_MB = 20  # MB/s copy rate while the SD card is otherwise idle
+MIN_RATE_FRACTION = 0.1  # share of MAX_RATE_MB left at full recording load
+BUSY_WRITE_MB = 6  # MB/s of SD card writes that count as full recording load
+PAUSE_WRITE_AWAIT_MS = 50  # pause copying while SD writes take longer than this
+PAUSE_QUEUE_DEPTH = 4  # or while this many requests are queued
+LOAD_SAMPLE_INTERVAL = 1  # seconds between diskstats samples
+TARGET_MIN_FREE_PERCENT = 5  # stop filling the target below this much free space
+PART_SUFFIX = ".tiering-part"
+LINK_SUFFIX = ".tiering-link"
+
+
+def log(message):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+
+def drop_cache(fd):
+    """Let the kernel drop a file's pages so copying does not evict the recorders' cache"""
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except (AttributeError, OSError):
+        pass
+
+
+def fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def file_sha256(path):
+    """SHA-256 read from the device rather than the page cache where possible"""
+    digest = hashlib.sha256()
+    with open(path, 'rb', buffering=0) as f:
+        drop_cache(f.fileno())
+        while True:
+            block = f.read(COPY_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+        drop_cache(f.fileno())
+    return digest.hexdigest()
+
+
+class WriteLoadThrottle:
+    """Copy rate limit derived from the SD card's current write load"""
+
+    def __init__(self, path, max_rate_mb=MAX_RATE_MB, busy_write_mb=BUSY_WRITE_MB):
+        from system_monitor import DiskStats
+        self.disk = DiskStats(path)
+        self.max_rate = max_rate_mb * 1024 * 1024
+        self.busy_write = busy_write_mb * 1024 * 1024
+        self.rate = self.max_rate
+        self.reason = None
+        self.sampled = 0
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+        if not self.disk.device:
+            log(f"✗ No block device found for {path}, copying at {max_rate_mb} MB/s without load throttling")
+
+    def _update(self):
+        now = time.monotonic()
+        if now - self.sampled < LOAD_SAMPLE_INTERVAL:
+            return
+        self.sampled = now
+        sample = self.disk.sample()
+        governor = read_governor_status()
+        write_rate = sample['disk_write_bytes_s']
+        if governor.get('transfers') == 'paused':
+            self.rate, self.reason = 0, f"governor {governor.get('name')}"
+        elif (sample['disk_write_await_ms'] or 0) > PAUSE_WRITE_AWAIT_MS:
+            self.rate, self.reason = 0, f"write await {sample['disk_write_await_ms']} ms"
+        elif (sample['disk_queue_depth'] or 0) > PAUSE_QUEUE_DEPTH:
+            self.rate, self.reason = 0, f"queue depth {sample['disk_queue_depth']}"
+        elif write_rate is None:
+            self.rate, self.reason = self.max_rate, None
+        else:
+            load = min(1.0, write_rate / self.busy_write)
+            self.rate = self.max_rate * max(MIN_RATE_FRACTION, 1.0 - load)
+            self.reason = f"recording {write_rate / 1024 ** 2:.1f} MB/s" if load > 0.1 else None
+
+    def wait(self, nbytes):
+        """Block until nbytes more may be copied"""
+        while True:
+            self._update()
+            if self.rate > 0:
+                break
+            time.sleep(LOAD_SAMPLE_INTERVAL)
+            self.window_start, self.window_bytes = time.monotonic(), 0
+        self.window_bytes += nbytes
+        ahead = self.window_bytes / self.rate - (time.monotonic() - self.window_start)
+        if ahead > 0:
+            time.sleep(ahead)
+        if time.monotonic() - self.window_start > 5:
+            self.window_start, self.window_bytes = time.monotonic(), 0
+
+    def close(self):
+        self.disk.close()
+
+
+class TierIndex:
+    """{'targets': [tier roots], 'files': {relpath: {target, sha256, size, moved}}}.
+
+    Shared with the FTP server (which only serves symlinks into a listed
+    target) through the catalog state lock.
+    """
+
+    def __init__(self, root):
+        self.state_dir = os.path.join(root, STATE_DIR)
+        self.path = os.path.join(self.state_dir, TIER_INDEX_FILE)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault('targets', [])
+        index.setdefault('files', {})
+        return index
+
+    def update(self, target=None, added=None, removed=()):
+        with open_state_lock(self.state_dir) as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index = self.load()
+            if target and target not in index['targets']:
+                index['targets'].append(target)
+            index['files'].update(added or {})
+            for relpath in removed:
+                index['files'].pop(relpath, None)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f, indent=1, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+
+class Tiering:
+    """Moves cold sessions from root to target, one file at a time"""
+
+    def __init__(self, root=CAPTURE_ROOT, target=TARGET_ROOT, max_rate_mb=MAX_RATE_MB, busy_write_mb=BUSY_WRITE_MB,
+                 min_age=RECENT_SECONDS, dry_run=False):
+        self.root = os.path.abspath(root)
+        self.target = os.path.abspath(target)
+        self.min_age = min_age
+        self.dry_run = dry_run
+        self.index = TierIndex(self.root)
+        self.registered = False  # target listed in the index, so the FTP server follows links to it
+        self.skipped = None  # last reason the target was unusable, logged once
+        self.throttle = WriteLoadThrottle(self.root, max_rate_mb, busy_write_mb)
+
+    def target_ready(self):
+        """The target exists, is a different filesystem from the SD card and has room"""
+        if not os.path.isdir(self.target):
+            return False, f"{self.target} not mounted"
+        if os.stat(self.target).st_dev == os.stat(self.root).st_dev:
+            return False, f"{self.target} is on the same filesystem as {self.root}"
+        free, total = free_space(self.target)
+        if total and 100.0 * free / total < TARGET_MIN_FREE_PERCENT:
+            return False, f"{self.target} has less than {TARGET_MIN_FREE_PERCENT}% free"
+        return True, None
+
+    def copy_file(self, source, destination):
+        """Copy, fsync and verify one file; returns (sha256, size) or None if the source changed"""
+        before = os.stat(source)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        part = destination + PART_SUFFIX
+        digest = hashlib.sha256()
+        size = 0
+        with open(source, 'rb', buffering=0) as src, open(part, 'wb', buffering=0) as dst:
+            try:
+                os.posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except (AttributeError, OSError):
+                pass
+            while True:
+                block = src.read(COPY_BLOCK)
+                if not block:
+                    break
+                self.throttle.wait(len(block))
+                digest.update(block)
+                dst.write(block)
+                size += len(block)
+            os.fsync(dst.fileno())
+            drop_cache(src.fileno())
+            drop_cache(dst.fileno())
+        after = os.stat(source)
+        if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns) or size != after.st_size:
+            os.unlink(part)
+            return None
+        os.utime(part, ns=(after.st_atime_ns, after.st_mtime_ns))
+        if file_sha256(part) != digest.hexdigest():
+            os.unlink(part)
+            raise OSError(f"checksum mismatch copying {source}")
+        os.replace(part, destination)
+        fsync_dir(os.path.dirname(destination))
+        return digest.hexdigest(), size
+
+    def swap_in_link(self, source, destination):
+        """Atomically replace the SD card file with a symlink to its copy"""
+        link = source + LINK_SUFFIX
+        if os.path.lexists(link):
+            os.unlink(link)
+        os.symlink(destination, link)
+        os.replace(link, source)
+        fsync_dir(os.path.dirname(source))
+
+    def move_session(self, session, active_outputs):
+        """Tier every regular file of a session; returns (files, bytes)"""
+        paths = [session.path]
+        if session.is_dir:
+            paths = sorted(entry.path for entry in os.scandir(session.path)
+                           if entry.is_file(follow_symlinks=False))
+        moved, moved_bytes, added = 0, 0, {}
+        try:
+            for source in paths:
+                if source.endswith((PART_SUFFIX, LINK_SUFFIX)):
+                    continue
+                st = os.stat(source, follow_symlinks=False)
+                if not stat.S_ISREG(st.st_mode) or time.time() - st.st_mtime < self.min_age:
+                    continue
+                info = parse_capture_name(os.path.basename(source))
+                if info is None or (info['frame'] and not info['epoch']):
+                    continue  # unrenamed frames and other leftovers stay for the recorder to repair
+                if session.path in active_outputs or os.path.dirname(source) in active_outputs:
+                    return moved, moved_bytes
+                relpath = os.path.relpath(source, self.root)
+                destination = os.path.join(self.target, relpath)
+                if self.dry_run:
+                    moved, moved_bytes = moved + 1, moved_bytes + st.st_size
+                    continue
+                if not self.registered:
+                    self.index.update(target=self.target)
+                    self.registered = True
+                result = self.copy_file(source, destination)
+                if result is None:
+                    log(f"{relpath} changed while copying, left in place")
+                    continue
+                self.swap_in_link(source, destination)
+                added[relpath] = {'target': destination, 'sha256': result[0], 'size': result[1],
+                                  'moved': round(time.time())}
+                moved, moved_bytes = moved + 1, moved_bytes + result[1]
+        finally:
+            if added:
+                self.index.update(added=added)
+        return moved, moved_bytes
+
+    def prune_index(self):
+        """Forget entries whose symlink is gone (deleted by retention or by hand)"""
+        files = self.index.load()['files']
+        gone = [relpath for relpath in files if not os.path.islink(os.path.join(self.root, relpath))]
+        if gone and not self.dry_run:
+            self.index.update(removed=gone)
+            for directory in sorted({os.path.dirname(files[relpath]['target']) for relpath in gone}, reverse=True):
+                # Empty session and day folders left on the target
+                while directory.startswith(self.target + os.sep):
+                    try:
+                        os.rmdir(directory)
+                    except OSError:
+                        break
+                    directory = os.path.dirname(directory)
+        return len(gone)
+
+    def run_once(self):
+        ready, reason = self.target_ready()
+        if not ready:
+            if reason != self.skipped:
+                log(f"Tiering skipped: {reason}")
+            self.skipped = reason
+            return None
+        self.skipped = None
+        started = time.monotonic()
+        now = time.time()
+        active_outputs = open_outputs()
+        active_outputs |= {os.path.dirname(path) for path in active_outputs}
+        sessions = [s for s in RetentionManager(self.root).scan()
+                    if s.path not in active_outputs and now - s.newest >= self.min_age and s.local]
+        total_files, total_bytes = 0, 0
+        for session in sessions:
+            ready, reason = self.target_ready()
+            if not ready:
+                log(f"Tiering stopped: {reason}")
+                break
+            try:
+                files, nbytes = self.move_session(session, active_outputs)
+            except OSError as e:
+                log(f"✗ {os.path.relpath(session.path, self.root)}: {e}")
+                continue
+            if files:
+                action = 'Would move' if self.dry_run else 'Moved'
+                throttled = f", throttled by {self.throttle.reason}" if self.throttle.reason else ''
+                log(f"{action} {os.path.relpath(session.path, self.root)} ({files} files, "
+                    f"{nbytes / 1024 ** 2:.1f} MB{throttled})")
+            total_files += files
+            total_bytes += nbytes
+        pruned = self.prune_index()
+        elapsed = time.monotonic() - started
+        log(f"{'Would move' if self.dry_run else 'Moved'} {total_files} files, {total_bytes / 1024 ** 2:.1f} MB "
+            f"in {elapsed:.1f}s ({total_bytes / 1024 ** 2 / max(elapsed, 0.001):.1f} MB/s)"
+            f"{f', {pruned} deleted entries pruned' if pruned else ''}")
+        return {'files': total_files, 'bytes': total_bytes}
+
+    def run(self, interval=CHECK_INTERVAL):
+        log(f"Tiering {self.root} -> {self.target} every {interval:g}s, up to "
+            f"{self.throttle.max_rate / 1024 ** 2:g} MB/s")
+        while True:
+            self.run_once()
+            time.sleep(interval)
+
+    def close(self):
+        self.throttle.close()
+
+
+def verify(root, sample=None):
+    """Re-hash tiered files against the index; returns the number of mismatches"""
+    items = sorted(TierIndex(os.path.abspath(root)).load()['files'].items())
+    items = items[:sample] if sample else items
+    bad = 0
+    for relpath, entry in items:
+        try:
+            ok = file_sha256(entry['target']) == entry['sha256']
+        except OSError as e:
+            ok = False
+            log(f"✗ {relpath}: {e}")
+        if not ok:
+            bad += 1
+            log(f"✗ {relpath}: checksum mismatch at {entry['target']}")
+    log(f"Verified {len(items)} tiered files, {bad} bad")
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move finished recordings from the SD card to a second volume')
+    parser.add_argument('--root', type=str, default=CAPTURE_ROOT, help=f'Capture directory (default: {CAPTURE_ROOT})')
+    parser.add_argument('--target', type=str, default=TARGET_ROOT,
+                        help=f'Directory on the second volume (default: {TARGET_ROOT})')
+    parser.add_argument('--max-rate-mb', type=float, default=MAX_RATE_MB,
+                        help=f'Copy rate in MB/s while the SD card is idle (default: {MAX_RATE_MB})')
+    parser.add_argument('--busy-write-mb', type=float, default=BUSY_WRITE_MB,
+                        help=f'SD card writes in MB/s that count as full recording load (default: {BUSY_WRITE_MB})')
+    parser.add_argument('--min-age', type=float, default=RECENT_SECONDS,
+                        help=f'Only move files unchanged for this many seconds (default: {RECENT_SECONDS})')
+    parser.add_argument('--interval', type=float, default=CHECK_INTERVAL,
+                        help=f'Seconds between passes (default: {CHECK_INTERVAL})')
+    parser.add_argument('--once', action='store_true', help='Run one pass and exit')
+    parser.add_argument('--dry-run', action='store_true', help='Log what would be moved without moving')
+    parser.add_argument('--verify', action='store_true', help='Re-check the checksums of tiered files and exit')
+    args = parser.parse_args()
+
+    if args.verify:
+        raise SystemExit(1 if verify(args.root) else 0)
+    if not os.path.isdir(args.root):
+        print(f"Error: Directory {args.root} does not exist.")
+        raise SystemExit(1)
+    lower_priority()
+    tiering = Tiering(args.root, args.target, args.max_rate_mb, args.busy_write_mb, args.min_age, args.dry_run)
+    try:
+        if args.once:
+            tiering.run_once()
+        else:
+            tiering.run(args.interval)
+    except KeyboardInterrupt:
+        print("\nTiering stopped")
+    finally:
+        tiering.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,11 @@ from tkinter import messagebox
 import vlc
 import platform
 import sys
-import requests
-from datetime import datetime
 import argparse
+from recorder_client import RecorderClient
+from grid_controller import GRID_SETTLE_SECONDS, GridController, start_api_server
+
+STALE_WRITE_SECONDS = 10  # a recording whose file has not grown for this long is flagged
 
 
 class RTSPStream:
@@ -14,10 +16,15 @@ class RTSPStream:
         self.rtsp_url = rtsp_url
         self.record_api_url = record_api_url
         self.stream_running = False
+        self.recorder = None  # RecorderClient, set by app
 
         self.frame = tk.Frame(parent, bg='black', width=400, height=300, highlightbackground="gray", highlightthickness=1)
         self.frame.pack_propagate(False)
 
+        # Packed before the video panel so the expanding panel leaves room for it
+        self.status_label = tk.Label(self.frame, text="", font=('Arial', 11, 'bold'), bg='black', fg='white')
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
+
         self.video_panel = tk.Frame(self.frame, bg='black')
         self.video_panel.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
@@ -48,38 +55,61 @@ class RTSPStream:
             self.player.stop()
             self.stream_running = False
 
-    def start_recording(self, grid_name, counter):
-        params = {'counter': counter, 'grid_name': grid_name}
-        try:
-            r = requests.get(f"{self.record_api_url}/record/start", params=params)
-            print(f"Started recording {grid_name} @ {self.record_api_url}: {r.status_code}")
-        except Exception as e:
-            print(f"Failed to start recording: {e}")
-
-    def stop_recording(self, grid_name):
-        params = {'grid_name': grid_name}
-        try:
-            r = requests.get(f"{self.record_api_url}/record/stop", params=params)
-            print(f"Stopped recording {grid_name} @ {self.record_api_url}: {r.status_code}")
-        except Exception as e:
-            print(f"Failed to stop recording: {e}")
+    def set_record_status(self, text, color='white'):
+        self.status_label.config(text=text, fg=color)
+
+    def follow_recorder_events(self):
+        """Subscribe to the recorder's /events stream for the live badge"""
+        self.recorder.subscribe_events(self.record_api_url, self._on_status_event)
+
+    def _on_status_event(self, status):
+        if status is None:
+            self.set_record_status("recorder offline", 'gray50')
+            return
+        error = status.get('error')
+        recordings = status.get('recordings') or []
+        if recordings:
+            rec = recordings[0]
+            text = f"● {rec['grid']} · {rec['bytes'] / 1048576:.1f} MB"
+            if rec.get('bytes_per_s') is not None:
+                text += f" · {rec['bytes_per_s'] / 1048576:.2f} MB/s"
+            age = rec.get('last_write_age')
+            stale = age is not None and age > STALE_WRITE_SECONDS
+            self.set_record_status(text, '#ffaa00' if stale or not rec['ffmpeg_running'] else '#ff4444')
+        elif error:
+            self.set_record_status(f"✗ {error['grid']}: {error['message'][:40]}", '#ffaa00')
+        elif not self.status_label.cget('text').startswith("waiting for"):
+            self.set_record_status("idle", 'gray70')
+
+    def _on_record_result(self, result, action, grid_name):
+        if result.ok:
+            print(f"{action.capitalize()} recording {grid_name} @ {self.record_api_url}: "
+                  f"{result.status_code} ({result.elapsed_ms:.0f} ms)")
+            if action == 'start':
+                self.set_record_status(f"● recording {grid_name}", '#ff4444')
+            elif self.status_label.cget('text').startswith(("● recording", f"● {grid_name} ")):
+                self.set_record_status("")
+        else:
+            reason = result.error or f"HTTP {result.status_code}"
+            print(f"Failed to {action} recording {grid_name} @ {self.record_api_url}: {reason}")
+            self.set_record_status(f"{action} {grid_name} failed", '#ffaa00')
 
 
 class RTSPPlayerApp:
-    def __init__(self, master, stream_infos):
+    def __init__(self, master, stream_infos, controller_port=0):
         self.master = master
         master.title("Multi RTSP Stream Player")
 
         self.vlc_instance = vlc.Instance()
         self.streams = []
+        self.recorder = RecorderClient(master)
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        self.grid_numbers = [str(i) for i in range(1, 53)]
-        self.grid_suffixes = ['A', 'B']
-
-        self.current_grid_index = 0
-        self.current_prefix = 'A'
-        self.recording_enabled = False
-        self.currently_recording_grid = None
+        # Grid sequencing lives in the controller; every camera is recorded
+        self.controller = GridController([api for _, api in stream_infos], client=self.recorder,
+                                         settle_seconds=GRID_SETTLE_SECONDS)
+        self.controller.add_listener(self._on_controller_event)
+        self.controller_api = start_api_server(self.controller, port=controller_port) if controller_port else None
 
         # Configure root window to use a specific style
         try:
@@ -147,9 +177,14 @@ class RTSPPlayerApp:
 
         for rtsp_url, record_api_url in stream_infos:
             stream = RTSPStream(self.grid_frame, self.vlc_instance, rtsp_url, record_api_url)
+            stream.recorder = self.recorder
             self.streams.append(stream)
 
         self._layout_streams()
+        for stream in self.streams:
+            stream.follow_recorder_events()
+        # Pick up the grid the recorders journaled before a crash or restart
+        self.controller.resume_last_session()
 
         self.bottom_spacer = tk.Frame(master, height=50)
         self.bottom_spacer.pack(fill=tk.X)
@@ -158,37 +193,43 @@ class RTSPPlayerApp:
 
         self.update_grid_display()
 
-    def get_current_label(self):
-        number_index = self.current_grid_index // 2
-        suffix_index = self.current_grid_index % 2
-        return f"{self.current_prefix}-{self.grid_numbers[number_index]}-{self.grid_suffixes[suffix_index]}"
+    def update_grid_display(self, state=None):
+        state = state or self.controller.state()
+        self.grid_label.config(text=state['grid'])
+        print(f"Current grid: {state['grid']}")
 
-    def update_grid_display(self):
-        label = self.get_current_label()
-        self.grid_label.config(text=label)
-        print(f"Current grid: {label}")
+        self.back_button.config(state=tk.NORMAL if state['can_go_back'] else tk.DISABLED)
+        self.forward_button.config(state=tk.NORMAL if state['can_go_forward'] else tk.DISABLED)
 
-        self.back_button.config(state=tk.NORMAL if self.current_grid_index > 0 else tk.DISABLED)
-        self.forward_button.config(
-            state=tk.NORMAL if self.current_grid_index < len(self.grid_numbers) * 2 - 1 else tk.DISABLED
-        )
-
-        if self.recording_enabled:
-            self.start_recording_current_grid()
+        if state['recording_enabled']:
+            # Set to recording state
+            self.toggle_record_button.config(
+                text="Stop Recording All",
+                bg='#ffcccc',       # Light red background
+                fg='#cc0000',       # Dark red text
+                relief='sunken',    # Sunken border to show pressed state
+                activebackground='#ffaaaa',  # Darker red when pressed
+                activeforeground='#aa0000'
+            )
+        else:
+            # Reset to normal state
+            self.toggle_record_button.config(
+                text="Start Recording All",
+                bg='#f0f0f0',       # Light gray
+                fg='black',         # Black text
+                relief='raised',    # Raised border
+                activebackground='#e0e0e0',  # Slightly darker when pressed
+                activeforeground='black'
+            )
 
     def next_grid(self):
-        if self.current_grid_index < len(self.grid_numbers) * 2 - 1:
-            self.current_grid_index += 1
-            self.update_grid_display()
+        self.controller.next_grid()
 
     def previous_grid(self):
-        if self.current_grid_index > 0:
-            self.current_grid_index -= 1
-            self.update_grid_display()
+        self.controller.previous_grid()
 
     def toggle_prefix(self):
-        self.current_prefix = 'B' if self.current_prefix == 'A' else 'A'
-        self.update_grid_display()
+        self.controller.toggle_prefix()
 
     def _layout_streams(self):
         total = len(self.streams)
@@ -233,57 +274,36 @@ class RTSPPlayerApp:
             self.stream_running = True
 
     def toggle_recording(self):
-        if self.recording_enabled:
-            self.stop_recording_current_grid()
-            self.recording_enabled = False
-            # Reset to normal state
-            self.toggle_record_button.config(
-                text="Start Recording All",
-                bg='#f0f0f0',       # Light gray
-                fg='black',         # Black text
-                relief='raised',    # Raised border
-                activebackground='#e0e0e0',  # Slightly darker when pressed
-                activeforeground='black'
-            )
-        else:
-            self.recording_enabled = True
-            # Set to recording state
-            self.toggle_record_button.config(
-                text="Stop Recording All",
-                bg='#ffcccc',       # Light red background
-                fg='#cc0000',       # Dark red text
-                relief='sunken',    # Sunken border to show pressed state
-                activebackground='#ffaaaa',  # Darker red when pressed
-                activeforeground='#aa0000'
-            )
-            self.start_recording_current_grid()
-
-    def start_recording_current_grid(self):
-        grid_name = self.get_current_label()
+        self.controller.toggle_recording()
 
-        if self.currently_recording_grid and self.currently_recording_grid != grid_name:
-            self.stop_recording_grid(self.currently_recording_grid)
-
-        self.currently_recording_grid = grid_name
-        counter = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-")
-
-        for idx, stream in enumerate(self.streams):
-            stream.start_recording(grid_name, f"{counter}{idx}")
-
-    def stop_recording_current_grid(self):
-        if self.currently_recording_grid:
-            self.stop_recording_grid(self.currently_recording_grid)
-            self.currently_recording_grid = None
-
-    def stop_recording_grid(self, grid_name):
-        for stream in self.streams:
-            stream.stop_recording(grid_name)
+    def _on_controller_event(self, event, data):
+        """Render controller events; runs on the Tk thread"""
+        if event == 'state':
+            self.update_grid_display(data)
+        elif event == 'pending':
+            for stream in self.streams:
+                stream.set_record_status(f"waiting for {data}...", 'gray70')
+        elif event == 'request' and data['action'] == 'start':
+            self.streams[data['camera']].set_record_status(f"starting {data['grid']}...", 'gray70')
+        elif event == 'result':
+            self.streams[data['camera']]._on_record_result(data['result'], data['action'], data['grid'])
+
+    def on_close(self):
+        """Stop any recording and let queued recorder requests finish before exiting"""
+        if self.controller_api:
+            self.controller_api.shutdown()
+        self.controller.stop_recording()
+        self.controller.close()
+        self.recorder.shutdown(wait=True)
+        self.master.destroy()
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--devices', nargs='+', required=True, help='List of RTSP URLs')
     parser.add_argument('--record-api', nargs='+', required=True, help='List of API URLs (by position)')
+    parser.add_argument('--controller-port', type=int, default=0,
+                        help='Also serve the grid controller API on this port (default: off)')
     return parser.parse_args()
 
 
@@ -311,7 +331,7 @@ def main():
     except:
         pass
     
-    app = RTSPPlayerApp(root, stream_infos)
+    app = RTSPPlayerApp(root, stream_infos, args.controller_port)
     root.mainloop()
 
 